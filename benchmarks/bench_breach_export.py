@@ -0,0 +1,65 @@
+"""
+Benchmark of exporting synthetic model breaches as CEF and LEEF events
+
+Formats the breaches with the BreachFormatter and writes them in batches to os.devnull,
+to measure the nr of events per second that "dtctl breaches export" can stream.
+
+Usage: python benchmarks/bench_breach_export.py [--breaches 50000] [--models 500] [--runs 5]
+"""
+import os
+import random
+import argparse
+import timeit
+from dtctl.breaches.export import export_breaches, EXPORT_FORMATS
+from dtctl.utils.sinks import StreamSink
+
+
+def make_breaches(rng, nr_of_breaches, nr_of_models):
+    """Create synthetic model breaches with a device and a destination"""
+    breaches = []
+    for pbid in range(nr_of_breaches):
+        pid = rng.randint(1, nr_of_models)
+        breaches.append({
+            'pbid': pbid,
+            'time': 1546300800000 + pbid * 1000,
+            'score': round(rng.random(), 3),
+            'model': {'pid': pid, 'name': 'Synthetic::Model {0}'.format(pid), 'tags': ['AP: Synthetic']},
+            'breachUrl': 'https://darktrace/#modelbreach/{0}'.format(pbid),
+            'triggeredComponents': [{
+                'device': {'did': rng.randint(1, 10000), 'ip': '10.0.{0}.{1}'.format(rng.randint(0, 255),
+                                                                                   rng.randint(1, 254)),
+                           'hostname': 'host{0}.synthetic.local'.format(rng.randint(1, 10000))},
+                'triggeredFilters': [
+                    {'comparatorType': 'display', 'filterType': 'Destination IP',
+                     'trigger': {'value': '192.168.{0}.{1}'.format(rng.randint(0, 255), rng.randint(1, 254))}},
+                    {'comparatorType': '>', 'filterType': 'Data volume', 'trigger': {'value': '1000'}}
+                ]
+            }]
+        })
+    return breaches
+
+
+def export_to_devnull(breaches, output_format):
+    """Export the breaches to os.devnull"""
+    with StreamSink(os.devnull) as sink:
+        return export_breaches(breaches, output_format, sink)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark exporting model breaches as CEF and LEEF events')
+    parser.add_argument('--breaches', type=int, default=50000, help='Number of breaches')
+    parser.add_argument('--models', type=int, default=500, help='Number of breached models')
+    parser.add_argument('--runs', type=int, default=5, help='Number of runs to average over')
+    args = parser.parse_args()
+
+    breaches = make_breaches(random.Random(42), args.breaches, args.models)
+
+    for output_format in EXPORT_FORMATS:
+        assert export_to_devnull(breaches, output_format) == args.breaches
+        duration = timeit.timeit(lambda: export_to_devnull(breaches, output_format), number=args.runs) / args.runs
+        print('{0}: {1} breaches in {2:.1f}ms ({3:.0f} events/s)'.format(
+            output_format, args.breaches, duration * 1000, args.breaches / duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of generating CEF log lines from synthetic packet loss and system usage records
+
+Compares the precompiled header and field mapping of the Cef class against building every
+log line with str.format, strptime and repeated lookups in the mapping.
+
+Usage: python benchmarks/bench_cef.py [--records 20000] [--runs 10]
+"""
+import random
+import argparse
+import timeit
+import datetime as dt
+from dtctl.utils.cef import Cef
+
+
+def make_records(rng, nr_of_records):
+    """Create synthetic system usage records"""
+    start = dt.datetime(2019, 1, 1)
+    return [
+        {
+            'system': 'probe{0}'.format(rng.randint(1, 50)),
+            'ip': '10.0.{0}.{1}'.format(rng.randint(0, 255), rng.randint(1, 254)),
+            'type': 'probe',
+            'timestamp': (start + dt.timedelta(seconds=index * 60)).isoformat('T', 'seconds'),
+            'label': 'Probe {0}=location\\{1}'.format(index, rng.randint(1, 9)),
+            'bandwidth': rng.randint(0, 10 ** 9),
+            'memused': rng.randint(0, 100),
+            'connectionsPerMinuteCurrent': rng.randint(0, 10 ** 5),
+            'cpu': rng.randint(0, 100)
+        }
+        for index in range(nr_of_records)
+    ]
+
+
+def formatted_log_line(cef, json_object, timestamp_key, system_key):
+    """Generate a log line with str.format, strptime and lookups in the mapping for every field"""
+    json_object = dict(json_object)
+    timestamp = dt.datetime.strptime(json_object.pop(timestamp_key), '%Y-%m-%dT%H:%M:%S')
+    system_name = json_object.pop(system_key)
+    ip_address = json_object.pop('ip', None)
+
+    line = 'CEF:{version}|{vendor}|{product}|{device_version}|{class_id}|{name}|{severity}|end={ts} ' \
+           'deviceExternalId={system} '.format(version=cef.version, vendor=cef.vendor, product=cef.product,
+                                                device_version=cef.device_version,
+                                                class_id=cef.device_event_class_id, name=cef.name,
+                                                severity=cef.severity, ts=timestamp.strftime('%b %d %Y %H:%M:%S'),
+                                                system=system_name)
+    if ip_address:
+        line += 'dvc={ip} '.format(ip=ip_address)
+
+    for key, value in json_object.items():
+        if key not in cef.MAPPING[cef.name]:
+            continue
+        if 'Label' in cef.MAPPING[cef.name][key]:
+            line += '{k}={v} '.format(k=cef.MAPPING[cef.name][key], v=key)
+        line += '{k}={v} '.format(k=cef.MAPPING[cef.name][key].replace('Label', ''),
+                                  v=cef.escape_strings_for_cef(value))
+    return line.strip()
+
+
+def formatted_logs(cef, records):
+    """Generate log lines with formatted_log_line"""
+    return ['{0}\n'.format(formatted_log_line(cef, record, 'timestamp', 'system')) for record in records]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark generating CEF log lines')
+    parser.add_argument('--records', type=int, default=20000, help='Number of records')
+    parser.add_argument('--runs', type=int, default=10, help='Number of runs to average over')
+    args = parser.parse_args()
+
+    records = make_records(random.Random(42), args.records)
+    cef = Cef(100, 'System Usage')
+    assert cef.generate_logs(records) == formatted_logs(cef, records)
+
+    formatted_time = timeit.timeit(lambda: formatted_logs(cef, records), number=args.runs) / args.runs
+    compiled_time = timeit.timeit(lambda: cef.generate_logs(records), number=args.runs) / args.runs
+    print('{0} records: str.format {1:.1f}ms ({2:.0f} lines/s), precompiled {3:.1f}ms ({4:.0f} lines/s) '
+          '({5:.1f}x)'.format(args.records, formatted_time * 1000, args.records / formatted_time,
+                              compiled_time * 1000, args.records / compiled_time, formatted_time / compiled_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark of the startup time of dtctl, measured with "python -X importtime"
+
+Exits with a non-zero status if importing the CLI takes longer than the threshold, so it
+can be used to catch startup time regressions (e.g. a heavy library imported at module level).
+
+Usage: python benchmarks/bench_import_time.py [--module dtctl.cli] [--runs 5] [--threshold 250]
+"""
+import re
+import sys
+import argparse
+import subprocess
+
+# Line format: "import time: <self us> | <cumulative us> | <indentation><module name>"
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def measure_import_time(module):
+    """Import a module in a fresh interpreter and return its cumulative import time and slowest imports"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {0}'.format(module)],
+                            stderr=subprocess.PIPE, check=True, universal_newlines=True)
+
+    cumulative_times = {}
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indentation, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        cumulative_times[name] = cumulative
+        # Dependencies of the measured module are indented by two spaces per level
+        if indentation <= 3:
+            top_level.append((cumulative, name))
+
+    if module not in cumulative_times:
+        raise RuntimeError('No import time reported for {0}'.format(module))
+
+    return cumulative_times[module] / 1000, sorted(top_level, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the dtctl CLI')
+    parser.add_argument('--module', default='dtctl.cli', help='Module to import')
+    parser.add_argument('--runs', type=int, default=5, help='Number of measurements, the fastest one is reported')
+    parser.add_argument('--threshold', type=float, default=250.0, help='Maximum import time in milliseconds')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to show')
+    args = parser.parse_args()
+
+    measurements = [measure_import_time(args.module) for _ in range(args.runs)]
+    elapsed, slowest = min(measurements, key=lambda measurement: measurement[0])
+
+    print('{0} imported in {1:.1f}ms (fastest of {2:d} runs, threshold {3:.0f}ms)'.format(
+        args.module, elapsed, args.runs, args.threshold))
+    for cumulative, name in slowest[:args.top]:
+        print('  {0:8.1f}ms  {1}'.format(cumulative / 1000, name))
+
+    if elapsed > args.threshold:
+        print('Import time exceeds the threshold of {0:.0f}ms'.format(args.threshold))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark of converting synthetic system usage records to key=value log lines
+
+Compares iter_log_lines, which builds the " key=" prefixes once per key order and encodes
+values by their type, against building every line with += and json.dumps per value.
+
+Usage: python benchmarks/bench_log_lines.py [--records 20000] [--runs 10]
+"""
+import json
+import random
+import argparse
+import timeit
+import datetime as dt
+from dtctl.utils.parsing import iter_log_lines
+
+
+def make_records(rng, nr_of_records):
+    """Create synthetic system usage records"""
+    start = dt.datetime(2019, 1, 1)
+    return [
+        {
+            'system': 'probe{0}'.format(rng.randint(1, 50)),
+            'ip': '10.0.{0}.{1}'.format(rng.randint(0, 255), rng.randint(1, 254)),
+            'type': 'probe',
+            'timestamp': (start + dt.timedelta(seconds=index * 60)).isoformat('T', 'seconds'),
+            'label': 'Probe "{0}" in location {1}'.format(index, rng.randint(1, 9)),
+            'bandwidth': rng.randint(0, 10 ** 9),
+            'memused': rng.randint(0, 100),
+            'connectionsPerMinuteCurrent': rng.randint(0, 10 ** 5),
+            'cpu': rng.randint(0, 100),
+            'load': round(rng.random() * 4, 2),
+            'master': rng.random() < 0.1,
+            'error': None
+        }
+        for index in range(nr_of_records)
+    ]
+
+
+def concatenated_log_lines(output, timestamp_key='timestamp', system_key='system'):
+    """Convert records to log lines with += and json.dumps per value, popping the timestamp and system"""
+    log_lines = []
+    for line in output:
+        timestamp = line.pop(timestamp_key)
+        system_name = line.pop(system_key)
+        message = ''
+        for key, value in line.items():
+            if isinstance(value, (list, dict, set)):
+                raise TypeError('Nested objects are not supported')
+            message += ' {0}={1}'.format(key, json.dumps(value))
+
+        log_lines.append('[{ts}] {system}{message}\n'.format(ts=timestamp, system=system_name, message=message))
+    return log_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark converting records to log lines')
+    parser.add_argument('--records', type=int, default=20000, help='Number of records')
+    parser.add_argument('--runs', type=int, default=10, help='Number of runs to average over')
+    args = parser.parse_args()
+
+    records = make_records(random.Random(42), args.records)
+    # The concatenating conversion modifies the records, so it gets copies of them, also while timing
+    assert list(iter_log_lines(records)) == concatenated_log_lines([dict(record) for record in records])
+
+    concatenated_time = timeit.timeit(lambda: concatenated_log_lines([dict(record) for record in records]),
+                                      number=args.runs) / args.runs
+    streamed_time = timeit.timeit(lambda: list(iter_log_lines(records)), number=args.runs) / args.runs
+    print('{0} records: += and json.dumps {1:.1f}ms ({2:.0f} lines/s), iter_log_lines {3:.1f}ms ({4:.0f} lines/s) '
+          '({5:.1f}x)'.format(args.records, concatenated_time * 1000, args.records / concatenated_time,
+                              streamed_time * 1000, args.records / streamed_time, concatenated_time / streamed_time))
+
+
+if __name__ == '__main__':
+    main()
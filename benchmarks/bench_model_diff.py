@@ -0,0 +1,111 @@
+"""
+Benchmark of the model diff engine over synthetic model histories
+
+Usage: python benchmarks/bench_model_diff.py [--pairs 5000] [--components 6] [--filters 8]
+"""
+import copy
+import random
+import argparse
+import timeit
+from dtctl.models.model_differ import get_model_differences
+
+
+def make_component(rng, cid, nr_of_filters):
+    """Create a synthetic model component"""
+    return {
+        'cid': cid,
+        'chid': cid * 10,
+        'mlid': rng.randint(1, 100),
+        'active': True,
+        'threshold': rng.randint(1, 1000),
+        'interval': rng.choice([3600, 86400]),
+        'logic': {'data': {'left': 'A', 'operator': 'AND', 'right': 'B'}, 'version': 'v0.1'},
+        'filters': [
+            {
+                'id': chr(ord('A') + index),
+                'cfid': cid * 100 + index,
+                'cfhid': cid * 1000 + index,
+                'filtertype': rng.choice(['Direction', 'Destination IP', 'Connection hostname', 'Protocol']),
+                'comparator': 'display' if index == nr_of_filters - 1 else rng.choice(['is', 'matches', '>']),
+                'arguments': {'value': str(rng.randint(0, 65535))}
+            }
+            for index in range(nr_of_filters)
+        ]
+    }
+
+
+def make_model_version(rng, pid, phid, nr_of_components, nr_of_filters):
+    """Create a synthetic model version"""
+    components = [make_component(rng, phid * 100 + index, nr_of_filters) for index in range(nr_of_components)]
+    return {
+        'policy': {
+            'pid': pid,
+            'phid': phid,
+            'name': 'Synthetic::Model {0}'.format(pid),
+            'message': 'Synthetic update',
+            'tags': ['Synthetic', 'AP: Egress'],
+            'actions': {'alert': True, 'antigena': {}, 'breach': True, 'model': True, 'setPriority': False},
+            'priority': 3,
+            'description': 'Synthetic model',
+            'logic': {'type': 'weightedComponentList', 'version': 1,
+                      'data': [{'cid': component['cid'], 'weight': 1} for component in components]}
+        },
+        'components': components
+    }
+
+
+def make_update(rng, model_version):
+    """Create the next version of a synthetic model with random modifications"""
+    updated = copy.deepcopy(model_version)
+    updated['policy']['phid'] += 1
+    components = updated['components']
+
+    # Every version gets new component ids
+    for component in components:
+        component['cid'] += 1000000
+    for item in updated['policy']['logic']['data']:
+        item['cid'] += 1000000
+
+    modification = rng.choice(['threshold', 'filter', 'weight', 'reorder', 'add', 'remove', 'tags'])
+    if modification == 'threshold':
+        rng.choice(components)['threshold'] += 1
+    elif modification == 'filter':
+        rng.choice(rng.choice(components)['filters'])['arguments']['value'] = 'changed'
+    elif modification == 'weight':
+        rng.choice(updated['policy']['logic']['data'])['weight'] = 2
+    elif modification == 'reorder':
+        rng.shuffle(updated['policy']['logic']['data'])
+    elif modification == 'add':
+        component = make_component(rng, 9999999, len(components[0]['filters']))
+        components.append(component)
+        updated['policy']['logic']['data'].append({'cid': component['cid'], 'weight': 1})
+    elif modification == 'remove' and len(components) > 1:
+        removed = components.pop()
+        updated['policy']['logic']['data'] = [item for item in updated['policy']['logic']['data']
+                                              if item['cid'] != removed['cid']]
+    else:
+        updated['policy']['tags'].append('Changed')
+
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the model diff engine')
+    parser.add_argument('--pairs', type=int, default=5000, help='Number of model version pairs to diff')
+    parser.add_argument('--components', type=int, default=6, help='Number of components per model')
+    parser.add_argument('--filters', type=int, default=8, help='Number of filters per component')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    pairs = []
+    for pid in range(args.pairs):
+        active = make_model_version(rng, pid, 1, args.components, args.filters)
+        pairs.append((make_update(rng, active), active))
+
+    elapsed = timeit.timeit(lambda: [get_model_differences(updated, active) for updated, active in pairs], number=1)
+    print('{0:d} model version pairs diffed in {1:.3f}s ({2:.0f} pairs/s)'.format(
+        args.pairs, elapsed, args.pairs / elapsed))
+
+
+if __name__ == '__main__':
+    main()
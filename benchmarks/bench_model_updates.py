@@ -0,0 +1,84 @@
+"""
+Benchmark of finding models with pending updates and updatable models over synthetic models
+
+Compares the history walk of get_pending_updates and get_updatable against sorting every
+model history, both on a plain "/models" response and on a response served from the
+response cache of the Api (as in "dtctl serve"), where the history state is cached as well.
+
+Usage: python benchmarks/bench_model_updates.py [--models 2000] [--history 10] [--runs 20]
+"""
+import json
+import random
+import argparse
+import timeit
+import datetime as dt
+import requests
+from dtctl.dtapi.api import Api
+from dtctl.models.functions import get_pending_updates, get_updatable, SYSTEM_USERS
+
+
+def make_models(rng, nr_of_models, history_length):
+    """Create synthetic models with unordered histories"""
+    start = dt.datetime(2019, 1, 1)
+    models = []
+    for pid in range(nr_of_models):
+        history = []
+        for phid in range(history_length):
+            modified = start + dt.timedelta(days=phid, seconds=rng.randint(0, 3600))
+            history.append({'phid': pid * 100 + phid, 'active': phid == history_length - 1 - rng.randint(0, 1),
+                            'by': rng.choice(SYSTEM_USERS + ('analyst',)),
+                            'modified': modified.strftime('%Y-%m-%d %H:%M:%S')})
+        rng.shuffle(history)
+        models.append({'pid': pid, 'name': 'Synthetic::Model {0}'.format(pid), 'history': history})
+    return models
+
+
+def sorted_pending_and_updatable(api):
+    """Find models with pending updates and updatable models by sorting every model history"""
+    pending = []
+    for model in api.get('/models'):
+        history_sorted = sorted(model['history'], key=lambda k: k['modified'], reverse=True)
+        if not history_sorted[0]['active']:
+            pending.append(model)
+
+    updatable = []
+    for model in api.get('/models'):
+        history_sorted = sorted(model['history'], key=lambda k: k['modified'], reverse=True)
+        if not history_sorted[0]['active'] and history_sorted[1]['by'] not in SYSTEM_USERS:
+            updatable.append(model['name'])
+    return pending, updatable
+
+
+def pending_and_updatable(api):
+    """Find models with pending updates and updatable models"""
+    return get_pending_updates(api), get_updatable(api)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark finding models with pending updates')
+    parser.add_argument('--models', type=int, default=2000, help='Number of models')
+    parser.add_argument('--history', type=int, default=10, help='Number of history entries per model')
+    parser.add_argument('--runs', type=int, default=20, help='Number of runs to average over')
+    args = parser.parse_args()
+
+    models = make_models(random.Random(42), args.models, args.history)
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = lambda call, **kwargs: models
+
+    cached_api = Api('http://127.0.0.1', 'pubkey', 'privkey', cache_ttl=3600)
+    cached_api.set_cached(requests.Request('GET', cached_api.address + '/models').prepare().url, json.dumps(models))
+
+    pending, updatable = pending_and_updatable(api)
+    assert ([model['pid'] for model in pending], updatable) == \
+        ([model['pid'] for model in sorted_pending_and_updatable(api)[0]], sorted_pending_and_updatable(api)[1])
+
+    for label, target in (('/models response', api), ('cached /models response', cached_api)):
+        sorted_time = timeit.timeit(lambda: sorted_pending_and_updatable(target), number=args.runs) / args.runs
+        new_time = timeit.timeit(lambda: pending_and_updatable(target), number=args.runs) / args.runs
+        print('{0}: sorted histories {1:.1f}ms, history state {2:.1f}ms ({3:.1f}x)'.format(
+            label, sorted_time * 1000, new_time * 1000, sorted_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
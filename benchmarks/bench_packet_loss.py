@@ -0,0 +1,101 @@
+"""
+Benchmark of extracting packet loss information from a year of synthetic packet loss breaches
+
+Compares the single compiled regex of iter_packet_loss_information against four re.search calls
+with pattern strings per trigger value. The breaches are generated one at a time, like the
+breaches of the windows that get_packet_loss requests.
+
+Usage: python benchmarks/bench_packet_loss.py [--probes 20] [--days 365] [--interval 60] [--runs 3]
+"""
+import re
+import random
+import argparse
+import timeit
+from dtctl.system.functions import iter_packet_loss_information
+from dtctl.utils.timeutils import prstime
+
+
+def make_breaches(seed, nr_of_probes, nr_of_days, interval):
+    """Generate synthetic packet loss breaches, one per probe every "interval" minutes"""
+    rng = random.Random(seed)
+    start = 1546300800000
+
+    for minute in range(0, nr_of_days * 24 * 60, interval):
+        for probe in range(1, nr_of_probes + 1):
+            time = start + minute * 60000
+            yield {
+                'pbid': time + probe,
+                'time': time,
+                'triggeredComponents': [{
+                    'time': time,
+                    'triggeredFilters': [
+                        {'comparatorType': 'display', 'filterType': 'Event details',
+                         'trigger': {'value': 'Packet loss'}},
+                        {'comparatorType': 'contains', 'filterType': 'Event details',
+                         'trigger': {'value': 'Host probe-{0:02d}-10.0.0.{0}: Packet loss rate above {1:.2f}% '
+                                              '(worker drop rate: {2:.2f}%)'.format(probe, rng.random() * 10,
+                                                                                    rng.random())}}
+                    ]
+                }]
+            }
+
+
+def searched_packet_loss_information(packet_loss_breaches):
+    """Extract packet loss information with four re.search calls with pattern strings per value"""
+    result = []
+
+    host_regex = r'Host (.+?):'
+    valid_ip_regex = r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$'
+    packet_loss_regex = r'rate above ([0-9]+\.[0-9]+)'
+    worker_drop_regex = r'worker drop rate: ([0-9]+\.[0-9]+)'
+
+    for breach in packet_loss_breaches:
+        for triggered_component in breach['triggeredComponents']:
+            for triggered_filter in triggered_component['triggeredFilters']:
+                if triggered_filter['comparatorType'] == 'display':
+                    continue
+
+                value = triggered_filter['trigger']['value']
+                packet_loss_percentage = re.search(packet_loss_regex, value)[1]
+                worker_drop_percentage = re.search(worker_drop_regex, value)[1]
+                host = re.search(host_regex, value)[1]
+                hostname = '-'.join(host.split('-')[0:-1])
+                ip_address = re.search(valid_ip_regex, host)[0]
+
+                result.append({
+                    'system': hostname,
+                    'ip': ip_address if ip_address else host,
+                    'timestamp': '{0}'.format(prstime(triggered_component['time'], True)),
+                    'packet_loss': float(packet_loss_percentage),
+                    'worker_drop_rate': float(worker_drop_percentage)
+                })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark extracting packet loss information')
+    parser.add_argument('--probes', type=int, default=20, help='Number of probes')
+    parser.add_argument('--days', type=int, default=365, help='Number of days of breaches')
+    parser.add_argument('--interval', type=int, default=60, help='Minutes in between breaches of a probe')
+    parser.add_argument('--runs', type=int, default=3, help='Number of runs to average over')
+    args = parser.parse_args()
+
+    def breaches():
+        return make_breaches(42, args.probes, args.days, args.interval)
+
+    records = list(iter_packet_loss_information(breaches()))
+    assert records == searched_packet_loss_information(breaches())
+
+    # Generating the breaches is part of both timings
+    generate_time = timeit.timeit(lambda: sum(1 for _ in breaches()), number=args.runs) / args.runs
+    searched_time = timeit.timeit(lambda: searched_packet_loss_information(breaches()),
+                                  number=args.runs) / args.runs - generate_time
+    compiled_time = timeit.timeit(lambda: sum(1 for _ in iter_packet_loss_information(breaches())),
+                                  number=args.runs) / args.runs - generate_time
+    print('{0} breaches: re.search {1:.2f}s ({2:.0f} breaches/s), compiled regex {3:.2f}s ({4:.0f} breaches/s) '
+          '({5:.1f}x)'.format(len(records), searched_time, len(records) / searched_time, compiled_time,
+                              len(records) / compiled_time, searched_time / compiled_time))
+
+
+if __name__ == '__main__':
+    main()
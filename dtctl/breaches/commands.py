@@ -1,11 +1,15 @@
 # pylint: disable=C0111
 # pylint: disable=R0801
+import os
 import datetime as dt
 import click
-from dtctl.breaches.functions import report_breaches, get_breaches
+from dtctl.breaches.functions import report_breaches, get_breaches, sync_breaches, get_store_file
+from dtctl.breaches.export import export_breaches, EXPORT_FORMATS
 from dtctl.utils.timeutils import determine_date_range
 from dtctl.utils.output import process_output
 from dtctl.utils.clickutils import OptionMutex
+from dtctl.utils.tagfilter import TAG_FILTER_MODES
+from dtctl.utils.sinks import open_sink, DEFAULT_BATCH_SIZE
 
 
 @click.command('list', short_help='List Darktrace model breaches')
@@ -14,7 +18,11 @@ from dtctl.utils.clickutils import OptionMutex
 @click.option('--include-acknowledged', '-k', is_flag=True, default=False, show_default=True,
               help='Include acknowledged breaches')
 @click.option('--tag', '-t', 'tags', type=click.STRING, multiple=True, cls=OptionMutex,
-              not_required_if=['minimal', 'pid'], help='Filter model breaches based on tag (option reusable)')
+              not_required_if=['minimal', 'pid'],
+              help='Filter model breaches based on current model tag or glob pattern, e.g. "AP: *". '
+                   'With "--local" the tags of the breached model version are used (option reusable)')
+@click.option('--tag-mode', type=click.Choice(TAG_FILTER_MODES), default='any', show_default=True,
+              help='List breaches of models with any, all or none of the tags')
 @click.option('--minimal', '-m', type=click.STRING, is_flag=True, default=False, show_default=True,
               cls=OptionMutex, not_required_if=['tag'], help='Only show minimal breach details')
 @click.option('--minscore', '-s', type=click.FLOAT, default=0.0, show_default=True, cls=OptionMutex,
@@ -27,13 +35,22 @@ from dtctl.utils.clickutils import OptionMutex
               help='Start date of the report. (overwrites the "--days" flag)')
 @click.option('--end-date', type=click.DateTime(formats=('%d-%m-%Y',)),
               help='End date of the report.')
+@click.option('--local', '-l', is_flag=True, default=False, show_default=True,
+              help='Query the local breach store instead of the Darktrace API (see: dtctl breaches sync)')
+@click.option('--store', 'store_file', type=click.Path(),
+              help='Full path to the local breach store. Defaults to breaches.db next to the config file')
 @click.option('--outfile', '-o', help='Full path to the output file.', type=click.Path())
 @click.pass_obj
-def list_breaches(program_state, acknowledged_only, include_acknowledged, tags, minimal, minscore, pid, days,
-                  start_date, end_date, outfile):
+def list_breaches(program_state, acknowledged_only, include_acknowledged, tags, tag_mode, minimal, minscore, pid,
+                  days, start_date, end_date, local, store_file, outfile):
     """List Darktrace model breaches"""
     end_date, start_date = determine_date_range(days, end_date, start_date)
 
+    if local and minimal:
+        raise click.UsageError('The local breach store only contains full breach details. '
+                               'Option "--minimal" cannot be used with "--local"')
+    store_file = get_store_file(program_state.config_file, store_file) if local else None
+
     if minscore > 1.0:
         minscore = 1.0
     if minscore < 0.0:
@@ -44,7 +61,7 @@ def list_breaches(program_state, acknowledged_only, include_acknowledged, tags,
         include_acknowledged = True
 
     output = get_breaches(program_state.api, acknowledged_only, include_acknowledged, tags, minimal,
-                          minscore, pid, start_date, end_date)
+                          minscore, pid, start_date, end_date, store_file, tag_mode)
 
     process_output(output, outfile)
 
@@ -64,8 +81,12 @@ def list_breaches(program_state, acknowledged_only, include_acknowledged, tags,
                                        'Will append to a table if a table named "RawDataTable" is found.',
               type=click.Path(exists=True))
 @click.option('--output', '-f', help='Specify output format', default='xlsx', type=click.Choice(['csv', 'xlsx']))
+@click.option('--local', '-l', is_flag=True, default=False, show_default=True,
+              help='Read breaches from the local breach store instead of the Darktrace API')
+@click.option('--store', 'store_file', type=click.Path(),
+              help='Full path to the local breach store. Defaults to breaches.db next to the config file')
 @click.pass_obj
-def report(program_state, arg, days, start_date, end_date, outfile, template, output):
+def report(program_state, arg, days, start_date, end_date, outfile, template, output, local, store_file):
     """
     Generate reports for Darktrace model breaches
 
@@ -80,4 +101,104 @@ def report(program_state, arg, days, start_date, end_date, outfile, template, ou
     if not outfile:
         outfile = f'./breaches_{arg}_{dt.datetime.now():%Y-%m-%d_%H.%M.%S}.{output}'
 
-    report_breaches(program_state, arg, start_date, end_date, outfile, template, output)
+    store_file = get_store_file(program_state.config_file, store_file) if local else None
+    report_breaches(program_state, arg, start_date, end_date, outfile, template, output, store_file)
+
+
+@click.command('sync', short_help='Synchronize new model breaches to a local breach store')
+@click.option('--days', '-d', default=7, type=click.INT, show_default=True,
+              help='Number of days to synchronize when no breaches have been synchronized before.')
+@click.option('--store', '-s', 'store_file', type=click.Path(),
+              help='Full path to the local breach store. Defaults to breaches.db next to the config file')
+@click.option('--state-file', type=click.Path(),
+              help='Full path to the sync state file. Defaults to breaches_sync.json next to the config file')
+@click.option('--outfile', '-o', help='Full path to the output file.', type=click.Path())
+@click.pass_obj
+def sync(program_state, days, store_file, state_file, outfile):
+    """
+    Synchronize new model breaches to a local breach store. The time and id of the last
+    synchronized breach of every instance are kept in a state file, so that subsequent
+    runs only request breaches that have not been synchronized yet.
+
+    \b
+    Every run also refreshes breaches that were synchronized before:
+    breaches from 5 minutes before the last synchronized breach onwards
+    are requested in full and updated, and for all older stored breaches
+    the acknowledgement state is re-synchronized. Queries with --local
+    only read the store, so run sync before querying to pick up
+    acknowledgements.
+    """
+    store_file = get_store_file(program_state.config_file, store_file)
+    state_file = state_file or os.path.join(os.path.dirname(program_state.config_file), 'breaches_sync.json')
+
+    output = sync_breaches(program_state.api, store_file, state_file, days)
+    process_output(output, outfile)
+
+
+@click.command('export', short_help='Export model breaches as CEF or LEEF events')
+@click.option('--format', '-f', 'output_format', type=click.Choice(EXPORT_FORMATS), default='cef', show_default=True,
+              help='Event format')
+@click.option('--include-acknowledged', '-k', is_flag=True, default=False, show_default=True,
+              help='Include acknowledged breaches')
+@click.option('--tag', '-t', 'tags', type=click.STRING, multiple=True, cls=OptionMutex, not_required_if=['pid'],
+              help='Filter model breaches based on current model tag or glob pattern, e.g. "AP: *". '
+                   'With "--local" the tags of the breached model version are used (option reusable)')
+@click.option('--tag-mode', type=click.Choice(TAG_FILTER_MODES), default='any', show_default=True,
+              help='Export breaches of models with any, all or none of the tags')
+@click.option('--minscore', '-s', type=click.FLOAT, default=0.0, show_default=True, cls=OptionMutex,
+              not_required_if=['pid'], help='Filter model breaches based on score (1.0 = 100%)')
+@click.option('--pid', '-p', type=click.INT, cls=OptionMutex, not_required_if=['tags', 'minscore'],
+              help='Filter model breaches based on model ID')
+@click.option('--days', '-d', default=1, type=click.INT, show_default=True,
+              help='Number of days in the past for the start date of the export.')
+@click.option('--start-date', type=click.DateTime(formats=('%d-%m-%Y',)),
+              help='Start date of the export. (overwrites the "--days" flag)')
+@click.option('--end-date', type=click.DateTime(formats=('%d-%m-%Y',)),
+              help='End date of the export.')
+@click.option('--local', '-l', is_flag=True, default=False, show_default=True,
+              help='Export from the local breach store instead of the Darktrace API (see: dtctl breaches sync)')
+@click.option('--store', 'store_file', type=click.Path(),
+              help='Full path to the local breach store. Defaults to breaches.db next to the config file')
+@click.option('--outfile', '-o', type=click.Path(), cls=OptionMutex, not_required_if=['syslog'],
+              help='Full path to the output file. Events are appended')
+@click.option('--syslog', type=click.STRING, cls=OptionMutex, not_required_if=['outfile'],
+              help='Send the events to a syslog server, e.g. udp://siem.local:514, tcp://siem.local:601 or '
+                   'tls://siem.local:6514')
+@click.option('--batch-size', type=click.IntRange(min=1), default=DEFAULT_BATCH_SIZE, show_default=True,
+              help='Nr of events that are written or sent at once')
+@click.pass_obj
+def export(program_state, output_format, include_acknowledged, tags, tag_mode, minscore, pid, days, start_date,
+           end_date, local, store_file, outfile, syslog, batch_size):
+    """
+    Export model breaches as CEF or LEEF events, one per line, to stdout,
+    a file or a syslog server (UDP, TCP or TLS).
+
+    \b
+    Events contain the breach time and id, the score (also as severity),
+    the breached model with its tags, and the device and destination of
+    the breach.
+
+    \b
+    Events are sent to syslog servers as RFC 5424 messages, in batches
+    while the next batch is formatted. When the server does not keep up,
+    formatting waits. When the server is down, events are spooled to the
+    "spool" directory next to the config file and sent before the next
+    events once the server can be reached again. The CA certificate of
+    TLS servers can be set with the DTCTL_SYSLOG_CACERT environment
+    variable.
+    """
+    end_date, start_date = determine_date_range(days, end_date, start_date)
+    store_file = get_store_file(program_state.config_file, store_file) if local else None
+    minscore = round(min(max(minscore, 0.0), 1.0), 1)
+
+    breaches = get_breaches(program_state.api, False, include_acknowledged, tags, False, minscore, pid, start_date,
+                            end_date, store_file, tag_mode)
+    if not breaches:
+        raise SystemExit('No output to write or display')
+
+    with open_sink(outfile, syslog, batch_size, append=True, spool_dir=os.path.dirname(program_state.config_file),
+                   msgid=output_format.upper()) as sink:
+        exported = export_breaches(breaches, output_format, sink)
+
+    if outfile or syslog:
+        click.echo('Exported {0} breaches to {1}'.format(exported, outfile or syslog), err=True)
@@ -0,0 +1,246 @@
+"""Formatting of model breaches as CEF or LEEF events for SIEMs"""
+import re
+import datetime as dt
+from dtctl.utils.cef import format_cef_header, escape_cef_value
+
+EXPORT_FORMATS = ('cef', 'leef')
+VENDOR = 'Darktrace'
+PRODUCT = 'DCIP Model Breaches'
+PRODUCT_VERSION = '1.0'
+
+# CEF headers and values are escaped by dtctl.utils.cef. LEEF 1.0 separates attributes with tabs,
+# so tabs and newlines cannot occur in values
+LEEF_HEADER_ESCAPE_TABLE = str.maketrans({'\\': '\\\\', '|': '\\|'})
+LEEF_VALUE_ESCAPE_TABLE = str.maketrans({'\t': ' ', '\n': ' ', '\r': ' '})
+LEEF_TIME_FORMAT = 'MMM dd yyyy HH:mm:ss.SSS z'
+
+IP_REGEX = re.compile(r'^(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}|[0-9a-fA-F:]*:[0-9a-fA-F:.]+)$')
+HOSTNAME_REGEX = re.compile(r'^[A-Za-z0-9_.-]+$')
+DESTINATION_FILTER_TYPES = ('Connection hostname', 'Destination IP')
+
+
+class BreachFormatter:
+    """
+    Formats model breaches as CEF or LEEF events. The event header only depends on the breached
+    model, so it is built once per model and reused for all of its breaches.
+
+    Events contain the breach time and id, the score (as severity as well), the breached model
+    and the device and destination of the breach, taken from its triggeredComponents.
+    """
+
+    def __init__(self, output_format='cef'):
+        """
+        Create the formatter
+
+        :param output_format: Event format, "cef" or "leef"
+        :type output_format: String
+        """
+        if output_format not in EXPORT_FORMATS:
+            raise ValueError('Unsupported format: {0}'.format(output_format))
+
+        self.output_format = output_format
+        self.headers = {}
+
+    def format(self, breach):
+        """
+        Format a single model breach
+
+        :param breach: Model breach as returned by the "/modelbreaches" endpoint
+        :type breach: Dict
+        :return: The event
+        :rtype: String
+        """
+        fields = get_breach_fields(breach)
+        if self.output_format == 'leef':
+            return self.format_leef(fields)
+        return self.format_cef(fields)
+
+    def format_breaches(self, breaches):
+        """
+        Format model breaches one at a time, so that breaches can be streamed
+
+        :param breaches: Model breaches
+        :type breaches: Iterable
+        :return: Events
+        :rtype: Iterator
+        """
+        format_breach = self.format
+        for breach in breaches:
+            yield format_breach(breach)
+
+    def get_header(self, fields):
+        """
+        Retrieve the event header of the breached model
+
+        :param fields: Fields of the breach, see get_breach_fields
+        :type fields: Dict
+        :return: The header
+        :rtype: String
+        """
+        key = (fields['pid'], fields['model'], fields['severity'])
+        header = self.headers.get(key)
+
+        if header is None:
+            if self.output_format == 'leef':
+                header = 'LEEF:1.0|{0}|{1}|{2}|{3}|'.format(
+                    VENDOR, PRODUCT, PRODUCT_VERSION, str(fields['pid']).translate(LEEF_HEADER_ESCAPE_TABLE))
+            else:
+                header = format_cef_header(VENDOR, PRODUCT, PRODUCT_VERSION, fields['pid'], fields['model'],
+                                           fields['severity'])
+            self.headers[key] = header
+        return header
+
+    def format_cef(self, fields):
+        """
+        Format the fields of a breach as CEF event
+
+        :param fields: Fields of the breach, see get_breach_fields
+        :type fields: Dict
+        :return: The event
+        :rtype: String
+        """
+        parts = ['rt={0}'.format(fields['time']), 'externalId={0}'.format(fields['pbid'])]
+        append = parts.append
+
+        if fields['device_ip']:
+            append('src=' + escape_cef_value(fields['device_ip']))
+        if fields['device_hostname']:
+            append('shost=' + escape_cef_value(fields['device_hostname']))
+        if fields['device_mac']:
+            append('smac=' + escape_cef_value(fields['device_mac']))
+        if fields['destination_ip']:
+            append('dst=' + escape_cef_value(fields['destination_ip']))
+        if fields['destination_hostname']:
+            append('dhost=' + escape_cef_value(fields['destination_hostname']))
+        if fields['message']:
+            append('msg=' + escape_cef_value(fields['message']))
+
+        append('cfp1Label=score cfp1={0}'.format(fields['score']))
+        if fields['device_id'] is not None:
+            append('cn1Label=deviceId cn1={0}'.format(fields['device_id']))
+        if fields['tags']:
+            append('cs1Label=tags cs1=' + escape_cef_value(fields['tags']))
+        if fields['url']:
+            append('cs2Label=breachUrl cs2=' + escape_cef_value(fields['url']))
+
+        return self.get_header(fields) + ' '.join(parts)
+
+    def format_leef(self, fields):
+        """
+        Format the fields of a breach as LEEF 1.0 event
+
+        :param fields: Fields of the breach, see get_breach_fields
+        :type fields: Dict
+        :return: The event
+        :rtype: String
+        """
+        time = dt.datetime.utcfromtimestamp(fields['time'] / 1000)
+        parts = ['devTime={0}.{1:03d} UTC'.format(time.strftime('%b %d %Y %H:%M:%S'), time.microsecond // 1000),
+                 'devTimeFormat=' + LEEF_TIME_FORMAT, 'cat=' + escape_leef(fields['model']),
+                 'sev={0}'.format(max(fields['severity'], 1)), 'pbid={0}'.format(fields['pbid'])]
+        append = parts.append
+
+        if fields['device_ip']:
+            append('src=' + escape_leef(fields['device_ip']))
+        if fields['device_hostname']:
+            append('srcHostName=' + escape_leef(fields['device_hostname']))
+        if fields['device_mac']:
+            append('srcMAC=' + escape_leef(fields['device_mac']))
+        if fields['destination_ip']:
+            append('dst=' + escape_leef(fields['destination_ip']))
+        if fields['destination_hostname']:
+            append('dstHostName=' + escape_leef(fields['destination_hostname']))
+        if fields['message']:
+            append('msg=' + escape_leef(fields['message']))
+
+        append('score={0}'.format(fields['score']))
+        if fields['device_id'] is not None:
+            append('deviceId={0}'.format(fields['device_id']))
+        if fields['tags']:
+            append('tags=' + escape_leef(fields['tags']))
+        if fields['url']:
+            append('breachUrl=' + escape_leef(fields['url']))
+
+        return self.get_header(fields) + '\t'.join(parts)
+
+
+def export_breaches(breaches, output_format, sink):
+    """
+    Stream model breaches as CEF or LEEF events to a sink
+
+    :param breaches: Model breaches
+    :type breaches: Iterable
+    :param output_format: Event format, "cef" or "leef"
+    :type output_format: String
+    :param sink: Destination of the events
+    :type sink: Sink
+    :return: Nr of exported breaches
+    :rtype: Int
+    """
+    return sink.write_lines(BreachFormatter(output_format).format_breaches(breaches))
+
+
+def get_breach_fields(breach):
+    """
+    Extract the fields of an event from a model breach. The device is the first device in the
+    triggeredComponents (or the device of a minimal breach). The destination is the last
+    displayed connection hostname or destination IP, the message is the first displayed message.
+
+    :param breach: Model breach as returned by the "/modelbreaches" endpoint
+    :type breach: Dict
+    :return: Fields of the event
+    :rtype: Dict
+    """
+    components = breach.get('triggeredComponents') or []
+    model = breach.get('model') or {}
+    device = next((component['device'] for component in components if component.get('device')),
+                  breach.get('device') or {})
+
+    destination = ''
+    message = ''
+    for component in components:
+        for triggered_filter in component.get('triggeredFilters') or ():
+            if triggered_filter.get('comparatorType') != 'display':
+                continue
+            value = (triggered_filter.get('trigger') or {}).get('value')
+            if not value:
+                continue
+            if triggered_filter.get('filterType') in DESTINATION_FILTER_TYPES:
+                destination = str(value)
+            elif triggered_filter.get('filterType') == 'Message' and not message:
+                message = str(value)
+
+    score = breach.get('score') or 0.0
+    is_ip = bool(IP_REGEX.match(destination))
+    is_hostname = not is_ip and bool(HOSTNAME_REGEX.match(destination))
+
+    return {
+        'pbid': breach.get('pbid'),
+        'time': breach.get('time'),
+        'score': score,
+        'severity': min(max(int(round(score * 10)), 0), 10),
+        'pid': model.get('pid', ''),
+        'model': model.get('name', ''),
+        'tags': ','.join(model.get('tags') or ()),
+        'url': breach.get('breachUrl', ''),
+        'device_id': device.get('did'),
+        'device_ip': device.get('ip', ''),
+        'device_hostname': device.get('hostname', ''),
+        'device_mac': device.get('macaddress', ''),
+        'destination_ip': destination if is_ip else '',
+        'destination_hostname': destination if is_hostname else '',
+        # Destinations that are neither an IP address nor a hostname describe the breach
+        'message': message or (destination if not is_ip and not is_hostname else '')
+    }
+
+
+def escape_leef(value):
+    """
+    Escape a LEEF attribute value
+
+    :param value: The value
+    :type value: String
+    :return: The escaped value
+    :rtype: String
+    """
+    return str(value).translate(LEEF_VALUE_ESCAPE_TABLE)
@@ -1,16 +1,30 @@
 # pylint: disable=C0325
 """Functions used by the Click breaches subcommand"""
-import numpy as np
-import pandas as pd
-from pandas.io.json import json_normalize
+import os
+import json
+import datetime as dt
+from pathlib import Path
+import click
+from dtctl.breaches.store import BreachStore
+from dtctl.breaches.planner import plan_breaches_query
 from dtctl.utils.timeutils import fmttime, prstime
 from dtctl.utils.parsing import convert_series
 from dtctl.utils.reporting import format_report, device_info
+from dtctl.utils.tagfilter import TagFilter, ENHANCED_TAG_FILTER, is_glob
 
+# Seconds before the oldest high-water mark from which breaches are synchronized, so breaches that
+# reach the master late (with an earlier time than an already synchronized breach) are not missed
+DEFAULT_SYNC_OVERLAP = 300
 
-def get_breaches(api, acknowledged_only, include_acknowledged, tags, minimal, minscore, pid, start_date, end_date):
+
+def get_breaches(api, acknowledged_only, include_acknowledged, tags, minimal, minscore, pid, start_date, end_date,
+                 store_file=None, tag_mode='any'):
     """
-    Function to get breaches based on filters and flags
+    Function to get breaches based on filters and flags. If a local breach store is given,
+    breaches are queried from the store instead of the Darktrace API, without any API request.
+
+    Tags are matched against the current tags of the breached models. The local breach store
+    matches the tags of the model version that breached, as recorded when it was synchronized.
 
     :param api: Darktrace API object with initialized config values
     :type api: Api
@@ -18,7 +32,7 @@ def get_breaches(api, acknowledged_only, include_acknowledged, tags, minimal, mi
     :type acknowledged_only: Boolean
     :param include_acknowledged: Value of include-acknowledged flag
     :type include_acknowledged: Boolean
-    :param tags: Tags to filter on
+    :param tags: Tags or glob patterns to filter on
     :type tags: List
     :param minimal: Value of minimal flag
     :type minimal: Boolean
@@ -30,70 +44,271 @@ def get_breaches(api, acknowledged_only, include_acknowledged, tags, minimal, mi
     :type start_date: DateTime
     :param end_date:
     :type end_date: DateTime
+    :param store_file: Path to a local breach store to query instead of the Darktrace API
+    :type store_file: String
+    :param tag_mode: Breaches of models with "any", "all" or "none" of the tags
+    :type tag_mode: String
     :return: Filtered breaches
     :rtype: List
     """
     start_date = fmttime(start_date) if start_date else None
     end_date = fmttime(end_date) if end_date else None
 
-    str_include_acknowledged = str(include_acknowledged).lower() if include_acknowledged else 'false'
-    str_minimal = str(minimal).lower() if minimal else 'false'
-
-    kwargs = {
-        'starttime': start_date,
-        'endtime': end_date,
-        'includeacknowledged': str_include_acknowledged,
-        'minimal': str_minimal,
-        'historicmodelonly': 'true',
-        'includebreachurl': 'true',
-        'minscore': minscore
-    }
+    if store_file:
+        # The tag index of the store can only answer "any" filters on literal tags
+        store_tags = tags if tag_mode == 'any' and not any(is_glob(tag) for tag in tags or ()) else None
+
+        with open_breach_store(store_file) as store:
+            breaches = store.query(start_date, end_date, acknowledged_only, include_acknowledged, store_tags,
+                                   minscore, pid)
+
+        if tags and not store_tags:
+            breaches = filter_breaches_by_tag(breaches, tags, tag_mode)
+        return breaches
 
-    if pid:
-        kwargs['pid'] = pid
+    plan = plan_breaches_query(api, acknowledged_only, include_acknowledged, tags, tag_mode, minimal, minscore, pid,
+                               start_date, end_date)
 
-    breaches = api.get('/modelbreaches', **kwargs)
+    breaches = []
+    for kwargs in plan['requests']:
+        breaches.extend(api.get('/modelbreaches', **kwargs))
 
-    if acknowledged_only:
+    if len(plan['requests']) > 1:
+        breaches.sort(key=lambda breach: (breach['time'], breach['pbid']))
+
+    if plan['filter_acknowledged']:
         breaches = filter_acknowledged_breaches(breaches)
 
-    if tags:
-        breaches = filter_breaches_by_tag(breaches, tags)
+    if plan['filter_pids'] is not None:
+        breaches = [breach for breach in breaches if breach['model'].get('pid') in plan['filter_pids']]
 
     return breaches
 
 
-def all_breaches(api, start_date, end_date):
+def all_breaches(api, start_date, end_date, store_file=None):
     """
     Get all model breaches
 
     :param api: Darktrace API object with initialized config values
     :param start_date: DateTime object that represents the start time for which breaches to report on
     :param end_date: DateTime object that represents the end time for which breaches to report on
+    :param store_file: Path to a local breach store to read breaches from instead of the Darktrace API
     :return: List of all breaches
     """
     start_date = fmttime(start_date) if start_date else None
     end_date = fmttime(end_date) if end_date else None
 
+    if store_file:
+        with open_breach_store(store_file) as store:
+            return store.query(start_date, end_date, include_acknowledged=True)
+
     breaches = api.get('/modelbreaches', starttime=start_date, endtime=end_date, includeacknowledged='true',
                        historicmodelonly='true', minimal='false', includebreachurl='true')
     return breaches
 
 
-def acknowledged_breaches(api, start_date, end_date):
+def acknowledged_breaches(api, start_date, end_date, store_file=None):
     """
     Get all acknowledged model breaches
 
     :param api: Darktrace API object with initialized config values
     :param start_date: DateTime object that represents the start time for which breaches to report on
     :param end_date: DateTime object that represents the end time for which breaches to report on
+    :param store_file: Path to a local breach store to read breaches from instead of the Darktrace API
     :return: List with acknowledged breaches
     """
+    if store_file:
+        start_time = fmttime(start_date) if start_date else None
+        end_time = fmttime(end_date) if end_date else None
+
+        with open_breach_store(store_file) as store:
+            return store.query(start_time, end_time, acknowledged_only=True)
+
     breaches = all_breaches(api, start_date, end_date)
     return filter_acknowledged_breaches(breaches)
 
 
-def report_breaches(program_state, arg, start_date, end_date, output_file, template, output_format):
+def open_breach_store(store_file):
+    """
+    Open an existing local breach store
+
+    :param store_file: Path to the local breach store
+    :type store_file: String
+    :return: The opened breach store
+    :rtype: BreachStore
+    """
+    if not os.path.exists(store_file):
+        raise click.UsageError('Local breach store {0} does not exist\n'
+                               '# Please synchronize breaches first: dtctl breaches sync'.format(store_file))
+    return BreachStore(store_file)
+
+
+def refresh_acknowledged(api, store, start_time, end_time):
+    """
+    Re-synchronize the acknowledgement state of the stored breaches in a window. Breaches can be
+    acknowledged long after they were synchronized, so the acknowledgement state is requested
+    with the (cheap) minimal breach details.
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :param store: The opened breach store
+    :type store: BreachStore
+    :param start_time: Start of the window (epoch in milliseconds)
+    :type start_time: Int
+    :param end_time: End of the window (epoch in milliseconds)
+    :type end_time: Int
+    :return: Nr of stored breaches of which the acknowledgement state changed
+    :rtype: Int
+    """
+    breaches = api.get('/modelbreaches', starttime=start_time, endtime=end_time, includeacknowledged='true',
+                       historicmodelonly='true', minimal='true')
+    return store.update_acknowledged(breaches)
+
+
+def get_store_file(config_file, store_file=None):
+    """
+    Determine the location of the local breach store. Defaults to "breaches.db"
+    in the directory of the config file.
+
+    :param config_file: Path to the config file
+    :type config_file: String
+    :param store_file: Explicitly specified path to the breach store
+    :type store_file: String
+    :return: Path to the local breach store
+    :rtype: String
+    """
+    return store_file or os.path.join(os.path.dirname(config_file), 'breaches.db')
+
+
+def sync_breaches(api, store_file, state_file, days):
+    """
+    Incrementally synchronize model breaches to a local breach store
+
+    For every instance the time and pbid of the newest synchronized breach is kept in
+    the state file (the high-water mark). Only breaches newer than the oldest high-water
+    mark (minus DEFAULT_SYNC_OVERLAP) are requested. All received breaches are upserted, so
+    breaches that are received again are not duplicated and breaches that were already
+    synchronized pick up changes like acknowledgements. For the stored breaches before the
+    requested window only the acknowledgement state is re-synchronized (see refresh_acknowledged).
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :param store_file: Path to the local breach store
+    :type store_file: String
+    :param state_file: Path to the file holding the high-water marks per instance
+    :type state_file: String
+    :param days: Nr of days to synchronize when no high-water mark is known yet
+    :type days: Int
+    :return: Summary of the synchronization
+    :rtype: Dict
+    """
+    state = load_sync_state(state_file)
+    high_water_marks = state['instances']
+    end_date = dt.datetime.utcnow()
+
+    if high_water_marks:
+        start_time = min(mark['time'] for mark in high_water_marks.values()) - DEFAULT_SYNC_OVERLAP * 1000
+    else:
+        start_time = fmttime(end_date - dt.timedelta(days=days))
+
+    breaches = api.get('/modelbreaches', starttime=start_time, endtime=fmttime(end_date),
+                       includeacknowledged='true', historicmodelonly='true', minimal='false',
+                       includebreachurl='true')
+
+    new_breaches = []
+    for breach in breaches:
+        instance_id = str(get_instance_id(breach['pbid']))
+        mark = high_water_marks.get(instance_id)
+
+        if mark and (breach['time'], breach['pbid']) <= (mark['time'], mark['pbid']):
+            continue
+
+        new_breaches.append(breach)
+
+    with BreachStore(store_file) as store:
+        oldest_time = store.oldest_time()
+        acknowledgements_updated = 0
+        if oldest_time is not None and oldest_time < start_time:
+            acknowledgements_updated = refresh_acknowledged(api, store, oldest_time, start_time)
+
+        added = store.add(breaches)
+        stored = store.count()
+
+    # Only move the high-water marks after the breaches have been committed to the store
+    for breach in new_breaches:
+        instance_id = str(get_instance_id(breach['pbid']))
+        mark = high_water_marks.get(instance_id)
+        if not mark or (breach['time'], breach['pbid']) > (mark['time'], mark['pbid']):
+            high_water_marks[instance_id] = {'time': breach['time'], 'pbid': breach['pbid']}
+
+    save_sync_state(state_file, state)
+
+    return {
+        'start_time': prstime(start_time, True),
+        'end_time': end_date.isoformat('T', 'seconds'),
+        'breaches_received': len(breaches),
+        'breaches_added': added,
+        'breaches_stored': stored,
+        'acknowledgements_updated': acknowledgements_updated,
+        'high_water_marks': high_water_marks
+    }
+
+
+def load_sync_state(state_file):
+    """
+    Load the synchronization state, i.e. the high-water marks per instance
+
+    :param state_file: Path to the state file
+    :type state_file: String
+    :return: Synchronization state
+    :rtype: Dict
+    """
+    if not os.path.exists(state_file):
+        return {'instances': {}}
+
+    with open(state_file, 'r') as infile:
+        try:
+            return json.load(infile)
+        except json.JSONDecodeError:
+            raise click.UsageError('Unable to parse breach sync state file\n{0}'.format(state_file))
+
+
+def save_sync_state(state_file, state):
+    """
+    Save the synchronization state. The state is written to a temporary file first,
+    to prevent a corrupt state file when dtctl is interrupted.
+
+    :param state_file: Path to the state file
+    :type state_file: String
+    :param state: Synchronization state
+    :type state: Dict
+    :return: None
+    """
+    state_dir = os.path.dirname(state_file)
+    if state_dir:
+        Path(state_dir).mkdir(parents=True, exist_ok=True)
+
+    temp_file = '{0}.tmp'.format(state_file)
+    with open(temp_file, 'w') as outfile:
+        json.dump(state, outfile, indent=4, sort_keys=True)
+    os.replace(temp_file, state_file)
+
+
+def get_instance_id(pbid):
+    """
+    Determine the id of the master instance that generated a breach. Master id
+    numbers are prepended to breach ids.
+
+    :param pbid: Model breach id
+    :type pbid: Int
+    :return: Id of the master instance
+    :rtype: Int
+    """
+    return int(str(pbid).strip('-')[0])
+
+
+def report_breaches(program_state, arg, start_date, end_date, output_file, template, output_format,
+                    store_file=None):
     """
     Report on model breaches
 
@@ -104,6 +319,7 @@ def report_breaches(program_state, arg, start_date, end_date, output_file, templ
     :param output_file: Filename in String where the report should be saved to
     :param template: Filename in String of template where to append new data to
     :param output_format: String that specifies output format
+    :param store_file: Path to a local breach store to read breaches from instead of the Darktrace API
     :return: None
     """
     start_date = fmttime(start_date) if start_date else None
@@ -115,10 +331,11 @@ def report_breaches(program_state, arg, start_date, end_date, output_file, templ
         'brief': report_breaches_brief
     }
 
-    report_functions[arg](program_state, start_date, end_date, output_file, template, output_format)
+    report_functions[arg](program_state, start_date, end_date, output_file, template, output_format, store_file)
 
 
-def report_commented_breaches(program_state, start_date, end_date, output_file, template, output_format):
+def report_commented_breaches(program_state, start_date, end_date, output_file, template, output_format,
+                              store_file=None):
     """
     Create a report that holds all model breaches for which
     comments have been entered.
@@ -129,8 +346,10 @@ def report_commented_breaches(program_state, start_date, end_date, output_file,
     :param output_file: Filename in String where the report should be saved to
     :param template: Filename in String of template where to append new data to
     :param output_format: String that specifies output format
+    :param store_file: Path to a local breach store to read breaches from instead of the Darktrace API
     :return: None
     """
+    import pandas as pd
     comments_json = program_state.api.get('/mbcomments', starttime=start_date, endtime=end_date)
 
     comments = pd.DataFrame(comments_json).sort_values('time', ascending=True)
@@ -144,13 +363,20 @@ def report_commented_breaches(program_state, start_date, end_date, output_file,
     unique['comments'] = joined
     unique['first_comment_by'] = unique['username']
 
+    store = open_breach_store(store_file) if store_file else None
     breaches_json = []
     total = len(unique.index)
     for count, pbid in enumerate(unique.index):
-        breaches_json.append(program_state.api.get('/modelbreaches', pbid=pbid, historicmodelonly=True))
+        breach = store.get(pbid) if store else None
+        if not breach:
+            breach = program_state.api.get('/modelbreaches', pbid=pbid, historicmodelonly=True)
+        breaches_json.append(breach)
         count += 1
         print(f'{count} out of {total} breaches ({round((count / total) * 100)}%) done')
 
+    if store:
+        store.close()
+
     breaches = pd.DataFrame([x for x in breaches_json if not x == []])
     breaches.index = breaches.pbid
 
@@ -172,7 +398,8 @@ def report_commented_breaches(program_state, start_date, end_date, output_file,
     format_report(merged[columns].sort_values('breach_time', ascending=True), output_file, template, output_format)
 
 
-def report_acknowledged_breaches(program_state, start_date, end_date, output_file, template, output_format):
+def report_acknowledged_breaches(program_state, start_date, end_date, output_file, template, output_format,
+                                 store_file=None):
     """
     Create a report that holds all model breaches that have been acknowledged
 
@@ -183,11 +410,14 @@ def report_acknowledged_breaches(program_state, start_date, end_date, output_fil
     :param template: Filename of template file to write data to. Data is appended to sheet 'RawData' and/or
                     appended to the table 'RawDataTable'
     :param output_format: String that specifies output format
+    :param store_file: Path to a local breach store to read breaches from instead of the Darktrace API
     :return: None
     """
+    import pandas as pd
+    from pandas.io.json import json_normalize
     instances_by_id = get_instances_region(program_state.api)
 
-    breaches = acknowledged_breaches(program_state.api, start_date, end_date)
+    breaches = acknowledged_breaches(program_state.api, start_date, end_date, store_file)
     breaches_df = json_normalize(breaches)
     breaches_df.index = breaches_df['pbid']
     breaches_df['breach_time'] = pd.to_datetime(breaches_df['time'].map(prstime))
@@ -200,7 +430,7 @@ def report_acknowledged_breaches(program_state, start_date, end_date, output_fil
     breaches_df['hostname'] = breaches_df.triggeredComponents.map(lambda x: device_info(x, 'hostname'))
     breaches_df['type'] = breaches_df.triggeredComponents.map(lambda x: device_info(x, 'typelabel'))
     breaches_df['destination'] = breaches_df.triggeredComponents.map(get_dest_hostname_or_ip)
-    breaches_df['region'] = breaches_df['pbid'].map(lambda x: instances_by_id[int(str(x).strip('-')[0])]['region'])
+    breaches_df['region'] = breaches_df['pbid'].map(lambda x: instances_by_id[get_instance_id(x)]['region'])
     breaches_df['link'] = breaches_df['pbid'].map(lambda x: '{0}/#modelbreach/{1}'.format(program_state.config['host'],
                                                                                           str(x)))
     breaches_df.sort_values(by=['time'], inplace=True)
@@ -216,7 +446,8 @@ def report_acknowledged_breaches(program_state, start_date, end_date, output_fil
     format_report(breaches_df[columns].sort_values('breach_time', ascending=True), output_file, template, output_format)
 
 
-def report_breaches_brief(program_state, start_date, end_date, output_file, template, output_format):
+def report_breaches_brief(program_state, start_date, end_date, output_file, template, output_format,
+                          store_file=None):
     """
     Brief report of breaches that excludes comments and detailed meta data
 
@@ -227,16 +458,20 @@ def report_breaches_brief(program_state, start_date, end_date, output_file, temp
     :param output_file: Filename in String where the report should be saved to
     :param template: Filename of template file to write data to. Data in sheet 'RawData' is overwritten
     :param output_format: String that specifies output format
+    :param store_file: Path to a local breach store to read breaches from instead of the Darktrace API
     :return: None
     """
+    import pandas as pd
+    import numpy as np
+    from pandas.io.json import json_normalize
     # Get status information in order to get instance ID and label (for region)
     instances_by_id = get_instances_region(program_state.api)
 
-    breaches = all_breaches(program_state.api, start_date, end_date)
+    breaches = all_breaches(program_state.api, start_date, end_date, store_file)
     breaches_df = json_normalize(breaches)
     breaches_df.index = breaches_df['pbid']
     breaches_df['breach_time'] = pd.to_datetime(breaches_df['time'].map(prstime))
-    breaches_df['region'] = breaches_df['pbid'].map(lambda x: instances_by_id[int(str(x).strip('-')[0])]['region'])
+    breaches_df['region'] = breaches_df['pbid'].map(lambda x: instances_by_id[get_instance_id(x)]['region'])
     breaches_df['hostname'] = breaches_df.triggeredComponents.map(get_hostname_or_ip)
     breaches_df['category'] = breaches_df['model.name'].map(lambda x: x.split('::')[0])
     breaches_df['enhanced'] = breaches_df['model.tags'].map(has_enhanced_tag)
@@ -269,11 +504,7 @@ def has_enhanced_tag(tags):
     :rtype: Int
     """
     if isinstance(tags, list):
-        if tags:
-            for tag in tags:
-                if 'enhanced' in tag.lower():
-                    return 1
-        return 0
+        return int(ENHANCED_TAG_FILTER.matches(tags))
     return 0
 
 
@@ -402,21 +633,17 @@ def filter_acknowledged_breaches(breaches):
     return acknowledged_breaches_list
 
 
-def filter_breaches_by_tag(breaches, tags_to_filter):
+def filter_breaches_by_tag(breaches, tags_to_filter, tag_mode='any'):
     """
-    Function to filter breaches based on tags
+    Function to filter breaches based on tags. Every breach is returned at most once.
 
     :param breaches: Breaches to filter
     :type breaches: List
-    :param tags_to_filter: Tags to filter on
+    :param tags_to_filter: Tags or glob patterns to filter on
     :type tags_to_filter: List
+    :param tag_mode: Breaches of models with "any", "all" or "none" of the tags
+    :type tag_mode: String
     :return: Filtered breaches
     :rtype: List
     """
-    filtered_breaches = []
-
-    for breach in breaches:
-        for tag in breach['model']['tags']:
-            if tag in tags_to_filter:
-                filtered_breaches.append(breach)
-    return filtered_breaches
+    return TagFilter(tags_to_filter, tag_mode).filter(breaches, lambda breach: breach['model']['tags'])
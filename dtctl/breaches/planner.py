@@ -0,0 +1,94 @@
+"""Planning of model breach queries against the Darktrace API"""
+from dtctl.models.index import get_model_index
+from dtctl.utils.tagfilter import TagFilter
+
+# Above this number of models, a single unfiltered request is cheaper than a request per model
+MAX_PUSHDOWN_PIDS = 25
+
+
+def plan_breaches_query(api, acknowledged_only, include_acknowledged, tags, tag_mode, minimal, minscore, pid,
+                        start_time, end_time):
+    """
+    Determine which filters the "/modelbreaches" endpoint can evaluate and which filters
+    remain to be applied locally. Tag filters are resolved to the IDs of the models whose
+    current tags match. Up to MAX_PUSHDOWN_PIDS models are requested one model at a time,
+    otherwise a single request is made and its breaches are filtered on the same model IDs.
+    Both ways the current model tags are used, so the results do not depend on the number
+    of matching models.
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :param acknowledged_only: Only return acknowledged breaches
+    :type acknowledged_only: Boolean
+    :param include_acknowledged: Also return acknowledged breaches
+    :type include_acknowledged: Boolean
+    :param tags: Tags or glob patterns to filter on
+    :type tags: List
+    :param tag_mode: Breaches of models with "any", "all" or "none" of the tags
+    :type tag_mode: String
+    :param minimal: Only request minimal breach details
+    :type minimal: Boolean
+    :param minscore: Minimum score of breaches
+    :type minscore: Float
+    :param pid: ID of a model to filter breaches on
+    :type pid: Int
+    :param start_time: Start of the time range (epoch in milliseconds)
+    :type start_time: Int
+    :param end_time: End of the time range (epoch in milliseconds)
+    :type end_time: Int
+    :return: Plan with the keyword arguments of every request and the filters to apply locally
+    :rtype: Dict
+    """
+    kwargs = {
+        'starttime': start_time,
+        'endtime': end_time,
+        'includeacknowledged': 'true' if include_acknowledged or acknowledged_only else 'false',
+        'minimal': 'true' if minimal else 'false',
+        'historicmodelonly': 'true',
+        'includebreachurl': 'true',
+        'minscore': minscore
+    }
+
+    plan = {
+        'requests': [],
+        # The API cannot exclude unacknowledged breaches
+        'filter_acknowledged': bool(acknowledged_only),
+        # Model IDs to filter breaches on when the tag filter could not be pushed down
+        'filter_pids': None
+    }
+
+    pids = [pid] if pid else None
+
+    if tags:
+        tagged_pids = get_pids_with_tags(api, tags, tag_mode)
+
+        if pids:
+            pids = [model_id for model_id in pids if model_id in tagged_pids]
+        elif len(tagged_pids) <= MAX_PUSHDOWN_PIDS:
+            pids = sorted(tagged_pids)
+        else:
+            plan['filter_pids'] = tagged_pids
+
+    if pids is None:
+        plan['requests'].append(kwargs)
+    else:
+        plan['requests'].extend(dict(kwargs, pid=model_id) for model_id in pids)
+
+    return plan
+
+
+def get_pids_with_tags(api, tags, tag_mode):
+    """
+    Resolve tag filters to the IDs of the models with matching tags
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :param tags: Tags or glob patterns to filter on
+    :type tags: List
+    :param tag_mode: Models with "any", "all" or "none" of the tags
+    :type tag_mode: String
+    :return: Model IDs
+    :rtype: Set
+    """
+    models = TagFilter(tags, tag_mode).filter(get_model_index(api).models, lambda model: model.get('tags'))
+    return {model['pid'] for model in models}
@@ -0,0 +1,224 @@
+"""Local storage of Darktrace model breaches"""
+import os
+import json
+import sqlite3
+from pathlib import Path
+from dtctl.utils.breaches import get_breach_device_id
+
+
+class BreachStore:
+    """Local SQLite store of Darktrace model breaches. Breaches are stored once per pbid."""
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS breaches ('
+        '    pbid INTEGER PRIMARY KEY,'
+        '    time INTEGER NOT NULL,'
+        '    pid INTEGER,'
+        '    score REAL,'
+        '    acknowledged INTEGER,'
+        '    did INTEGER,'
+        '    data TEXT NOT NULL'
+        ')',
+        'CREATE TABLE IF NOT EXISTS breach_tags ('
+        '    pbid INTEGER NOT NULL REFERENCES breaches (pbid),'
+        '    tag TEXT NOT NULL,'
+        '    PRIMARY KEY (tag, pbid)'
+        ')',
+        'CREATE INDEX IF NOT EXISTS breaches_time ON breaches (time)',
+        'CREATE INDEX IF NOT EXISTS breaches_pid ON breaches (pid, time)',
+        'CREATE INDEX IF NOT EXISTS breaches_score ON breaches (score)',
+        'CREATE INDEX IF NOT EXISTS breaches_acknowledged ON breaches (acknowledged, time)',
+        'CREATE INDEX IF NOT EXISTS breaches_did ON breaches (did, time)',
+        'CREATE INDEX IF NOT EXISTS breach_tags_pbid ON breach_tags (pbid)'
+    )
+
+    def __init__(self, path):
+        """Open (and if needed create) the breach store"""
+        store_dir = os.path.dirname(path)
+        if store_dir:
+            Path(store_dir).mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+
+        with self.connection:
+            for statement in self.SCHEMA:
+                self.connection.execute(statement)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the connection to the store
+
+        :return: None
+        """
+        self.connection.close()
+
+    def add(self, breaches):
+        """
+        Add breaches to the store. Breaches that are already stored are updated, so changes
+        like acknowledgements are picked up when a breach is received again.
+
+        :param breaches: Breaches as returned by the "/modelbreaches" endpoint
+        :type breaches: List
+        :return: Nr of breaches that were not stored yet
+        :rtype: Int
+        """
+        with self.connection:
+            stored = self.count()
+            self.connection.executemany(
+                'INSERT INTO breaches (pid, score, acknowledged, did, pbid, time, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (pbid) DO UPDATE SET acknowledged = excluded.acknowledged, data = excluded.data',
+                (get_indexed_values(breach) + (breach['time'], json.dumps(breach)) for breach in breaches)
+            )
+            self._add_tags(breaches)
+            added = self.count() - stored
+        return added
+
+    def update_acknowledged(self, breaches):
+        """
+        Update the acknowledgement state of stored breaches. Breaches that are not stored are ignored.
+
+        :param breaches: Breaches with at least a pbid and acknowledged value, e.g. minimal breaches
+        :type breaches: List
+        :return: Nr of stored breaches that were updated
+        :rtype: Int
+        """
+        with self.connection:
+            changes = self.connection.total_changes
+            self.connection.executemany(
+                "UPDATE breaches SET acknowledged = ?, data = json_set(data, '$.acknowledged', json(?)) "
+                "WHERE pbid = ? AND acknowledged != ?",
+                ((1 if breach.get('acknowledged') else 0, json.dumps(breach.get('acknowledged', False)),
+                  breach['pbid'], 1 if breach.get('acknowledged') else 0) for breach in breaches)
+            )
+            updated = self.connection.total_changes - changes
+        return updated
+
+    def _add_tags(self, breaches):
+        """
+        Add the model tags of breaches to the tag index
+
+        :param breaches: Breaches for which to index tags
+        :type breaches: List
+        :return: None
+        """
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO breach_tags (pbid, tag) VALUES (?, ?)',
+            ((breach['pbid'], tag) for breach in breaches for tag in breach.get('model', {}).get('tags') or [])
+        )
+
+    def count(self):
+        """
+        Nr of breaches in the store
+
+        :return: Nr of breaches
+        :rtype: Int
+        """
+        return self.connection.execute('SELECT COUNT(*) FROM breaches').fetchone()[0]
+
+    def oldest_time(self):
+        """
+        Time of the oldest breach in the store
+
+        :return: Time (epoch in milliseconds) or None if the store is empty
+        :rtype: Int
+        """
+        return self.connection.execute('SELECT MIN(time) FROM breaches').fetchone()[0]
+
+    def query(self, start_time=None, end_time=None, acknowledged_only=False, include_acknowledged=False,
+              tags=None, minscore=None, pid=None, did=None):
+        """
+        Query breaches from the store. All filters are answered from the indexes.
+
+        :param start_time: Only breaches at or after this time (epoch in milliseconds)
+        :type start_time: Int
+        :param end_time: Only breaches at or before this time (epoch in milliseconds)
+        :type end_time: Int
+        :param acknowledged_only: Only return acknowledged breaches
+        :type acknowledged_only: Boolean
+        :param include_acknowledged: Also return acknowledged breaches
+        :type include_acknowledged: Boolean
+        :param tags: Only return breaches of models that have at least one of these tags
+        :type tags: List
+        :param minscore: Minimum score of breaches
+        :type minscore: Float
+        :param pid: Only return breaches of this model
+        :type pid: Int
+        :param did: Only return breaches of this device
+        :type did: Int
+        :return: Breaches ordered by time
+        :rtype: List
+        """
+        conditions = []
+        parameters = []
+
+        if start_time is not None:
+            conditions.append('time >= ?')
+            parameters.append(start_time)
+
+        if end_time is not None:
+            conditions.append('time <= ?')
+            parameters.append(end_time)
+
+        if acknowledged_only:
+            conditions.append('acknowledged = 1')
+        elif not include_acknowledged:
+            conditions.append('acknowledged = 0')
+
+        if minscore:
+            conditions.append('score >= ?')
+            parameters.append(minscore)
+
+        if pid is not None:
+            conditions.append('pid = ?')
+            parameters.append(pid)
+
+        if did is not None:
+            conditions.append('did = ?')
+            parameters.append(did)
+
+        if tags:
+            conditions.append('pbid IN (SELECT pbid FROM breach_tags WHERE tag IN ({0}))'.format(
+                ', '.join('?' * len(tags))
+            ))
+            parameters.extend(tags)
+
+        statement = 'SELECT data FROM breaches'
+        if conditions:
+            statement += ' WHERE ' + ' AND '.join(conditions)
+        statement += ' ORDER BY time, pbid'
+
+        return [json.loads(data) for data, in self.connection.execute(statement, parameters)]
+
+    def get(self, pbid):
+        """
+        Retrieve a single breach from the store
+
+        :param pbid: Model breach id
+        :type pbid: Int
+        :return: The breach or None if it is not in the store
+        :rtype: Dict
+        """
+        row = self.connection.execute('SELECT data FROM breaches WHERE pbid = ?', (pbid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def get_indexed_values(breach):
+    """
+    Values of the indexed columns of a breach
+
+    :param breach: Model breach
+    :type breach: Dict
+    :return: pid, score, acknowledged, did and pbid
+    :rtype: Tuple
+    """
+    return (breach.get('model', {}).get('pid'), breach.get('score'), 1 if breach.get('acknowledged') else 0,
+            get_breach_device_id(breach), breach['pbid'])
+
@@ -3,21 +3,10 @@ import os
 import sys
 from pathlib import Path
 import click
-from dtctl.breaches import commands as breaches_commands
-from dtctl.config import commands as config_commands
 from dtctl.config.operations import load_config, get_private_key
-from dtctl.components import commands as components_commands
-from dtctl.details import commands as details_commands
-from dtctl.devices import commands as devices_commands
 from dtctl.dtapi.api import Api
-from dtctl.filters import commands as filters_commands
-from dtctl.intelfeed import commands as intelfeed_commands
-from dtctl.metrics import commands as metrics_commands
-from dtctl.models import commands as models_commands
-from dtctl.query import commands as query_commands
-from dtctl.subnets import commands as subnets_commands
-from dtctl.system import commands as system_commands
-from dtctl.tags import commands as tags_commands
+from dtctl.serve.functions import forward_command
+from dtctl.utils.clickutils import LazyGroup
 from dtctl.utils.state import ProgramState
 
 
@@ -25,7 +14,21 @@ __author__ = 'Connor Dillon, Daan Wagenaar'
 DEFAULT_CONFIG_FILE = os.path.join(str(Path.home()), '.dtctl', 'config.json')
 
 
-@click.group()
+class DtctlGroup(LazyGroup):
+    """Top-level dtctl command group, which keeps the arguments of the subcommand for the group callback"""
+
+    def parse_args(self, ctx, args):
+        """Parse the arguments and record the remaining arguments in ctx.meta["subcommand_args"]"""
+        rest = super(DtctlGroup, self).parse_args(ctx, args)
+        ctx.meta['subcommand_args'] = ctx.protected_args + ctx.args
+        return rest
+
+
+@click.group(cls=DtctlGroup, lazy_subcommands={
+    'collect': 'dtctl.collect.commands.collect',
+    'exporter': 'dtctl.exporter.commands.exporter',
+    'serve': 'dtctl.serve.commands.serve',
+})
 @click.version_option(None, "-v", "--version", message="%(version)s")
 @click.option('--host', '-h', help='Host address of the Darktrace API. Include scheme (https://)')
 @click.option('--pub-dtkey', '-p', help='Public key for the Darktrace API.')
@@ -39,9 +42,13 @@ DEFAULT_CONFIG_FILE = os.path.join(str(Path.home()), '.dtctl', 'config.json')
 @click.pass_context
 def cli(ctx, host, pub_dtkey, priv_dtkey, cacert, insecure, debug, config_file):
     """Darktrace Command Line Interface"""
+    if isinstance(ctx.obj, ProgramState):
+        # Invoked by "dtctl serve", which already holds an authenticated API session
+        return
+
     config_dict = load_config(config_file)
 
-    if '--help' in sys.argv:
+    if '--help' in ctx.meta.get('subcommand_args', []):
         return
 
     # Provide fake values for when config command is given
@@ -68,149 +75,151 @@ def cli(ctx, host, pub_dtkey, priv_dtkey, cacert, insecure, debug, config_file):
         if 'cacert' in config_dict:
             cacert = config_dict['cacert']
 
-    privkey = get_private_key(priv_dtkey, config_dict)
+    privkey = get_private_key(priv_dtkey, config_dict, config_file)
 
     api_obj = Api(host, pub_dtkey, privkey, cacert, insecure, debug)
     ctx.obj = ProgramState(api_obj, debug, config_dict, config_file)
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'export': 'dtctl.breaches.commands.export',
+    'list': 'dtctl.breaches.commands.list_breaches',
+    'report': 'dtctl.breaches.commands.report',
+    'sync': 'dtctl.breaches.commands.sync',
+})
 def breaches():
     """Commands for Darktrace model breaches"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'list': 'dtctl.components.commands.list_components',
+})
 def components():
     """View Darktrace components"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'get': 'dtctl.config.commands.get_config',
+    'set': 'dtctl.config.commands.set_config',
+    'agent': 'dtctl.config.commands.agent',
+})
 def config():
     """Manage dtctl configurations"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'breach': 'dtctl.details.commands.breach_details',
+    'connection': 'dtctl.details.commands.connection_details',
+    'device': 'dtctl.details.commands.device_details',
+    'endpoint': 'dtctl.details.commands.endpoint_details',
+    'host': 'dtctl.details.commands.host_details',
+    'msg': 'dtctl.details.commands.message_details',
+})
 def details():
     """View details of entities (represented as commands)"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'list': 'dtctl.devices.commands.list_devices',
+    'info': 'dtctl.devices.commands.device_info',
+    'ip': 'dtctl.devices.commands.ip_info',
+})
 def devices():
     """List active devices identified by Darktrace"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'list': 'dtctl.filters.commands.list_filters',
+})
 def filters():
     """View Darktrace filters"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'list': 'dtctl.intelfeed.commands.list_intelfeed',
+    'add': 'dtctl.intelfeed.commands.add_entry',
+    'del': 'dtctl.intelfeed.commands.del_entry',
+})
 def intelfeed():
     """Manage Darktrace's intelligence feeds"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'list': 'dtctl.metrics.commands.list_metrics',
+})
 def metrics():
     """View Darktrace metrics"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'autoupdatable': 'dtctl.models.commands.autoupdatable',
+    'updatable': 'dtctl.models.commands.updatable',
+    'pending-updates': 'dtctl.models.commands.pending_updates',
+    'report': 'dtctl.models.commands.report',
+    'list': 'dtctl.models.commands.list_models',
+    'update-diff': 'dtctl.models.commands.update_diff',
+    'history': 'dtctl.models.commands.history',
+    'input-diff': 'dtctl.models.commands.input_diff',
+    'select': 'dtctl.models.commands.select_model',
+    'search': 'dtctl.models.commands.search_model',
+})
 def models():
     """View Darktrace models"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'list': 'dtctl.subnets.commands.list_subnets',
+    'aggregates': 'dtctl.subnets.commands.aggregates',
+    'instances': 'dtctl.subnets.commands.instances',
+    'unidirectional': 'dtctl.subnets.commands.unidirectional',
+    'dhcp': 'dtctl.subnets.commands.dhcp',
+    'devices': 'dtctl.subnets.commands.devices',
+})
 def subnets():
     """View information of Darktrace's identified subnets"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'info': 'dtctl.system.commands.info',
+    'status': 'dtctl.system.commands.status',
+    'usage': 'dtctl.system.commands.usage',
+    'auditlog': 'dtctl.system.commands.auditlog',
+    'summary-statistics': 'dtctl.system.commands.summary_statistics',
+    'tags': 'dtctl.system.commands.tags',
+    'instances': 'dtctl.system.commands.instances',
+    'moo': 'dtctl.system.commands.moo',
+    'packet-loss': 'dtctl.system.commands.packet_loss',
+    'issues': 'dtctl.system.commands.issues',
+    'coverage': 'dtctl.system.commands.coverage',
+    'snapshot': 'dtctl.system.commands.snapshot',
+})
 def system():
     """View internal Darktrace information"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'list': 'dtctl.tags.commands.list_tags',
+    'device': 'dtctl.tags.commands.device',
+    'search': 'dtctl.tags.commands.search',
+})
 def tags():
     """Manage Darktrace tags"""
 
 
-@cli.group()
+@cli.group(cls=LazyGroup, lazy_subcommands={
+    'get': 'dtctl.query.commands.get',
+    'post': 'dtctl.query.commands.post',
+})
 def query():
     """Send direct HTTP requests to Darktrace API"""
 
 
-# Sub-commands for "breach" command
-breaches.add_command(breaches_commands.list_breaches)
-breaches.add_command(breaches_commands.report)
-
-# sub-commands for "components" command
-components.add_command(components_commands.list_components)
-
-# sub-commands for "config" command
-config.add_command(config_commands.get_config)
-config.add_command(config_commands.set_config)
-
-# sub-commands for "details" command
-details.add_command(details_commands.breach_details)
-details.add_command(details_commands.connection_details)
-details.add_command(details_commands.device_details)
-details.add_command(details_commands.endpoint_details)
-details.add_command(details_commands.host_details)
-details.add_command(details_commands.message_details)
-
-# sub-commands for "devices" command
-devices.add_command(devices_commands.list_devices)
-devices.add_command(devices_commands.device_info)
-devices.add_command(devices_commands.ip_info)
-
-# sub-commands for "filters" command
-filters.add_command(filters_commands.list_filters)
-
-# sub-commands for "intelfeed" command
-intelfeed.add_command(intelfeed_commands.list_intelfeed)
-intelfeed.add_command(intelfeed_commands.add_entry)
-intelfeed.add_command(intelfeed_commands.del_entry)
-
-# sub-commands for "metrics" command
-metrics.add_command(metrics_commands.list_metrics)
-
-# sub-commands for "models" command
-models.add_command(models_commands.autoupdatable)
-models.add_command(models_commands.updatable)
-models.add_command(models_commands.pending_updates)
-models.add_command(models_commands.report)
-models.add_command(models_commands.list_models)
-models.add_command(models_commands.update_diff)
-models.add_command(models_commands.input_diff)
-models.add_command(models_commands.select_model)
-models.add_command(models_commands.search_model)
-
-# sub-commands for "subnets" command
-subnets.add_command(subnets_commands.list_subnets)
-subnets.add_command(subnets_commands.aggregates)
-subnets.add_command(subnets_commands.instances)
-subnets.add_command(subnets_commands.unidirectional)
-subnets.add_command(subnets_commands.dhcp)
-subnets.add_command(subnets_commands.devices)
-
-# sub-commands for "sytem" command
-system.add_command(system_commands.info)
-system.add_command(system_commands.status)
-system.add_command(system_commands.usage)
-system.add_command(system_commands.auditlog)
-system.add_command(system_commands.summary_statistics)
-system.add_command(system_commands.tags)
-system.add_command(system_commands.instances)
-system.add_command(system_commands.moo)
-system.add_command(system_commands.packet_loss)
-system.add_command(system_commands.issues)
-system.add_command(system_commands.coverage)
-
-# sub-commands for "tags" command
-tags.add_command(tags_commands.list_tags)
-tags.add_command(tags_commands.device)
-tags.add_command(tags_commands.search)
-
-# sub-commands for "query" command
-query.add_command(query_commands.get)
-query.add_command(query_commands.post)
+def main():
+    """
+    Entry point of dtctl. Commands are forwarded to "dtctl serve" if it runs, otherwise they run in this process.
+    """
+    exit_code = forward_command(cli, sys.argv[1:])
+
+    if exit_code is None:
+        cli()  # pylint: disable=E1120
+    sys.exit(exit_code)
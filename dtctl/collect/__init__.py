@@ -0,0 +1 @@
+"""Package for the Click collect command"""
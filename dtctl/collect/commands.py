@@ -0,0 +1,69 @@
+# pylint: disable=C0111
+import signal
+import click
+from dtctl.collect.functions import Collector, DEFAULT_CACHE_TTL, load_jobs, get_collect_state_file
+
+
+@click.command('collect', short_help='Run system monitoring collectors on intervals')
+@click.option('--config', '-f', 'jobs_file', type=click.Path(exists=True, dir_okay=False), required=True,
+              help='Jobs file (JSON, or YAML if it ends with .yaml or .yml)')
+@click.option('--state-file', type=click.Path(),
+              help='Full path to the state file of windowed jobs. Defaults to collect_state.json next to the '
+                   'config file')
+@click.option('--cache-ttl', type=click.IntRange(min=0), default=DEFAULT_CACHE_TTL, show_default=True,
+              help='Seconds that responses of the Darktrace API are shared between jobs. 0 disables caching')
+@click.option('--once', is_flag=True, default=False, help='Run every job once and exit')
+@click.pass_obj
+def collect(program_state, jobs_file, state_file, cache_ttl, once):
+    """
+    Run the system monitoring collectors (usage, packet-loss, issues and coverage) on
+    intervals in a single process, instead of calling the system commands from cron.
+    All jobs share one API session and cached API responses.
+
+    \b
+    Example jobs file (YAML):
+        jobs:
+          - collector: usage
+            interval: 300
+            output: cef            # log (default), cef or json
+            outfile: /var/log/dtctl/usage.log
+          - collector: packet-loss
+            interval: 3600
+            outfile: /var/log/dtctl/packet_loss.log
+            max_bytes: 10485760    # rotate after 10 MiB (default)
+            backup_count: 5        # default
+          - collector: coverage
+            interval: 86400
+            outfile: /var/log/dtctl/coverage.log
+            infile: subnets.txt    # input_format, network_col and netmask_col as in "system coverage"
+          - collector: issues
+            interval: 600
+            output: cef
+            syslog: tcp://siem.local:601   # instead of outfile, also udp:// and tls://
+
+    \b
+    The packet-loss and issues collectors continue where their previous run
+    ended. Their first run collects "window" seconds (default: 86400). Windows
+    overlap by "overlap" seconds (default: 300) to pick up late breaches;
+    records that were already written are left out. Jobs need a unique
+    "name" when a collector is used more than once.
+
+    \b
+    Records are sent to syslog servers as RFC 5424 messages over a single
+    connection per server. While a server is down, messages are spooled
+    to the "spool" directory next to the state file and sent once it can
+    be reached again.
+    """
+    jobs = load_jobs(jobs_file)
+
+    program_state.api.cache_ttl = cache_ttl or None
+    collector = Collector(program_state.api, jobs, get_collect_state_file(program_state.config_file, state_file))
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    try:
+        collector.run(once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.close()
@@ -0,0 +1,441 @@
+"""Functions for running system monitoring collectors on intervals in a single process"""
+import os
+import sys
+import json
+import time
+import heapq
+import hashlib
+import logging
+import tempfile
+import threading
+import datetime as dt
+from pathlib import Path
+from logging.handlers import RotatingFileHandler
+import click
+from dtctl.utils.timeutils import fmttime, prstime
+
+# Seconds that responses of the Darktrace API are shared between jobs, e.g. "/status" for usage and issues
+DEFAULT_CACHE_TTL = 10
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+# Seconds of history collected by the first run of a windowed collector
+DEFAULT_WINDOW = 86400
+# Seconds that windows overlap, so breaches that become available late are not missed
+DEFAULT_OVERLAP = 300
+
+# Collectors with their CEF event class ID and name, and whether they collect a time window
+COLLECTORS = {
+    'usage': {'cef': (100, 'System Usage'), 'windowed': False},
+    'packet-loss': {'cef': (110, 'Packet Loss'), 'windowed': True},
+    'issues': {'cef': (130, 'System Issue'), 'windowed': True},
+    'coverage': {'cef': (140, 'Subnet Coverage'), 'windowed': False}
+}
+OUTPUT_FORMATS = ('log', 'cef', 'json')
+
+
+class Collector:
+    """
+    Runs collector jobs on their intervals with a single API session. Jobs are kept in a heap ordered
+    by their next run time. Windowed jobs continue where their previous run ended, their state is kept
+    in a state file so that a restarted collector does not write records twice.
+    """
+
+    def __init__(self, api, jobs, state_file):
+        """
+        Create the collector
+
+        :param api: Darktrace API object with initialized config values, shared by all jobs
+        :type api: Api
+        :param jobs: Validated jobs, see load_jobs
+        :type jobs: List
+        :param state_file: Path to the file holding the state of windowed jobs
+        :type state_file: String
+        """
+        self.api = api
+        self.jobs = jobs
+        self.state_file = state_file
+        self.state = load_collect_state(state_file)
+        self.handlers = {}
+        self.sinks = {}
+        self.stopped = threading.Event()
+
+    def run(self, once=False):
+        """
+        Run the jobs until stopped
+
+        :param once: Run every job once and return
+        :type once: Boolean
+        :return: None
+        """
+        now = time.time()
+        schedule = [(now, index) for index in range(len(self.jobs))]
+        heapq.heapify(schedule)
+
+        while schedule and not self.stopped.is_set():
+            next_run, index = schedule[0]
+            delay = next_run - time.time()
+            if delay > 0:
+                self.stopped.wait(delay)
+                continue
+
+            heapq.heappop(schedule)
+            self.run_job(self.jobs[index])
+
+            if not once:
+                # Runs that were missed because a job took longer than its interval are skipped
+                interval = self.jobs[index]['interval']
+                next_run += interval * max(1, int((time.time() - next_run) // interval) + 1)
+                heapq.heappush(schedule, (next_run, index))
+
+    def stop(self):
+        """
+        Stop running jobs after the current job
+
+        :return: None
+        """
+        self.stopped.set()
+
+    def run_job(self, job):
+        """
+        Run a single job and write its records. Errors are reported, but do not stop the collector.
+
+        :param job: The job to run
+        :type job: Dict
+        :return: Nr of records written, None if the job failed
+        :rtype: Int
+        """
+        try:
+            return self.collect(job)
+        except (SystemExit, Exception) as err:  # pylint: disable=W0703
+            message = err.format_message() if isinstance(err, click.ClickException) else str(err)
+            print('[{0}] Job "{1}" failed: {2}'.format(dt.datetime.utcnow().isoformat('T', 'seconds'), job['name'],
+                                                       message), file=sys.stderr)
+            return None
+
+    def collect(self, job):
+        """
+        Collect the records of a job, remove records that have been written before and write the others
+
+        :param job: The job to run
+        :type job: Dict
+        :return: Nr of records written
+        :rtype: Int
+        """
+        end_date = dt.datetime.utcnow().replace(microsecond=0)
+        job_state = self.state['jobs'].get(job['name'], {})
+
+        if not COLLECTORS[job['collector']]['windowed']:
+            records = collect_records(self.api, job, None, None)
+            self.write(job, records)
+            return len(records)
+
+        if 'end' in job_state:
+            start_date = prstime(job_state['end']) - dt.timedelta(seconds=job['overlap'])
+        else:
+            start_date = end_date - dt.timedelta(seconds=job['window'])
+
+        records = collect_records(self.api, job, start_date, end_date)
+
+        seen = set(job_state.get('seen', []))
+        record_keys = [get_record_key(record) for record in records]
+        new_records = [record for record, key in zip(records, record_keys) if key not in seen]
+        self.write(job, new_records)
+
+        # Records in the part of the window that the next run requests again
+        overlap_start = (end_date - dt.timedelta(seconds=job['overlap'])).isoformat('T', 'seconds')
+        self.state['jobs'][job['name']] = {
+            'end': fmttime(end_date),
+            'seen': sorted({key for record, key in zip(records, record_keys)
+                            if str(record.get('timestamp', '')) >= overlap_start})
+        }
+        save_collect_state(self.state_file, self.state)
+        return len(new_records)
+
+    def write(self, job, records):
+        """
+        Write records to the output file or syslog server of a job
+
+        :param job: The job
+        :type job: Dict
+        :param records: Records of the collector
+        :type records: List
+        :return: None
+        """
+        if not records:
+            return
+
+        if job.get('syslog'):
+            self.get_sink(job).write_lines(line.rstrip('\n') for line in format_records(job, records))
+            return
+
+        handler = self.get_handler(job)
+        for line in format_records(job, records):
+            handler.handle(logging.makeLogRecord({'msg': line.rstrip('\n'), 'levelno': logging.INFO}))
+
+    def get_handler(self, job):
+        """
+        Retrieve the rotating file handler of the output file of a job. Jobs with the same output file share a handler.
+
+        :param job: The job
+        :type job: Dict
+        :return: The handler
+        :rtype: RotatingFileHandler
+        """
+        outfile = os.path.abspath(job['outfile'])
+
+        if outfile not in self.handlers:
+            Path(os.path.dirname(outfile)).mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(outfile, maxBytes=job['max_bytes'], backupCount=job['backup_count'])
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.handlers[outfile] = handler
+        return self.handlers[outfile]
+
+    def get_sink(self, job):
+        """
+        Retrieve the sink of the syslog server of a job. Jobs with the same syslog server share a sink, and
+        its connection. Messages are spooled next to the state file while the syslog server is down.
+
+        :param job: The job
+        :type job: Dict
+        :return: The sink
+        :rtype: SyslogSink
+        """
+        from dtctl.utils.sinks import SyslogSink, get_spool_file, SYSLOG_CACERT_ENV
+        url = job['syslog']
+
+        if url not in self.sinks:
+            spool_file = get_spool_file(os.path.dirname(os.path.abspath(self.state_file)), url)
+            self.sinks[url] = SyslogSink(url, spool_file=spool_file, cacert=os.environ.get(SYSLOG_CACERT_ENV),
+                                         msgid=job['output'].upper())
+        return self.sinks[url]
+
+    def close(self):
+        """
+        Close all output files and connections to syslog servers
+
+        :return: None
+        """
+        for handler in self.handlers.values():
+            handler.close()
+        self.handlers.clear()
+
+        for sink in self.sinks.values():
+            try:
+                sink.close()
+            except SystemExit as err:
+                print(err, file=sys.stderr)
+        self.sinks.clear()
+
+
+def collect_records(api, job, start_date, end_date):
+    """
+    Run the collector of a job
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :param job: The job
+    :type job: Dict
+    :param start_date: Start of the window of windowed collectors
+    :type start_date: DateTime
+    :param end_date: End of the window of windowed collectors
+    :type end_date: DateTime
+    :return: Records
+    :rtype: List
+    """
+    from dtctl.system.functions import get_usage, get_packet_loss, get_system_issues, calculate_coverage
+    collector = job['collector']
+
+    if collector == 'usage':
+        return get_usage(api)
+
+    if collector == 'packet-loss':
+        return get_packet_loss(api, start_date, end_date)
+
+    if collector == 'issues':
+        return get_system_issues(api, start_date, end_date)
+
+    return [calculate_coverage(api, job['infile'], job['input_format'], job.get('network_col'),
+                               job.get('netmask_col'))]
+
+
+def format_records(job, records):
+    """
+    Format records as lines in the output format of a job. The records are not modified.
+
+    :param job: The job
+    :type job: Dict
+    :param records: Records of the collector
+    :type records: List
+    :return: Lines
+    :rtype: List
+    """
+    from dtctl.utils.cef import Cef
+    from dtctl.utils.parsing import convert_json_to_log_lines
+
+    if job['output'] == 'json':
+        return [json.dumps(record, sort_keys=True) for record in records]
+
+    if job['output'] == 'cef':
+        return Cef(*COLLECTORS[job['collector']]['cef']).generate_logs(records)
+
+    return convert_json_to_log_lines(records)
+
+
+def get_record_key(record):
+    """
+    Identify a record by its content
+
+    :param record: Record of a collector
+    :type record: Dict
+    :return: Key of the record
+    :rtype: String
+    """
+    return hashlib.sha1(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_jobs(jobs_file):
+    """
+    Load and validate the jobs of the collector. Jobs files are JSON, or YAML if their name ends
+    with ".yaml" or ".yml" (requires PyYAML).
+
+    :param jobs_file: Path to the jobs file
+    :type jobs_file: String
+    :return: Jobs with their defaults filled in
+    :rtype: List
+    """
+    with open(jobs_file, 'r') as infile:
+        if jobs_file.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise click.UsageError('YAML jobs files require PyYAML: pip install pyyaml')
+            try:
+                config = yaml.safe_load(infile)
+            except yaml.YAMLError as err:
+                raise click.UsageError('Unable to parse jobs file {0}\n{1}'.format(jobs_file, err))
+        else:
+            try:
+                config = json.load(infile)
+            except json.JSONDecodeError as err:
+                raise click.UsageError('Unable to parse jobs file {0}\n{1}'.format(jobs_file, err))
+
+    jobs = config.get('jobs') if isinstance(config, dict) else config
+    if not isinstance(jobs, list) or not jobs:
+        raise click.UsageError('Jobs file {0} does not contain a list of "jobs"'.format(jobs_file))
+
+    jobs = [validate_job(job, index) for index, job in enumerate(jobs)]
+
+    names = [job['name'] for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise click.UsageError('Job names must be unique, set "name" for jobs: {0}'.format(', '.join(duplicates)))
+    return jobs
+
+
+def validate_job(job, index):
+    """
+    Validate a job and fill in its defaults
+
+    :param job: Job as read from the jobs file
+    :type job: Dict
+    :param index: Position of the job in the jobs file
+    :type index: Int
+    :return: The job with its defaults
+    :rtype: Dict
+    """
+    if not isinstance(job, dict):
+        raise click.UsageError('Job {0} is not a mapping'.format(index + 1))
+
+    collector = job.get('collector')
+    if collector not in COLLECTORS:
+        raise click.UsageError('Job {0}: "collector" must be one of: {1}'.format(index + 1, ', '.join(COLLECTORS)))
+
+    job = dict({
+        'name': collector,
+        'output': 'log',
+        'max_bytes': DEFAULT_MAX_BYTES,
+        'backup_count': DEFAULT_BACKUP_COUNT,
+        'window': DEFAULT_WINDOW,
+        'overlap': DEFAULT_OVERLAP,
+        'input_format': 'text'
+    }, **job)
+
+    for key in ('interval', 'window', 'overlap', 'max_bytes', 'backup_count'):
+        minimum = 1 if key == 'interval' else 0
+        if not isinstance(job.get(key), int) or isinstance(job[key], bool) or job[key] < minimum:
+            raise click.UsageError('Job "{0}": "{1}" must be a {2} number'.format(
+                job['name'], key, 'positive' if minimum else 'non-negative'))
+
+    if job['output'] not in OUTPUT_FORMATS:
+        raise click.UsageError('Job "{0}": "output" must be one of: {1}'.format(job['name'], ', '.join(OUTPUT_FORMATS)))
+
+    if bool(job.get('outfile')) == bool(job.get('syslog')):
+        raise click.UsageError('Job "{0}": either "outfile" or "syslog" is required'.format(job['name']))
+
+    if job.get('syslog'):
+        from dtctl.utils.sinks import parse_syslog_url
+        parse_syslog_url(job['syslog'])
+
+    if collector == 'coverage':
+        if not job.get('infile') or not os.path.exists(job['infile']):
+            raise click.UsageError('Job "{0}": "infile" must be an existing file'.format(job['name']))
+        if job['input_format'] not in ('csv', 'text'):
+            raise click.UsageError('Job "{0}": "input_format" must be one of: csv, text'.format(job['name']))
+        if job['input_format'] == 'csv' and not (job.get('network_col') and job.get('netmask_col')):
+            raise click.UsageError('Job "{0}": "network_col" and "netmask_col" are required for csv input'.format(
+                job['name']))
+
+    return job
+
+
+def get_collect_state_file(config_file, state_file=None):
+    """
+    Determine the location of the collector state. Defaults to "collect_state.json"
+    in the directory of the config file.
+
+    :param config_file: Path to the config file
+    :type config_file: String
+    :param state_file: Explicitly specified path to the state file
+    :type state_file: String
+    :return: Path to the state file
+    :rtype: String
+    """
+    return state_file or os.path.join(os.path.dirname(config_file), 'collect_state.json')
+
+
+def load_collect_state(state_file):
+    """
+    Load the state of windowed jobs, i.e. the end of their last window and the records in its overlap
+
+    :param state_file: Path to the state file
+    :type state_file: String
+    :return: Collector state
+    :rtype: Dict
+    """
+    if not os.path.exists(state_file):
+        return {'jobs': {}}
+
+    with open(state_file, 'r') as infile:
+        try:
+            return json.load(infile)
+        except json.JSONDecodeError:
+            raise click.UsageError('Unable to parse collector state file\n{0}'.format(state_file))
+
+
+def save_collect_state(state_file, state):
+    """
+    Save the state of windowed jobs. The state is written to a temporary file first,
+    to prevent a corrupt state file when dtctl is interrupted.
+
+    :param state_file: Path to the state file
+    :type state_file: String
+    :param state: Collector state
+    :type state: Dict
+    :return: None
+    """
+    state_dir = os.path.dirname(os.path.abspath(state_file))
+    Path(state_dir).mkdir(parents=True, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile('w', dir=state_dir, suffix='.tmp', delete=False) as outfile:
+        json.dump(state, outfile, indent=4, sort_keys=True)
+    os.replace(outfile.name, state_file)
@@ -0,0 +1,212 @@
+"""
+Local key agent that caches decrypted Darktrace private keys
+
+The agent listens on a Unix socket that is only accessible by the current user. A decrypted
+private key is cached for a limited time (TTL), so that subsequent dtctl invocations skip the
+password prompt and the key derivation. The agent is opt-in: dtctl only uses it when it runs.
+"""
+import os
+import sys
+import time
+import socket
+import hashlib
+import argparse
+import threading
+import subprocess
+import socketserver
+import click
+from dtctl.utils.unixsocket import UserUnixServer, unix_request
+
+DEFAULT_TTL = 900
+AGENT_SOCKET_ENV = 'DTCTL_AGENT_SOCKET'
+AGENT_SOCKET_NAME = 'agent.sock'
+AGENT_TIMEOUT = 2.0
+AGENT_START_TIMEOUT = 5.0
+
+
+class KeyAgent(socketserver.ThreadingMixIn, UserUnixServer):
+    """
+    Unix socket server holding decrypted private keys in memory. Keys are identified by a hash of
+    their encrypted form, so changing the configured key invalidates the cached key.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, ttl=DEFAULT_TTL):
+        """
+        Create the agent and bind its socket with permissions for the current user only
+
+        :param socket_path: Path of the Unix socket
+        :type socket_path: String
+        :param ttl: Seconds a private key is cached after it was added
+        :type ttl: Int
+        """
+        self.ttl = ttl
+        self.keys = {}
+        self.lock = threading.Lock()
+        super(KeyAgent, self).__init__(socket_path)
+
+    def service_actions(self):
+        """Remove expired keys, called by serve_forever in between requests"""
+        now = time.monotonic()
+        with self.lock:
+            for key_id in [key_id for key_id, (_, expires) in self.keys.items() if expires <= now]:
+                del self.keys[key_id]
+
+    def handle_request_dict(self, request):
+        """
+        Execute a request of a dtctl client
+
+        :param request: Request with a "command" and its arguments
+        :type request: Dict
+        :return: Response
+        :rtype: Dict
+        """
+        command = request['command']
+        self.service_actions()
+
+        with self.lock:
+            if command == 'get':
+                entry = self.keys.get(request['key_id'])
+                return {'privkey': entry[0] if entry else None}
+
+            if command == 'add':
+                self.keys[request['key_id']] = (request['privkey'], time.monotonic() + self.ttl)
+                return {'added': True}
+
+            if command == 'status':
+                now = time.monotonic()
+                return {'pid': os.getpid(), 'ttl': self.ttl,
+                        'expires_in': sorted(int(expires - now) for _, expires in self.keys.values())}
+
+            if command == 'stop':
+                self.keys.clear()
+                return {'stopped': True}
+
+        return {'error': 'Unknown command: {0}'.format(command)}
+
+
+def get_agent_socket(config_file):
+    """
+    Path of the key agent socket, next to the config file unless overridden by DTCTL_AGENT_SOCKET
+
+    :param config_file: Path to config file
+    :type config_file: String
+    :return: Path of the Unix socket
+    :rtype: String
+    """
+    return os.environ.get(AGENT_SOCKET_ENV) or os.path.join(os.path.dirname(config_file), AGENT_SOCKET_NAME)
+
+
+def get_key_id(secure_dtkey):
+    """
+    Identifier of an encrypted private key in the agent
+
+    :param secure_dtkey: Encrypted private key as stored in the config file
+    :type secure_dtkey: String
+    :return: Key identifier
+    :rtype: String
+    """
+    return hashlib.sha256(secure_dtkey.encode('utf-8')).hexdigest()
+
+
+def agent_request(socket_path, request):
+    """
+    Send a request to the key agent
+
+    :param socket_path: Path of the Unix socket
+    :type socket_path: String
+    :param request: Request with a "command" and its arguments
+    :type request: Dict
+    :return: Response, or None if no agent is running
+    :rtype: Dict
+    """
+    return unix_request(socket_path, request, AGENT_TIMEOUT)
+
+
+def get_agent_key(socket_path, secure_dtkey):
+    """
+    Retrieve a decrypted private key from the key agent
+
+    :param socket_path: Path of the Unix socket
+    :type socket_path: String
+    :param secure_dtkey: Encrypted private key as stored in the config file
+    :type secure_dtkey: String
+    :return: Plain-text private key, or None if the agent does not run or does not have the key
+    :rtype: String
+    """
+    response = agent_request(socket_path, {'command': 'get', 'key_id': get_key_id(secure_dtkey)})
+    return response.get('privkey') if response else None
+
+
+def add_agent_key(socket_path, secure_dtkey, privkey):
+    """
+    Cache a decrypted private key in the key agent, if it runs
+
+    :param socket_path: Path of the Unix socket
+    :type socket_path: String
+    :param secure_dtkey: Encrypted private key as stored in the config file
+    :type secure_dtkey: String
+    :param privkey: Plain-text private key
+    :type privkey: String
+    :return: Whether the key was cached
+    :rtype: Boolean
+    """
+    response = agent_request(socket_path, {'command': 'add', 'key_id': get_key_id(secure_dtkey), 'privkey': privkey})
+    return bool(response and response.get('added'))
+
+
+def start_agent(socket_path, ttl=DEFAULT_TTL):
+    """
+    Start the key agent as a background process
+
+    :param socket_path: Path of the Unix socket
+    :type socket_path: String
+    :param ttl: Seconds a private key is cached after it was added
+    :type ttl: Int
+    :return: Process ID of the agent
+    :rtype: Int
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise click.UsageError('The key agent requires Unix domain sockets, which are not available on this platform')
+
+    status = agent_request(socket_path, {'command': 'status'})
+    if status:
+        raise click.UsageError('Key agent already running (pid {0})'.format(status['pid']))
+
+    # A socket without a listening agent is left behind by an agent that did not exit cleanly
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+
+    subprocess.Popen([sys.executable, '-m', 'dtctl.config.agent', '--socket', socket_path, '--ttl', str(ttl)],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True, close_fds=True)
+
+    deadline = time.monotonic() + AGENT_START_TIMEOUT
+    while time.monotonic() < deadline:
+        status = agent_request(socket_path, {'command': 'status'})
+        if status:
+            return status['pid']
+        time.sleep(0.05)
+
+    raise click.UsageError('Key agent did not start within {0:.0f} seconds'.format(AGENT_START_TIMEOUT))
+
+
+def main(argv=None):
+    """Run the key agent in the foreground"""
+    parser = argparse.ArgumentParser(description='dtctl key agent')
+    parser.add_argument('--socket', required=True, help='Path of the Unix socket')
+    parser.add_argument('--ttl', type=int, default=DEFAULT_TTL, help='Seconds a private key is cached')
+    args = parser.parse_args(argv)
+
+    agent = KeyAgent(args.socket, args.ttl)
+    try:
+        agent.serve_forever(poll_interval=1)
+    finally:
+        agent.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,21 @@
 # pylint: disable=C0111
 import click
 from dtctl.config.operations import get_config_key
-from dtctl.config.functions import set_dt_key, set_cacert, set_secure_dt_key, set_dt_public_key, set_dt_host
+from dtctl.config.functions import set_dt_key, set_cacert, set_secure_dt_key, set_dt_public_key, set_dt_host, \
+    unlock_agent_key
+from dtctl.config.agent import DEFAULT_TTL, get_agent_socket, agent_request, start_agent
+from dtctl.utils.crypto import KDFS, DEFAULT_KDF
 
 
 @click.command('set', short_help='Set a dtctl configuration option')
 @click.argument('config-option', type=click.Choice(['secure-dtkey', 'dtkey', 'pub-dtkey', 'host', 'cacert']))
 @click.option('--value', '-v', type=click.STRING, help='Value to configure for "config-option"')
+@click.option('--kdf', type=click.Choice(KDFS), default=DEFAULT_KDF, show_default=True,
+              help='Key derivation function used to encrypt "secure-dtkey"')
+@click.option('--kdf-cost', type=click.IntRange(min=1),
+              help='Cost of the key derivation (PBKDF2 iterations or scrypt N). Defaults to the KDF default')
 @click.pass_obj
-def set_config(program_state, config_option, value):
+def set_config(program_state, config_option, value, kdf, kdf_cost):
     """
     Set a dtctl configuration option
 
@@ -24,7 +31,7 @@ def set_config(program_state, config_option, value):
         raise click.UsageError('Missing option "--value" / "-v".')
 
     if config_option == 'secure-dtkey':
-        set_secure_dt_key(program_state.config_file)
+        set_secure_dt_key(program_state.config_file, kdf, kdf_cost)
 
     if config_option == 'dtkey':
         set_dt_key(program_state.config_file)
@@ -56,3 +63,66 @@ def get_config(program_state, config_option):
     """
     value = get_config_key(program_state.config_file, config_option)
     click.echo(value)
+
+
+@click.group('agent', short_help='Cache the decrypted private key in a local key agent')
+def agent():
+    """
+    Manage the local key agent. While the agent runs, the decrypted "secure-dtkey"
+    is cached for a limited time, so dtctl does not prompt for the password on
+    every invocation.
+
+    \b
+    The agent listens on a Unix socket next to the config file, which can be
+    overridden with the DTCTL_AGENT_SOCKET environment variable.
+    """
+
+
+@agent.command('start', short_help='Start the key agent and unlock the private key')
+@click.option('--ttl', '-t', type=click.IntRange(min=1), default=DEFAULT_TTL, show_default=True,
+              help='Seconds the decrypted private key remains cached')
+@click.option('--no-unlock', is_flag=True, default=False,
+              help='Do not unlock the private key now, but on the next dtctl command')
+@click.pass_obj
+def start(program_state, ttl, no_unlock):
+    """
+    Start the key agent in the background and unlock the configured "secure-dtkey"
+    """
+    socket_path = get_agent_socket(program_state.config_file)
+    pid = start_agent(socket_path, ttl)
+    click.echo('Key agent started (pid {0}) on {1}'.format(pid, socket_path))
+
+    if not no_unlock and unlock_agent_key(program_state.config_file, socket_path):
+        click.echo('Private key cached for {0} seconds'.format(ttl))
+
+
+@agent.command('stop', short_help='Stop the key agent and forget cached keys')
+@click.pass_obj
+def stop(program_state):
+    """
+    Stop the key agent. Cached private keys are removed from memory.
+    """
+    if agent_request(get_agent_socket(program_state.config_file), {'command': 'stop'}):
+        click.echo('Key agent stopped')
+    else:
+        click.echo('Key agent is not running')
+
+
+@agent.command('status', short_help='Show whether the key agent runs and caches a key')
+@click.pass_obj
+def status(program_state):
+    """
+    Show the status of the key agent
+    """
+    socket_path = get_agent_socket(program_state.config_file)
+    agent_status = agent_request(socket_path, {'command': 'status'})
+
+    if not agent_status:
+        click.echo('Key agent is not running')
+        return
+
+    click.echo('Key agent running (pid {0}) on {1}'.format(agent_status['pid'], socket_path))
+    for expires_in in agent_status['expires_in']:
+        click.echo('Cached private key expires in {0} seconds'.format(expires_in))
+    if not agent_status['expires_in']:
+        click.echo('No cached private keys')
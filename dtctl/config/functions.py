@@ -1,8 +1,9 @@
 """Functions used by the Click config subcommand"""
 import getpass
 import click
-from dtctl.utils.crypto import encrypt, decrypt
+from dtctl.utils.crypto import encrypt, decrypt, DEFAULT_KDF
 from dtctl.config.operations import set_config_key, get_config_key
+from dtctl.config.agent import add_agent_key
 
 
 def get_cacert(config_file):
@@ -51,11 +52,13 @@ def set_dt_key(config_file):
     set_config_key(config_file, 'dtkey', dtkey)
 
 
-def set_secure_dt_key(config_file):
+def set_secure_dt_key(config_file, kdf=DEFAULT_KDF, kdf_cost=None):
     """
     Configure Daktrace private key securely by storing an encrypted version
 
     :param config_file: Path to config file
+    :param kdf: Key derivation function used to derive the encryption key from the password
+    :param kdf_cost: Cost of the key derivation, None for the default cost of the KDF
     :return: None
     """
     privkey = getpass.getpass('Enter Darktrace private key: ')
@@ -67,7 +70,7 @@ def set_secure_dt_key(config_file):
     if not password == verification_password:
         raise click.UsageError('Passwords did not match')
 
-    encrypted_value = encrypt(password, privkey)
+    encrypted_value = encrypt(password, privkey, kdf, kdf_cost)
     set_config_key(config_file, 'secure-dtkey', encrypted_value)
 
 
@@ -92,3 +95,19 @@ def set_dt_host(config_file, host):
         host = 'https://{0}'.format(host)
 
     set_config_key(config_file, 'host', host)
+
+
+def unlock_agent_key(config_file, socket_path):
+    """
+    Decrypt the configured Darktrace private key and cache it in the key agent
+
+    :param config_file: Path to config file
+    :param socket_path: Path of the key agent socket
+    :return: Whether a key was cached
+    """
+    secure_dtkey = get_config_key(config_file, 'secure-dtkey')
+    if not secure_dtkey:
+        return False
+
+    password = getpass.getpass('Enter password to decrypt Darktrace private key: ')
+    return add_agent_key(socket_path, secure_dtkey, decrypt(password, secure_dtkey))
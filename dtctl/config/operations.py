@@ -6,18 +6,22 @@ import getpass
 from pathlib import Path
 import click
 from dtctl.utils.crypto import decrypt
+from dtctl.config.agent import get_agent_socket, get_agent_key, add_agent_key
 
 
-def get_private_key(priv_dtkey, config_dict):
+def get_private_key(priv_dtkey, config_dict, config_file=None):
     """
     Determines where and how to retrieve the Darktrace private key
     and returns the key unencrypted to be used in Darktrace API calls
-    in API calls
+    in API calls. If a key agent runs, a decrypted secure-dtkey is
+    retrieved from and cached in the agent.
 
     :param priv_dtkey: The command line provided dtkey (None if not provided)
     :type priv_dtkey: String or None
     :param config_dict: The loaded configuration
     :type config_dict: Dict
+    :param config_file: Path to config file, used to locate the key agent (None to not use the key agent)
+    :type config_file: String or None
     :return: Plain-text Darktrace private key
     :rtype: String
     """
@@ -29,8 +33,14 @@ def get_private_key(priv_dtkey, config_dict):
 
     if 'dtkey' not in config_dict and 'secure-dtkey' in config_dict:
         secure_dtkey = config_dict['secure-dtkey']
-        password = getpass.getpass('Enter password to decrypt Darktrace private key: ')
-        privkey = decrypt(password, secure_dtkey)
+        agent_socket = get_agent_socket(config_file) if config_file else None
+        privkey = get_agent_key(agent_socket, secure_dtkey) if agent_socket else None
+
+        if not privkey:
+            password = getpass.getpass('Enter password to decrypt Darktrace private key: ')
+            privkey = decrypt(password, secure_dtkey)
+            if agent_socket:
+                add_agent_key(agent_socket, secure_dtkey, privkey)
 
     if 'dtkey' in config_dict:
         print('WARNING: Using plaintext dtkey from config file.', file=sys.stderr)
@@ -7,14 +7,15 @@ try:
     from simplejson.errors import JSONDecodeError
 except ImportError:
     from json import JSONDecodeError
+import time
 import datetime as dt
-import requests
+import threading
 
 
 class Api:
     """Convenience class for interacting with Darktrace API"""
 
-    def __init__(self, address, public_key, private_key, cacert=None, insecure=False, debug=False):
+    def __init__(self, address, public_key, private_key, cacert=None, insecure=False, debug=False, cache_ttl=None):
         """Create Darktrace API object"""
         self.address = address
         self.public_key = public_key
@@ -22,6 +23,112 @@ class Api:
         self.insecure = insecure
         self.ca_cert = cacert
         self.debug = debug
+        # Seconds that responses of GET requests are reused, None to never reuse responses
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._session = None
+
+    @property
+    def session(self):
+        """
+        HTTP session that is reused for all requests, so connections (and TLS handshakes) are reused
+
+        :return: The session
+        :rtype: requests.Session
+        """
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def get_cached(self, url):
+        """
+        Retrieve a cached response body of a GET request
+
+        :param url: Full URL of the request, including query parameters
+        :type url: String
+        :return: Cached response body or None if the response is not cached or expired
+        :rtype: String
+        """
+        entry = self._get_cache_entry(url)
+        return entry[0] if entry else None
+
+    def get_cache_key(self, call, **kwargs):
+        """
+        Identify the cached response of a GET request. The key changes every time the response
+        is fetched again, so it can be used to cache values derived from the response.
+
+        :param call: The API endpoint call. E.g. /status
+        :type call: String
+        :param kwargs: Arguments of the HTTP request
+        :type kwargs: Dict
+        :return: URL and fetch time of the cached response, or None if the response is not cached
+        :rtype: Tuple
+        """
+        import requests
+        url = requests.Request('GET', self.address + call, params=kwargs).prepare().url
+        entry = self._get_cache_entry(url)
+        return (url, entry[1]) if entry else None
+
+    def _get_cache_entry(self, url):
+        """
+        Retrieve a cache entry and remove it if it expired
+
+        :param url: Full URL of the request, including query parameters
+        :type url: String
+        :return: Response body and fetch time, or None if the response is not cached or expired
+        :rtype: Tuple
+        """
+        if self.cache_ttl is None:
+            return None
+
+        with self._cache_lock:
+            entry = self._cache.get(url)
+            if entry and time.monotonic() - entry[1] < self.cache_ttl:
+                return entry
+            self._cache.pop(url, None)
+        return None
+
+    def set_cached(self, url, body):
+        """
+        Cache the response body of a GET request
+
+        :param url: Full URL of the request, including query parameters
+        :type url: String
+        :param body: Response body
+        :type body: String
+        :return: None
+        """
+        if self.cache_ttl is None:
+            return
+
+        with self._cache_lock:
+            self._cache[url] = (body, time.monotonic())
+
+    def clear_cache(self):
+        """
+        Remove all cached responses
+
+        :return: None
+        """
+        with self._cache_lock:
+            self._cache.clear()
+
+    def prune_cache(self):
+        """
+        Remove expired cached responses. Expired responses are otherwise only removed when they are
+        requested again, which never happens for requests with changing parameters (e.g. time windows).
+
+        :return: None
+        """
+        if self.cache_ttl is None:
+            return
+
+        now = time.monotonic()
+        with self._cache_lock:
+            for url in [url for url, (_, fetched) in self._cache.items() if now - fetched >= self.cache_ttl]:
+                del self._cache[url]
 
     def get_signature(self, call, timestamp):
         """
@@ -67,13 +174,13 @@ class Api:
         :return: Result of API call
         :rtype: Dict
         """
+        import requests
         post_data = kwargs.pop('postdata')
         req = requests.Request('POST', self.address + call, data=post_data, params=kwargs)
         prepped = req.prepare()
         headers = self.get_headers(prepped.path_url)
         prepped.headers = headers
         prepped.headers['Content-Type'] = 'application/x-www-form-urlencoded; charset=UTF-8'
-        session = requests.Session()
 
         if self.debug:
             print_debug_message(prepped)
@@ -89,7 +196,7 @@ class Api:
             # in combination with sessions.
             #
             # resp = session.send(prepped, verify=verify)
-            resp = session.post(self.address + call, data=post_data, headers=headers, verify=verify)
+            resp = self.session.post(self.address + call, data=post_data, headers=headers, verify=verify)
             resp.raise_for_status()
         except requests.exceptions.SSLError as err:
             raise SystemExit(err)
@@ -98,6 +205,9 @@ class Api:
         except requests.exceptions.HTTPError as err:
             raise SystemExit(err)
 
+        # The request may have changed what GET requests return, e.g. the intel feed
+        self.clear_cache()
+
         if resp.status_code in [200, 201]:
             try:
                 return resp.json()
@@ -122,11 +232,16 @@ class Api:
         :return: Result of API call
         :rtype: Dict
         """
+        import requests
         req = requests.Request('GET', self.address + call, params=kwargs)
         prepped = req.prepare()
+
+        cached_body = self.get_cached(prepped.url)
+        if cached_body is not None:
+            return json.loads(cached_body)
+
         headers = self.get_headers(prepped.path_url)
         prepped.headers = headers
-        session = requests.Session()
 
         if self.debug:
             print_debug_message(prepped)
@@ -137,7 +252,7 @@ class Api:
             verify = not self.insecure
 
         try:
-            resp = session.send(prepped, verify=verify)
+            resp = self.session.send(prepped, verify=verify)
             resp.raise_for_status()
         except requests.exceptions.SSLError as err:
             raise SystemExit(err)
@@ -151,13 +266,16 @@ class Api:
             raise SystemExit(err)
 
         try:
-            return resp.json()
+            result = resp.json()
         except (json.decoder.JSONDecodeError, JSONDecodeError):
             body = resp.text
             if '<title>Darktrace | Login</title>' in body:
                 raise SystemExit('API endpoint not supported')
             return body
 
+        self.set_cached(prepped.url, resp.text)
+        return result
+
     def delete(self, call, **kwargs):
         """
         Perform a DELETE request to Darktrace API
@@ -169,11 +287,11 @@ class Api:
         :return: Result of API call
         :rtype: Dict
         """
+        import requests
         req = requests.Request('DELETE', self.address + call, params=kwargs)
         prepped = req.prepare()
         headers = self.get_headers(prepped.path_url)
         prepped.headers = headers
-        session = requests.Session()
 
         if self.debug:
             print_debug_message(prepped)
@@ -184,12 +302,15 @@ class Api:
             verify = not self.insecure
 
         try:
-            resp = session.send(prepped, verify=verify)
+            resp = self.session.send(prepped, verify=verify)
         except requests.exceptions.SSLError as err:
             raise SystemExit(err)
         except requests.exceptions.ConnectionError as err:
             raise SystemExit('Error: Failed connecting to {0}'.format(self.address))
 
+        # The request may have changed what GET requests return, e.g. the intel feed
+        self.clear_cache()
+
         return_info = {
             'status_code': resp.status_code,
             'status': 'unknown'
@@ -0,0 +1,59 @@
+# pylint: disable=C0111
+import signal
+import click
+from dtctl.exporter.functions import MetricsPoller, MetricsServer, DEFAULT_ADDRESS, DEFAULT_PORT, \
+    DEFAULT_INTERVAL, DEFAULT_PACKET_LOSS_WINDOW
+
+
+@click.command('exporter', short_help='Serve appliance health metrics for Prometheus')
+@click.option('--address', default=DEFAULT_ADDRESS, show_default=True, help='Address to listen on')
+@click.option('--port', type=click.IntRange(min=1, max=65535), default=DEFAULT_PORT, show_default=True,
+              help='Port to listen on')
+@click.option('--interval', type=click.IntRange(min=1), default=DEFAULT_INTERVAL, show_default=True,
+              help='Seconds in between refreshes of the metrics')
+@click.option('--packet-loss-window', type=click.IntRange(min=1), default=DEFAULT_PACKET_LOSS_WINDOW,
+              show_default=True, help='Seconds of packet loss breaches to report the most recent packet loss from')
+@click.option('--coverage-file', type=click.Path(exists=True, dir_okay=False),
+              help='File with subnets that should be monitored. Enables the subnet coverage metrics')
+@click.option('--format', '-f', 'input_format', help='Format of the coverage file',
+              default='text', type=click.Choice(['csv', 'text']), show_default=True)
+@click.option('--network-col', help='Column name containing network', type=click.STRING)
+@click.option('--netmask-col', help='Column name containing subnet', type=click.STRING)
+@click.pass_obj
+def exporter(program_state, address, port, interval, packet_loss_window, coverage_file, input_format, network_col,
+             netmask_col):
+    """
+    Serve appliance health metrics (usage, DHCP, packet loss and optionally
+    subnet coverage) in the OpenMetrics format on http://ADDRESS:PORT/metrics
+
+    \b
+    The metrics are refreshed every "interval" seconds in the background.
+    Scrapes return the last refreshed metrics, so they never wait for the
+    Darktrace API and do not cause additional API requests. The
+    dtctl_exporter_collector_up metric shows whether a refresh failed.
+    """
+    coverage = None
+    if coverage_file:
+        coverage = {'infile': coverage_file, 'input_format': input_format, 'network_col': network_col,
+                    'netmask_col': netmask_col}
+
+    # Collectors that use the same endpoint share its response within a refresh
+    program_state.api.cache_ttl = interval
+    poller = MetricsPoller(program_state.api, interval, packet_loss_window, coverage)
+
+    try:
+        server = MetricsServer((address, port), poller)
+    except OSError as err:
+        raise click.UsageError('Unable to listen on {0}:{1}: {2}'.format(address, port, err.strerror))
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    click.echo('Serving metrics of {0} on http://{1}:{2}/metrics'.format(program_state.api.address, address, port))
+
+    poller.start()
+    try:
+        server.serve_forever(poll_interval=1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        poller.stop()
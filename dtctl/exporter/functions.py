@@ -0,0 +1,290 @@
+"""Functions for serving Darktrace appliance health metrics in the OpenMetrics format"""
+import sys
+import time
+import threading
+import datetime as dt
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import click
+
+DEFAULT_ADDRESS = '127.0.0.1'
+DEFAULT_PORT = 9840
+DEFAULT_INTERVAL = 60
+# Seconds of packet loss breaches from which the most recent packet loss per probe is reported
+DEFAULT_PACKET_LOSS_WINDOW = 3600
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Fields of "system usage" records with their metric name and help text
+USAGE_METRICS = (
+    ('cpu', 'darktrace_cpu_percent', 'CPU usage in percent'),
+    ('memused', 'darktrace_memory_used_percent', 'Memory usage in percent'),
+    ('bandwidth', 'darktrace_bandwidth_bits_per_second', 'Current bandwidth in bits per second'),
+    ('dtqueue', 'darktrace_darkflow_queue', 'Nr of items in the Darkflow queue'),
+    ('connectionsPerMinuteCurrent', 'darktrace_connections_per_minute', 'Current nr of connections per minute')
+)
+# DHCP status of subnets with the field of "subnets dhcp" records that counts them
+DHCP_STATUS_FIELDS = (
+    ('not_registered', 'subnets_not_registered'),
+    ('dhcp_disabled', 'subnets_with_dhcp_disabled'),
+    ('without_clients', 'subnets_without_clients'),
+    ('failing', 'subnets_failing_dhcp'),
+    ('tracking', 'subnets_tracking_dhcp')
+)
+COLLECTORS = ('usage', 'dhcp', 'packet-loss', 'coverage')
+
+
+class MetricsPoller:
+    """
+    Refreshes the metrics in a background thread. Every poll requests the Darktrace API once per
+    endpoint and renders the metrics of all collectors into a single document, so scrapes only read
+    the last document: they never wait for the appliance and do not cause additional API requests.
+    """
+
+    def __init__(self, api, interval=DEFAULT_INTERVAL, packet_loss_window=DEFAULT_PACKET_LOSS_WINDOW,
+                 coverage=None):
+        """
+        Create the poller
+
+        :param api: Darktrace API object with initialized config values and caching enabled, so that
+                    collectors that use the same endpoint share its response
+        :type api: Api
+        :param interval: Seconds in between polls
+        :type interval: Int
+        :param packet_loss_window: Seconds of packet loss breaches that are requested by every poll
+        :type packet_loss_window: Int
+        :param coverage: Arguments of calculate_coverage (infile, input_format, network_col and netmask_col),
+                         None to not report subnet coverage
+        :type coverage: Dict
+        """
+        self.api = api
+        self.interval = interval
+        self.packet_loss_window = packet_loss_window
+        self.coverage = coverage
+        self.collectors = [collector for collector in COLLECTORS if collector != 'coverage' or coverage]
+        self.families = {}
+        self.status = {}
+        self.metrics = render_metrics([]).encode('utf-8')
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Poll in a background thread until stopped
+
+        :return: None
+        """
+        self.thread = threading.Thread(target=self.run, name='dtctl-exporter-poller', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """
+        Poll until stopped
+
+        :return: None
+        """
+        while not self.stopped.is_set():
+            self.poll()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        """
+        Stop polling after the current poll
+
+        :return: None
+        """
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+
+    def poll(self):
+        """
+        Refresh the metrics of all collectors. A collector that fails keeps reporting its previous
+        values, with dtctl_exporter_collector_up set to 0.
+
+        :return: None
+        """
+        self.api.prune_cache()
+
+        for collector in self.collectors:
+            started = time.monotonic()
+            try:
+                self.families[collector] = collect_metrics(self.api, collector, self.packet_loss_window,
+                                                           self.coverage)
+                last_success = time.time()
+                up = 1
+            except (SystemExit, Exception) as err:  # pylint: disable=W0703
+                message = err.format_message() if isinstance(err, click.ClickException) else str(err)
+                print('[{0}] Collector "{1}" failed: {2}'.format(dt.datetime.utcnow().isoformat('T', 'seconds'),
+                                                                 collector, message), file=sys.stderr)
+                last_success = self.status.get(collector, {}).get('last_success')
+                up = 0
+
+            self.status[collector] = {'up': up, 'last_success': last_success,
+                                      'duration': time.monotonic() - started}
+
+        families = [family for collector in self.collectors for family in self.families.get(collector, [])]
+        self.metrics = render_metrics(families + self.get_exporter_families()).encode('utf-8')
+
+    def get_exporter_families(self):
+        """
+        Metrics about the collectors of the exporter itself
+
+        :return: Metric families
+        :rtype: List
+        """
+        status = [({'collector': collector}, self.status[collector]) for collector in self.collectors
+                  if collector in self.status]
+
+        return [
+            ('dtctl_exporter_collector_up', 'Whether the last poll of the collector succeeded',
+             [(labels, values['up']) for labels, values in status]),
+            ('dtctl_exporter_collector_last_success_timestamp_seconds', 'Time of the last successful poll',
+             [(labels, values['last_success']) for labels, values in status if values['last_success']]),
+            ('dtctl_exporter_collector_duration_seconds', 'Duration of the last poll of the collector',
+             [(labels, round(values['duration'], 6)) for labels, values in status])
+        ]
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the last rendered metrics on /metrics"""
+
+    def do_GET(self):  # pylint: disable=C0103
+        """Write the metrics"""
+        if urlsplit(self.path).path != '/metrics':
+            self.send_error(404, 'Metrics are served on /metrics')
+            return
+
+        body = self.server.poller.metrics
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=W0622
+        """Scrapes are not logged"""
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """HTTP server that serves the metrics of a poller"""
+    daemon_threads = True
+
+    def __init__(self, address, poller):
+        """
+        Create the server and bind its socket
+
+        :param address: Host and port to listen on
+        :type address: Tuple
+        :param poller: Poller that refreshes the metrics
+        :type poller: MetricsPoller
+        """
+        self.poller = poller
+        super(MetricsServer, self).__init__(address, MetricsHandler)
+
+
+def collect_metrics(api, collector, packet_loss_window, coverage):
+    """
+    Convert the output of a system monitoring function to metric families
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :param collector: Name of the collector
+    :type collector: String
+    :param packet_loss_window: Seconds of packet loss breaches to request
+    :type packet_loss_window: Int
+    :param coverage: Arguments of calculate_coverage
+    :type coverage: Dict
+    :return: Metric families as (name, help, samples), with samples as (labels, value)
+    :rtype: List
+    """
+    from dtctl.system.functions import get_usage, get_packet_loss, calculate_coverage
+    from dtctl.subnets.functions import get_dhcp_stats
+
+    if collector == 'usage':
+        usage = get_usage(api)
+        return [
+            (name, help_text, [({'system': record['system'], 'type': record['type'], 'ip': record.get('ip', ''),
+                                 'label': record.get('label', '')}, record.get(field)) for record in usage])
+            for field, name, help_text in USAGE_METRICS
+        ]
+
+    if collector == 'dhcp':
+        dhcp = get_dhcp_stats(api)
+        return [
+            ('darktrace_subnets_seen', 'Nr of subnets seen by the instance',
+             [({'system': record['system']}, record['subnets_seen']) for record in dhcp]),
+            ('darktrace_dhcp_subnets', 'Nr of subnets seen by the instance per DHCP status',
+             [({'system': record['system'], 'status': status}, record[field])
+              for record in dhcp for status, field in DHCP_STATUS_FIELDS]),
+            ('darktrace_dhcp_average_quality', 'Average DHCP quality of the subnets that track DHCP',
+             [({'system': record['system']}, record['average_dhcp_quality']) for record in dhcp])
+        ]
+
+    if collector == 'packet-loss':
+        end_date = dt.datetime.utcnow().replace(microsecond=0)
+        start_date = end_date - dt.timedelta(seconds=packet_loss_window)
+
+        # Only the most recent packet loss of every probe is reported
+        latest = {}
+        for record in sorted(get_packet_loss(api, start_date, end_date), key=lambda record: record['timestamp']):
+            latest[(record['system'], record['ip'])] = record
+
+        return [
+            ('darktrace_packet_loss_percent', 'Most recently reported packet loss in percent',
+             [({'system': system, 'ip': ip}, record['packet_loss']) for (system, ip), record in latest.items()]),
+            ('darktrace_worker_drop_rate_percent', 'Most recently reported worker drop rate in percent',
+             [({'system': system, 'ip': ip}, record['worker_drop_rate'])
+              for (system, ip), record in latest.items()])
+        ]
+
+    result = calculate_coverage(api, coverage['infile'], coverage['input_format'], coverage.get('network_col'),
+                                coverage.get('netmask_col'))
+    return [
+        ('darktrace_subnet_coverage_percent', 'Percentage of the expected subnets that is seen by Darktrace',
+         [({}, result['coverage_in_percentage'])]),
+        ('darktrace_subnets_expected', 'Nr of subnets in the coverage input file',
+         [({}, result['subnets_expected'])]),
+        ('darktrace_subnets_covered', 'Nr of expected subnets that are seen by Darktrace',
+         [({}, result['subnets_covered'])])
+    ]
+
+
+def render_metrics(families):
+    """
+    Render metric families as gauges in the OpenMetrics text format. Samples without a numeric
+    value (e.g. "Unknown" in the usage of an instance) or with a NaN value are left out.
+
+    :param families: Metric families as (name, help, samples), with samples as (labels, value) or, for
+                     historic values, as (labels, value, timestamp in seconds)
+    :type families: List
+    :return: The metrics
+    :rtype: String
+    """
+    lines = []
+
+    for name, help_text, samples in families:
+        lines.append('# TYPE {0} gauge'.format(name))
+        lines.append('# HELP {0} {1}'.format(name, help_text.replace('\\', '\\\\').replace('\n', '\\n')))
+
+        for labels, value, *timestamp in samples:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+                continue
+            label_text = ','.join('{0}="{1}"'.format(key, escape_label_value(label_value))
+                                  for key, label_value in labels.items())
+            lines.append('{0}{1} {2}{3}'.format(name, '{' + label_text + '}' if label_text else '', value,
+                                                ' {0}'.format(timestamp[0]) if timestamp else ''))
+
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def escape_label_value(value):
+    """
+    Escape a label value for the OpenMetrics text format
+
+    :param value: The label value
+    :type value: String
+    :return: Escaped label value
+    :rtype: String
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
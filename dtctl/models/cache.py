@@ -0,0 +1,73 @@
+"""Local cache of Darktrace model versions"""
+import os
+import json
+import tempfile
+from pathlib import Path
+
+
+class ModelVersionCache:
+    """
+    File based cache of model versions. A model version is identified by the model ID (pid)
+    and the ID of its history entry (phid). Model versions never change, so cached entries
+    never expire.
+    """
+
+    def __init__(self, directory):
+        """Create a cache stored in directory"""
+        self.directory = directory
+
+    def get_path(self, pid, phid):
+        """
+        Path of the cache file of a model version
+
+        :param pid: Model ID
+        :type pid: Int
+        :param phid: Model history ID
+        :type phid: Int
+        :return: Path to the cache file
+        :rtype: String
+        """
+        return os.path.join(self.directory, str(int(pid)), '{0:d}.json'.format(int(phid)))
+
+    def get(self, pid, phid):
+        """
+        Retrieve a model version from the cache
+
+        :param pid: Model ID
+        :type pid: Int
+        :param phid: Model history ID
+        :type phid: Int
+        :return: The model version or None if it is not cached
+        :rtype: Dict
+        """
+        try:
+            with open(self.get_path(pid, phid)) as infile:
+                return json.load(infile)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, pid, phid, model_info):
+        """
+        Store a model version in the cache. The version is written to a temporary file
+        first, so that an interrupted write never leaves a corrupt cache entry.
+
+        :param pid: Model ID
+        :type pid: Int
+        :param phid: Model history ID
+        :type phid: Int
+        :param model_info: Model version as returned by the "/models/{pid}?phid={phid}" endpoint
+        :type model_info: Dict
+        :return: None
+        """
+        path = self.get_path(pid, phid)
+        Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+
+        # A unique temporary file per write, so that concurrent writers never share a temporary file
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix='.tmp', delete=False) as outfile:
+            try:
+                json.dump(model_info, outfile)
+            except BaseException:
+                outfile.close()
+                os.unlink(outfile.name)
+                raise
+        os.replace(outfile.name, path)
@@ -1,14 +1,18 @@
 # pylint: disable=C0111
 # pylint: disable=R0913
+import os
 import datetime as dt
 import click
 from dtctl.models.functions import get_autoupdatable, get_pending_updates, get_updatable, report_models, \
                                    breach_summary, get_models, get_models_with_changes, get_deleted_models, \
                                    get_new_models, select_models_by_key_values, search_models
-from dtctl.models.model_differ import get_update_diffs
-from dtctl.utils.output import process_output
+from dtctl.models.model_differ import get_update_diffs, DEFAULT_WORKERS
+from dtctl.models.cache import ModelVersionCache
+from dtctl.models.history import get_model_history
+from dtctl.utils.output import process_output, process_output_lines
 from dtctl.utils.timeutils import determine_date_range
 from dtctl.utils.clickutils import OptionMutex
+from dtctl.utils.reporting import export_frame, EXPORT_FORMATS
 
 
 @click.command('select', short_help='View models based on top-level key value pairs')
@@ -46,12 +50,17 @@ def select_model(program_state, selectors, outfile):
 @click.option('--with-components', '-w', help='List models and their components', is_flag=True)
 @click.option('--tag', '-t', cls=OptionMutex, not_required_if=['enhanced-only'],
               type=click.STRING, help='List models for specified tag (case insensitive). ')
+@click.option('--jsonl', '-j', help='Output one model per line as JSON lines (streamed)', is_flag=True)
 @click.option('--outfile', '-o', type=click.Path(), help='Full path to the output file')
 @click.pass_obj
-def list_models(program_state, enhanced_only, active_only, with_components, tag, outfile):
+def list_models(program_state, enhanced_only, active_only, with_components, tag, jsonl, outfile):
     """List all models present within Darktrace"""
-    output = get_models(program_state.api, enhanced_only, active_only, with_components, tag)
-    process_output(output, outfile)
+    output = get_models(program_state.api, enhanced_only, active_only, with_components, tag, stream=jsonl)
+
+    if jsonl:
+        process_output_lines(output, outfile)
+    else:
+        process_output(output, outfile)
 
 
 @click.command('autoupdatable', short_help='Models that have autoupdate configured')
@@ -97,11 +106,74 @@ def updatable(program_state, outfile):
 
 
 @click.command('update-diff', short_help='Shows changes for models that have pending updates')
+@click.option('--workers', '-w', type=click.IntRange(min=1), default=DEFAULT_WORKERS, show_default=True,
+              help='Number of model versions to fetch concurrently')
+@click.option('--no-cache', is_flag=True, help='Do not use or update the local cache of model versions')
 @click.option('--outfile', '-o', type=click.Path(), help='Full path to the output file')
 @click.pass_obj
-def update_diff(program_state, outfile):
-    """List models that have updates pending and their respective changes"""
-    process_output(get_update_diffs(program_state.api), outfile)
+def update_diff(program_state, workers, no_cache, outfile):
+    """
+    List models that have updates pending and their respective changes
+
+    \b
+    Changes to the model policy are listed under "policy". Changes to the model components
+    are listed under "components", split into "added", "removed", "modified" and "reordered"
+    components. Components are referred to by their position in the model logic ("index").
+
+    \b
+    Model versions are cached in the "model_versions" directory next to the config file,
+    so subsequent runs only fetch model versions that have not been fetched before.
+    """
+    cache = None if no_cache else \
+        ModelVersionCache(os.path.join(os.path.dirname(program_state.config_file), 'model_versions'))
+    process_output(get_update_diffs(program_state.api, cache, workers), outfile)
+
+
+@click.command('history', short_help='Timeline of changes to all models')
+@click.option('--pid', '-p', 'pids', type=click.INT, multiple=True, help='Only include this model (option reusable)')
+@click.option('--active-only', '-a', help='Only include models that are active', is_flag=True)
+@click.option('--days', '-d', type=click.INT,
+              help='Number of days in the past for the start date of the history. Defaults to all history')
+@click.option('--start-date', type=click.DateTime(formats=('%d-%m-%Y',)),
+              help='Start date of the history. (overwrites the "--days" flag)')
+@click.option('--end-date', type=click.DateTime(formats=('%d-%m-%Y',)),
+              help='End date of the history.')
+@click.option('--changes', '-c', 'with_changes', is_flag=True,
+              help='Add the changes of every model version compared to its previous version')
+@click.option('--workers', '-w', type=click.IntRange(min=1), default=DEFAULT_WORKERS, show_default=True,
+              help='Number of model versions to fetch concurrently')
+@click.option('--no-cache', is_flag=True, help='Do not use or update the local cache of model versions')
+@click.option('--output', '-f', help='Specify output format', default='xlsx', show_default=True,
+              type=click.Choice(EXPORT_FORMATS))
+@click.option('--outfile', '-o', type=click.Path(), help='Full path to the output file.'
+                                                         ' Defaults to ./models_history_%Y-%m-%d_%H.%M.%S.xlsx')
+@click.pass_obj
+def history(program_state, pids, active_only, days, start_date, end_date, with_changes, workers, no_cache,
+            output, outfile):
+    """
+    Create a timeline with every version of every model. With --changes, consecutive model
+    versions are fetched and compared to show what changed in every version.
+
+    \b
+    Parquet output requires the pyarrow package.
+
+    \b
+    Examples:
+        dtctl models history --days 365 --changes --output parquet
+        dtctl models history --pid 123 --pid 456 --output csv
+    """
+    if days is not None or start_date or end_date:
+        end_date, start_date = determine_date_range(-1 if days is None else days, end_date, start_date)
+
+    if not outfile:
+        outfile = f'./models_history_{dt.datetime.now():%Y-%m-%d_%H.%M.%S}.{output}'
+
+    cache = None if no_cache or not with_changes else \
+        ModelVersionCache(os.path.join(os.path.dirname(program_state.config_file), 'model_versions'))
+
+    model_history = get_model_history(program_state.api, active_only, pids, start_date, end_date, with_changes,
+                                      cache, workers)
+    export_frame(model_history, outfile, output)
 
 
 @click.command('input-diff', short_help='Shows new or modified models based on input list')
@@ -157,17 +229,20 @@ def input_diff(program_state, arg, infile, days, start_date, end_date, enhanced_
 @click.option('--end-date', type=click.DateTime(formats=('%d-%m-%Y',)),
               help='End date of the report.')
 @click.option('--active-only', '-a', help='Only list models that are active', is_flag=True)
+@click.option('--group-by', '-g', type=click.Choice(['model', 'category', 'tag']), default='model',
+              show_default=True, help='Group breach statistics by model, model category or model tag')
 @click.option('--outfile', '-o', type=click.Path(), help='Full path to the output file'
                                                          ' Defaults to ./models_arg_%Y-%m-%d_%H.%M.%S.xlsx')
 @click.pass_obj
-def report(program_state, arg, days, start_date, end_date, active_only, outfile):
+def report(program_state, arg, days, start_date, end_date, active_only, group_by, outfile):
     """
     Generate report that lists models or breaches per model
 
     \b
     Arguments:
         all                 Create Excel report that contains all models within Darktrace
-        breach-summary      Create Excel report that contains breach statistics per model
+        breach-summary      Create Excel report that contains breach statistics per model,
+                            model category or model tag (see --group-by)
     """
     end_date, start_date = determine_date_range(days, end_date, start_date)
 
@@ -178,4 +253,5 @@ def report(program_state, arg, days, start_date, end_date, active_only, outfile)
         report_models(program_state.api, active_only=active_only, outfile=outfile)
 
     if arg == 'breach-summary':
-        breach_summary(program_state.api, outfile=outfile, start_date=start_date, end_date=end_date)
+        breach_summary(program_state.api, outfile=outfile, start_date=start_date, end_date=end_date,
+                       group_by=group_by)
@@ -2,12 +2,22 @@
 # pylint: disable=E1135
 """Functions used by the Click models subcommand"""
 import os
-import fnmatch
-import datetime as dt
-import pandas as pd
-from pandas.io.json import json_normalize
+from operator import itemgetter
+from collections import OrderedDict
 import click
+from dtctl.models.index import get_model_index, index_components_by_cid
 from dtctl.utils.timeutils import fmttime
+from dtctl.utils.breaches import get_breach_device_id
+from dtctl.utils.tagfilter import ENHANCED_TAG_FILTER, substring_filter
+
+MODEL_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Users that apply model updates made by Darktrace
+SYSTEM_USERS = ('darktrace', 'System', 'nobody')
+
+# History states of the most recent cached "/models" responses, see Api.get_cache_key
+MAX_CACHED_HISTORY_STATES = 4
+_HISTORY_STATES = OrderedDict()
 
 
 def select_models_by_key_values(api, key_values):
@@ -22,15 +32,11 @@ def select_models_by_key_values(api, key_values):
     :return: Selected models
     :rtype: List
     """
-    models = api.get('/models')
-    selected_models = []
-    for model in models:
-        for key, value in key_values.items():
-            if key not in model:
-                continue
-            if str(model[key]).lower() == value.lower():
-                selected_models.append(model)
-    return selected_models
+    index = get_model_index(api)
+    selected_pids = set()
+    for key, value in key_values.items():
+        selected_pids.update(model['pid'] for model in index.select(key, value))
+    return [model for model in index.models if model['pid'] in selected_pids]
 
 
 def get_deleted_models(api, enhanced_only, active_only, infile, **_):
@@ -139,6 +145,7 @@ def get_models_by_date_range(models, **kwargs):
     :return: Filtered models
     :rtype: List
     """
+    import pandas as pd
     if 'start_date' not in kwargs:
         raise TypeError
 
@@ -148,15 +155,13 @@ def get_models_by_date_range(models, **kwargs):
     start_date = kwargs['start_date']
     end_date = kwargs['end_date']
 
-    filtered_models = []
-    for model in models:
-        model_datetime = dt.datetime.strptime(model['modified'], '%Y-%m-%d %H:%M:%S')
-        if start_date <= model_datetime <= end_date:
-            filtered_models.append(model)
-    return filtered_models
+    modified = pd.to_datetime(pd.Series([model['modified'] for model in models], dtype=object),
+                              format=MODEL_TIME_FORMAT)
+    in_range = ((modified >= start_date) & (modified <= end_date)).tolist()
+    return [model for model, model_in_range in zip(models, in_range) if model_in_range]
 
 
-def get_models(api, enhanced_only, active_only, with_components, filter_tag):
+def get_models(api, enhanced_only, active_only, with_components, filter_tag, stream=False):
     """
     Generic function for listing models. If the enhanced_only flag is provided
     only list models that have that tag
@@ -170,16 +175,20 @@ def get_models(api, enhanced_only, active_only, with_components, filter_tag):
     :param with_components: Display model components
     :type with_components: Boolean
     :param filter_tag: String that filters listed models based on specified tag
+    :param stream: Return an iterator that joins components to models as they are consumed
+    :type stream: Boolean
     :return: Dict of models
     """
     models = api.get('/models')
-    if with_components:
-        models = get_model_components(api, models)
 
     selected_models = filter_models_by_flags(models, enhanced_only, active_only)
 
     if filter_tag:
-        return get_models_filtered_by_tag(filter_tag, selected_models)
+        selected_models = get_models_filtered_by_tag(filter_tag, selected_models)
+
+    if with_components:
+        models_with_components = iter_model_components(selected_models, index_components_by_cid(api.get('/components')))
+        return models_with_components if stream else list(models_with_components)
 
     return selected_models
 
@@ -195,24 +204,28 @@ def get_model_components(api, models):
     :return: Models including their components list
     :rtype: List
     """
-    components = api.get('/components')
-    models_to_return = []
-    for model in models:
-        for component in model['logic']['data']:
-            if isinstance(component, dict):
-                cid = component['cid']
-            else:
-                cid = component
+    components_by_cid = index_components_by_cid(api.get('/components'))
+    return list(iter_model_components(models, components_by_cid))
 
-            components_for_model = [x for x in components if x['cid'] == cid]
 
-            if 'components' in model:
-                model['components'].extend(components_for_model)
-            else:
-                model['components'] = components_for_model
+def iter_model_components(models, components_by_cid):
+    """
+    Join components to models. Models are copied, the given models are not modified.
+
+    :param models: Models to get components for
+    :type models: Iterable
+    :param components_by_cid: Components grouped by cid, see index_components_by_cid
+    :type components_by_cid: Dict
+    :return: Models including their components list
+    :rtype: Iterator
+    """
+    for model in models:
+        components = list(model.get('components', []))
+        for component in model['logic']['data']:
+            cid = component['cid'] if isinstance(component, dict) else component
+            components.extend(components_by_cid.get(cid, []))
 
-        models_to_return.append(model)
-    return models_to_return
+        yield dict(model, components=components)
 
 
 def get_enhanced_only_models(active_only, models):
@@ -224,19 +237,10 @@ def get_enhanced_only_models(active_only, models):
     :param models: Dict of models to filter on enhanced (and active_only)
     :return: Dict of filtered models
     """
-    enhanced_models = []
-    for model in models:
-        if active_only:
-            if not model['active']:
-                continue
+    if active_only:
+        models = [model for model in models if model['active']]
 
-        try:
-            for tag in model['tags']:
-                if 'enhanced' in tag.lower():
-                    enhanced_models.append(model)
-        except KeyError:
-            pass
-    return enhanced_models
+    return ENHANCED_TAG_FILTER.filter(models, lambda model: model.get('tags'))
 
 
 def get_active_only_models(active_only, filter_tag, models):
@@ -249,22 +253,13 @@ def get_active_only_models(active_only, filter_tag, models):
     :param models: Dict of models
     :return: Dict of filtered models
     """
-    active_models = []
-    for model in models:
-        if active_only:
-            if not model['active']:
-                continue
+    if active_only:
+        models = [model for model in models if model['active']]
+
+    if filter_tag:
+        return get_models_filtered_by_tag(filter_tag, models)
 
-        if filter_tag:
-            try:
-                for tag in model['tags']:
-                    if filter_tag.lower() in tag.lower():
-                        active_models.append(model)
-            except KeyError:
-                pass
-        else:
-            active_models.append(model)
-    return active_models
+    return list(models)
 
 
 def get_models_filtered_by_tag(filter_tag, models):
@@ -275,15 +270,7 @@ def get_models_filtered_by_tag(filter_tag, models):
     :param models: Dict of models
     :return: Dict of filtered models
     """
-    filtered_models = []
-    for model in models:
-        try:
-            for tag in model['tags']:
-                if filter_tag.lower() in tag.lower():
-                    filtered_models.append(model)
-        except KeyError:
-            pass
-    return filtered_models
+    return substring_filter(filter_tag).filter(models, lambda model: model.get('tags'))
 
 
 def get_autoupdatable(api, **kwargs):
@@ -315,12 +302,9 @@ def get_pending_updates(api, **kwargs):
     :return: None
     """
     models = api.get('/models', **kwargs)
-    models_with_updates = []
-    for model in models:
-        history_sorted = sorted(model['history'], key=lambda k: k['modified'], reverse=True)
-        if not history_sorted[0]['active']:
-            models_with_updates.append(model)
-    return models_with_updates
+    history_state = get_history_state(models, api.get_cache_key('/models', **kwargs))
+
+    return [models[model_index] for model_index, (latest_active, _) in history_state.items() if not latest_active]
 
 
 # This is potentially already functionality in Darktrace itself. I.e. models with changes are not updated automagically
@@ -337,14 +321,57 @@ def get_updatable(api, **kwargs):
     :return: None
     """
     models = api.get('/models', **kwargs)
-    models_updatable = []
+    history_state = get_history_state(models, api.get_cache_key('/models', **kwargs))
 
-    for model in models:
-        history_sorted = sorted(model['history'], key=lambda k: k['modified'], reverse=True)
-        if not history_sorted[0]['active']:
-            if history_sorted[1]['by'] not in ['darktrace', 'System', 'nobody']:
-                models_updatable.append(model['name'])
-    return models_updatable
+    # Models without a previous history entry are never considered updatable
+    return [models[model_index]['name'] for model_index, (latest_active, previous_by) in history_state.items()
+            if not latest_active and previous_by is not None and previous_by not in SYSTEM_USERS]
+
+
+def get_history_state(models, cache_key=None):
+    """
+    Determine the latest and the previous history entry of every model by modification time.
+    Note that the history list is not guaranteed to be ordered.
+
+    Results are cached for cached "/models" responses (e.g. in a long-running "dtctl serve"
+    process), so that repeated commands do not walk all model histories again.
+
+    :param models: Models as returned by the "/models" endpoint
+    :type models: List
+    :param cache_key: Key of the cached "/models" response (see Api.get_cache_key), None to not cache
+    :type cache_key: Tuple
+    :return: Per index of a model in models: whether its latest history entry is active and
+             who made its previous history entry (None if there is none). Models without history are left out.
+    :rtype: Dict
+    """
+    if cache_key is not None and cache_key in _HISTORY_STATES:
+        return _HISTORY_STATES[cache_key]
+
+    # Modification times are formatted as "%Y-%m-%d %H:%M:%S", which sorts chronologically
+    get_modified = itemgetter('modified')
+
+    history_state = {}
+    for model_index, model in enumerate(models):
+        history = model.get('history')
+        if not history:
+            continue
+
+        try:
+            history = sorted(history, key=get_modified, reverse=True)
+        except (KeyError, TypeError):
+            # Leave out history entries without modification time
+            history = sorted((entry for entry in history if entry.get('modified')), key=get_modified, reverse=True)
+            if not history:
+                continue
+
+        history_state[model_index] = (bool(history[0]['active']), history[1]['by'] if len(history) > 1 else None)
+
+    if cache_key is not None:
+        if len(_HISTORY_STATES) >= MAX_CACHED_HISTORY_STATES:
+            _HISTORY_STATES.popitem(last=False)
+        _HISTORY_STATES[cache_key] = history_state
+
+    return history_state
 
 
 def filter_models_by_flags(models, enhanced_only, active_only):
@@ -379,30 +406,56 @@ def report_models(api, **kwargs):
     output_file = kwargs['outfile']
     active_only = kwargs['active_only']
 
-    models = pd.DataFrame(api.get('/models'))
+    models = api.get('/models')
 
     if active_only:
-        models = models[models.active == True]
-    models['idx'] = models.index
-
-    history_list = []
-    for _, row in models[['idx', 'history']].iterrows():
-        idx, events = row
-        for event in events:
-            event['idx'] = idx
-            history_list.append(event)
-    history = pd.DataFrame(history_list)
-
-    models_columns = [x for x in models.columns if x not in history.columns] + ['idx']
+        models = [model for model in models if model['active']]
+
     columns = ['pid', 'name', 'active', 'modified', 'created', 'by', 'message', 'description', 'tags', 'phid']
+    history = get_model_history_frame(models)
+    history.reindex(columns=columns).to_excel(output_file)
+
+
+def get_model_history_frame(models):
+    """
+    Create a table with one row per model version (pid x phid). Values of a model version's
+    history entry take precedence over the values of the model itself.
+
+    :param models: Models as returned by the "/models" endpoint
+    :type models: List
+    :return: Model history sorted by pid and modification time
+    :rtype: DataFrame
+    """
+    import pandas as pd
+    models_df = pd.DataFrame(models)
+    if models_df.empty or 'history' not in models_df:
+        return pd.DataFrame(columns=['pid', 'phid', 'modified'])
+
+    exploded = models_df.explode('history')
+    exploded = exploded[exploded['history'].notna()]
+
+    history = pd.json_normalize(exploded['history'].tolist())
+    history.index = exploded.index
+
+    model_columns = [column for column in models_df.columns if column not in history.columns and column != 'history']
+    merged = pd.concat([exploded[model_columns], history], axis=1)
+
+    return merged.sort_values(['pid', 'modified'], kind='mergesort').reset_index(drop=True)
 
-    merged = history.merge(models[models_columns], on='idx')
-    merged[columns].sort_values(['pid', 'modified'], ascending=True).to_excel(output_file)
+
+BREACH_SUMMARY_GROUPS = {
+    'model': 'model.name',
+    'category': 'category',
+    'tag': 'tag'
+}
+
+BREACH_SUMMARY_COLUMNS = ('nr_of_breaches', 'nr_of_acknowledged', 'score_p50', 'score_p90', 'score_p99',
+                          'nr_of_devices', 'first_breach', 'last_breach')
 
 
 def breach_summary(api, **kwargs):
     """
-    Function for listing nr of breaches per model
+    Function for listing nr of breaches per model, model category or model tag
 
     :param api: A valid and active authenticated session with the DarkTrace API
     :return: None
@@ -413,21 +466,60 @@ def breach_summary(api, **kwargs):
     breaches = api.get('/modelbreaches', starttime=start_date, endtime=end_date,
                        includeacknowledged='true', historicmodelonly='true', minimal='false')
 
-    breaches_df = json_normalize(breaches)
-    breaches_df['acknowledged'] = breaches_df['acknowledged'].map(bool)
+    summary_df = summarize_breaches(breaches, kwargs.get('group_by', 'model'))
+    summary_df.to_excel(kwargs['outfile'])
 
-    summary_df = pd.DataFrame(columns=['nr_of_breaches', 'nr_of_acknowledged'])
 
-    for name, group in breaches_df.groupby('model.name'):
-        nr_of_breaches = len(group)
-        nr_of_acknowledged = group[group.acknowledged == True]['acknowledged'].count()
+def summarize_breaches(breaches, group_by='model'):
+    """
+    Calculate breach statistics per model, model category (the part of the model name before "::")
+    or model tag. A breach of a model with multiple tags counts for every tag.
 
-        # DF holds the following structure
-        #               nr_of_breaches      nr_of_acknowledged
-        # model.name
-        summary_df.loc[name] = [nr_of_breaches, nr_of_acknowledged]
+    :param breaches: Breaches as returned by the "/modelbreaches" endpoint
+    :type breaches: List
+    :param group_by: Group breaches by "model", "category" or "tag"
+    :type group_by: String
+    :return: Nr of breaches, nr of acknowledged breaches, score percentiles, nr of distinct devices and
+             first and last breach time per group
+    :rtype: DataFrame
+    """
+    import pandas as pd
+    group_column = BREACH_SUMMARY_GROUPS[group_by]
 
-    summary_df.to_excel(kwargs['outfile'])
+    breaches_df = pd.DataFrame({
+        'model.name': [breach['model']['name'] for breach in breaches],
+        'tag': [breach['model'].get('tags') or [] for breach in breaches],
+        'acknowledged': [bool(breach.get('acknowledged')) for breach in breaches],
+        'score': pd.to_numeric([breach.get('score') for breach in breaches], errors='coerce'),
+        'did': [get_breach_device_id(breach) for breach in breaches],
+        'time': [breach['time'] for breach in breaches]
+    })
+
+    if group_by == 'tag':
+        breaches_df = breaches_df.explode('tag').dropna(subset=['tag'])
+
+    if breaches_df.empty:
+        return pd.DataFrame(columns=BREACH_SUMMARY_COLUMNS, index=pd.Index([], name=group_column))
+
+    if group_by == 'category':
+        breaches_df['category'] = breaches_df['model.name'].str.split('::', n=1).str[0]
+
+    summary_df = breaches_df.groupby(group_column).agg(
+        nr_of_breaches=('time', 'size'),
+        nr_of_acknowledged=('acknowledged', 'sum'),
+        score_p50=('score', lambda scores: scores.quantile(0.5)),
+        score_p90=('score', lambda scores: scores.quantile(0.9)),
+        score_p99=('score', lambda scores: scores.quantile(0.99)),
+        nr_of_devices=('did', 'nunique'),
+        first_breach=('time', 'min'),
+        last_breach=('time', 'max')
+    )
+
+    summary_df['nr_of_acknowledged'] = summary_df['nr_of_acknowledged'].astype(int)
+    summary_df['first_breach'] = pd.to_datetime(summary_df['first_breach'], unit='ms')
+    summary_df['last_breach'] = pd.to_datetime(summary_df['last_breach'], unit='ms')
+
+    return summary_df.sort_values('nr_of_breaches', ascending=False, kind='mergesort')
 
 
 def get_rules(api, list_of_cids):
@@ -441,8 +533,9 @@ def get_rules(api, list_of_cids):
     :return: List of components
     :rtype: List
     """
+    cids = set(list_of_cids)
     components = api.get('/components')
-    return [x for x in components if x['cid'] in list_of_cids]
+    return [x for x in components if x['cid'] in cids]
 
 
 def search_models(api, name_query):
@@ -457,12 +550,5 @@ def search_models(api, name_query):
     :rtype: List
     """
     if name_query:
-        models = api.get('/models')
-        qualifying_models = []
-
-        for model in models:
-            if fnmatch.fnmatch(model['name'].lower(), name_query.lower()):
-                qualifying_models.append(model)
-
-        return qualifying_models
+        return get_model_index(api).search(name_query)
     return None
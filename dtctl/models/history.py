@@ -0,0 +1,88 @@
+"""Functions for the change history of Darktrace models"""
+from dtctl.models.functions import get_model_history_frame
+from dtctl.models.model_differ import fetch_model_versions, get_model_differences, DEFAULT_WORKERS
+
+HISTORY_COLUMNS = ['pid', 'phid', 'name', 'modified', 'by', 'message', 'active', 'tags', 'description']
+
+
+def get_model_history(api, active_only=False, pids=None, start_date=None, end_date=None, with_changes=False,
+                      cache=None, workers=DEFAULT_WORKERS):
+    """
+    Retrieve the history of all model versions
+
+    :param api: A valid and active authenticated session with the Darktrace API
+    :type api: Api
+    :param active_only: Only include models that are active
+    :type active_only: Boolean
+    :param pids: Only include these models
+    :type pids: List
+    :param start_date: Only include model versions modified at or after this date
+    :type start_date: DateTime
+    :param end_date: Only include model versions modified at or before this date
+    :type end_date: DateTime
+    :param with_changes: Add the changes of every version compared to the previous version of the model
+    :type with_changes: Boolean
+    :param cache: Cache for model versions, or None to always fetch model versions
+    :type cache: ModelVersionCache
+    :param workers: Number of model versions to fetch concurrently
+    :type workers: Int
+    :return: Model history with one row per model version
+    :rtype: DataFrame
+    """
+    import pandas as pd
+    models = api.get('/models')
+
+    if active_only:
+        models = [model for model in models if model['active']]
+
+    if pids:
+        pids = set(pids)
+        models = [model for model in models if model['pid'] in pids]
+
+    history = get_model_history_frame(models).reindex(columns=HISTORY_COLUMNS)
+
+    # The previous version is determined before filtering on dates, so the first version
+    # within the date range is still compared with its predecessor
+    history['previous_phid'] = history.groupby('pid')['phid'].shift()
+
+    modified = pd.to_datetime(history['modified'])
+    if start_date:
+        history = history[modified >= pd.Timestamp(start_date)]
+    if end_date:
+        history = history[modified <= pd.Timestamp(end_date)]
+
+    if with_changes:
+        history = history.assign(changes=get_version_changes(api, history, cache, workers))
+
+    return history.drop(columns='previous_phid').reset_index(drop=True)
+
+
+def get_version_changes(api, history, cache=None, workers=DEFAULT_WORKERS):
+    """
+    Determine the changes of model versions compared to their previous version. All required
+    model versions are fetched concurrently.
+
+    :param api: A valid and active authenticated session with the Darktrace API
+    :type api: Api
+    :param history: Model history with pid, phid and previous_phid columns
+    :type history: DataFrame
+    :param cache: Cache for model versions, or None to always fetch model versions
+    :type cache: ModelVersionCache
+    :param workers: Number of model versions to fetch concurrently
+    :type workers: Int
+    :return: Changes per model version, None for the first version of a model
+    :rtype: List
+    """
+    version_pairs = [(int(pid), int(phid), int(previous_phid))
+                     for pid, phid, previous_phid in history[['pid', 'phid', 'previous_phid']].dropna().values]
+
+    versions = [(pid, phid) for pid, phid, _ in version_pairs] + \
+        [(pid, previous_phid) for pid, _, previous_phid in version_pairs]
+    model_versions = fetch_model_versions(api, versions, cache, workers)
+
+    changes = {}
+    for pid, phid, previous_phid in version_pairs:
+        differences = get_model_differences(model_versions[(pid, phid)], model_versions[(pid, previous_phid)])
+        changes[(pid, phid)] = {key: value for key, value in differences.items() if key not in ('model', 'message')}
+
+    return [changes.get((pid, phid)) for pid, phid in history[['pid', 'phid']].values]
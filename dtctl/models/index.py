@@ -0,0 +1,169 @@
+"""Indexes of Darktrace models and components for fast lookups"""
+import re
+import time
+import fnmatch
+import weakref
+from collections import defaultdict
+
+# Model indexes with their build time, per Api object
+_MODEL_INDEXES = weakref.WeakKeyDictionary()
+
+
+class ModelIndex:
+    """Lookups of Darktrace models by pid, name, uuid, tag and category"""
+
+    def __init__(self, models):
+        """
+        Build the index
+
+        :param models: Models as returned by the "/models" endpoint
+        :type models: List
+        """
+        self.models = models
+        self.by_pid = {}
+        self.by_name = defaultdict(list)
+        self.by_uuid = {}
+        self.by_tag = defaultdict(list)
+        self.by_category = defaultdict(list)
+
+        for model in models:
+            self.by_pid[model['pid']] = model
+            self.by_name[model['name'].lower()].append(model)
+
+            if model.get('uuid'):
+                self.by_uuid[model['uuid'].lower()] = model
+
+            for tag in model.get('tags') or []:
+                self.by_tag[tag.lower()].append(model)
+
+            # A model named "Anomalous Connection::Data Sent" is in category "anomalous connection"
+            categories = model['name'].lower().split('::')[:-1]
+            for depth in range(1, len(categories) + 1):
+                self.by_category['::'.join(categories[:depth])].append(model)
+
+    def get_by_pid(self, pid):
+        """
+        Find a model by its ID
+
+        :param pid: Model ID
+        :type pid: Int
+        :return: The model or None if no model has this ID
+        :rtype: Dict
+        """
+        return self.by_pid.get(int(pid))
+
+    def get_by_name(self, name):
+        """
+        Find a model by its name (case insensitive). Model names are not unique, use
+        select("name", name) to find all models with a name.
+
+        :param name: Full model name, e.g. "System::Packet Loss"
+        :type name: String
+        :return: The first model with this name or None if no model has this name
+        :rtype: Dict
+        """
+        models = self.by_name.get(name.lower())
+        return models[0] if models else None
+
+    def get_by_uuid(self, uuid):
+        """
+        Find a model by its uuid
+
+        :param uuid: Model uuid
+        :type uuid: String
+        :return: The model or None if no model has this uuid
+        :rtype: Dict
+        """
+        return self.by_uuid.get(uuid.lower())
+
+    def get_by_tag(self, tag):
+        """
+        Find models with a tag (case insensitive)
+
+        :param tag: Model tag
+        :type tag: String
+        :return: Models with the tag
+        :rtype: List
+        """
+        return list(self.by_tag.get(tag.lower(), []))
+
+    def get_by_category(self, category):
+        """
+        Find models in a category, the part of the model name before "::" (case insensitive)
+
+        :param category: Model category, e.g. "Anomalous Connection" or "Compliance::Crypto"
+        :type category: String
+        :return: Models in the category
+        :rtype: List
+        """
+        return list(self.by_category.get(category.lower().rstrip(':'), []))
+
+    def search(self, name_query):
+        """
+        Search models by name
+
+        :param name_query: Shell-style search string potentially containing wildcards (case insensitive)
+        :type name_query: String
+        :return: Models with a matching name
+        :rtype: List
+        """
+        pattern = re.compile(fnmatch.translate(name_query), re.IGNORECASE)
+        return [model for model in self.models if pattern.match(model['name'])]
+
+    def select(self, key, value):
+        """
+        Find models by the value of a top-level key (case insensitive)
+
+        :param key: Model key
+        :type key: String
+        :param value: Value of the key
+        :type value: String
+        :return: Models with the given value
+        :rtype: List
+        """
+        if key == 'name':
+            return list(self.by_name.get(value.lower(), []))
+
+        if key == 'pid':
+            model = self.by_pid.get(int(value)) if value.isdigit() else None
+        elif key == 'uuid':
+            model = self.get_by_uuid(value)
+        else:
+            return [model for model in self.models if key in model and str(model[key]).lower() == value.lower()]
+
+        return [model] if model else []
+
+
+def index_components_by_cid(components):
+    """
+    Group components by their component ID
+
+    :param components: Model components
+    :type components: List
+    :return: Components per cid, in their original order
+    :rtype: Dict
+    """
+    components_by_cid = {}
+    for component in components:
+        components_by_cid.setdefault(component['cid'], []).append(component)
+    return components_by_cid
+
+
+def get_model_index(api):
+    """
+    Retrieve the model index for a Darktrace API. The index is built from the "/models"
+    endpoint on first use and reused afterwards. If the API caches responses (e.g. in a
+    long-running "dtctl serve" process), the index is rebuilt when its age exceeds the cache TTL.
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :return: Model index
+    :rtype: ModelIndex
+    """
+    index, built = _MODEL_INDEXES.get(api, (None, None))
+    cache_ttl = api.cache_ttl
+
+    if index is None or (cache_ttl is not None and time.monotonic() - built > cache_ttl):
+        index = ModelIndex(api.get('/models'))
+        _MODEL_INDEXES[api] = (index, time.monotonic())
+    return index
@@ -1,128 +1,262 @@
 """Specific functions for model diffing"""
-import collections
-from dictdiffer import diff
+from concurrent.futures import ThreadPoolExecutor
 from dtctl.models.functions import get_pending_updates
+from dtctl.models.index import index_components_by_cid
+from dtctl.utils.diffing import diff_values, match_items, find_reordered
 
 
-def get_update_diffs(api):
+DEFAULT_WORKERS = 8
+
+# Keys that differ between every model version, even if nothing changed
+COMPONENT_KEYS_TO_IGNORE = ('cid', 'chid', 'mlid', 'active', 'logic')
+FILTER_KEYS_TO_IGNORE = ('cfid', 'cfhid')
+POLICY_KEYS_TO_IGNORE = ('history', 'pid', 'uuid', 'phid', 'active', 'modified', 'activeTimes', 'created', 'edited',
+                         'version', 'logic', 'actions', 'tags', 'message')
+
+
+def get_update_diffs(api, cache=None, workers=DEFAULT_WORKERS):
     """
     Getting differences between model updates
 
     :param api: A valid and active authenticated session with the DarkTrace API
+    :param cache: Cache for model versions, or None to always fetch model versions
+    :type cache: ModelVersionCache
+    :param workers: Number of model versions to fetch concurrently
+    :type workers: Int
     :return: A dict with differences of models with pending updates
     """
     model_differences = []
+    versions_to_compare = []
 
-    models_with_updates = get_pending_updates(api)
-    # models_with_updates = ['test']
-    for model_with_update in models_with_updates:
+    for model_with_update in get_pending_updates(api):
         history_sorted = sorted(model_with_update['history'], key=lambda k: k['modified'], reverse=True)
         updated_model = history_sorted.pop(0)
 
-        for history in history_sorted:
-            if history['active']:
-                active_from_history = history
+        # The oldest active history entry is the model version that is currently running
+        active_from_history = next((history for history in reversed(history_sorted) if history['active']), None)
+        if not active_from_history:
+            continue
 
-        updated_model_info = api.get('/models/{0}?phid={1}'.format(model_with_update['pid'], updated_model['phid']))
-        active_model_info = api.get('/models/{0}?phid={1}'.format(model_with_update['pid'],
-                                                                  active_from_history['phid']))
-        # import json
-        # with open('updated_model.json') as infile:
-        #     updated_model_info = json.load(infile)
-        #
-        # with open('active_model.json') as infile:
-        #     active_model_info = json.load(infile)
+        versions_to_compare.append(((model_with_update['pid'], updated_model['phid']),
+                                    (model_with_update['pid'], active_from_history['phid'])))
 
-        merged_differences = {
-            'model': updated_model_info['policy']['name'],
-            'message': updated_model_info['policy']['message']
-        }
+    model_versions = fetch_model_versions(api, [version for versions in versions_to_compare for version in versions],
+                                          cache, workers)
 
-        model_components_differences = get_model_component_differences(updated_model_info,
-                                                                       active_model_info)
+    for updated_version, active_version in versions_to_compare:
+        updated_model_info = model_versions[updated_version]
+        active_model_info = model_versions[active_version]
 
-        # This function currently edits the passed objects inline. Keep this in mind if
-        # using these objects after this function call.
-        model_policy_differences = get_model_policy_differences(updated_model_info['policy'],
-                                                                active_model_info['policy'])
+        model_differences.append(get_model_differences(updated_model_info, active_model_info))
 
-        if model_policy_differences:
-            merged_differences['policy'] = model_policy_differences
+    return model_differences
 
-        if model_components_differences:
-            # Merge existing differences and model info with component differences
-            merged_differences = {**merged_differences, **model_components_differences}
 
-        model_differences.append(merged_differences)
+def get_model_differences(updated_model_info, active_model_info):
+    """
+    Retrieve all differences between two versions of a model. The passed model versions are not modified.
 
-    return model_differences
+    :param updated_model_info: The updated model version
+    :type updated_model_info: Dict
+    :param active_model_info: The active model version
+    :type active_model_info: Dict
+    :return: Model name, update message and the differences of the policy and components
+    :rtype: Dict
+    """
+    differences = {
+        'model': updated_model_info['policy']['name'],
+        'message': updated_model_info['policy']['message']
+    }
 
+    model_policy_differences = get_model_policy_differences(updated_model_info['policy'],
+                                                            active_model_info['policy'])
+    if model_policy_differences:
+        differences['policy'] = model_policy_differences
 
-def get_model_component_differences(updated_model_info, active_model_info):
+    model_components_differences = get_model_component_differences(updated_model_info, active_model_info)
+    if model_components_differences:
+        differences['components'] = model_components_differences
+
+    return differences
+
+
+def fetch_model_versions(api, versions, cache=None, workers=DEFAULT_WORKERS):
+    """
+    Fetch model versions concurrently. Cached versions are not fetched again and
+    fetched versions are added to the cache.
+
+    :param api: A valid and active authenticated session with the DarkTrace API
+    :type api: Api
+    :param versions: (pid, phid) pairs of the model versions to fetch
+    :type versions: List
+    :param cache: Cache for model versions, or None to always fetch model versions
+    :type cache: ModelVersionCache
+    :param workers: Number of model versions to fetch concurrently
+    :type workers: Int
+    :return: Model versions by (pid, phid)
+    :rtype: Dict
     """
-    Retrieve differences between two model's component sections.
+    model_versions = {}
+    for version in set(versions):
+        model_info = cache.get(*version) if cache else None
+        if model_info is not None:
+            model_versions[version] = model_info
 
-    Note: Obtaining the differences for the "Logic" key is not yet implemented
+    def fetch(version):
+        model_info = api.get('/models/{0}?phid={1}'.format(*version))
+        if cache:
+            cache.put(*version, model_info)
+        return model_info
+
+    versions_to_fetch = sorted(set(versions) - set(model_versions))
+    if versions_to_fetch:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            model_versions.update(zip(versions_to_fetch, executor.map(fetch, versions_to_fetch)))
+
+    return model_versions
+
+
+def get_model_component_differences(updated_model_info, active_model_info):
+    """
+    Retrieve differences between two model's component sections. Components get new
+    component IDs in every model version, so components are matched on their content.
+    The passed model versions are not modified.
 
-    :param updated_model_info: The "components" key from the updated model
+    :param updated_model_info: The updated model version
     :type updated_model_info: Dict
-    :param active_model_info: The "Components" key from the active model
+    :param active_model_info: The active model version
     :type active_model_info: Dict
-    :return: Differences between components
+    :return: Added, removed, modified and reordered components
     :rtype: Dict
     """
-    differences = {'components': []}
-    component_keys_to_ignore = ('cid', 'chid', 'mlid', 'active', 'filters', 'logic')
+    active_components = get_normalized_components(active_model_info)
+    updated_components = get_normalized_components(updated_model_info)
 
-    order_of_cids_for_active_model = determine_cid_order(active_model_info['policy']['logic']['data'])
-    order_of_cids_for_updated_model = determine_cid_order(updated_model_info['policy']['logic']['data'])
+    pairs, removed, added = match_items(active_components, updated_components)
 
-    updated_model_components_sorted = get_components_by_cid(order_of_cids_for_updated_model,
-                                                            updated_model_info['components'])
-    active_model_components_sorted = get_components_by_cid(order_of_cids_for_active_model,
-                                                           active_model_info['components'])
+    differences = {}
+    if added:
+        differences['added'] = [dict(updated_components[index], index=index) for index in added]
 
-    if len(updated_model_components_sorted) > len(active_model_components_sorted):
-        differences['nr_of_new_components'] = len(updated_model_components_sorted) - \
-                                              len(active_model_components_sorted)
+    if removed:
+        differences['removed'] = [dict(active_components[index], index=index) for index in removed]
 
-    if len(updated_model_components_sorted) < len(active_model_components_sorted):
-        differences['nr_of_components_removed'] = len(active_model_components_sorted) - \
-                                                  len(updated_model_components_sorted)
+    modified = []
+    for active_index, updated_index in pairs:
+        component_differences = get_single_component_differences(updated_components[updated_index],
+                                                                  active_components[active_index])
+        if component_differences:
+            modified.append(dict(component_differences, index=updated_index))
 
-    # Our initial work will only work if components changed, but none are added or removed
-    if len(updated_model_info['components']) != len(active_model_info['components']):
-        return differences
+    if modified:
+        differences['modified'] = modified
 
-    for index, active_component_dict in enumerate(active_model_components_sorted):
-        updated_component_dict = updated_model_components_sorted[index]
-        differences['components'].insert(0, {})
+    reordered = find_reordered(pairs)
+    if reordered:
+        differences['reordered'] = [{'from': active_index, 'to': updated_index}
+                                    for active_index, updated_index in reordered]
 
-        filter_differences = get_filter_differences(updated_component_dict['filters'], active_component_dict['filters'])
-        if filter_differences:
-            differences['components'][0]['filters'] = filter_differences
+    return differences
 
-        # Delete keys _AFTER_ we obtain filter differences
-        # because the 'filter' key is also removed before we
-        # check for base differences
-        for key_to_delete in component_keys_to_ignore:
-            updated_component_dict.pop(key_to_delete, None)
-            active_component_dict.pop(key_to_delete, None)
 
-        base_differences = [change for change in diff(active_component_dict, updated_component_dict)]
+def get_normalized_components(model_info):
+    """
+    Retrieve the components of a model version in logic order, without their version specific keys.
+    The weight of a component in the model logic is added to the component.
 
-        if base_differences:
-            differences['components'][0]['base'] = base_differences
+    :param model_info: A model version
+    :type model_info: Dict
+    :return: Normalized components
+    :rtype: List
+    """
+    logic_data = model_info['policy']['logic']['data']
+    weights = {item['cid']: item.get('weight') for item in logic_data if isinstance(item, dict)}
+
+    normalized_components = []
+    for component in get_components_by_cid(determine_cid_order(logic_data), model_info['components']):
+        normalized_component = {key: value for key, value in component.items()
+                                if key not in COMPONENT_KEYS_TO_IGNORE}
+        normalized_component['filters'] = sorted(
+            ({key: value for key, value in component_filter.items() if key not in FILTER_KEYS_TO_IGNORE}
+             for component_filter in component.get('filters', [])),
+            key=lambda component_filter: str(component_filter.get('id'))
+        )
+        if component['cid'] in weights:
+            normalized_component['weight'] = weights[component['cid']]
+        normalized_components.append(normalized_component)
+    return normalized_components
+
+
+def get_single_component_differences(updated_component, active_component):
+    """
+    Retrieve differences between two versions of a normalized component
 
-        if not differences['components'][0]:
-            del differences['components'][0]  # No need to report if no differences are present
+    :param updated_component: The component in the updated model
+    :type updated_component: Dict
+    :param active_component: The component in the active model
+    :type active_component: Dict
+    :return: Differences between the components
+    :rtype: Dict
+    """
+    differences = {}
+
+    if active_component.get('weight') != updated_component.get('weight'):
+        differences['weight'] = {'old': active_component.get('weight'), 'new': updated_component.get('weight')}
+
+    filter_differences = get_filter_differences(updated_component['filters'], active_component['filters'])
+    if filter_differences:
+        differences['filters'] = filter_differences
+
+    base_differences = diff_values(
+        {key: value for key, value in active_component.items() if key not in ('filters', 'weight')},
+        {key: value for key, value in updated_component.items() if key not in ('filters', 'weight')}
+    )
+    if base_differences:
+        differences['base'] = base_differences
+
+    return differences
+
+
+def get_filter_differences(updated_model_component_filters, active_model_component_filters):
+    """
+    Retrieve differences between two component's filter sections. Filters are matched on their id.
+    Changes to display filters are reported separately from changes to rule filters.
+
+    :param updated_model_component_filters: The normalized filters of the updated component
+    :type updated_model_component_filters: List
+    :param active_model_component_filters: The normalized filters of the active component
+    :type active_model_component_filters: List
+    :return: Difference between filters
+    :rtype: Dict
+    """
+    pairs, removed, added = match_items(active_model_component_filters, updated_model_component_filters,
+                                        identity='id')
+
+    differences = {}
+    if added:
+        differences['added'] = [updated_model_component_filters[index] for index in added]
+
+    if removed:
+        differences['removed'] = [active_model_component_filters[index] for index in removed]
+
+    for active_index, updated_index in pairs:
+        active_filter = active_model_component_filters[active_index]
+        updated_filter = updated_model_component_filters[updated_index]
+
+        changes = diff_values(active_filter, updated_filter)
+        if changes:
+            # Check both to ensure also newly added display filters are put under the 'display' key
+            is_display = 'display' in (active_filter.get('comparator'), updated_filter.get('comparator'))
+            differences.setdefault('display' if is_display else 'rules', []).append(
+                {'id': updated_filter.get('id'), 'changes': changes}
+            )
 
     return differences
 
 
 def get_components_by_cid(cid_order, components):
     """
-    Inefficient helper function to return a sorted list of components.
+    Helper function to return a sorted list of components.
 
     This function exists because Darktrace keeps components order only in the policy -> logic -> data section
     and not in the regular components sections.
@@ -134,12 +268,8 @@ def get_components_by_cid(cid_order, components):
     :return: Components ordered according to cid_order
     :rtype: List
     """
-    ordered_components_list = []
-    for cid in cid_order:
-        for component in components:
-            if cid == component['cid']:
-                ordered_components_list.append(component)
-    return ordered_components_list
+    components_by_cid = index_components_by_cid(components)
+    return [component for cid in cid_order for component in components_by_cid.get(cid, [])]
 
 
 def determine_cid_order(logic_data):
@@ -160,109 +290,11 @@ def determine_cid_order(logic_data):
     return order_list
 
 
-def get_filter_differences(updated_model_component_filters, active_model_component_filters):
-    """
-    Retrieve differences between two model's filter sections
-
-    :param updated_model_component_filters: The "filters" key from the updated model
-    :type updated_model_component_filters: Dict
-    :param active_model_component_filters: The "Filters" key from the active model
-    :type active_model_component_filters: Dict
-    :return: Difference between filters
-    :rtype: Dict
-    """
-    differences = {}
-    filter_keys_to_ignore = ('id', 'cfid', 'cfhid')
-
-    updated_model_component_filters_sorted = sorted(updated_model_component_filters,
-                                                    key=lambda component_filter: component_filter['id'])
-    active_model_component_filters_sorted = sorted(active_model_component_filters,
-                                                   key=lambda component_filter: component_filter['id'])
-
-    if len(updated_model_component_filters_sorted) > len(active_model_component_filters_sorted):
-        differences['nr_of_filters_added'] = len(updated_model_component_filters_sorted) - \
-                                             len(active_model_component_filters_sorted)
-
-    if len(updated_model_component_filters_sorted) < len(active_model_component_filters_sorted):
-        differences['nr_of_filters_removed'] = len(active_model_component_filters_sorted) - \
-                                               len(updated_model_component_filters_sorted)
-
-    if len(updated_model_component_filters_sorted) != len(active_model_component_filters_sorted):
-        # This needs to be done to make sure DictDiffer compares correct objects
-        updated_model_component_filters_sorted, active_model_component_filters_sorted = \
-            fill_missing_filters(updated_model_component_filters_sorted,
-                                 active_model_component_filters_sorted)
-
-    for index, active_model_component_filter in enumerate(active_model_component_filters_sorted):
-
-        # Looping with an index works because we first fill any missing filters. This means
-        # we always have equal length active_model_component_filters and updated_model_component_filters
-        updated_model_component_filter = updated_model_component_filters_sorted[index]
-
-        for key_to_delete in filter_keys_to_ignore:
-            updated_model_component_filter.pop(key_to_delete, None)
-            active_model_component_filter.pop(key_to_delete, None)
-
-        changes = [change for change in diff(active_model_component_filter, updated_model_component_filter)]
-        if changes:
-            # Check both to ensure also newly added display filters are
-            # put under the 'display' key
-            if active_model_component_filter['comparator'] == 'display' or \
-                    updated_model_component_filter['comparator'] == 'display':
-                if 'display' in differences:
-                    differences['display'].append(changes)
-                else:
-                    differences['display'] = [changes]
-                # Needed because we otherwise still process the active or updated model
-                # component in the else clause because one of those could be false.
-                continue
-            else:
-                if 'rules' in differences:
-                    differences['rules'].append(changes)
-                else:
-                    differences['rules'] = [changes]
-
-    return differences
-
-
-def fill_missing_filters(updated_model_component_filters_sorted, active_model_component_filters_sorted):
-    """
-    Function to ensure both model filters have the same number of filters in order for
-    the DictDiffer to do its work. Where needed an empty filter with a corresponding
-    id are added.
-
-    :param updated_model_component_filters_sorted: The "filters" key of a component of the updated model
-    :type updated_model_component_filters_sorted: Dict
-    :param active_model_component_filters_sorted: The "fiters" key of a component of the active model
-    :type active_model_component_filters_sorted: Dict
-    :return: Updated model component filters and Active model component
-    :rtype: Tuple
-    """
-    active_ids = [active_filter['id'] for active_filter in active_model_component_filters_sorted]
-    updated_ids = [updated_filter['id'] for updated_filter in updated_model_component_filters_sorted]
-
-    filters_removed = list(set(active_ids) - set(updated_ids))
-    filters_added = list(set(updated_ids) - set(active_ids))
-
-    for index, active_filter in enumerate(active_model_component_filters_sorted):
-        if active_filter['id'] in filters_removed:
-            dict_to_add = dict.fromkeys(active_filter)
-            dict_to_add['id'] = active_filter['id']
-            updated_model_component_filters_sorted.insert(index, dict_to_add)
-
-    for index, updated_filter in enumerate(updated_model_component_filters_sorted):
-        if updated_filter['id'] in filters_added:
-            dict_to_add = dict.fromkeys(updated_filter)
-            dict_to_add['id'] = updated_filter['id']
-            active_model_component_filters_sorted.insert(index, dict_to_add)
-
-    return updated_model_component_filters_sorted, active_model_component_filters_sorted
-
-
 def get_model_policy_differences(updated_model_policy, active_model_policy):
     """
     Retrieve differences between two model's "Policy" section. The policy section can be
-    considered the model base.
+    considered the model base. Component weights are compared with the components.
+    The passed policies are not modified.
 
     :param updated_model_policy: The "policy" key of the updated model
     :type updated_model_policy: Dict
@@ -271,18 +303,17 @@ def get_model_policy_differences(updated_model_policy, active_model_policy):
     :return: Differences between policies
     :rtype: Dict
     """
-    policy_keys_to_ignore = ('history', 'pid', 'uuid', 'phid', 'active', 'modified',
-                             'activeTimes', 'created', 'edited', 'version', 'logic',
-                             'actions', 'tags', 'message')
-
-    active_model_policy_actions_sorted = collections.OrderedDict(sorted(active_model_policy['actions'].items()))
-    updated_model_policy_actions_sorted = collections.OrderedDict(sorted(updated_model_policy['actions'].items()))
-
-    tag_changes = get_model_tag_differences(updated_model_policy['tags'], active_model_policy['tags'])
-    action_changes = [change for change in diff(active_model_policy_actions_sorted,
-                                                updated_model_policy_actions_sorted)]
-    component_weight_changes = get_logic_weight_differences(active_model_policy['logic']['data'],
-                                                            updated_model_policy['logic']['data'])
+    tag_changes = get_model_tag_differences(updated_model_policy.get('tags', []),
+                                            active_model_policy.get('tags', []))
+    action_changes = diff_values(active_model_policy.get('actions', {}), updated_model_policy.get('actions', {}))
+    logic_changes = diff_values(
+        {key: value for key, value in active_model_policy.get('logic', {}).items() if key != 'data'},
+        {key: value for key, value in updated_model_policy.get('logic', {}).items() if key != 'data'}
+    )
+    base_changes = diff_values(
+        {key: value for key, value in active_model_policy.items() if key not in POLICY_KEYS_TO_IGNORE},
+        {key: value for key, value in updated_model_policy.items() if key not in POLICY_KEYS_TO_IGNORE}
+    )
 
     differences = {}
     if tag_changes:
@@ -291,14 +322,8 @@ def get_model_policy_differences(updated_model_policy, active_model_policy):
     if action_changes:
         differences['actions'] = action_changes
 
-    if component_weight_changes:
-        differences['component_weight_changes'] = component_weight_changes
-
-    for key_to_delete in policy_keys_to_ignore:
-        updated_model_policy.pop(key_to_delete, None)
-        active_model_policy.pop(key_to_delete, None)
-
-    base_changes = [change for change in diff(active_model_policy, updated_model_policy)]
+    if logic_changes:
+        differences['logic'] = logic_changes
 
     if base_changes:
         differences['base'] = base_changes
@@ -311,102 +336,21 @@ def get_model_tag_differences(updated_model_policy_tags, active_model_policy_tag
     Retrieve differences between two model's "tag" keys
 
     :param updated_model_policy_tags: The "tag" key of the updated model
-    :type updated_model_policy_tags: Dict
+    :type updated_model_policy_tags: List
     :param active_model_policy_tags: The "tag" key of the active model
-    :type active_model_policy_tags: Dict
+    :type active_model_policy_tags: List
     :return: Tag differences
     :rtype: Dict
     """
-    differences = {}
-    for tag in active_model_policy_tags:
-        if tag not in updated_model_policy_tags:
-            if 'removed_tags' in differences:
-                differences['removed_tags'].append(tag)
-            else:
-                differences['removed_tags'] = [tag]
-
-    for tag in updated_model_policy_tags:
-        if tag not in active_model_policy_tags:
-            if 'added_tags' in differences:
-                differences['added_tags'].append(tag)
-            else:
-                differences['added_tags'] = [tag]
-    return differences
-
-
-def get_model_action_differences(updated_model_policy_actions, active_model_policy_actions):
-    """
-    Retrieve differences between two model's "action" section
+    updated_tags = set(updated_model_policy_tags)
+    active_tags = set(active_model_policy_tags)
 
-    :param updated_model_policy_actions: The "actions" key of the updated model
-    :type updated_model_policy_actions: Dict
-    :param active_model_policy_actions: The "actions" key of the active model
-    :type active_model_policy_actions: Dict
-    :return: Action differences
-    :rtype: Dict
-    """
-    keys_to_ignore = []
     differences = {}
+    removed_tags = [tag for tag in active_model_policy_tags if tag not in updated_tags]
+    if removed_tags:
+        differences['removed_tags'] = removed_tags
 
-    for key in active_model_policy_actions.keys():
-        if key in keys_to_ignore:
-            continue
-
-        try:
-            if active_model_policy_actions[key] != updated_model_policy_actions[key]:
-                differences[key] = updated_model_policy_actions[key]
-        except KeyError:
-            differences['added_or_removed_action'] = key
-    return differences
-
-
-def get_logic_weight_differences(active_model_policy_logic_data, updated_model_policy_logic_data):
-    """
-    Retrieve differences between two model's logic weights
-
-    :param active_model_policy_logic_data: The "data" key of the active model policy->logic dict
-    :type active_model_policy_logic_data: Dict
-    :param updated_model_policy_logic_data: The "data" key of the update model policy->logic dict
-    :type updated_model_policy_logic_data: Dict
-    :return: Logic weight differences
-    :rtype: Dict
-    """
-    differences = {}
-    if len(updated_model_policy_logic_data) > len(active_model_policy_logic_data):
-        differences['nr_of_weights_added'] = len(updated_model_policy_logic_data) - \
-                                             len(active_model_policy_logic_data)
-
-    if len(updated_model_policy_logic_data) < len(active_model_policy_logic_data):
-        differences['nr_of_weights_removed'] = len(active_model_policy_logic_data) - \
-                                               len(updated_model_policy_logic_data)
-
-    if len(updated_model_policy_logic_data) != len(active_model_policy_logic_data):
-        # The CID's always change, so we cannot compare. This leaves only the rule weights and nr of rules
-        # that we can effectively compare. However, the rule weights are effectively a list of integers after
-        # removing the CIDs. Unfortunately, comparing lists has all sorts of problems.
-        #
-        # Our assumption is that Darktrace orders the policy logic data list always the same.
-        # This means that if we have an unequal number, we cannot "reliably" compare.
-        # As such, we just return with the removed/added messages.
-        return differences
-
-    weights_to_compare = []
-
-    for rule in active_model_policy_logic_data:
-        if isinstance(rule, dict):
-            weights_to_compare.append(rule['weight'])
-
-    for index, rule in enumerate(updated_model_policy_logic_data):
-        if not weights_to_compare:
-            if isinstance(rule, dict):
-                differences['component_{0}'.format(index)] = ('removed', rule['weight'])
-            else:
-                continue
-
-        if isinstance(rule, dict):
-            try:
-                if rule['weight'] != weights_to_compare[index]:
-                    differences['component_{0}'.format(index)] = ('changed', rule['weight'])
-            except IndexError:
-                differences['component_{0}'.format(index)] = ('added', rule['weight'])
+    added_tags = [tag for tag in updated_model_policy_tags if tag not in active_tags]
+    if added_tags:
+        differences['added_tags'] = added_tags
     return differences
@@ -0,0 +1,69 @@
+# pylint: disable=C0111
+import os
+import signal
+from pathlib import Path
+import click
+from dtctl.serve.functions import CommandServer, DEFAULT_CACHE_TTL, get_serve_socket
+from dtctl.utils.unixsocket import unix_request
+
+
+@click.command('serve', short_help='Serve dtctl commands from a long-running process')
+@click.option('--socket', 'socket_path', type=click.Path(),
+              help='Path of the Unix socket. Defaults to "serve.sock" next to the config file')
+@click.option('--cache-ttl', type=click.IntRange(min=0), default=DEFAULT_CACHE_TTL, show_default=True,
+              help='Seconds that responses of the Darktrace API are reused. 0 disables caching')
+@click.option('--status', 'show_status', is_flag=True, default=False, help='Show the status of a running server')
+@click.option('--stop', is_flag=True, default=False, help='Stop a running server')
+@click.pass_context
+def serve(ctx, socket_path, cache_ttl, show_status, stop):
+    """
+    Serve dtctl commands from a long-running process that keeps the
+    authenticated API session, its connections and API responses warm.
+
+    \b
+    While the server runs, dtctl forwards commands to it and prints their
+    output, so repeated commands skip the startup, key decryption, TLS
+    handshakes and downloads of unchanged data. The "config", "collect"
+    and "exporter" commands, and commands given other connection options
+    than the server, always run locally.
+
+    \b
+    The socket location can be overridden with the DTCTL_SERVE_SOCKET
+    environment variable, for both the server and its clients.
+    """
+    program_state = ctx.obj
+    socket_path = socket_path or get_serve_socket(program_state.config_file)
+    server_status = unix_request(socket_path, {'command': 'status'}, timeout=2.0)
+
+    if show_status or stop:
+        if not server_status:
+            raise SystemExit('dtctl serve is not running on {0}'.format(socket_path))
+        if stop:
+            unix_request(socket_path, {'command': 'stop'}, timeout=2.0)
+            click.echo('Stopped dtctl serve (pid {0})'.format(server_status['pid']))
+        else:
+            click.echo('dtctl serve running (pid {0}) on {1} for {2}, {3} commands served'.format(
+                server_status['pid'], socket_path, server_status['host'], server_status['served']))
+        return
+
+    if server_status:
+        raise click.UsageError('dtctl serve already running (pid {0}) on {1}'.format(server_status['pid'], socket_path))
+
+    # A socket without a listening server is left behind by a server that did not exit cleanly
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    Path(os.path.dirname(os.path.abspath(socket_path))).mkdir(parents=True, exist_ok=True)
+
+    program_state.api.cache_ttl = cache_ttl or None
+    server = CommandServer(socket_path, ctx.find_root().command, program_state)
+
+    # Remove the socket on "kill" as well as on Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    click.echo('Serving dtctl commands for {0} on {1}'.format(program_state.api.address, socket_path))
+
+    try:
+        server.serve_forever(poll_interval=1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,216 @@
+"""Functions for serving dtctl commands from a long-running process"""
+import io
+import os
+import sys
+import time
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+import click
+from dtctl.utils.unixsocket import UserUnixServer, unix_request
+
+DEFAULT_CACHE_TTL = 60
+SERVE_SOCKET_ENV = 'DTCTL_SERVE_SOCKET'
+SERVE_SOCKET_NAME = 'serve.sock'
+# Commands that are never forwarded, because they manage the local installation, prompt for input or run
+# for a long time
+LOCAL_COMMANDS = ('collect', 'config', 'exporter', 'serve')
+# Options of the dtctl command group that change the API session. Commands given any of these
+# options run locally, as the server uses the API session it was started with.
+LOCAL_OPTIONS = ('pub_dtkey', 'priv_dtkey', 'cacert', 'insecure', 'debug')
+
+
+class CommandServer(UserUnixServer):
+    """
+    Unix socket server that runs dtctl commands with a warm program state. The authenticated API
+    session, its connection pool and cached responses are reused by all commands. Commands run one
+    at a time, as their output is captured by redirecting stdout and stderr of the process.
+    """
+
+    def __init__(self, socket_path, cli, program_state):
+        """
+        Create the server and bind its socket with permissions for the current user only
+
+        :param socket_path: Path of the Unix socket
+        :type socket_path: String
+        :param cli: The dtctl command group
+        :type cli: click.Group
+        :param program_state: Program state with an authenticated API session
+        :type program_state: ProgramState
+        """
+        self.cli = cli
+        self.program_state = program_state
+        self.started = time.time()
+        self.served = 0
+        super(CommandServer, self).__init__(socket_path)
+
+    def handle_request_dict(self, request):
+        """
+        Execute a request of a dtctl client
+
+        :param request: Request with a "command" and its arguments
+        :type request: Dict
+        :return: Response
+        :rtype: Dict
+        """
+        command = request['command']
+
+        if command == 'run':
+            if not self.serves(request.get('host'), request['config_file']):
+                return {'run_locally': True}
+            self.served += 1
+            return run_command(self.cli, self.program_state, request['args'], request['cwd'])
+
+        if command == 'status':
+            return {'pid': os.getpid(), 'host': self.program_state.api.address, 'started': self.started,
+                    'served': self.served, 'cache_ttl': self.program_state.api.cache_ttl}
+
+        if command == 'stop':
+            return {'stopped': True}
+
+        return {'error': 'Unknown command: {0}'.format(command)}
+
+    def serves(self, host, config_file):
+        """
+        Whether commands for a host and config file can run in this server
+
+        :param host: Host given to the client, None if the client uses the configured host
+        :type host: String
+        :param config_file: Config file of the client
+        :type config_file: String
+        :return: Whether the server uses the same host and config file
+        :rtype: Boolean
+        """
+        if host and host != self.program_state.api.address:
+            return False
+        return os.path.abspath(config_file) == os.path.abspath(self.program_state.config_file)
+
+
+def run_command(cli, program_state, args, cwd):
+    """
+    Run a dtctl command and capture its output
+
+    :param cli: The dtctl command group
+    :type cli: click.Group
+    :param program_state: Program state with an authenticated API session
+    :type program_state: ProgramState
+    :param args: Command line arguments, without the program name
+    :type args: List
+    :param cwd: Working directory of the client, used for relative paths
+    :type cwd: String
+    :return: Captured stdout and stderr and the exit code
+    :rtype: Dict
+    """
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    previous_cwd = os.getcwd()
+
+    try:
+        os.chdir(cwd)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            exit_code = invoke_command(cli, program_state, args)
+    finally:
+        os.chdir(previous_cwd)
+
+    return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'exit_code': exit_code}
+
+
+def invoke_command(cli, program_state, args):
+    """
+    Invoke a dtctl command the way click does for a standalone program, but without exiting
+
+    :param cli: The dtctl command group
+    :type cli: click.Group
+    :param program_state: Program state with an authenticated API session
+    :type program_state: ProgramState
+    :param args: Command line arguments, without the program name
+    :type args: List
+    :return: Exit code
+    :rtype: Int
+    """
+    try:
+        result = cli.main(args=args, prog_name='dtctl', obj=program_state, standalone_mode=False)
+        # Exits by click (e.g. after showing help) return the exit code, commands return None
+        return result if isinstance(result, int) else 0
+    except click.ClickException as err:
+        err.show()
+        return err.exit_code
+    except click.Abort:
+        click.echo('Aborted!', err=True)
+        return 1
+    except SystemExit as err:
+        if err.code is None or isinstance(err.code, int):
+            return err.code or 0
+        click.echo(err.code, err=True)
+        return 1
+    except Exception:  # pylint: disable=W0703
+        # A failing command must not stop the server
+        traceback.print_exc()
+        return 1
+
+
+def get_serve_socket(config_file):
+    """
+    Path of the socket of "dtctl serve", next to the config file unless overridden by DTCTL_SERVE_SOCKET
+
+    :param config_file: Path to config file
+    :type config_file: String
+    :return: Path of the Unix socket
+    :rtype: String
+    """
+    return os.environ.get(SERVE_SOCKET_ENV) or os.path.join(os.path.dirname(config_file), SERVE_SOCKET_NAME)
+
+
+def get_forwarded_options(cli, args):
+    """
+    Parse the options of the dtctl command group, to determine whether a command can be forwarded
+
+    :param cli: The dtctl command group
+    :type cli: click.Group
+    :param args: Command line arguments, without the program name
+    :type args: List
+    :return: Values of the options of the dtctl command group, or None if the command has to run locally
+    :rtype: Dict
+    """
+    try:
+        ctx = cli.make_context('dtctl', list(args), resilient_parsing=True)
+    except click.ClickException:
+        return None
+
+    if not ctx.protected_args or ctx.protected_args[0] in LOCAL_COMMANDS:
+        return None
+
+    # Resilient parsing does not fill in default values
+    options = {param.name: param.get_default(ctx) for param in cli.params}
+    options.update((name, value) for name, value in ctx.params.items() if value is not None)
+
+    if any(options.get(name) for name in LOCAL_OPTIONS):
+        return None
+
+    return options
+
+
+def forward_command(cli, args):
+    """
+    Run a command in a running "dtctl serve" process and write its output. The server is looked
+    up next to the config file of the client.
+
+    :param cli: The dtctl command group
+    :type cli: click.Group
+    :param args: Command line arguments, without the program name
+    :type args: List
+    :return: Exit code, or None if the command has to run locally
+    :rtype: Int
+    """
+    options = get_forwarded_options(cli, args)
+    if options is None:
+        return None
+
+    request = {'command': 'run', 'args': list(args), 'cwd': os.getcwd(),
+               'host': options['host'], 'config_file': os.path.abspath(options['config_file'])}
+    response = unix_request(get_serve_socket(options['config_file']), request)
+    if not response or 'exit_code' not in response:
+        return None
+
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['exit_code']
@@ -1,7 +1,8 @@
 # pylint: disable=C0111
+import os
 import click
 from dtctl.subnets.functions import get_subnet_list, get_aggregates, get_subnets_per_instances, \
-                                    get_dhcp_stats, get_unidirectional_traffic, list_devices
+                                    get_dhcp_stats, get_unidirectional_traffic, list_devices, parse_bucket_edges
 from dtctl.utils.output import process_output
 from dtctl.utils.parsing import convert_json_to_log_lines
 from dtctl.utils.cef import Cef
@@ -41,10 +42,26 @@ def instances(program_state, outfile):
 @click.option('--cef', is_flag=True, default=False, show_default=True,
               cls=OptionMutex, not_required_if=['log'],
               help='Line based output for CEF logging purposes')
+@click.option('--syslog', type=click.STRING, cls=OptionMutex, not_required_if=['outfile'],
+              help='Send the lines of --log or --cef to a syslog server, e.g. udp://siem.local:514, '
+                   'tcp://siem.local:601 or tls://siem.local:6514')
+@click.option('--per-subnet', '-s', is_flag=True, default=False, show_default=True,
+              cls=OptionMutex, not_required_if=['cef'],
+              help='DHCP status of each individual subnet instead of statistics per instance')
 @click.pass_obj
-def dhcp(program_state, outfile, log, cef):
-    """Metrics for DHCP tracking"""
-    output = get_dhcp_stats(program_state.api)
+def dhcp(program_state, outfile, log, cef, per_subnet, syslog):
+    """
+    Metrics for DHCP tracking
+
+    \b
+    Each subnet seen by a Darktrace instance is classified as:
+        not_registered      Subnet is not (yet) in the Darktrace subnet list
+        dhcp_disabled       Darktrace does not track DHCP for the subnet
+        without_clients     DHCP never seen and no client devices in the subnet
+        tracking            Darktrace reports a DHCP quality for the subnet
+        failing             DHCP is tracked but no DHCP quality is reported
+    """
+    output = get_dhcp_stats(program_state.api, per_subnet)
     append = False
     to_json = True
 
@@ -59,15 +76,30 @@ def dhcp(program_state, outfile, log, cef):
         cef_object = Cef(device_event_class_id=120, name='DHCP Quality')
         output = cef_object.generate_logs(output)
 
-    process_output(output, outfile, append, to_json)
+    process_output(output, outfile, append, to_json, syslog, os.path.dirname(program_state.config_file))
 
 
 @click.command('unidirectional', short_help='Metrics for unidirectional traffic')
 @click.option('--outfile', '-o', type=click.Path(), help='Full path to the output file')
+@click.option('--buckets', '-b', type=click.STRING, default='0,10,40,70,100', show_default=True,
+              help='Comma separated edges (in percentages) of the histogram buckets')
+@click.option('--top', '-t', type=click.IntRange(min=1),
+              help='List this number of subnets with the most unidirectional traffic per instance')
 @click.pass_obj
-def unidirectional(program_state, outfile):
-    """Metrics for unidirectional traffic"""
-    process_output(get_unidirectional_traffic(program_state.api), outfile)
+def unidirectional(program_state, outfile, buckets, top):
+    """
+    Metrics for unidirectional traffic. Subnets are counted per instance in histogram buckets
+    based on their percentage of recent unidirectional traffic. Percentages outside the bucket
+    edges are counted in the first or last bucket. Mean, median and 95th percentile are calculated
+    over all subnets reporting unidirectional traffic.
+
+    \b
+    Examples:
+        dtctl subnets unidirectional --buckets 0,5,25,50,75,100
+        dtctl subnets unidirectional --top 10
+    """
+    output = get_unidirectional_traffic(program_state.api, parse_bucket_edges(buckets), top)
+    process_output(output, outfile)
 
 
 @click.command('devices', short_help='Nr of devices seen by Darktrace')
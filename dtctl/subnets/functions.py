@@ -2,11 +2,17 @@
 
 import ipaddress
 import socket
-import netaddr
+import click
 from dtctl.utils.subnetting import is_valid_ipv4_network
 from dtctl.utils.timeutils import utc_now_timestamp
 
 
+SUBNET_DATA_COLUMNS = ('instance', 'sid', 'network', 'devices', 'clientDevices', 'mostRecentDHCP',
+                       'dhcpQuality', 'recentUnidirectionalTrafficPercent')
+DEFAULT_UNIDIRECTIONAL_BUCKETS = (0, 10, 40, 70, 100)
+DHCP_STATUSES = ('not_registered', 'dhcp_disabled', 'without_clients', 'tracking', 'failing')
+
+
 def list_devices(api):
     """
     List the number of devices seen by Darktrace. This is the cummulative
@@ -15,24 +21,56 @@ def list_devices(api):
     :param api: Darktrace API object with initialized config values
     :return: Dictionary that contains the nr of devices
     """
-    status_dict = api.get('/status')
-    result = {'clients': 0, 'servers': 0, 'total': 0}
-    for _, instance_values in status_dict['instances'].items():
-        try:
-            if instance_values['error'] is True:
-                continue
-        except KeyError:
-            pass
+    return count_devices(get_subnet_frame(api.get('/status')))
+
+
+def count_devices(subnet_frame):
+    """
+    Count the devices reported by the subnets in a subnet DataFrame
+
+    :param subnet_frame: DataFrame as returned by get_subnet_frame
+    :type subnet_frame: DataFrame
+    :return: Dictionary that contains the nr of devices
+    :rtype: Dict
+    """
+    servers = int(subnet_frame['devices'].fillna(0).sum())
+    clients = int(subnet_frame['clientDevices'].fillna(0).sum())
+    return {'clients': clients, 'servers': servers, 'total': clients + servers}
+
+
+def get_subnet_frame(status_dict):
+    """
+    Flatten the "subnetData" of all instances into a single DataFrame. Instances reporting
+    an error are skipped. The name of the instance that reported a subnet is kept in the
+    "instance" column.
+
+    :param status_dict: Output of the Darktrace "/status" endpoint
+    :type status_dict: Dict
+    :return: One row for each subnet seen by an instance
+    :rtype: DataFrame
+    """
+    import pandas as pd
+    frames = []
+    for instance_key, instance_values in status_dict['instances'].items():
+        if instance_values.get('error') is True:
+            continue
+
+        frame = pd.DataFrame(instance_values.get('subnetData', []))
+        frame['instance'] = instance_key
+        frames.append(frame)
 
-        for subnet in instance_values['subnetData']:
-            if 'devices' in subnet:
-                result['total'] += subnet['devices']
-                result['servers'] += subnet['devices']
-            if 'clientDevices' in subnet:
-                result['total'] += subnet['clientDevices']
-                result['clients'] += subnet['clientDevices']
+    if frames:
+        subnet_frame = pd.concat(frames, ignore_index=True, sort=False)
+    else:
+        subnet_frame = pd.DataFrame()
 
-    return result
+    # Not every Darktrace version reports all fields. Make sure the columns
+    # that are used for calculations are always present.
+    for column in SUBNET_DATA_COLUMNS:
+        if column not in subnet_frame.columns:
+            subnet_frame[column] = None
+
+    return subnet_frame
 
 
 def get_subnet_list(api):
@@ -74,6 +112,7 @@ def get_aggregates(api):
     :param api: A valid and active authenticated session with the DarkTrace API
     :return: List of CIDR aggregated subnets
     """
+    import netaddr
     subnets = api.get('/subnets')
     place_holder = set()
     for subnet in subnets:
@@ -103,144 +142,266 @@ def get_subnets_per_instances(api):
     :param api: A valid and active authenticated session with the DarkTrace API
     :return: Dictionary of subnet information per instance
     """
-    subnets_per_instance = {}
+    status_dict = api.get('/status')
+    return extract_subnets_per_instances(status_dict, get_subnet_frame(status_dict))
+
+
+def extract_subnets_per_instances(status_dict, subnet_frame):
+    """
+    Group the IPv4 subnets of a subnet DataFrame by the instance that has seen them.
+    Instances that report an error are included as {'error': True}.
 
-    status_result = api.get('/status')
-    instances = status_result['instances']
+    :param status_dict: Output of the Darktrace "/status" endpoint
+    :type status_dict: Dict
+    :param subnet_frame: DataFrame as returned by get_subnet_frame
+    :type subnet_frame: DataFrame
+    :return: Dictionary of subnet information per instance
+    :rtype: Dict
+    """
+    subnets_per_instance = {name: {'error': True} if values.get('error') is True else []
+                            for name, values in status_dict['instances'].items()}
 
-    for name, instance_values in instances.items():
-        subnets_per_instance[name] = []
-        seen_subnets = instance_values['subnetData']
-        for subnet in seen_subnets:
-            if is_valid_ipv4_network(subnet['network']):
-                subnets_per_instance[name].append(subnet['network'])
+    valid = subnet_frame['network'].map(lambda network: isinstance(network, str) and
+                                        is_valid_ipv4_network(network))
+    for name, networks in subnet_frame[valid].groupby('instance', sort=False)['network']:
+        subnets_per_instance[name] = list(networks)
 
     return subnets_per_instance
 
 
-def get_unidirectional_traffic(api):
+def get_unidirectional_traffic(api, bucket_edges=DEFAULT_UNIDIRECTIONAL_BUCKETS, top=None):
     """
     Statistics for unidirectional traffic
 
     :param api: Darktrace API object with initialized config values
+    :param bucket_edges: Edges (in percentages) of the histogram buckets
+    :type bucket_edges: Tuple
+    :param top: Nr of subnets with the most unidirectional traffic to list per instance, None to not list them
+    :type top: Int
     :return: Dictionary that contains system information
     """
     status_dict = api.get('/status')
+    return calculate_unidirectional_traffic(status_dict, get_subnet_frame(status_dict), bucket_edges, top)
+
+
+def calculate_unidirectional_traffic(status_dict, subnet_frame, bucket_edges=DEFAULT_UNIDIRECTIONAL_BUCKETS,
+                                     top=None):
+    """
+    Calculate statistics for unidirectional traffic per instance. Subnets are counted in
+    histogram buckets based on their "recentUnidirectionalTrafficPercent". Like numpy.histogram
+    all buckets are half-open, except for the last bucket which includes its upper edge.
+    Percentages below the first or above the last edge (e.g. a reported 150%) are counted in
+    the first or last bucket, so every subnet reporting a percentage is counted.
+
+    :param status_dict: Output of the Darktrace "/status" endpoint
+    :type status_dict: Dict
+    :param subnet_frame: DataFrame as returned by get_subnet_frame
+    :type subnet_frame: DataFrame
+    :param bucket_edges: Monotonically increasing edges (in percentages) of the histogram buckets
+    :type bucket_edges: Tuple
+    :param top: Nr of subnets with the most unidirectional traffic to list per instance, None to not list them
+    :type top: Int
+    :return: Unidirectional traffic statistics per instance
+    :rtype: Dict
+    """
+    import pandas as pd
+    import numpy as np
+    bucket_names = ['{0:g}_to_{1:g}%'.format(low, high) for low, high in zip(bucket_edges[:-1], bucket_edges[1:])]
+    subnet_frame = subnet_frame.assign(
+        percentage=pd.to_numeric(subnet_frame['recentUnidirectionalTrafficPercent'], errors='coerce')
+    )
+    frames_by_instance = dict(tuple(subnet_frame.groupby('instance', sort=False)))
     unidirectional_traffic = {}
 
     for instance_key, instance_values in status_dict['instances'].items():
-        try:
-            if instance_values['error'] is True:
-                continue
-        except KeyError:
-            pass
-
-        unidirectional_traffic[instance_key] = {}
-        unidirectional_traffic[instance_key]['master_recorded'] = instance_values['recentUnidirectionalConnections']
-        unidirectional_traffic[instance_key]['total_seen_subnets'] = len(instance_values['subnetData'])
-        unidirectional_traffic[instance_key]['average_subnets_reporting_unidirectional'] = 'NOTIMPLEMENTED'
-        subnet_count_00_to_10 = 0
-        subnet_count_10_to_40 = 0
-        subnet_count_40_to_70 = 0
-        subnet_count_70_to_100 = 0
-
-        for subnet in instance_values['subnetData']:
-            if 'recentUnidirectionalTrafficPercent' not in subnet:
-                continue
-
-            uni = int(subnet['recentUnidirectionalTrafficPercent'])
-            if 0 < uni < 10:
-                subnet_count_00_to_10 += 1
-            elif 10 <= uni < 40:
-                subnet_count_10_to_40 += 1
-            elif 40 <= uni < 70:
-                subnet_count_40_to_70 += 1
-            elif uni >= 70:
-                subnet_count_70_to_100 += 1
-
-        unidirectional_traffic[instance_key]['0_to_10%'] = subnet_count_00_to_10
-        unidirectional_traffic[instance_key]['10_to_40%'] = subnet_count_10_to_40
-        unidirectional_traffic[instance_key]['40_to_70%'] = subnet_count_40_to_70
-        unidirectional_traffic[instance_key]['70_to_100%'] = subnet_count_70_to_100
+        if instance_values.get('error') is True:
+            continue
+
+        instance_frame = frames_by_instance.get(instance_key, subnet_frame.iloc[0:0])
+        values = instance_frame['percentage'].dropna().to_numpy(dtype=float)
+        counts, _ = np.histogram(np.clip(values, bucket_edges[0], bucket_edges[-1]), bins=bucket_edges)
+
+        statistics = {
+            'master_recorded': instance_values.get('recentUnidirectionalConnections'),
+            'total_seen_subnets': len(instance_frame.index),
+            'subnets_reporting_unidirectional': int(values.size),
+            'mean_percentage': None,
+            'median_percentage': None,
+            'p95_percentage': None
+        }
+
+        if values.size:
+            statistics['mean_percentage'] = round(float(np.mean(values)), 2)
+            statistics['median_percentage'] = round(float(np.median(values)), 2)
+            statistics['p95_percentage'] = round(float(np.percentile(values, 95)), 2)
+
+        statistics.update(zip(bucket_names, counts.tolist()))
+
+        if top:
+            worst = instance_frame.dropna(subset=['percentage']).nlargest(top, 'percentage')
+            statistics['worst_subnets'] = [
+                {'sid': _to_native(row.sid), 'network': row.network, 'percentage': float(row.percentage)}
+                for row in worst.itertuples(index=False)
+            ]
+
+        unidirectional_traffic[instance_key] = statistics
 
     return unidirectional_traffic
 
 
-def get_dhcp_stats(api):
+def parse_bucket_edges(edges):
+    """
+    Parse comma separated histogram bucket edges, e.g. "0,10,40,70,100"
+
+    :param edges: Comma separated bucket edges in percentages
+    :type edges: String
+    :return: Bucket edges
+    :rtype: Tuple
+    """
+    try:
+        bucket_edges = tuple(float(edge) for edge in edges.split(','))
+    except ValueError:
+        raise click.UsageError('Bucket edges must be comma separated numbers. E.g.: 0,10,40,70,100')
+
+    if len(bucket_edges) < 2 or any(low >= high for low, high in zip(bucket_edges[:-1], bucket_edges[1:])):
+        raise click.UsageError('At least two increasing bucket edges are required. E.g.: 0,10,40,70,100')
+
+    return bucket_edges
+
+
+def _to_native(value):
+    """
+    Convert numpy scalars to Python scalars for JSON serialization
+
+    :param value: Value to convert
+    :return: Python scalar
+    """
+    import numpy as np
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def get_dhcp_stats(api, per_subnet=False):
     """
     Overview of DHCP seen status for each subnet
 
     :param api: Darktrace API object with initialized config values
+    :param per_subnet: Return the DHCP status of each individual subnet instead of statistics per instance
+    :type per_subnet: Boolean
     :return: Dictionary that contains system information
     """
     status_dict = api.get('/status')
-    all_subnets = api.get('/subnets')
-    subnets_by_sid = convert_to_subnets_by_sid(all_subnets)
-    dhcp_statistics = []
+    return calculate_dhcp_stats(status_dict, get_subnet_frame(status_dict), api.get('/subnets'), per_subnet)
 
-    for _instance_key, instance_values in status_dict['instances'].items():
-        try:
-            if instance_values['error'] is True:
-                continue
-        except KeyError:
-            pass
 
-        dhcp_information = {
-            'system': instance_values['hostname'],
-            # 'ip': instance_key,  # Replace with 'ip' key once made available in status output
-            'timestamp': utc_now_timestamp(),
-            'subnets_not_registered': 0,
-            'subnets_seen': len(instance_values['subnetData']),
-            'subnets_with_dhcp_disabled': 0,
-            'subnets_without_clients': 0,
-            'subnets_failing_dhcp': 0,
-            'subnets_tracking_dhcp': 0,
-            'total_dhcp_quality': 0
-        }
+def calculate_dhcp_stats(status_dict, subnet_frame, all_subnets, per_subnet=False):
+    """
+    Calculate DHCP statistics per instance. The subnets seen by the instances are joined on "sid"
+    with the subnets known to Darktrace, after which every subnet is classified in one vectorised
+    operation. Instances that do not track DHCP for any subnet report an average quality of 0.
+
+    :param status_dict: Output of the Darktrace "/status" endpoint
+    :type status_dict: Dict
+    :param subnet_frame: DataFrame as returned by get_subnet_frame
+    :type subnet_frame: DataFrame
+    :param all_subnets: Output of the Darktrace "/subnets" endpoint
+    :type all_subnets: List
+    :param per_subnet: Return the DHCP status of each individual subnet instead of statistics per instance
+    :type per_subnet: Boolean
+    :return: DHCP statistics per instance or DHCP status per subnet
+    :rtype: List
+    """
+    import pandas as pd
+    dhcp_frame = classify_dhcp_subnets(subnet_frame, all_subnets)
+    timestamp = utc_now_timestamp()
+    hostnames = {key: values.get('hostname') for key, values in status_dict['instances'].items()
+                 if values.get('error') is not True}
+
+    if per_subnet:
+        return [
+            {
+                'system': hostnames[row.instance],
+                'timestamp': timestamp,
+                'sid': _to_native(row.sid),
+                'network': row.network,
+                'dhcp_status': row.dhcp_status,
+                'dhcp_quality': None if pd.isna(row.quality) else int(row.quality),
+                'client_devices': None if pd.isna(row.clientDevices) else int(row.clientDevices),
+                'most_recent_dhcp': row.mostRecentDHCP
+            }
+            for row in dhcp_frame.itertuples(index=False)
+        ]
+
+    counts = pd.crosstab(dhcp_frame['instance'], dhcp_frame['dhcp_status'])
+    counts = counts.reindex(index=list(hostnames), columns=list(DHCP_STATUSES), fill_value=0)
+    quality = dhcp_frame[dhcp_frame['dhcp_status'] == 'tracking'].groupby('instance')['quality'].sum()
+    quality = quality.reindex(list(hostnames), fill_value=0)
+    seen = dhcp_frame.groupby('instance').size().reindex(list(hostnames), fill_value=0)
 
-        for subnet in instance_values['subnetData']:
-            # If a seen subnet is not in the Darktrace subnet list
-            # we continue on the next. This should not happen to often
-            # and usually is a result of timing issues with internal
-            # Darktrace updating mechanisms
-            if subnet['sid'] not in subnets_by_sid:
-                dhcp_information['subnets_not_registered'] += 1
-                continue
-
-            # Boolean value provided by Darktrace
-            # False: Darktrace does not track DHCP for this subnet
-            # True: Darktrace tracks DHCP for this subnet
-            if not subnets_by_sid[subnet['sid']]['dhcp']:
-                dhcp_information['subnets_with_dhcp_disabled'] += 1
-                continue
-
-            # mostRecentDHCP can have three values
-            # 1. ''    -> Empty string. Assumed to be similar to never
-            # 2. Date  -> Date of last DHCP packet seen
-            # 3. Never -> Never seen DHCP or not tracking
-            #               - Because DHCP tracking is disabled (covered in statement above)
-            #               - Because no client devices are inside the subnet (covered in statement below)
-            if (subnet['mostRecentDHCP'] == 'Never') and subnet['clientDevices'] == 0:
-                dhcp_information['subnets_without_clients'] += 1
-                continue
-
-            # dhcpQuality is reported for subnets that have seen DHCP
-            # If dhcpQuality is missing, we have a subnet with
-            if 'dhcpQuality' in subnet:
-                dhcp_information['subnets_tracking_dhcp'] += 1
-                dhcp_information['total_dhcp_quality'] += int(subnet['dhcpQuality'])
-            else:
-                dhcp_information['subnets_failing_dhcp'] += 1
-
-        dhcp_information['average_dhcp_quality'] = \
-            round(dhcp_information['total_dhcp_quality'] /
-                  dhcp_information['subnets_tracking_dhcp'])
-
-        dhcp_statistics.append(dhcp_information)
+    dhcp_statistics = []
+    for instance_key, hostname in hostnames.items():
+        subnets_tracking_dhcp = int(counts.at[instance_key, 'tracking'])
+        total_dhcp_quality = int(quality[instance_key])
+
+        dhcp_statistics.append({
+            'system': hostname,
+            # 'ip': instance_key,  # Replace with 'ip' key once made available in status output
+            'timestamp': timestamp,
+            'subnets_not_registered': int(counts.at[instance_key, 'not_registered']),
+            'subnets_seen': int(seen[instance_key]),
+            'subnets_with_dhcp_disabled': int(counts.at[instance_key, 'dhcp_disabled']),
+            'subnets_without_clients': int(counts.at[instance_key, 'without_clients']),
+            'subnets_failing_dhcp': int(counts.at[instance_key, 'failing']),
+            'subnets_tracking_dhcp': subnets_tracking_dhcp,
+            'total_dhcp_quality': total_dhcp_quality,
+            'average_dhcp_quality': round(total_dhcp_quality / subnets_tracking_dhcp) if subnets_tracking_dhcp else 0
+        })
 
     return dhcp_statistics
 
 
+def classify_dhcp_subnets(subnet_frame, all_subnets):
+    """
+    Join seen subnets with the subnets known to Darktrace and classify their DHCP status
+
+    The "dhcp_status" column holds one of DHCP_STATUSES. Conditions are evaluated in order:
+        - not_registered:   The seen subnet is not in the Darktrace subnet list. This should not
+                            happen to often and usually is a result of timing issues with internal
+                            Darktrace updating mechanisms
+        - dhcp_disabled:    Darktrace does not track DHCP for this subnet
+        - without_clients:  DHCP has never been seen and the subnet holds no client devices
+        - tracking:         Darktrace reports a dhcpQuality for the subnet
+        - failing:          Any other subnet, i.e. DHCP is tracked but no quality is reported
+
+    :param subnet_frame: DataFrame as returned by get_subnet_frame
+    :type subnet_frame: DataFrame
+    :param all_subnets: Output of the Darktrace "/subnets" endpoint
+    :type all_subnets: List
+    :return: Seen subnets including the "dhcp_status" and numeric "quality" columns
+    :rtype: DataFrame
+    """
+    import pandas as pd
+    import numpy as np
+    registered = pd.DataFrame(all_subnets, columns=['sid', 'dhcp']).drop_duplicates('sid')
+    registered['registered'] = True
+    joined = subnet_frame.merge(registered, on='sid', how='left')
+
+    not_registered = joined['registered'].isna().to_numpy()
+    dhcp_disabled = ~joined['dhcp'].fillna(False).astype(bool).to_numpy()
+    # mostRecentDHCP can have three values
+    # 1. ''    -> Empty string. Assumed to be similar to never
+    # 2. Date  -> Date of last DHCP packet seen
+    # 3. Never -> Never seen DHCP or not tracking
+    without_clients = ((joined['mostRecentDHCP'] == 'Never') &
+                       (pd.to_numeric(joined['clientDevices'], errors='coerce') == 0)).to_numpy()
+    quality = pd.to_numeric(joined['dhcpQuality'], errors='coerce')
+    tracking = quality.notna().to_numpy()
+
+    joined['dhcp_status'] = np.select([not_registered, dhcp_disabled, without_clients, tracking],
+                                      list(DHCP_STATUSES[:4]), default='failing')
+    joined['quality'] = quality
+    return joined
+
+
 def get_summary(api):
     # Not finished yet. Need to perform subnet summary
     # Count of total subnets seen (per instance/per probe)
@@ -254,18 +415,3 @@ def get_summary(api):
     subnets = api.get('/subnets')
     return subnets
 
-
-def convert_to_subnets_by_sid(subnets):
-    """
-    Function to convert Darktrace subnets dict into a dict with key SID. This is handy
-    for lookups based on SID.
-
-    We could do api.get('/subnets?sid=<sid>') however this would result in an insane
-    amount of requests to DT.
-    :param subnets: dict
-    :return: dict
-    """
-    subnets_by_sid = {}
-    for subnet in subnets:
-        subnets_by_sid[subnet.pop('sid')] = subnet
-    return subnets_by_sid
@@ -1,7 +1,9 @@
 # pylint: disable=C0111
+import os
 import click
 from dtctl.system.functions import get_status, get_usage, get_tags, get_info, get_auditlog, \
-    get_summary_statistics, get_instances, get_packet_loss, get_system_issues, calculate_coverage
+    get_summary_statistics, get_instances, get_packet_loss, get_system_issues, calculate_coverage, get_snapshot, \
+    aggregate_packet_loss, get_packet_loss_trend_records, write_packet_loss_trend, PACKET_LOSS_TREND_FORMATS
 from dtctl.utils.output import process_output
 from dtctl.utils.parsing import convert_json_to_log_lines
 from dtctl.utils.timeutils import determine_date_range
@@ -33,8 +35,11 @@ def status(program_state, outfile):
 @click.option('--cef', is_flag=True, default=False, show_default=True,
               cls=OptionMutex, not_required_if=['log'],
               help='Line based output for CEF logging purposes')
+@click.option('--syslog', type=click.STRING, cls=OptionMutex, not_required_if=['outfile'],
+              help='Send the lines of --log or --cef to a syslog server, e.g. udp://siem.local:514, '
+                   'tcp://siem.local:601 or tls://siem.local:6514')
 @click.pass_obj
-def usage(program_state, outfile, log, cef):
+def usage(program_state, outfile, log, cef, syslog):
     """Short usage information of all instances and probes"""
     output = get_usage(program_state.api)
     append = False
@@ -51,7 +56,7 @@ def usage(program_state, outfile, log, cef):
         cef_object = Cef(device_event_class_id=100, name='System Usage')
         output = cef_object.generate_logs(output)
 
-    process_output(output, outfile, append, to_json)
+    process_output(output, outfile, append, to_json, syslog, os.path.dirname(program_state.config_file))
 
 
 @click.command('tags', short_help='All tags configured in Darktrace')
@@ -111,12 +116,51 @@ def auditlog(program_state, offset, limit, outfile):
 @click.option('--cef', is_flag=True, default=False, show_default=True,
               cls=OptionMutex, not_required_if=['log'],
               help='Line based output for CEF logging purposes')
+@click.option('--syslog', type=click.STRING, cls=OptionMutex, not_required_if=['outfile'],
+              help='Send the lines of --log or --cef to a syslog server, e.g. udp://siem.local:514, '
+                   'tcp://siem.local:601 or tls://siem.local:6514')
+@click.option('--aggregate', type=click.STRING,
+              help='Aggregate the packet loss per probe into intervals of this length, e.g. 15min, 1h or 1d')
+@click.option('--rolling', type=click.STRING,
+              help='With --aggregate, add the max and mean packet loss over a rolling window, e.g. 24h')
+@click.option('--top', type=click.IntRange(min=1),
+              help='With --aggregate, only report the probes with the highest packet loss')
+@click.option('--format', '-f', 'output_format', type=click.Choice(PACKET_LOSS_TREND_FORMATS), default='json',
+              show_default=True, help='Output format of --aggregate. Parquet requires pyarrow and --outfile')
 @click.pass_obj
-def packet_loss(program_state, days, start_date, end_date, outfile, log, cef):
-    """Information about reported packet loss per system"""
+def packet_loss(program_state, days, start_date, end_date, outfile, log, cef, syslog, aggregate, rolling, top,
+                output_format):
+    """
+    Information about reported packet loss per system
+
+    \b
+    With --aggregate, the packet loss is reported as a time series per
+    probe instead: the nr of reports and the max and mean packet loss and
+    worker drop rate per interval, for example for capacity planning.
+    Intervals without reported packet loss are left out. The OpenMetrics
+    output is timestamped with the start of the intervals, so it can be
+    backfilled into Prometheus (promtool tsdb create-blocks-from openmetrics).
+    """
+    if not aggregate and (rolling or top or output_format != 'json'):
+        raise click.UsageError('--rolling, --top and --format require --aggregate')
+    if aggregate and (log or cef or syslog):
+        raise click.UsageError('--aggregate cannot be combined with --log, --cef or --syslog')
+
     end_date, start_date = determine_date_range(days, end_date, start_date)
 
     output = get_packet_loss(program_state.api, start_date, end_date)
+
+    if aggregate:
+        if not output:
+            raise SystemExit('No output to write or display')
+
+        trend = aggregate_packet_loss(output, aggregate, rolling, top)
+        if output_format == 'json':
+            process_output(get_packet_loss_trend_records(trend), outfile)
+        else:
+            write_packet_loss_trend(trend, outfile, output_format)
+        return
+
     append = False
     to_json = True
 
@@ -131,7 +175,7 @@ def packet_loss(program_state, days, start_date, end_date, outfile, log, cef):
         cef_object = Cef(device_event_class_id=110, name='Packet Loss')
         output = cef_object.generate_logs(output)
 
-    process_output(output, outfile, append, to_json)
+    process_output(output, outfile, append, to_json, syslog, os.path.dirname(program_state.config_file))
 
 
 @click.command('issues', short_help='View Darktrace system issues')
@@ -148,8 +192,11 @@ def packet_loss(program_state, days, start_date, end_date, outfile, log, cef):
 @click.option('--cef', is_flag=True, default=False, show_default=True,
               cls=OptionMutex, not_required_if=['log'],
               help='Line based output for CEF logging purposes')
+@click.option('--syslog', type=click.STRING, cls=OptionMutex, not_required_if=['outfile'],
+              help='Send the lines of --log or --cef to a syslog server, e.g. udp://siem.local:514, '
+                   'tcp://siem.local:601 or tls://siem.local:6514')
 @click.pass_obj
-def issues(program_state, days, start_date, end_date, outfile, log, cef):
+def issues(program_state, days, start_date, end_date, outfile, log, cef, syslog):
     """Information about Darktrace system issues"""
     end_date, start_date = determine_date_range(days, end_date, start_date)
 
@@ -168,7 +215,7 @@ def issues(program_state, days, start_date, end_date, outfile, log, cef):
         cef_object = Cef(device_event_class_id=130, name='System Issue')
         output = cef_object.generate_logs(output)
 
-    process_output(output, outfile, append, to_json)
+    process_output(output, outfile, append, to_json, syslog, os.path.dirname(program_state.config_file))
 
 
 @click.command('coverage', short_help='Calculate coverage based on list of subnets')
@@ -185,8 +232,11 @@ def issues(program_state, days, start_date, end_date, outfile, log, cef):
 @click.option('--cef', is_flag=True, default=False, show_default=True,
               cls=OptionMutex, not_required_if=['log'],
               help='Line based output for CEF logging purposes')
+@click.option('--syslog', type=click.STRING, cls=OptionMutex, not_required_if=['outfile'],
+              help='Send the lines of --log or --cef to a syslog server, e.g. udp://siem.local:514, '
+                   'tcp://siem.local:601 or tls://siem.local:6514')
 @click.pass_obj
-def coverage(program_state, outfile, infile, input_format, network_col, netmask_col, log, cef):
+def coverage(program_state, outfile, infile, input_format, network_col, netmask_col, log, cef, syslog):
     """
     Calculate coverage based on list of subnets expected to be monitored. Each subnet seen by
     Darktrace is matched against each entry in the input file using Python's ipaddress library.
@@ -215,7 +265,59 @@ def coverage(program_state, outfile, infile, input_format, network_col, netmask_
         cef_object = Cef(device_event_class_id=140, name='Subnet Coverage')
         output = cef_object.generate_logs([output])
 
-    process_output(output, outfile, append, to_json)
+    process_output(output, outfile, append, to_json, syslog, os.path.dirname(program_state.config_file))
+
+
+@click.command('snapshot', short_help='All status derived metrics from a single status request')
+@click.option('--outfile', '-o', type=click.Path(), help='Full path to the output file')
+@click.option('--log', is_flag=True, default=False, show_default=True,
+              cls=OptionMutex, not_required_if=['cef'],
+              help='Line based output for logging purposes')
+@click.option('--cef', is_flag=True, default=False, show_default=True,
+              cls=OptionMutex, not_required_if=['log'],
+              help='Line based output for CEF logging purposes')
+@click.option('--syslog', type=click.STRING, cls=OptionMutex, not_required_if=['outfile'],
+              help='Send the lines of --log or --cef to a syslog server, e.g. udp://siem.local:514, '
+                   'tcp://siem.local:601 or tls://siem.local:6514')
+@click.pass_obj
+def snapshot(program_state, outfile, log, cef, syslog):
+    """
+    Calculate all metrics derived from Darktrace status information at once. Status and
+    subnet information is requested only once, which makes this command suitable for
+    frequent monitoring instead of calling the individual commands.
+
+    \b
+    Includes:
+        - Nr of devices               (dtctl subnets devices)
+        - Subnets per instance        (dtctl subnets instances)
+        - Unidirectional traffic      (dtctl subnets unidirectional)
+        - DHCP quality                (dtctl subnets dhcp)
+        - Usage                       (dtctl system usage)
+        - Instances and probes        (dtctl system instances --show-probes)
+
+    \b
+    Line based output (--log, --cef) only contains the usage and DHCP metrics,
+    --log additionally contains the nr of devices.
+    """
+    output = get_snapshot(program_state.api)
+    append = False
+    to_json = True
+
+    if log or cef:
+        append = True
+        to_json = False
+
+    if log:
+        devices = {'system': output['system'], 'timestamp': output['timestamp'], **output['devices']}
+        output = convert_json_to_log_lines(output['usage']) + convert_json_to_log_lines(output['dhcp']) + \
+            convert_json_to_log_lines([devices])
+
+    if cef:
+        usage_cef = Cef(device_event_class_id=100, name='System Usage')
+        dhcp_cef = Cef(device_event_class_id=120, name='DHCP Quality')
+        output = usage_cef.generate_logs(output['usage']) + dhcp_cef.generate_logs(output['dhcp'])
+
+    process_output(output, outfile, append, to_json, syslog, os.path.dirname(program_state.config_file))
 
 
 @click.command('moo', hidden=True, add_help_option=False)
@@ -3,9 +3,32 @@ import os.path
 import re
 import ipaddress
 import click
-import pandas as pd
-from dtctl.utils.timeutils import fmttime, prstime, utc_now_timestamp
-from dtctl.subnets.functions import get_subnet_list
+from dtctl.models.index import get_model_index
+from dtctl.utils.breaches import iter_model_breaches
+from dtctl.utils.timeutils import prstime, utc_now_timestamp
+from dtctl.subnets.functions import get_subnet_list, get_subnet_frame, count_devices, \
+    extract_subnets_per_instances, calculate_unidirectional_traffic, calculate_dhcp_stats
+
+# Host (ending in its IP address), packet loss and worker drop rate in the trigger values of the
+# System::Packet Loss model, e.g. "Host probe-01-10.0.0.1: Packet loss rate above 1.50% (worker drop rate: 0.10%)"
+PACKET_LOSS_REGEX = re.compile(r'Host (?P<host>[^:]*?(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})?):'
+                               r'(?:.*?rate above (?P<packet_loss>[^\s%,;)]*))?'
+                               r'(?:.*?worker drop rate: (?P<worker_drop_rate>[^\s%,;)]*))?', re.DOTALL)
+PACKET_LOSS_TREND_FORMATS = ('json', 'csv', 'parquet', 'openmetrics')
+# Columns of packet loss time series with their metric name and help text
+PACKET_LOSS_TREND_METRICS = (
+    ('reports', 'darktrace_packet_loss_reports', 'Nr of packet loss reports in the interval'),
+    ('packet_loss_max', 'darktrace_packet_loss_max_percent', 'Maximum reported packet loss in the interval'),
+    ('packet_loss_mean', 'darktrace_packet_loss_mean_percent', 'Mean reported packet loss in the interval'),
+    ('worker_drop_rate_max', 'darktrace_worker_drop_rate_max_percent',
+     'Maximum reported worker drop rate in the interval'),
+    ('worker_drop_rate_mean', 'darktrace_worker_drop_rate_mean_percent',
+     'Mean reported worker drop rate in the interval'),
+    ('packet_loss_rolling_max', 'darktrace_packet_loss_rolling_max_percent',
+     'Maximum packet loss of the intervals in the rolling window'),
+    ('packet_loss_rolling_mean', 'darktrace_packet_loss_rolling_mean_percent',
+     'Mean packet loss of the intervals in the rolling window')
+)
 
 
 def calculate_coverage(api, infile, input_format, network_col, netmask_col):
@@ -111,6 +134,7 @@ def get_subnets_from_csv_file(infile, network_col, netmask_col):
     :return: Unique subnets retrieved from file
     :rtype: Set
     """
+    import pandas as pd
     input_subnets = set()
     try:
         input_subnets_df = pd.read_csv(infile, sep=None, engine='python', usecols=[network_col, netmask_col])
@@ -178,7 +202,18 @@ def get_usage(api, **kwargs):
     :param api: Darktrace API object with initialized config values
     :return: Dictionary that contains parsed resource information
     """
-    status_dict = api.get('/status', **kwargs)
+    return extract_usage(api.get('/status', **kwargs))
+
+
+def extract_usage(status_dict):
+    """
+    Extract resource usage of master instances and connected probes from status information
+
+    :param status_dict: Output of the Darktrace "/status" endpoint
+    :type status_dict: Dict
+    :return: Resource usage per master and probe
+    :rtype: List
+    """
     usage_list = []
 
     for _instance_key, instance_values in status_dict['instances'].items():
@@ -262,7 +297,20 @@ def get_instances(api, show_probes, **kwargs):
     :return: Darktrace master instances with their labels and ids
     :rtype: Dict
     """
-    status = api.get('/status', **kwargs)
+    return extract_instances(api.get('/status', **kwargs), show_probes)
+
+
+def extract_instances(status, show_probes):
+    """
+    Extract master instances, their labels and id numbers from status information
+
+    :param status: Output of the Darktrace "/status" endpoint
+    :type status: Dict
+    :param show_probes: To include probe information in output
+    :type show_probes: Bool
+    :return: Darktrace master instances with their labels and ids
+    :rtype: Dict
+    """
     instances = {}
 
     for instance_name, values in status['instances'].items():
@@ -308,6 +356,33 @@ def get_instances(api, show_probes, **kwargs):
     return instances
 
 
+def get_snapshot(api):
+    """
+    Snapshot of all metrics that are derived from Darktrace status information. The "/status"
+    and "/subnets" endpoints are requested once and all metrics are calculated from the same
+    responses, instead of every metric downloading the status document separately.
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :return: Devices, usage, instances, subnets per instance, unidirectional traffic and DHCP metrics
+    :rtype: Dict
+    """
+    status_dict = api.get('/status')
+    all_subnets = api.get('/subnets')
+    subnet_frame = get_subnet_frame(status_dict)
+
+    return {
+        'system': status_dict.get('hostname', 'unknown'),
+        'timestamp': utc_now_timestamp(),
+        'devices': count_devices(subnet_frame),
+        'usage': extract_usage(status_dict),
+        'instances': extract_instances(status_dict, True),
+        'subnets_per_instance': extract_subnets_per_instances(status_dict, subnet_frame),
+        'unidirectional': calculate_unidirectional_traffic(status_dict, subnet_frame),
+        'dhcp': calculate_dhcp_stats(status_dict, subnet_frame, all_subnets)
+    }
+
+
 def get_auditlog(api, **kwargs):
     """
     View account activity log
@@ -334,64 +409,241 @@ def get_packet_loss(api, start_date, end_date):
     :return: JSON objects containing packet-loss information
     :rtype: List
     """
-    start_date = fmttime(start_date) if start_date else None
-    end_date = fmttime(end_date) if end_date else None
-
-    models = api.get('/models')
-    packet_loss_model = None
-
     # Unsure if for all Darktrace installations the packet loss model has the same ID
-    # therefore we loop through all models
-    for model in models:
-        if model['name'] == 'System::Packet Loss':
-            packet_loss_model = model
-            break
+    # therefore we look the model up by name
+    packet_loss_model = get_system_model(api, 'System::Packet Loss')
 
-    packet_loss_breaches = api.get('/modelbreaches', pid=packet_loss_model['pid'],
-                                   starttime=start_date, endtime=end_date)
+    packet_loss_breaches = iter_model_breaches(api, start_date, end_date, pid=packet_loss_model['pid'])
 
     return extract_packet_loss_information(packet_loss_breaches)
 
 
+def get_system_model(api, name):
+    """
+    Find a Darktrace system model by its name
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :param name: Name of the model
+    :type name: String
+    :return: The model
+    :rtype: Dict
+    """
+    model = get_model_index(api).get_by_name(name)
+    if not model:
+        raise click.UsageError('Model "{0}" does not exist on the Darktrace master'.format(name))
+    return model
+
+
 def extract_packet_loss_information(packet_loss_breaches):
     """
     Extract packet loss information from trigger values in breaches
 
     :param packet_loss_breaches: Breaches from the packet loss model
-    :type packet_loss_breaches: List
+    :type packet_loss_breaches: Iterable
     :return: Packet loss statistics per system
-    :rtype: Dict
+    :rtype: List
     """
-    result = []
+    return list(iter_packet_loss_information(packet_loss_breaches))
 
-    host_regex = r'Host (.+?):'
-    valid_ip_regex = r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$'
-    packet_loss_regex = r'rate above ([0-9]+\.[0-9]+)'
-    worker_drop_regex = r'worker drop rate: ([0-9]+\.[0-9]+)'
 
+def iter_packet_loss_information(packet_loss_breaches):
+    """
+    Extract packet loss information from trigger values in breaches, one breach at a time so that
+    breaches can be streamed. A single regex captures the host, packet loss and worker drop rate
+    of a trigger value. Values without a host are skipped, missing or malformed percentages are
+    reported as None.
+
+    :param packet_loss_breaches: Breaches from the packet loss model
+    :type packet_loss_breaches: Iterable
+    :return: Packet loss statistics per system
+    :rtype: Iterator
+    """
     for breach in packet_loss_breaches:
-        for triggered_component in breach['triggeredComponents']:
-            for triggered_filter in triggered_component['triggeredFilters']:
-                if triggered_filter['comparatorType'] == 'display':
+        for triggered_component in breach.get('triggeredComponents') or ():
+            timestamp = None
+
+            for triggered_filter in triggered_component.get('triggeredFilters') or ():
+                if triggered_filter.get('comparatorType') == 'display':
                     continue
 
-                value = triggered_filter['trigger']['value']
-                packet_loss_percentage = re.search(packet_loss_regex, value)[1]
-                worker_drop_percentage = re.search(worker_drop_regex, value)[1]
-                host = re.search(host_regex, value)[1]
-                hostname = '-'.join(host.split('-')[0:-1])
-                ip_address = re.search(valid_ip_regex, host)[0]
-
-                info_dict = {
-                    'system': hostname,
-                    'ip': ip_address if ip_address else host,
-                    'timestamp': '{0}'.format(prstime(triggered_component['time'], True)),
-                    'packet_loss': float(packet_loss_percentage),
-                    'worker_drop_rate': float(worker_drop_percentage)
+                value = (triggered_filter.get('trigger') or {}).get('value')
+                match = PACKET_LOSS_REGEX.search(value) if isinstance(value, str) else None
+                if not match or not match.group('host'):
+                    continue
+
+                host, ip_address, packet_loss_percentage, worker_drop_percentage = match.groups()
+                if timestamp is None:
+                    timestamp = prstime(triggered_component['time'], True)
+
+                yield {
+                    'system': host.rpartition('-')[0],
+                    'ip': ip_address or host,
+                    'timestamp': timestamp,
+                    'packet_loss': parse_percentage(packet_loss_percentage),
+                    'worker_drop_rate': parse_percentage(worker_drop_percentage)
                 }
 
-                result.append(info_dict)
-    return result
+
+def parse_percentage(value):
+    """
+    Convert a percentage in a trigger value to a float
+
+    :param value: The percentage, e.g. "1.50"
+    :type value: String
+    :return: The percentage or None if it is missing or malformed
+    :rtype: Float
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def aggregate_packet_loss(records, interval, rolling=None, top=None):
+    """
+    Aggregate packet loss records to a time series per probe, with the maximum and mean packet loss
+    and worker drop rate per interval. Intervals without reported packet loss are left out.
+
+    :param records: Packet loss records, see get_packet_loss
+    :type records: List
+    :param interval: Length of the intervals as pandas offset alias, e.g. "1h" or "15min"
+    :type interval: String
+    :param rolling: Length of a rolling window as pandas offset alias, e.g. "24h", to add the maximum and
+                    mean packet loss of the intervals in the window ending at every interval
+    :type rolling: String
+    :param top: Only keep the probes with the highest maximum packet loss
+    :type top: Int
+    :return: Time series with a row per probe and interval, sorted by probe and time
+    :rtype: DataFrame
+    """
+    import pandas as pd
+
+    interval = parse_offset(interval, '--aggregate')
+    rolling = parse_offset(rolling, '--rolling', fixed=True) if rolling else None
+
+    frame = pd.DataFrame(records, columns=['system', 'ip', 'timestamp', 'packet_loss', 'worker_drop_rate'])
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+    frame[['packet_loss', 'worker_drop_rate']] = frame[['packet_loss', 'worker_drop_rate']].astype(float)
+
+    trend = frame.groupby(['system', 'ip']).resample(interval, on='timestamp').agg({
+        'packet_loss': ['size', 'max', 'mean'],
+        'worker_drop_rate': ['max', 'mean']
+    })
+    trend.columns = ['reports', 'packet_loss_max', 'packet_loss_mean', 'worker_drop_rate_max',
+                     'worker_drop_rate_mean']
+    trend = trend[trend['reports'] > 0].reset_index().sort_values(['system', 'ip', 'timestamp'])
+
+    if rolling:
+        # The windows are in the order of the probes and their intervals, the same order as the trend
+        windows = trend.groupby(['system', 'ip']).rolling(rolling, on='timestamp')
+        trend['packet_loss_rolling_max'] = windows['packet_loss_max'].max().values
+        trend['packet_loss_rolling_mean'] = windows['packet_loss_mean'].mean().values
+
+    # Packet loss is reported with 2 decimals, means are rounded to 3
+    means = [column for column in trend if column.endswith('_mean')]
+    trend[means] = trend[means].round(3)
+
+    if top:
+        worst = set(trend.groupby(['system', 'ip'])['packet_loss_max'].max().nlargest(top).index)
+        trend = trend[[probe in worst for probe in zip(trend['system'], trend['ip'])]]
+
+    return trend.sort_values(['system', 'ip', 'timestamp']).reset_index(drop=True)
+
+
+def parse_offset(offset, option, fixed=False):
+    """
+    Validate a pandas offset alias
+
+    :param offset: The offset alias, e.g. "1h"
+    :type offset: String
+    :param option: Name of the option that holds the offset, for the error message
+    :type option: String
+    :param fixed: Only accept offsets of a fixed length, e.g. "1d" but not "1M"
+    :type fixed: Boolean
+    :return: The offset
+    :rtype: DateOffset
+    """
+    from pandas.tseries.frequencies import to_offset
+
+    try:
+        parsed_offset = to_offset(offset)
+        if fixed:
+            parsed_offset.nanos  # pylint: disable=W0104
+    except ValueError:
+        raise click.UsageError('Invalid {0} interval "{1}", use e.g. 15min, 1h or 1d'.format(option, offset))
+    return parsed_offset
+
+
+def get_packet_loss_trend_records(trend):
+    """
+    Convert a packet loss time series to JSON objects
+
+    :param trend: Time series, see aggregate_packet_loss
+    :type trend: DataFrame
+    :return: JSON objects with ISO timestamps, without NaN values
+    :rtype: List
+    """
+    trend = trend.assign(timestamp=trend['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S'))
+    return [{key: None if value != value else value for key, value in record.items()}
+            for record in trend.to_dict('records')]
+
+
+def get_packet_loss_trend_metrics(trend):
+    """
+    Convert a packet loss time series to metric families with a sample per probe and interval,
+    timestamped with the start of the interval
+
+    :param trend: Time series, see aggregate_packet_loss
+    :type trend: DataFrame
+    :return: Metric families, see dtctl.exporter.functions.render_metrics
+    :rtype: List
+    """
+    timestamps = (trend['timestamp'].astype('int64') // 10 ** 9).tolist()
+    labels = [{'system': system, 'ip': ip} for system, ip in zip(trend['system'], trend['ip'])]
+
+    return [
+        (name, help_text, list(zip(labels, trend[column].tolist(), timestamps)))
+        for column, name, help_text in PACKET_LOSS_TREND_METRICS if column in trend
+    ]
+
+
+def write_packet_loss_trend(trend, outfile, output_format):
+    """
+    Write a packet loss time series as CSV, Parquet or OpenMetrics to a file, or CSV and OpenMetrics to stdout
+
+    :param trend: Time series, see aggregate_packet_loss
+    :type trend: DataFrame
+    :param outfile: Full path to the output file, None for stdout
+    :type outfile: String
+    :param output_format: "csv", "parquet" or "openmetrics"
+    :type output_format: String
+    :return: None
+    """
+    from dtctl.exporter.functions import render_metrics
+
+    if trend.empty:
+        raise SystemExit('No output to write or display')
+
+    if output_format == 'parquet':
+        if not outfile:
+            raise click.UsageError('Parquet output requires --outfile')
+        try:
+            trend.to_parquet(outfile, index=False)
+        except ImportError:
+            raise click.UsageError('Parquet output requires pyarrow: pip install pyarrow')
+        return
+
+    if output_format == 'csv':
+        output = trend.to_csv(index=False, date_format='%Y-%m-%dT%H:%M:%S')
+    else:
+        output = render_metrics(get_packet_loss_trend_metrics(trend))
+
+    if outfile:
+        with open(outfile, 'w', newline='') as output_file:
+            output_file.write(output)
+    else:
+        click.echo(output, nl=False)
 
 
 def get_system_issues(api, start_date, end_date):
@@ -407,22 +659,12 @@ def get_system_issues(api, start_date, end_date):
     :return: JSON objects containing packet-loss information
     :rtype: List
     """
-    start_date = fmttime(start_date) if start_date else None
-    end_date = fmttime(end_date) if end_date else None
-
     status = api.get('/status')
-    models = api.get('/models')
-    system_issue_model = None
+    # Unsure if for all Darktrace installations the system model has the same ID
+    # therefore we look the model up by name
+    system_issue_model = get_system_model(api, 'System::System')
 
-    # Unsure if for all Darktrace installations the packet loss model has the same ID
-    # therefore we loop through all models
-    for model in models:
-        if model['name'] == 'System::System':
-            system_issue_model = model
-            break
-
-    system_issue_breaches = api.get('/modelbreaches', pid=system_issue_model['pid'],
-                                    starttime=start_date, endtime=end_date)
+    system_issue_breaches = iter_model_breaches(api, start_date, end_date, pid=system_issue_model['pid'])
 
     return extract_system_issue_information(system_issue_breaches, status)
 
@@ -432,40 +674,42 @@ def extract_system_issue_information(system_issue_breaches, status):
     Extract system issue information from trigger values in breaches
 
     :param system_issue_breaches: Breaches from the system model
-    :type system_issue_breaches: List
+    :type system_issue_breaches: Iterable
     :param status: Darktrace status information
     :type status: Dict
     :return: Identified system issues
-    :rtype: Dict
+    :rtype: List
     """
-    result = []
+    return list(iter_system_issue_information(system_issue_breaches, status))
 
-    # valid_ip_regex = r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'
 
-    try:
-        unified_view_hostname = status['hostname']
-    except KeyError:
-        unified_view_hostname = 'unknown'
-
-    for breach in system_issue_breaches:
-        for triggered_component in breach['triggeredComponents']:
-            for triggered_filter in triggered_component['triggeredFilters']:
-                if triggered_filter['comparatorType'] == 'display' or triggered_filter['filterType'] != 'Event details':
-                    continue
-
-                value = triggered_filter['trigger']['value']
-                # Currently not using this as it is most likely the source
-                # of a faulty probe or master and not the source of the
-                # originating device
-                # ip_address = re.search(valid_ip_regex, value)[0]
+def iter_system_issue_information(system_issue_breaches, status):
+    """
+    Extract system issue information from trigger values in breaches, one breach at a time so that
+    breaches can be streamed. Every triggered component reports its first "Event details" value.
 
-                info_dict = {
-                    'system': unified_view_hostname,
-                    'timestamp': '{0}'.format(prstime(triggered_component['time'], True)),
-                    'message': value
-                }
+    :param system_issue_breaches: Breaches from the system model
+    :type system_issue_breaches: Iterable
+    :param status: Darktrace status information
+    :type status: Dict
+    :return: Identified system issues
+    :rtype: Iterator
+    """
+    unified_view_hostname = status.get('hostname', 'unknown')
 
-                result.append(info_dict)
-                break
+    for breach in system_issue_breaches:
+        for triggered_component in breach.get('triggeredComponents') or ():
+            # The IP address in the event details is most likely the source of a faulty
+            # probe or master and not the source of the originating device, so it is not used
+            value = next((triggered_filter['trigger']['value']
+                          for triggered_filter in triggered_component.get('triggeredFilters') or ()
+                          if triggered_filter.get('comparatorType') != 'display'
+                          and triggered_filter.get('filterType') == 'Event details'), None)
+            if value is None:
+                continue
 
-    return result
+            yield {
+                'system': unified_view_hostname,
+                'timestamp': prstime(triggered_component['time'], True),
+                'message': value
+            }
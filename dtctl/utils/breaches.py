@@ -0,0 +1,66 @@
+"""Helper functions for Darktrace model breaches"""
+import datetime as dt
+from dtctl.utils.timeutils import fmttime
+
+# Period of breaches requested at once when streaming breaches of long periods
+DEFAULT_BREACH_WINDOW = dt.timedelta(days=7)
+
+
+def get_breach_device_id(breach):
+    """
+    Retrieve the id of the device that breached a model
+
+    :param breach: Model breach
+    :type breach: Dict
+    :return: Device id or None if the breach does not contain device information
+    :rtype: Int
+    """
+    for component in breach.get('triggeredComponents') or []:
+        if 'device' in component and 'did' in component['device']:
+            return component['device']['did']
+
+    if 'device' in breach:
+        return breach['device'].get('did')
+
+    return None
+
+
+def iter_model_breaches(api, start_date, end_date, window=DEFAULT_BREACH_WINDOW, **kwargs):
+    """
+    Stream model breaches by requesting them one window at a time, so that only the breaches of a
+    single window are kept in memory. Breaches on the boundary of two windows are returned once.
+
+    :param api: Darktrace API object with initialized config values
+    :type api: Api
+    :param start_date: Start of the period, None to request all breaches up to end_date at once
+    :type start_date: DateTime
+    :param end_date: End of the period
+    :type end_date: DateTime
+    :param window: Period of breaches that is requested at once
+    :type window: TimeDelta
+    :param **kwargs: Any other url parameter of the "/modelbreaches" endpoint, e.g. pid
+    :return: Model breaches
+    :rtype: Iterator
+    """
+    if not start_date:
+        yield from api.get('/modelbreaches', starttime=None, endtime=fmttime(end_date) if end_date else None,
+                           **kwargs)
+        return
+
+    end_date = end_date or dt.datetime.utcnow()
+    previous_pbids = set()
+
+    while start_date < end_date:
+        window_end = min(start_date + window, end_date)
+        pbids = set()
+
+        for breach in api.get('/modelbreaches', starttime=fmttime(start_date), endtime=fmttime(window_end),
+                              **kwargs):
+            pbid = breach.get('pbid')
+            if pbid is not None and pbid in previous_pbids:
+                continue
+            pbids.add(pbid)
+            yield breach
+
+        previous_pbids = pbids
+        start_date = window_end
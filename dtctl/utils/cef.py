@@ -1,6 +1,12 @@
 """Convenience classes and methods for generating CEF logging"""
 from datetime import datetime as dt
 
+CEF_TIMESTAMP_FORMAT = '%b %d %Y %H:%M:%S'
+# The characters "\" and "=" need to be escaped in extension values, newlines are written as "\n" and "\r"
+CEF_ESCAPE_TABLE = str.maketrans({'=': r'\=', '\\': '\\\\', '\n': r'\n', '\r': r'\r'})
+# The characters "\" and "|" need to be escaped in header fields
+CEF_HEADER_ESCAPE_TABLE = str.maketrans({'|': r'\|', '\\': '\\\\'})
+
 
 class Cef:
     """Convenience classes and methods for generating CEF logging"""
@@ -50,11 +56,22 @@ class Cef:
         self.name = name
         self.severity = severity
 
+        # The header and the extension fields of the mapping are the same for every log line,
+        # so they are built once. Fields with a Label key are written as the Label key with the
+        # name of the field, followed by the value key (the Label key without "Label").
+        self.header = format_cef_header(self.vendor, self.product, self.device_version, self.device_event_class_id,
+                                        self.name, self.severity, self.version) + 'end='
+        self.fields = {
+            key: '{0}={1} {2}='.format(cef_key, key, cef_key.replace('Label', '')) if 'Label' in cef_key
+            else '{0}='.format(cef_key)
+            for key, cef_key in self.MAPPING.get(name, {}).items()
+        }
+
     def generate_log_line(self, json_object, timestamp_key, system_key):
         """
         Generate a single log line in CEF format. Loops through all items in the json_object
-        to build a CEF compatible log line. Note that the json_object must have the keys
-        that are specified in the MAPPING object.
+        to build a CEF compatible log line. Only the keys that are specified in the MAPPING
+        object are added as extension fields. The json_object is not modified.
 
         :param json_object: The object containing all log information. This object is looped through
         :type json_object: Dict
@@ -65,45 +82,22 @@ class Cef:
         :return: Single log line in CEF format
         :rtype: String
         """
-        timestamp = dt.strptime(json_object.pop(timestamp_key), '%Y-%m-%dT%H:%M:%S')
-        system_name = json_object.pop(system_key)
-        ip_address = json_object.pop('ip', None)
-
         # CEF "Header" and default fields
-        line = 'CEF:{version}|{vendor}|{product}|{device_version}|{class_id}|{name}|{severity}|end={ts} ' \
-               'deviceExternalId={system} '\
-            .format(
-                version=self.version,
-                vendor=self.vendor,
-                product=self.product,
-                device_version=self.device_version,
-                class_id=self.device_event_class_id,
-                name=self.name,
-                severity=self.severity,
-                ts=timestamp.strftime('%b %d %Y %H:%M:%S'),
-                system=system_name
-            )
+        parts = [self.header + format_cef_timestamp(json_object[timestamp_key]),
+                 'deviceExternalId=' + escape_cef_value(json_object[system_key])]
 
+        ip_address = json_object.get('ip')
         if ip_address:
-            line += 'dvc={ip} '.format(ip=ip_address)
+            parts.append('dvc=' + escape_cef_value(ip_address))
 
+        fields = self.fields
         for key, value in json_object.items():
-            if key not in self.MAPPING[self.name]:
+            field = fields.get(key)
+            if field is None or key in (timestamp_key, system_key, 'ip'):
                 continue
+            parts.append(field + (value.translate(CEF_ESCAPE_TABLE) if isinstance(value, str) else str(value)))
 
-            if 'Label' in self.MAPPING[self.name][key]:
-                line += '{k}={v} '.format(k=self.MAPPING[self.name][key],
-                                          v=key)
-
-            # The Label key has already been added above if present.
-            # However, we also need the value in the corresponding value field (without Label)
-            # For this we replace "Label" with nothing. This also means that fields without Label
-            # are automatically picked up correctly.
-            line += '{k}={v} '.format(k=self.MAPPING[self.name][key].replace('Label', ''),
-                                      v=self.escape_strings_for_cef(value))
-
-        # Remove last whitespace as result of string concatenation
-        return line.strip()
+        return ' '.join(parts).strip()
 
     def generate_logs(self, output, timestamp_key='timestamp', system_key='system'):
         """
@@ -122,11 +116,8 @@ class Cef:
         if not isinstance(output, list):
             raise TypeError('Not a list')
 
-        log_lines = []
-        for json_object in output:
-            cef_log_line = '{0}\n'.format(self.generate_log_line(json_object, timestamp_key, system_key))
-            log_lines.append(cef_log_line)
-        return log_lines
+        generate_log_line = self.generate_log_line
+        return [generate_log_line(json_object, timestamp_key, system_key) + '\n' for json_object in output]
 
     def convert_to_custom_cef_fields(self, input_dict):
         """
@@ -169,7 +160,7 @@ class Cef:
         """
         Function to escape strings to be CEF compatible
 
-        The characters "\" and "=" need to be escaped
+        The characters "\" and "=" need to be escaped, newlines are written as "\n" and "\r"
 
         :param line: The text for which characters need to be replaced
         :type line: String
@@ -177,9 +168,63 @@ class Cef:
         :rtype: String
         """
         if isinstance(line, str):
-            return line.translate(str.maketrans({
-                '=': r'\=',
-                '\\': '\\\\'
-            }))
+            return line.translate(CEF_ESCAPE_TABLE)
 
         return line
+
+
+def format_cef_header(vendor, product, device_version, device_event_class_id, name, severity, version=0):
+    """
+    Build the header of a CEF event, up to and including the "|" before the extension
+
+    :param vendor: Device vendor
+    :type vendor: String
+    :param product: Device product
+    :type product: String
+    :param device_version: Device version
+    :type device_version: String
+    :param device_event_class_id: Device event class ID, e.g. the id of a model
+    :type device_event_class_id: Int or String
+    :param name: Name of the event
+    :type name: String
+    :param severity: Severity of the event (0-10)
+    :type severity: Int
+    :param version: Version of the CEF format
+    :type version: Int
+    :return: The header
+    :rtype: String
+    """
+    return 'CEF:{0}|{1}|{2}|{3}|{4}|{5}|{6}|'.format(
+        version, *(str(field).translate(CEF_HEADER_ESCAPE_TABLE)
+                   for field in (vendor, product, device_version, device_event_class_id, name)), severity)
+
+
+def escape_cef_value(value):
+    """
+    Escape a CEF extension value
+
+    :param value: The value
+    :type value: Any
+    :return: The escaped value
+    :rtype: String
+    """
+    return str(value).translate(CEF_ESCAPE_TABLE)
+
+
+def format_cef_timestamp(timestamp):
+    """
+    Convert a timestamp in the format of the dtctl output (e.g. 2019-01-01T01:01:01)
+    to the format of the CEF "end" field (e.g. Jan 01 2019 01:01:01)
+
+    :param timestamp: The timestamp
+    :type timestamp: String
+    :return: The CEF timestamp
+    :rtype: String
+    """
+    # fromisoformat is considerably faster than strptime, but also accepts other formats
+    if len(timestamp) == 19 and timestamp[10] == 'T':
+        try:
+            return dt.fromisoformat(timestamp).strftime(CEF_TIMESTAMP_FORMAT)
+        except ValueError:
+            pass
+    return dt.strptime(timestamp, '%Y-%m-%dT%H:%M:%S').strftime(CEF_TIMESTAMP_FORMAT)
@@ -1,4 +1,5 @@
 """Utility classes for extending click functionality"""
+import importlib
 import click
 
 
@@ -26,3 +27,40 @@ class OptionMutex(click.Option):
                                            + str(mutex_opt) + '".')
                 self.prompt = None
         return super(OptionMutex, self).handle_parse_result(ctx, opts, args)
+
+
+class LazyGroup(click.Group):
+    """
+    Command group that imports the modules of its subcommands only when a subcommand is used.
+    This keeps the startup time of dtctl independent of the dependencies of all other commands.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Create LazyGroup object
+
+        :param lazy_subcommands: Subcommand names mapped to the import path of their command,
+                                 e.g. {'list': 'dtctl.breaches.commands.list_breaches'}
+        :type lazy_subcommands: Dict
+        """
+        self.lazy_subcommands: dict = kwargs.pop('lazy_subcommands', {})
+        super(LazyGroup, self).__init__(*args, **kwargs)
+
+    def list_commands(self, ctx):
+        """List the names of both eagerly registered and lazy subcommands"""
+        return sorted(set(super(LazyGroup, self).list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx, cmd_name):
+        """Return a subcommand, importing its module if it is a lazy subcommand"""
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            self.add_command(self._load_command(cmd_name), cmd_name)
+        return super(LazyGroup, self).get_command(ctx, cmd_name)
+
+    def _load_command(self, cmd_name):
+        module_name, command_name = self.lazy_subcommands[cmd_name].rsplit('.', 1)
+        command = getattr(importlib.import_module(module_name), command_name)
+
+        if not isinstance(command, click.BaseCommand):
+            raise ValueError('Lazy subcommand "{0}" does not refer to a click command: {1}'.format(
+                cmd_name, self.lazy_subcommands[cmd_name]))
+        return command
@@ -1,13 +1,45 @@
 """Common functions for cryptography"""
 from base64 import b64encode, b64decode
 import click
-from Cryptodome.Cipher import AES
-from Cryptodome.Util import Padding
-from Cryptodome.Protocol.KDF import PBKDF2
-from Cryptodome.Random import get_random_bytes
 
+# Key derivation functions for encrypting new data and their default cost (iterations for PBKDF2, N for scrypt).
+# Data encrypted before KDFs were configurable has no KDF prefix and uses PBKDF2-HMAC-SHA1 with 1000 iterations.
+KDFS = ('pbkdf2-sha256', 'scrypt')
+DEFAULT_KDF = 'pbkdf2-sha256'
+DEFAULT_KDF_COSTS = {'pbkdf2-sha256': 600000, 'scrypt': 2 ** 17}
 
-def encrypt(pass_phrase, data):
+
+def derive_key(pass_phrase, salt, kdf=None, cost=None):
+    """
+    Derive an encryption key from a pass phrase
+
+    :param pass_phrase: Pass phrase to derive the key from
+    :type pass_phrase: String
+    :param salt: Random salt
+    :type salt: Bytes
+    :param kdf: Key derivation function, one of KDFS or None for the legacy key derivation
+    :type kdf: String
+    :param cost: Cost of the key derivation, None for the default cost of the KDF
+    :type cost: Int
+    :return: AES-256 key, or an AES-128 key for the legacy key derivation
+    :rtype: Bytes
+    """
+    from Cryptodome.Hash import SHA256
+    from Cryptodome.Protocol.KDF import PBKDF2, scrypt
+
+    if kdf is None:
+        return PBKDF2(pass_phrase, salt)
+
+    if kdf not in KDFS:
+        raise click.UsageError('Unsupported key derivation function: {0}'.format(kdf))
+
+    cost = cost or DEFAULT_KDF_COSTS[kdf]
+    if kdf == 'scrypt':
+        return scrypt(pass_phrase, salt, 32, N=cost, r=8, p=1)
+    return PBKDF2(pass_phrase, salt, 32, count=cost, hmac_hash_module=SHA256)
+
+
+def encrypt(pass_phrase, data, kdf=DEFAULT_KDF, cost=None):
     """
     Encrypt data using a pass phrase
 
@@ -15,13 +47,21 @@ def encrypt(pass_phrase, data):
     :type pass_phrase: String
     :param data: Data to encrypt
     :type data: String
-    :return: Formatted string that contains salt, iv and encrypted message
+    :param kdf: Key derivation function, one of KDFS
+    :type kdf: String
+    :param cost: Cost of the key derivation, None for the default cost of the KDF
+    :type cost: Int
+    :return: Formatted string that contains the KDF, its cost, salt, iv and encrypted message
     :rtype: String
     """
+    from Cryptodome.Cipher import AES
+    from Cryptodome.Util import Padding
+    from Cryptodome.Random import get_random_bytes
     mode = AES.MODE_CBC
     block_size = AES.block_size
-    salt = get_random_bytes(8)
-    key = PBKDF2(pass_phrase, salt)
+    cost = cost or DEFAULT_KDF_COSTS.get(kdf)
+    salt = get_random_bytes(16)
+    key = derive_key(pass_phrase, salt, kdf, cost)
     body = Padding.pad(data.encode('utf-8'), block_size)
     initialization_vector = get_random_bytes(16)
 
@@ -32,7 +72,7 @@ def encrypt(pass_phrase, data):
     initialization_vector = b64encode(initialization_vector).decode('utf-8')
     body = b64encode(cipher.encrypt(body)).decode('utf-8')
 
-    return '{0}.{1}.{2}'.format(salt, initialization_vector, body)
+    return '{0}${1:d}${2}.{3}.{4}'.format(kdf, cost, salt, initialization_vector, body)
 
 
 def decrypt(pass_phrase, cipher_text):
@@ -46,15 +86,22 @@ def decrypt(pass_phrase, cipher_text):
     :return: Decrypted data
     :rtype: String
     """
+    from Cryptodome.Cipher import AES
+    from Cryptodome.Util import Padding
     mode = AES.MODE_CBC
     block_size = AES.block_size
+
+    kdf, cost = None, None
+    if '$' in cipher_text:
+        kdf, cost, cipher_text = cipher_text.split('$')
+        cost = int(cost)
     salt, initialization_vector, body = cipher_text.split('.')
 
     body = b64decode(body.encode('utf-8'))
     initialization_vector = b64decode(initialization_vector.encode('utf-8'))
     salt = b64decode(salt.encode('utf-8'))
 
-    key = PBKDF2(pass_phrase, salt)
+    key = derive_key(pass_phrase, salt, kdf, cost)
     cipher = AES.new(key, mode, initialization_vector)
 
     try:
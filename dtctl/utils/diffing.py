@@ -0,0 +1,192 @@
+"""Structural differences between JSON documents"""
+import json
+from bisect import bisect_left
+
+# Minimal fraction of equal top-level keys for two unequal items to be considered versions of each other
+MIN_SIMILARITY = 0.5
+
+
+def diff_values(old, new, path=''):
+    """
+    Determine the differences between two JSON values. Dicts are compared key by key and
+    lists of equal length element by element. Other values are compared as a whole.
+    The values are not modified.
+
+    :param old: The old value
+    :type old: Any
+    :param new: The new value
+    :type new: Any
+    :param path: Path of the values within their documents
+    :type path: String
+    :return: Changes with the change type ("added", "removed" or "changed"), path and old and/or new value
+    :rtype: List
+    """
+    changes = []
+    _diff_values(old, new, path, changes)
+    return changes
+
+
+def _diff_values(old, new, path, changes):
+    if old == new:
+        return
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(old.keys() - new.keys(), key=str):
+            changes.append({'change': 'removed', 'path': join_path(path, key), 'old': old[key]})
+
+        for key in sorted(new.keys() - old.keys(), key=str):
+            changes.append({'change': 'added', 'path': join_path(path, key), 'new': new[key]})
+
+        for key in sorted(old.keys() & new.keys(), key=str):
+            _diff_values(old[key], new[key], join_path(path, key), changes)
+        return
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            _diff_values(old_item, new_item, join_path(path, index), changes)
+        return
+
+    changes.append({'change': 'changed', 'path': path, 'old': old, 'new': new})
+
+
+def join_path(path, key):
+    """
+    Append a dict key or list index to a path
+
+    :param path: Path of the parent value
+    :type path: String
+    :param key: Dict key or list index
+    :type key: String or Int
+    :return: Path of the child value
+    :rtype: String
+    """
+    return '{0}.{1}'.format(path, key) if path else str(key)
+
+
+def content_key(document):
+    """
+    Canonical representation of the content of a JSON document. Documents with equal content
+    have equal keys, regardless of the order of their dict keys.
+
+    :param document: JSON document
+    :type document: Any
+    :return: Content key
+    :rtype: String
+    """
+    return json.dumps(document, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def similarity(old, new):
+    """
+    Fraction of top-level keys that two dicts have in common with equal values
+
+    :param old: The old dict
+    :type old: Dict
+    :param new: The new dict
+    :type new: Dict
+    :return: Similarity between 0.0 and 1.0
+    :rtype: Float
+    """
+    keys = old.keys() | new.keys()
+    if not keys:
+        return 1.0
+    return sum(1 for key in keys if key in old and key in new and old[key] == new[key]) / len(keys)
+
+
+def match_items(old_items, new_items, identity=None):
+    """
+    Match the items of two lists of dicts. Items are matched on their identity key first, then
+    on equal content and finally on similarity of their content.
+
+    :param old_items: Items of the old version
+    :type old_items: List
+    :param new_items: Items of the new version
+    :type new_items: List
+    :param identity: Key that identifies an item across versions, if the items have one
+    :type identity: String
+    :return: Pairs of matched (old index, new index), unmatched old indexes and unmatched new indexes
+    :rtype: Tuple
+    """
+    pairs = []
+    unmatched_old = list(range(len(old_items)))
+    unmatched_new = set(range(len(new_items)))
+
+    if identity:
+        new_by_identity = {}
+        for index, item in enumerate(new_items):
+            new_by_identity.setdefault(item.get(identity), index)
+
+        remaining = []
+        for old_index in unmatched_old:
+            new_index = new_by_identity.get(old_items[old_index].get(identity))
+            if new_index is not None and new_index in unmatched_new:
+                pairs.append((old_index, new_index))
+                unmatched_new.discard(new_index)
+            else:
+                remaining.append(old_index)
+        unmatched_old = remaining
+
+    new_by_content = {}
+    for new_index in sorted(unmatched_new):
+        new_by_content.setdefault(content_key(new_items[new_index]), []).append(new_index)
+
+    remaining = []
+    for old_index in unmatched_old:
+        candidates = new_by_content.get(content_key(old_items[old_index]))
+        if candidates:
+            new_index = candidates.pop(0)
+            pairs.append((old_index, new_index))
+            unmatched_new.discard(new_index)
+        else:
+            remaining.append(old_index)
+    unmatched_old = remaining
+
+    remaining = []
+    for old_index in unmatched_old:
+        best_index, best_similarity = None, 0.0
+        for new_index in sorted(unmatched_new):
+            item_similarity = similarity(old_items[old_index], new_items[new_index])
+            if item_similarity >= MIN_SIMILARITY and item_similarity > best_similarity:
+                best_index, best_similarity = new_index, item_similarity
+
+        if best_index is None:
+            remaining.append(old_index)
+        else:
+            pairs.append((old_index, best_index))
+            unmatched_new.discard(best_index)
+
+    return sorted(pairs), remaining, sorted(unmatched_new)
+
+
+def find_reordered(pairs):
+    """
+    Determine which matched items moved. The items that keep their relative order form the longest
+    increasing sequence of new indexes; all other matched items are considered reordered.
+
+    :param pairs: Pairs of matched (old index, new index), sorted on old index
+    :type pairs: List
+    :return: Pairs of the reordered items
+    :rtype: List
+    """
+    # Patience sorting for the longest increasing subsequence of new indexes
+    tails = []
+    tail_positions = []
+    predecessors = [None] * len(pairs)
+
+    for position, (_, new_index) in enumerate(pairs):
+        length = bisect_left(tails, new_index)
+        if length == len(tails):
+            tails.append(new_index)
+            tail_positions.append(position)
+        else:
+            tails[length] = new_index
+            tail_positions[length] = position
+        predecessors[position] = tail_positions[length - 1] if length else None
+
+    in_order = set()
+    position = tail_positions[-1] if tail_positions else None
+    while position is not None:
+        in_order.add(position)
+        position = predecessors[position]
+
+    return [pair for position, pair in enumerate(pairs) if position not in in_order]
@@ -1,10 +1,12 @@
 """Common functions for output related requirements"""
+import sys
 import json
+import click
 
 
-def process_output(output, outfile, append=False, to_json=True):
+def process_output(output, outfile, append=False, to_json=True, syslog=None, spool_dir=None):
     """
-    Output a Python object (Dict or List) to stdout or file
+    Output a Python object (Dict or List) to stdout or file, or line based output to a syslog server
 
     :param output: The data to output
     :type output: Dict or List
@@ -14,15 +16,28 @@ def process_output(output, outfile, append=False, to_json=True):
     :type append: Boolean
     :param to_json: Flag for outputting in json
     :type append: Boolean
+    :param syslog: URL of a syslog server to send line based output to, e.g. tcp://siem.local:601
+    :type syslog: String
+    :param spool_dir: Directory of the spool files of syslog servers that are down, None to not spool
+    :type spool_dir: String
     :return: None
     :rtype: None
     """
+    if syslog and to_json:
+        raise click.UsageError('Only line based output (--log or --cef) can be sent to a syslog server')
+
     if not output:
         # We raise it as SystemExit instead of click.UsageError
         # because it is not necessarily an error to not have output
         # however, we do want an exit code != 0
         raise SystemExit('No output to write or display')
 
+    if syslog:
+        from dtctl.utils.sinks import open_sink
+        with open_sink(syslog_url=syslog, spool_dir=spool_dir) as sink:
+            sink.write_lines(str(line).rstrip('\n') for line in output)
+        return
+
     # Process the output for when an outfile is specified
     if outfile:
         file_mode = 'a' if append else 'w'
@@ -45,3 +60,32 @@ def process_output(output, outfile, append=False, to_json=True):
             print(str(item).strip())
     else:
         print(output)
+
+
+def process_output_lines(output, outfile, append=False):
+    """
+    Output Python objects as JSON lines (one compact JSON object per line) to stdout or file.
+    Objects are written as they are produced, so iterators are never fully held in memory.
+
+    :param output: The objects to output
+    :type output: Iterable
+    :param outfile: The file to write the output to
+    :type outfile: String
+    :param append: Flag for appending to file
+    :type append: Boolean
+    :return: None
+    :rtype: None
+    """
+    ofile = open(outfile, 'a' if append else 'w') if outfile else sys.stdout
+    written = 0
+
+    try:
+        for item in output:
+            ofile.write(json.dumps(item, sort_keys=bool(outfile)) + '\n')
+            written += 1
+    finally:
+        if outfile:
+            ofile.close()
+
+    if not written:
+        raise SystemExit('No output to write or display')
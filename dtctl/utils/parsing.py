@@ -1,8 +1,12 @@
 """Common functions for parsing and conversion requirements"""
 import json
+from json.encoder import encode_basestring_ascii
 
+INFINITY = float('inf')
+NESTED_TYPES = (list, tuple, dict, set, frozenset)
 
-def convert_json_to_log_lines(output, timestamp_key='timestamp', system_key='system'):
+
+def convert_json_to_log_lines(output, timestamp_key='timestamp', system_key='system', flatten=False):
     """
     Function to convert a list of JSON objects to a list containing log lines
 
@@ -12,27 +16,136 @@ def convert_json_to_log_lines(output, timestamp_key='timestamp', system_key='sys
     :type timestamp_key: String
     :param system_key: The dictionary key that holds the identifier for the system generating the log line
     :type system_key: String
+    :param flatten: Flatten nested objects to dotted keys instead of raising a TypeError
+    :type flatten: Boolean
     :return: JSON object converted to separate log lines
     :rtype: List
     """
+    if not isinstance(output, list):
+        raise TypeError('Not a list')
+
+    return list(iter_log_lines(output, timestamp_key, system_key, flatten))
+
+
+def iter_log_lines(records, timestamp_key='timestamp', system_key='system', flatten=False):
+    """
+    Convert JSON objects to log lines one at a time. The records are not modified.
+
+    Records of the same collector have the same keys, so the " key=" prefixes of the fields are
+    built once per key order and values are encoded by their type, falling back to json.dumps.
+
+    :param records: Flat JSON objects (dicts within python)
+    :type records: Iterable
+    :param timestamp_key: The dictionary key that holds timestamp information
+    :type timestamp_key: String
+    :param system_key: The dictionary key that holds the identifier for the system generating the log line
+    :type system_key: String
+    :param flatten: Flatten nested objects to dotted keys (e.g. "dhcp.failing=1" or "ips.0="10.0.0.1"")
+                    instead of raising a TypeError
+    :type flatten: Boolean
+    :return: Log lines
+    :rtype: Iterator
+    """
     # Example of our goal log line
     # [2019-01-01T00:00:00.123456] system key1=value key2=value keyN=value
+    key_orders = {}
 
-    if not isinstance(output, list):
-        raise TypeError('Not a list')
+    for record in records:
+        keys = tuple(record)
+        fields = key_orders.get(keys)
+        if fields is None:
+            fields = [(key, ' {0}='.format(key)) for key in keys if key not in (timestamp_key, system_key)]
+            key_orders[keys] = fields
 
-    log_lines = []
-    for line in output:
-        timestamp = line.pop(timestamp_key)
-        system_name = line.pop(system_key)
-        message = ''
-        for key, value in line.items():
-            if isinstance(value, (list, dict, set)):
+        message = []
+        for key, prefix in fields:
+            value = record[key]
+            encode = SCALAR_ENCODERS.get(value.__class__)
+            if encode is not None:
+                message.append(prefix + encode(value))
+            elif flatten and isinstance(value, NESTED_TYPES):
+                message.extend(' {0}={1}'.format(nested_key, encode_value(nested_value))
+                               for nested_key, nested_value in flatten_value(key, value))
+            elif isinstance(value, (list, dict, set)):
                 raise TypeError('Nested objects are not supported')
-            message += ' {0}={1}'.format(key, json.dumps(value))
+            else:
+                message.append(prefix + json.dumps(value))
+
+        yield '[{0}] {1}{2}\n'.format(record[timestamp_key], record[system_key], ''.join(message))
+
+
+def encode_float(value):
+    """
+    Encode a float the way json.dumps does, including NaN and Infinity
+
+    :param value: The value
+    :type value: Float
+    :return: The encoded value
+    :rtype: String
+    """
+    if value != value:  # pylint: disable=R0124
+        return 'NaN'
+    if value == INFINITY:
+        return 'Infinity'
+    if value == -INFINITY:
+        return '-Infinity'
+    return float.__repr__(value)
+
+
+# Encoders of the exact types of JSON scalars, producing the same text as json.dumps
+SCALAR_ENCODERS = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    float: encode_float,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null'
+}
+
+
+def encode_value(value):
+    """
+    Encode a scalar value the way json.dumps does
+
+    :param value: The value
+    :type value: Any
+    :return: The encoded value
+    :rtype: String
+    """
+    encode = SCALAR_ENCODERS.get(value.__class__)
+    if encode is not None:
+        return encode(value)
+    return json.dumps(value)
+
+
+def flatten_value(key, value):
+    """
+    Flatten a nested object to (dotted key, scalar value) pairs. Empty objects are kept as value.
+
+    :param key: Key of the object
+    :type key: String
+    :param value: The object
+    :type value: Dict, List or Set
+    :return: Pairs of keys and values
+    :rtype: Iterator
+    """
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, (set, frozenset)):
+        items = enumerate(sorted(value, key=str))
+    else:
+        items = enumerate(value)
+
+    empty = True
+    for nested_key, nested_value in items:
+        empty = False
+        nested_key = '{0}.{1}'.format(key, nested_key)
+        if isinstance(nested_value, NESTED_TYPES):
+            yield from flatten_value(nested_key, nested_value)
+        else:
+            yield nested_key, nested_value
 
-        log_lines.append('[{ts}] {system}{message}\n'.format(ts=timestamp, system=system_name, message=message))
-    return log_lines
+    if empty:
+        yield key, {} if isinstance(value, dict) else []
 
 
 def convert_series(series_to_convert):
@@ -1,14 +1,11 @@
 # pylint: disable=W0212
 """Common functions for reporting requirements"""
+import json
 import click
-import openpyxl
-import openpyxl.utils
-from openpyxl import styles
-from openpyxl import load_workbook
-from openpyxl.worksheet import table
 
 
 TABLE_NAME = 'RawDataTable'
+EXPORT_FORMATS = ('xlsx', 'parquet', 'csv')
 
 
 def format_report(breaches_df, output_file, template, output_format):
@@ -24,6 +21,9 @@ def format_report(breaches_df, output_file, template, output_format):
     :param output_format: The output format. Does not work in combination with template if CSV is given
     :return: None
     """
+    import openpyxl.utils
+    from openpyxl import styles
+    from openpyxl import load_workbook
     # If format is CSV, we use pandas CSV function to output CSV file and return
     if output_format == 'csv':
         breaches_df.to_csv(output_file)
@@ -87,6 +87,37 @@ def format_report(breaches_df, output_file, template, output_format):
     return None
 
 
+def export_frame(frame, output_file, output_format):
+    """
+    Write a Pandas DataFrame to a file. Lists and dicts in the DataFrame are written as JSON.
+
+    :param frame: The DataFrame to write
+    :type frame: DataFrame
+    :param output_file: Filename in String where the DataFrame should be saved to
+    :type output_file: String
+    :param output_format: The output format: xlsx, parquet or csv
+    :type output_format: String
+    :return: None
+    """
+    frame = frame.copy()
+    for column in frame.columns[frame.dtypes == object]:
+        if frame[column].map(lambda value: isinstance(value, (list, dict))).any():
+            frame[column] = frame[column].map(
+                lambda value: json.dumps(value, sort_keys=True) if isinstance(value, (list, dict)) else value
+            )
+
+    if output_format == 'parquet':
+        try:
+            frame.to_parquet(output_file, index=False)
+        except ImportError:
+            raise click.UsageError('Parquet output requires the pyarrow package\n'
+                                   '# Please install it first: pip install pyarrow')
+    elif output_format == 'csv':
+        frame.to_csv(output_file, index=False)
+    else:
+        frame.to_excel(output_file, index=False)
+
+
 def set_auto_size_columns(work_sheet):
     """
     Configure width for all columns in a worksheet. Workaround for the lack of
@@ -95,6 +126,7 @@ def set_auto_size_columns(work_sheet):
     :param work_sheet: Worksheet for which to configure column width
     :return: None
     """
+    import openpyxl.utils
     for col in work_sheet.columns:
         max_length = 0
         column = col[0].column  # Get the column name
@@ -117,6 +149,7 @@ def set_table(column_letter, length_of_table):
     :param length_of_table: the final row for data range of table
     :return: Table: Returns an openpyxl Excel table with style and ranges configured.
     """
+    from openpyxl.worksheet import table
     # Set generic table style
     style = table.TableStyleInfo(name="TableStyleLight8", showFirstColumn=False,
                                  showLastColumn=False, showRowStripes=True, showColumnStripes=True)
@@ -0,0 +1,492 @@
+"""Destinations for streaming log lines: files, stdout and syslog servers over UDP, TCP or TLS"""
+import os
+import re
+import sys
+import time
+import queue
+import socket
+import threading
+import datetime as dt
+from urllib.parse import urlsplit
+import click
+
+DEFAULT_BATCH_SIZE = 500
+# Nr of batches a syslog sink holds while its socket is busy, after which writing blocks
+DEFAULT_QUEUE_SIZE = 8
+SYSLOG_PORTS = {'udp': 514, 'tcp': 514, 'tls': 6514}
+SYSLOG_CACERT_ENV = 'DTCTL_SYSLOG_CACERT'
+# Facility "user" and severity "informational"
+SYSLOG_PRIORITY = 1 * 8 + 6
+SOCKET_TIMEOUT = 10.0
+# Seconds in between attempts to reach a syslog server that is down. Messages are spooled meanwhile.
+RECONNECT_INTERVAL = 5.0
+DEFAULT_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+
+
+class Sink:
+    """
+    Destination for log lines. Lines are collected in batches, which are sent as a whole,
+    so the cost of a write (system call, socket send) is shared by all lines of a batch.
+    Subclasses implement send.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Create the sink
+
+        :param batch_size: Nr of lines that are sent at once
+        :type batch_size: Int
+        """
+        self.batch_size = batch_size
+        self.batch = []
+        self.written = 0
+
+    def write(self, line):
+        """
+        Write a log line. The line is sent when its batch is full or the sink is flushed.
+
+        :param line: Log line without line ending
+        :type line: String
+        :return: None
+        """
+        self.batch.append(line)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def write_lines(self, lines):
+        """
+        Write all log lines of an iterable
+
+        :param lines: Log lines without line endings
+        :type lines: Iterable
+        :return: Nr of lines written
+        :rtype: Int
+        """
+        written = self.written
+        for line in lines:
+            self.write(line)
+        self.flush()
+        return self.written - written
+
+    def flush(self):
+        """
+        Send the lines that have been written
+
+        :return: None
+        """
+        if self.batch:
+            batch, self.batch = self.batch, []
+            self.send(batch)
+            self.written += len(batch)
+
+    def send(self, lines):
+        """
+        Send a batch of log lines
+
+        :param lines: Log lines without line endings
+        :type lines: List
+        :return: None
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Send the remaining lines and release the destination
+
+        :return: None
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not mask the original error with errors of sending the remaining lines
+            self.batch = []
+            try:
+                self.close()
+            except (SystemExit, OSError):
+                pass
+
+
+class StreamSink(Sink):
+    """Writes newline terminated log lines to a file or stdout"""
+
+    def __init__(self, outfile=None, append=False, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Create the sink
+
+        :param outfile: Path to the output file, None for stdout
+        :type outfile: String
+        :param append: Append to the output file instead of overwriting it
+        :type append: Boolean
+        :param batch_size: Nr of lines that are written at once
+        :type batch_size: Int
+        """
+        super(StreamSink, self).__init__(batch_size)
+        self.outfile = outfile
+        self.stream = open(outfile, 'a' if append else 'w') if outfile else sys.stdout
+
+    def send(self, lines):
+        """Write a batch of log lines"""
+        self.stream.write('\n'.join(lines) + '\n')
+
+    def close(self):
+        """Write the remaining lines and close the output file"""
+        try:
+            super(StreamSink, self).close()
+        finally:
+            if self.outfile:
+                self.stream.close()
+            else:
+                self.stream.flush()
+
+
+class SyslogSink(Sink):
+    """
+    Sends log lines as RFC 5424 syslog messages over UDP (one datagram per message) or over TCP or
+    TLS (octet counting framing, RFC 6587 and RFC 5425). The connection is kept open for all batches.
+
+    Batches are sent by a writer thread, so formatting the next batch continues while the previous
+    batch is sent. The queue of the writer holds a limited nr of batches: when the server does not
+    keep up, write blocks until the writer has sent a batch (backpressure).
+
+    With a spool file, messages that cannot be sent because the server is down are appended to the
+    spool file instead of failing, and the server is retried every RECONNECT_INTERVAL seconds. The
+    spool is replayed when the server can be reached again, before any new messages. Messages
+    are delivered at least once: a replay that fails halfway is repeated in full.
+    """
+
+    def __init__(self, url, batch_size=DEFAULT_BATCH_SIZE, spool_file=None, cacert=None, msgid=None,
+                 queue_size=DEFAULT_QUEUE_SIZE, spool_max_bytes=DEFAULT_SPOOL_MAX_BYTES):
+        """
+        Create the sink and connect to the syslog server
+
+        :param url: URL of the syslog server, see parse_syslog_url
+        :type url: String
+        :param batch_size: Nr of lines that are sent at once
+        :type batch_size: Int
+        :param spool_file: Path to the spool file, None to fail when the server is down
+        :type spool_file: String
+        :param cacert: Full path to the CA certificate of TLS servers, None for the CAs of the system
+        :type cacert: String
+        :param msgid: Syslog MSGID of the messages, e.g. CEF
+        :type msgid: String
+        :param queue_size: Nr of batches that are held while the socket is busy
+        :type queue_size: Int
+        :param spool_max_bytes: Maximum size of the spool file
+        :type spool_max_bytes: Int
+        """
+        super(SyslogSink, self).__init__(batch_size)
+        self.protocol, self.host, self.port = parse_syslog_url(url)
+        self.url = url
+        self.spool_file = spool_file
+        self.spool_max_bytes = spool_max_bytes
+        self.cacert = cacert
+        self.socket = None
+        self.next_connect = 0.0
+        self.spooled = 0
+        self.error = None
+
+        # Everything but the timestamp of the message header is the same for all messages
+        hostname = re.sub(r'[^!-~]', '_', socket.gethostname())[:255] or '-'
+        self.header = ' {0} dtctl {1} {2} - '.format(hostname, os.getpid(), msgid or '-')
+
+        try:
+            self.connect()
+        except OSError as err:
+            if not spool_file:
+                raise SystemExit('Error: Failed connecting to {0}: {1}'.format(self.url, err))
+            self.next_connect = time.monotonic() + RECONNECT_INTERVAL
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run, name='dtctl-syslog-sink', daemon=True)
+        self.thread.start()
+
+    def connect(self):
+        """
+        Connect to the syslog server
+
+        :return: None
+        """
+        self.disconnect()
+
+        if self.protocol == 'udp':
+            family, _, _, _, address = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_DGRAM)[0]
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            try:
+                sock.connect(address)
+            except OSError:
+                sock.close()
+                raise
+        else:
+            sock = socket.create_connection((self.host, self.port), timeout=SOCKET_TIMEOUT)
+
+        if self.protocol == 'tls':
+            import ssl
+            try:
+                context = ssl.create_default_context(cafile=self.cacert)
+                sock = context.wrap_socket(sock, server_hostname=self.host)
+            except (OSError, ValueError):
+                sock.close()
+                raise
+
+        self.socket = sock
+
+    def disconnect(self):
+        """
+        Close the connection to the syslog server
+
+        :return: None
+        """
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+
+    def send(self, lines):
+        """Queue a batch of log lines as syslog messages for the writer thread, blocks while the queue is full"""
+        self.check_error()
+
+        timestamp = dt.datetime.utcnow().isoformat('T', 'milliseconds') + 'Z'
+        prefix = '<{0}>1 {1}{2}'.format(SYSLOG_PRIORITY, timestamp, self.header)
+        self.queue.put([(prefix + line).encode('utf-8') for line in lines])
+
+    def run(self):
+        """
+        Deliver the queued batches until the sink is closed
+
+        :return: None
+        """
+        while True:
+            messages = self.queue.get()
+            if messages is None:
+                return
+
+            if self.error is None:
+                try:
+                    self.deliver(messages)
+                except SystemExit as err:
+                    # Remaining batches are discarded, the error is raised by the next write
+                    self.error = err
+
+    def deliver(self, messages, retry=True):
+        """
+        Send messages, after the messages in the spool. Messages that cannot be sent are spooled.
+
+        :param messages: Syslog messages
+        :type messages: List
+        :param retry: Reconnect and retry once if an open connection fails
+        :type retry: Boolean
+        :return: None
+        """
+        reused = self.socket is not None
+        try:
+            if self.socket is None:
+                if time.monotonic() < self.next_connect:
+                    raise ConnectionError('waiting to reconnect')
+                self.connect()
+            self.replay_spool()
+            self.transmit(messages)
+            return
+        except OSError as err:
+            self.disconnect()
+            if reused and retry:
+                # The server may have closed the connection after the previous batch
+                self.deliver(messages, retry=False)
+                return
+            self.next_connect = time.monotonic() + RECONNECT_INTERVAL
+            if not self.spool_file:
+                raise SystemExit('Error: Failed sending to {0}: {1}'.format(self.url, err))
+
+        self.spool(messages)
+
+    def transmit(self, messages):
+        """
+        Send messages over the current connection
+
+        :param messages: Syslog messages
+        :type messages: List
+        :return: None
+        """
+        if self.protocol == 'udp':
+            send = self.socket.send
+            for message in messages:
+                send(message)
+        else:
+            self.socket.sendall(frame_messages(messages))
+
+    def spool(self, messages):
+        """
+        Append messages to the spool file
+
+        :param messages: Syslog messages
+        :type messages: List
+        :return: None
+        """
+        data = frame_messages(messages)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_file)), exist_ok=True)
+            if os.path.exists(self.spool_file) and \
+                    os.path.getsize(self.spool_file) + len(data) > self.spool_max_bytes:
+                raise SystemExit('Error: {0} is unreachable and spool file {1} is full'.format(
+                    self.url, self.spool_file))
+            with open(self.spool_file, 'ab') as outfile:
+                outfile.write(data)
+        except OSError as err:
+            raise SystemExit('Error: Failed writing spool file {0}: {1}'.format(self.spool_file, err))
+        self.spooled += len(messages)
+
+    def replay_spool(self):
+        """
+        Send the messages in the spool file. The spool file is moved aside first, so messages
+        that are spooled meanwhile (e.g. by another dtctl process) are not lost. A replay file
+        that is left behind by a failed replay is replayed first.
+
+        :return: None
+        """
+        if not self.spool_file:
+            return
+
+        replay_file = self.spool_file + '.replay'
+        if not os.path.exists(replay_file):
+            if not os.path.exists(self.spool_file):
+                return
+            os.replace(self.spool_file, replay_file)
+
+        messages = list(read_spool(replay_file))
+        for index in range(0, len(messages), self.batch_size):
+            self.transmit(messages[index:index + self.batch_size])
+        os.remove(replay_file)
+
+        # Messages that were spooled while replaying
+        self.replay_spool()
+
+    def check_error(self):
+        """
+        Raise the error of the writer thread, if sending failed
+
+        :return: None
+        """
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """Send the remaining lines, wait for the writer thread and close the connection"""
+        try:
+            super(SyslogSink, self).close()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
+            self.disconnect()
+
+        if self.spooled:
+            click.echo('{0} is unreachable, {1} messages were spooled to {2} and are sent when it can be '
+                       'reached again'.format(self.url, self.spooled, self.spool_file), err=True)
+        self.check_error()
+
+
+def frame_messages(messages):
+    """
+    Frame syslog messages with octet counting (RFC 6587)
+
+    :param messages: Syslog messages
+    :type messages: List
+    :return: Framed messages
+    :rtype: Bytes
+    """
+    return b''.join(b'%d %s' % (len(message), message) for message in messages)
+
+
+def read_spool(spool_file):
+    """
+    Read the messages of a spool file. A message that was partially written
+    (e.g. when dtctl was killed) ends the spool.
+
+    :param spool_file: Path to the spool file
+    :type spool_file: String
+    :return: Syslog messages
+    :rtype: Iterator
+    """
+    with open(spool_file, 'rb') as infile:
+        data = infile.read()
+
+    position = 0
+    while position < len(data):
+        separator = data.find(b' ', position)
+        try:
+            length = int(data[position:separator])
+        except ValueError:
+            return
+        if separator < 0 or separator + 1 + length > len(data):
+            return
+        yield data[separator + 1:separator + 1 + length]
+        position = separator + 1 + length
+
+
+def parse_syslog_url(url):
+    """
+    Parse the URL of a syslog server, e.g. udp://siem.local:514, tcp://10.0.0.1:601 or tls://siem.local:6514
+
+    :param url: The URL
+    :type url: String
+    :return: Protocol, host and port
+    :rtype: Tuple
+    """
+    try:
+        parsed = urlsplit(url)
+        port = parsed.port or SYSLOG_PORTS.get(parsed.scheme)
+    except ValueError:
+        raise click.UsageError('Invalid syslog URL: {0}'.format(url))
+
+    if parsed.scheme not in SYSLOG_PORTS or not parsed.hostname:
+        raise click.UsageError('Syslog URL must look like udp://host:port, tcp://host:port or tls://host:port, '
+                               'not: {0}'.format(url))
+
+    return parsed.scheme, parsed.hostname, port
+
+
+def get_spool_file(directory, url):
+    """
+    Location of the spool file of a syslog server: "spool/<protocol>_<host>_<port>.spool" in a directory
+
+    :param directory: The directory, e.g. the directory of the config file
+    :type directory: String
+    :param url: URL of the syslog server
+    :type url: String
+    :return: Path to the spool file
+    :rtype: String
+    """
+    protocol, host, port = parse_syslog_url(url)
+    name = re.sub(r'[^A-Za-z0-9.-]', '_', '{0}_{1}_{2}'.format(protocol, host, port))
+    return os.path.join(directory, 'spool', name + '.spool')
+
+
+def open_sink(outfile=None, syslog_url=None, batch_size=DEFAULT_BATCH_SIZE, append=False, spool_dir=None,
+              msgid=None):
+    """
+    Open the destination of log lines: a syslog server, an output file or stdout. The CA certificate
+    of TLS syslog servers can be given with the DTCTL_SYSLOG_CACERT environment variable.
+
+    :param outfile: Path to the output file
+    :type outfile: String
+    :param syslog_url: URL of a syslog server, see parse_syslog_url
+    :type syslog_url: String
+    :param batch_size: Nr of lines that are sent at once
+    :type batch_size: Int
+    :param append: Append to the output file instead of overwriting it
+    :type append: Boolean
+    :param spool_dir: Directory of the spool files of syslog servers that are down, None to not spool
+    :type spool_dir: String
+    :param msgid: Syslog MSGID of the messages, e.g. CEF
+    :type msgid: String
+    :return: The sink
+    :rtype: Sink
+    """
+    if syslog_url:
+        spool_file = get_spool_file(spool_dir, syslog_url) if spool_dir else None
+        return SyslogSink(syslog_url, batch_size, spool_file, os.environ.get(SYSLOG_CACERT_ENV), msgid)
+
+    return StreamSink(outfile, append, batch_size)
@@ -0,0 +1,106 @@
+"""Filtering of models and model breaches based on their tags"""
+import re
+import glob
+import fnmatch
+
+TAG_FILTER_MODES = ('any', 'all', 'none')
+
+
+class TagFilter:
+    """
+    Matches collections of tags against a set of tag filters. Filters can be literal tags
+    or glob patterns (e.g. "AP: *"). Filters are prepared once, so a single TagFilter can be
+    used efficiently for large numbers of models or breaches.
+    """
+
+    def __init__(self, filters, mode='any', ignore_case=False):
+        """
+        Prepare the tag filters
+
+        :param filters: Literal tags or glob patterns to filter on
+        :type filters: Iterable
+        :param mode: "any" to match when one filter matches, "all" to match when every filter
+                     matches and "none" to match when no filter matches
+        :type mode: String
+        :param ignore_case: Match tags case insensitively
+        :type ignore_case: Boolean
+        """
+        if mode not in TAG_FILTER_MODES:
+            raise ValueError('Unsupported tag filter mode: {0}'.format(mode))
+
+        self.mode = mode
+        self.ignore_case = ignore_case
+
+        filters = frozenset(self._normalize(tag_filter) for tag_filter in filters)
+        self.literals = frozenset(tag_filter for tag_filter in filters if not is_glob(tag_filter))
+        self.patterns = tuple(re.compile(fnmatch.translate(tag_filter)) for tag_filter in filters
+                              if is_glob(tag_filter))
+
+        # All glob patterns combined, so "any" and "none" need a single regex match per tag
+        self.combined_pattern = re.compile('|'.join(pattern.pattern for pattern in self.patterns)) \
+            if self.patterns else None
+
+    def _normalize(self, tag):
+        return tag.lower() if self.ignore_case else tag
+
+    def matches(self, tags):
+        """
+        Check if a collection of tags matches the filters
+
+        :param tags: Tags of a model or breach
+        :type tags: Iterable
+        :return: True if the tags match the filters
+        :rtype: Boolean
+        """
+        tags = frozenset(self._normalize(tag) for tag in tags or ())
+
+        if self.mode == 'all':
+            return self.literals <= tags and \
+                all(any(pattern.match(tag) for tag in tags) for pattern in self.patterns)
+
+        matched = not self.literals.isdisjoint(tags) or \
+            (self.combined_pattern is not None and any(self.combined_pattern.match(tag) for tag in tags))
+
+        return matched if self.mode == 'any' else not matched
+
+    def filter(self, items, get_tags):
+        """
+        Select the items of which the tags match the filters. Every item is returned at most once.
+
+        :param items: Models, breaches or other items to filter
+        :type items: Iterable
+        :param get_tags: Function that returns the tags of an item
+        :type get_tags: Function
+        :return: Matching items in their original order
+        :rtype: List
+        """
+        return [item for item in items if self.matches(get_tags(item))]
+
+
+def is_glob(tag_filter):
+    """
+    Check if a tag filter is a glob pattern rather than a literal tag
+
+    :param tag_filter: Tag filter
+    :type tag_filter: String
+    :return: True if the filter contains glob characters
+    :rtype: Boolean
+    """
+    return any(character in tag_filter for character in '*?[')
+
+
+def substring_filter(tag, mode='any'):
+    """
+    Create a case insensitive filter for tags that contain a string
+
+    :param tag: String to search for in tags
+    :type tag: String
+    :param mode: Tag filter mode
+    :type mode: String
+    :return: Tag filter
+    :rtype: TagFilter
+    """
+    return TagFilter(['*{0}*'.format(glob.escape(tag))], mode=mode, ignore_case=True)
+
+
+ENHANCED_TAG_FILTER = substring_filter('enhanced')
@@ -0,0 +1,108 @@
+"""Local JSON request/response servers on Unix sockets that are only accessible by the current user"""
+import os
+import json
+import socket
+import struct
+import threading
+import socketserver
+
+MAX_REQUEST_SIZE = 65536
+
+
+class JsonLineHandler(socketserver.StreamRequestHandler):
+    """Handles a single request line with a JSON object and writes the JSON response line"""
+
+    def handle(self):
+        """Read a request line and write the response line"""
+        try:
+            request = json.loads(self.rfile.readline(MAX_REQUEST_SIZE).decode('utf-8'))
+            response = self.server.handle_request_dict(request)
+        except (ValueError, AttributeError, KeyError, TypeError):
+            response = {'error': 'Invalid request'}
+
+        self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+        if response.get('stopped'):
+            # Shutting down waits for serve_forever to return, so it cannot be done by the serving thread
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class UserUnixServer(socketserver.UnixStreamServer):
+    """
+    Unix socket server that only accepts connections of processes of the current user. Subclasses
+    implement handle_request_dict, which returns the response to a request. A response with
+    "stopped" set to True stops the server.
+    """
+
+    def __init__(self, socket_path, handler_class=JsonLineHandler):
+        """
+        Create the server and bind its socket with permissions for the current user only
+
+        :param socket_path: Path of the Unix socket
+        :type socket_path: String
+        :param handler_class: Request handler class
+        :type handler_class: Type
+        """
+        previous_umask = os.umask(0o177)
+        try:
+            super(UserUnixServer, self).__init__(socket_path, handler_class)
+        finally:
+            os.umask(previous_umask)
+        os.chmod(socket_path, 0o600)
+
+    def verify_request(self, request, client_address):
+        """Only accept connections of processes of the user running the server"""
+        if not hasattr(socket, 'SO_PEERCRED'):
+            # Rely on the permissions of the socket file
+            return True
+
+        credentials = request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', credentials)
+        return uid == os.getuid()
+
+    def handle_request_dict(self, request):
+        """
+        Execute a request
+
+        :param request: The request
+        :type request: Dict
+        :return: Response
+        :rtype: Dict
+        """
+        raise NotImplementedError
+
+    def server_close(self):
+        """Close and remove the socket"""
+        super(UserUnixServer, self).server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def unix_request(socket_path, request, timeout=None):
+    """
+    Send a JSON request to a server on a Unix socket
+
+    :param socket_path: Path of the Unix socket
+    :type socket_path: String
+    :param request: The request
+    :type request: Dict
+    :param timeout: Seconds to wait for the response, None to wait indefinitely
+    :type timeout: Float
+    :return: Response, or None if no server is listening on the socket
+    :rtype: Dict
+    """
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            client.sendall((json.dumps(request) + '\n').encode('utf-8'))
+            with client.makefile('rb') as response:
+                return json.loads(response.readline().decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
@@ -9,8 +9,12 @@ setup(
     author_email='daan@vynder.io',
     packages=find_packages(),
     package_data={},
-    install_requires=['click', 'requests', 'openpyxl', 'pandas', 'numpy', 'netaddr', 'pycryptodomex', 'dictdiffer'],
+    install_requires=['click', 'requests', 'openpyxl', 'pandas', 'numpy', 'netaddr', 'pycryptodomex'],
+    extras_require={
+        'yaml': ['pyyaml'],
+        'parquet': ['pyarrow']
+    },
     entry_points={
-        'console_scripts': ['dtctl = dtctl.cli:cli']
+        'console_scripts': ['dtctl = dtctl.cli:main']
     }
 )
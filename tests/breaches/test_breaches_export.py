@@ -0,0 +1,131 @@
+import json
+from unittest.mock import patch
+import pytest
+from click.testing import CliRunner
+from dtctl.cli import cli
+from dtctl.breaches.export import BreachFormatter, get_breach_fields, export_breaches
+from dtctl.utils.sinks import StreamSink
+
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def triggered_components():
+    with open('tests/data/triggered_components.json') as infile:
+        return json.load(infile)
+
+
+@pytest.fixture
+def breach(triggered_components):
+    return {
+        'pbid': 123,
+        'time': 1546304461123,
+        'score': 0.874,
+        'model': {'pid': 42, 'name': 'Device::Anomalous|Connection', 'tags': ['AP: C2', 'Enhanced']},
+        'breachUrl': 'https://darktrace/#modelbreach/123',
+        'triggeredComponents': triggered_components[0]
+    }
+
+
+def test_get_breach_fields(triggered_components, breach):
+    fields = get_breach_fields(breach)
+
+    assert fields['severity'] == 9
+    assert fields['device_id'] == 1000000000001
+    assert fields['device_hostname'] == 'host1.name.local'
+    assert fields['destination_hostname'] == 'destination.hostname.test'
+    assert fields['destination_ip'] == ''
+
+    fields = get_breach_fields(dict(breach, triggeredComponents=triggered_components[1]))
+    assert (fields['device_ip'], fields['destination_ip']) == ('10.0.0.2', '10.0.0.1')
+
+    fields = get_breach_fields(dict(breach, triggeredComponents=triggered_components[2]))
+    assert (fields['device_id'], fields['message']) == (None, 'Destination message')
+
+    # Minimal breaches have a device instead of triggeredComponents
+    fields = get_breach_fields({'pbid': 1, 'time': 0, 'device': {'did': 5, 'ip': '10.0.0.5'}})
+    assert (fields['device_id'], fields['device_ip'], fields['severity'], fields['pid']) == (5, '10.0.0.5', 0, '')
+
+
+def test_format_cef(breach):
+    event = BreachFormatter('cef').format(breach)
+
+    assert event == 'CEF:0|Darktrace|DCIP Model Breaches|1.0|42|Device::Anomalous\\|Connection|9|' \
+                    'rt=1546304461123 externalId=123 shost=host1.name.local dhost=destination.hostname.test ' \
+                    'cfp1Label=score cfp1=0.874 cn1Label=deviceId cn1=1000000000001 cs1Label=tags ' \
+                    'cs1=AP: C2,Enhanced cs2Label=breachUrl cs2=https://darktrace/#modelbreach/123'
+
+
+def test_format_cef_escapes_values(breach, triggered_components):
+    triggered_components[2][0]['triggeredFilters'][0]['trigger']['value'] = 'a=b\\c\nd'
+    event = BreachFormatter('cef').format(dict(breach, triggeredComponents=triggered_components[2]))
+
+    assert 'msg=a\\=b\\\\c\\nd ' in event
+
+
+def test_format_leef(breach):
+    event = BreachFormatter('leef').format(breach)
+
+    assert event.split('\t') == [
+        'LEEF:1.0|Darktrace|DCIP Model Breaches|1.0|42|devTime=Jan 01 2019 01:01:01.123 UTC',
+        'devTimeFormat=MMM dd yyyy HH:mm:ss.SSS z', 'cat=Device::Anomalous|Connection', 'sev=9', 'pbid=123',
+        'srcHostName=host1.name.local', 'dstHostName=destination.hostname.test', 'score=0.874',
+        'deviceId=1000000000001', 'tags=AP: C2,Enhanced', 'breachUrl=https://darktrace/#modelbreach/123'
+    ]
+
+
+def test_formatter_reuses_headers(breach):
+    formatter = BreachFormatter('cef')
+    events = list(formatter.format_breaches([breach, dict(breach, pbid=124), dict(breach, score=0.1)]))
+
+    assert len(events) == 3
+    assert len(formatter.headers) == 2
+    assert events[2].startswith('CEF:0|Darktrace|DCIP Model Breaches|1.0|42|Device::Anomalous\\|Connection|1|')
+
+    with pytest.raises(ValueError):
+        BreachFormatter('xml')
+
+
+def test_export_breaches(breach, tmpdir):
+    outfile = str(tmpdir.join('breaches.cef'))
+
+    with StreamSink(outfile, batch_size=2) as sink:
+        assert export_breaches([breach] * 5, 'cef', sink) == 5
+
+    with open(outfile) as infile:
+        lines = infile.read().splitlines()
+    assert len(lines) == 5
+    assert all(line.startswith('CEF:0|Darktrace|DCIP Model Breaches|') for line in lines)
+
+
+@patch('dtctl.cli.get_private_key')
+@patch('dtctl.breaches.commands.get_breaches')
+def test_export_command(get_breaches, get_private_key, breach, tmpdir):
+    get_private_key.return_value = ''
+    get_breaches.return_value = [breach, dict(breach, pbid=124)]
+    outfile = str(tmpdir.join('breaches.leef'))
+
+    result = runner.invoke(cli, ['-h', 'http://127.0.0.1', '-p', '_', 'breaches', 'export', '-f', 'leef', '-o',
+                                 outfile, '-s', '2'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Exported 2 breaches to {0}'.format(outfile) in result.output
+    assert get_breaches.call_args[0][5] == 1.0
+    with open(outfile) as infile:
+        assert [line.split('\t')[4] for line in infile] == ['pbid=123', 'pbid=124']
+
+    get_breaches.return_value = []
+    result = runner.invoke(cli, ['-h', 'http://127.0.0.1', '-p', '_', 'breaches', 'export'])
+    assert result.exit_code != 0
+    assert 'No output to write or display' in result.output
+
+
+@patch('dtctl.cli.get_private_key')
+def test_export_outfile_and_syslog_are_exclusive(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', 'http://127.0.0.1', '-p', '_', 'breaches', 'export', '-o', 'out.cef',
+                                 '--syslog', 'udp://127.0.0.1:514'])
+
+    assert result.exit_code != 0
+    assert 'mutually exclusive' in result.output
@@ -1,7 +1,9 @@
 import json
 import pytest
 from unittest.mock import MagicMock
-from dtctl.breaches.functions import has_enhanced_tag, get_instances_region
+from dtctl.breaches.functions import has_enhanced_tag, get_instances_region, sync_breaches, get_instance_id, \
+    DEFAULT_SYNC_OVERLAP
+from dtctl.breaches.store import BreachStore
 from dtctl.dtapi.api import Api
 
 
@@ -32,3 +34,77 @@ def test_get_instances_region(status_info):
     assert 'region' not in instances[1]
     assert instances[2]['label'] == 'Location2 - Name2'
     assert instances[2]['region'] == 'Location2'
+
+
+def test_get_instance_id():
+    assert get_instance_id(1234) == 1
+    assert get_instance_id(-2345) == 2
+
+
+def test_sync_breaches(tmpdir):
+    store_file = '{0}/breaches.db'.format(tmpdir)
+    state_file = '{0}/state/breaches_sync.json'.format(tmpdir)
+    breaches = [
+        {'pbid': 1001, 'time': 1546300800000, 'model': {'tags': []}},
+        {'pbid': 2001, 'time': 1546300900000, 'model': {'tags': []}}
+    ]
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(return_value=breaches)
+
+    result = sync_breaches(api, store_file, state_file, 7)
+
+    assert result['breaches_added'] == 2
+    assert result['high_water_marks'] == {'1': {'time': 1546300800000, 'pbid': 1001},
+                                          '2': {'time': 1546300900000, 'pbid': 2001}}
+
+    # The second run requests breaches from the oldest high-water mark (minus an overlap) onwards
+    # and updates breaches that were already synchronized (e.g. acknowledgements). Breaches that
+    # reached the master late, with an earlier time than the high-water mark, are stored as well.
+    breaches[1] = dict(breaches[1], acknowledged=True)
+    api.get = MagicMock(return_value=breaches + [{'pbid': 1002, 'time': 1546300850000, 'model': {'tags': []}},
+                                                 {'pbid': 2002, 'time': 1546300700000, 'model': {'tags': []}}])
+
+    result = sync_breaches(api, store_file, state_file, 7)
+
+    assert api.get.call_args[1]['starttime'] == 1546300800000 - DEFAULT_SYNC_OVERLAP * 1000
+    assert result['breaches_received'] == 4
+    assert result['breaches_added'] == 2
+    assert result['breaches_stored'] == 4
+    assert result['high_water_marks']['1'] == {'time': 1546300850000, 'pbid': 1002}
+    assert result['high_water_marks']['2'] == {'time': 1546300900000, 'pbid': 2001}
+
+    with BreachStore(store_file) as store:
+        assert store.count() == 4
+        assert store.get(2002)['time'] == 1546300700000
+        assert store.get(2001)['acknowledged'] is True
+
+
+def test_sync_breaches_refreshes_acknowledged(tmpdir):
+    store_file = '{0}/breaches.db'.format(tmpdir)
+    state_file = '{0}/breaches_sync.json'.format(tmpdir)
+    with BreachStore(store_file) as store:
+        store.add([{'pbid': 1001, 'time': 1000, 'acknowledged': False, 'model': {'tags': []}},
+                   {'pbid': 1002, 'time': 1546300800000, 'acknowledged': False, 'model': {'tags': []}}])
+    with open(state_file, 'w') as outfile:
+        json.dump({'instances': {'1': {'time': 1546300800000, 'pbid': 1002}}}, outfile)
+
+    def get(endpoint, **kwargs):
+        # Breach 1001 was acknowledged after it was synchronized
+        if kwargs['minimal'] == 'true':
+            return [{'pbid': 1001, 'time': 1000, 'acknowledged': True}]
+        return []
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(side_effect=get)
+
+    result = sync_breaches(api, store_file, state_file, 7)
+
+    start_time = 1546300800000 - DEFAULT_SYNC_OVERLAP * 1000
+    refresh_kwargs = api.get.call_args_list[1][1]
+    assert (refresh_kwargs['starttime'], refresh_kwargs['endtime']) == (1000, start_time)
+    assert result['acknowledgements_updated'] == 1
+
+    with BreachStore(store_file) as store:
+        assert store.get(1001)['acknowledged'] is True
+
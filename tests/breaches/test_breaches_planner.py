@@ -0,0 +1,102 @@
+from unittest.mock import MagicMock, patch
+from dtctl.breaches.functions import get_breaches
+from dtctl.breaches.planner import plan_breaches_query
+from dtctl.dtapi.api import Api
+
+
+MODELS = [
+    {'pid': 10, 'name': 'Anomalous Connection::Data Sent', 'tags': ['AP: Egress']},
+    {'pid': 20, 'name': 'Device::Attack Tooling', 'tags': ['AP: Tooling', 'Critical']},
+    {'pid': 30, 'name': 'System::Packet Loss', 'tags': []}
+]
+
+
+def get_api(breaches_by_pid=None):
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+
+    def get(endpoint, **kwargs):
+        if endpoint == '/models':
+            return MODELS
+        if 'pid' not in kwargs:
+            return sorted((breach for breaches in breaches_by_pid.values() for breach in breaches),
+                          key=lambda breach: breach['pbid'])
+        return breaches_by_pid.get(kwargs['pid'], [])
+
+    api.get = MagicMock(side_effect=get)
+    return api
+
+
+def test_plan_without_tags():
+    plan = plan_breaches_query(get_api(), True, False, None, 'any', False, 0.5, None, 1000, 2000)
+
+    assert len(plan['requests']) == 1
+    assert plan['requests'][0]['includeacknowledged'] == 'true'
+    assert plan['requests'][0]['minscore'] == 0.5
+    assert 'pid' not in plan['requests'][0]
+    assert plan['filter_acknowledged']
+    assert plan['filter_pids'] is None
+
+
+def test_plan_pushes_tags_down_to_pids():
+    plan = plan_breaches_query(get_api(), False, False, ['AP: *'], 'any', False, 0.0, None, 1000, 2000)
+    assert [kwargs['pid'] for kwargs in plan['requests']] == [10, 20]
+
+    plan = plan_breaches_query(get_api(), False, False, ['AP: *'], 'none', False, 0.0, None, 1000, 2000)
+    assert [kwargs['pid'] for kwargs in plan['requests']] == [30]
+
+    plan = plan_breaches_query(get_api(), False, False, ['Unknown'], 'any', False, 0.0, None, 1000, 2000)
+    assert plan['requests'] == []
+
+    plan = plan_breaches_query(get_api(), False, False, ['Critical'], 'any', False, 0.0, 10, 1000, 2000)
+    assert plan['requests'] == []
+
+
+@patch('dtctl.breaches.planner.MAX_PUSHDOWN_PIDS', 1)
+def test_plan_falls_back_to_single_request():
+    plan = plan_breaches_query(get_api(), False, False, ['AP: *'], 'any', False, 0.0, None, 1000, 2000)
+
+    assert len(plan['requests']) == 1
+    assert 'pid' not in plan['requests'][0]
+    assert plan['filter_pids'] == {10, 20}
+
+
+def test_get_breaches_with_pushdown():
+    api = get_api({
+        10: [{'pbid': 1002, 'time': 2000, 'acknowledged': False, 'model': {'pid': 10, 'tags': ['AP: Egress']}}],
+        20: [{'pbid': 2001, 'time': 1000, 'acknowledged': False, 'model': {'pid': 20, 'tags': ['AP: Tooling']}},
+             {'pbid': 2002, 'time': 3000, 'acknowledged': False, 'model': {'pid': 20, 'tags': []}}]
+    })
+
+    breaches = get_breaches(api, False, False, ('AP: *',), False, 0.0, None, None, None)
+
+    # Breaches are merged in time order
+    assert [breach['pbid'] for breach in breaches] == [2001, 1002, 2002]
+
+
+RETAGGED_BREACHES = {
+    # Model 10 was tagged "Legacy" when it breached and has been retagged "AP: Egress" since
+    10: [{'pbid': 1001, 'time': 1000, 'acknowledged': False, 'model': {'pid': 10, 'tags': ['Legacy']}}],
+    20: [{'pbid': 2001, 'time': 2000, 'acknowledged': False, 'model': {'pid': 20, 'tags': ['AP: Tooling']}}],
+    30: [{'pbid': 3001, 'time': 3000, 'acknowledged': False, 'model': {'pid': 30, 'tags': ['AP: Egress']}}]
+}
+
+
+def get_retagged_pbids(tags, tag_mode='any'):
+    breaches = get_breaches(get_api(RETAGGED_BREACHES), False, True, tags, False, 0.0, None, None, None,
+                            tag_mode=tag_mode)
+    return [breach['pbid'] for breach in breaches]
+
+
+def test_get_breaches_retagged_model():
+    # Tags are matched against the current model tags
+    assert get_retagged_pbids(('AP: *',)) == [1001, 2001]
+    assert get_retagged_pbids(('Legacy',)) == []
+    assert get_retagged_pbids(('AP: *',), 'none') == [3001]
+
+
+@patch('dtctl.breaches.planner.MAX_PUSHDOWN_PIDS', 1)
+def test_get_breaches_retagged_model_without_pushdown():
+    # The results do not depend on whether the tag filter was pushed down
+    assert get_retagged_pbids(('AP: *',)) == [1001, 2001]
+    assert get_retagged_pbids(('Legacy',)) == []
+    assert get_retagged_pbids(('AP: *',), 'none') == [3001]
@@ -0,0 +1,93 @@
+from unittest.mock import MagicMock
+from dtctl.breaches.functions import get_breaches
+from dtctl.breaches.store import BreachStore
+from dtctl.dtapi.api import Api
+
+
+BREACHES = [
+    {'pbid': 1001, 'time': 1000, 'score': 0.5, 'acknowledged': False,
+     'model': {'pid': 10, 'tags': ['AP: Egress']}, 'triggeredComponents': [{'device': {'did': 5}}]},
+    {'pbid': 1002, 'time': 2000, 'score': 0.9, 'acknowledged': True,
+     'model': {'pid': 10, 'tags': ['AP: Egress', 'Critical']}, 'device': {'did': 6}},
+    {'pbid': 2001, 'time': 3000, 'score': 0.2, 'acknowledged': False,
+     'model': {'pid': 20, 'tags': []}, 'triggeredComponents': [{'device': {'did': 5}}]}
+]
+
+
+def test_breach_store_query(tmpdir):
+    with BreachStore('{0}/breaches.db'.format(tmpdir)) as store:
+        assert store.add(BREACHES) == 3
+        assert store.add(BREACHES) == 0
+
+        def pbids(**kwargs):
+            return [breach['pbid'] for breach in store.query(**kwargs)]
+
+        assert pbids() == [1001, 2001]
+        assert pbids(include_acknowledged=True) == [1001, 1002, 2001]
+        assert pbids(acknowledged_only=True) == [1002]
+        assert pbids(start_time=1500, end_time=3000, include_acknowledged=True) == [1002, 2001]
+        assert pbids(minscore=0.5, include_acknowledged=True) == [1001, 1002]
+        assert pbids(pid=10, include_acknowledged=True) == [1001, 1002]
+        assert pbids(did=5) == [1001, 2001]
+        assert pbids(tags=['AP: Egress', 'Critical'], include_acknowledged=True) == [1001, 1002]
+
+        assert store.get(1002) == BREACHES[1]
+        assert store.get(9999) is None
+
+
+def test_breach_store_upsert(tmpdir):
+    with BreachStore('{0}/breaches.db'.format(tmpdir)) as store:
+        store.add(BREACHES)
+
+        acknowledged = dict(BREACHES[0], acknowledged=True)
+        assert store.add([acknowledged]) == 0
+        assert store.get(1001) == acknowledged
+        assert [breach['pbid'] for breach in store.query(acknowledged_only=True)] == [1001, 1002]
+
+
+def test_breach_store_update_acknowledged(tmpdir):
+    with BreachStore('{0}/breaches.db'.format(tmpdir)) as store:
+        store.add(BREACHES)
+
+        updated = store.update_acknowledged([{'pbid': 1001, 'acknowledged': True},
+                                             {'pbid': 1002, 'acknowledged': False},
+                                             {'pbid': 2001, 'acknowledged': False},
+                                             {'pbid': 9999, 'acknowledged': True}])
+
+        assert updated == 2
+        assert store.get(1001)['acknowledged'] is True
+        assert store.get(1002)['acknowledged'] is False
+        assert [breach['pbid'] for breach in store.query(acknowledged_only=True)] == [1001]
+
+
+def test_get_breaches_local(tmpdir):
+    store_file = '{0}/breaches.db'.format(tmpdir)
+    with BreachStore(store_file) as store:
+        store.add(BREACHES)
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(return_value=[])
+
+    breaches = get_breaches(api, False, True, ('Critical',), False, 0.0, None, None, None, store_file)
+
+    assert [breach['pbid'] for breach in breaches] == [1002]
+    # Local queries only read the store
+    api.get.assert_not_called()
+
+    breaches = get_breaches(api, False, True, ('AP: *',), False, 0.0, None, None, None, store_file, 'none')
+
+    assert [breach['pbid'] for breach in breaches] == [2001]
+
+
+def test_get_breaches_local_acknowledged(tmpdir):
+    store_file = '{0}/breaches.db'.format(tmpdir)
+    with BreachStore(store_file) as store:
+        store.add(BREACHES)
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(side_effect=SystemExit('Error: Failed connecting to http://127.0.0.1'))
+
+    # Local queries work without the Darktrace API
+    breaches = get_breaches(api, True, False, None, False, 0.0, None, None, None, store_file)
+
+    assert [breach['pbid'] for breach in breaches] == [1002]
@@ -0,0 +1,237 @@
+import os
+import json
+import socket
+from unittest.mock import MagicMock, patch
+import click
+import pytest
+from click.testing import CliRunner
+from dtctl.cli import cli
+from dtctl.collect.functions import Collector, load_jobs, format_records, load_collect_state
+from dtctl.dtapi.api import Api
+from dtctl.utils.sinks import read_spool
+
+
+runner = CliRunner()
+
+PACKET_LOSS = [
+    {'system': 'probe1', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T00:00:00', 'packet_loss': 1.5,
+     'worker_drop_rate': 0.0},
+    {'system': 'probe2', 'ip': '10.0.0.2', 'timestamp': '2019-01-01T00:10:00', 'packet_loss': 2.5,
+     'worker_drop_rate': 0.1}
+]
+
+
+@pytest.fixture
+def status_info():
+    with open('tests/data/status.json') as infile:
+        return json.load(infile)
+
+
+def get_free_port():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    server.close()
+    return port
+
+
+def write_jobs(tmpdir, jobs, name='jobs.json'):
+    jobs_file = os.path.join(str(tmpdir), name)
+    with open(jobs_file, 'w') as outfile:
+        json.dump({'jobs': jobs}, outfile)
+    return jobs_file
+
+
+def test_load_jobs(tmpdir):
+    jobs = load_jobs(write_jobs(tmpdir, [
+        {'collector': 'usage', 'interval': 60, 'outfile': 'usage.log'},
+        {'name': 'loss-cef', 'collector': 'packet-loss', 'interval': 3600, 'output': 'cef', 'outfile': 'loss.log'}
+    ]))
+
+    assert jobs[0]['name'] == 'usage'
+    assert jobs[0]['output'] == 'log'
+    assert jobs[1]['window'] == 86400
+    assert jobs[1]['output'] == 'cef'
+
+
+def test_load_jobs_yaml(tmpdir):
+    jobs_file = os.path.join(str(tmpdir), 'jobs.yaml')
+    with open(jobs_file, 'w') as outfile:
+        outfile.write('jobs:\n  - collector: usage\n    interval: 300\n    outfile: usage.log\n')
+
+    assert load_jobs(jobs_file)[0]['interval'] == 300
+
+
+@pytest.mark.parametrize('jobs, message', [
+    ([], 'does not contain a list'),
+    ([{'collector': 'unknown', 'interval': 60, 'outfile': 'out.log'}], '"collector" must be one of'),
+    ([{'collector': 'usage', 'outfile': 'out.log'}], '"interval" must be a positive number'),
+    ([{'collector': 'usage', 'interval': 0, 'outfile': 'out.log'}], '"interval" must be a positive number'),
+    ([{'collector': 'usage', 'interval': 60}], '"outfile" or "syslog" is required'),
+    ([{'collector': 'usage', 'interval': 60, 'outfile': 'out.log', 'syslog': 'udp://127.0.0.1'}],
+     '"outfile" or "syslog" is required'),
+    ([{'collector': 'usage', 'interval': 60, 'syslog': 'http://127.0.0.1'}], 'Syslog URL must look like'),
+    ([{'collector': 'usage', 'interval': 60, 'outfile': 'out.log', 'output': 'xml'}], '"output" must be one of'),
+    ([{'collector': 'coverage', 'interval': 60, 'outfile': 'out.log'}], '"infile" must be an existing file'),
+    ([{'collector': 'coverage', 'interval': 60, 'outfile': 'out.log', 'infile': 'tests/data/subnet_input_list.csv',
+       'input_format': 'csv', 'network_col': 'network'}], '"network_col" and "netmask_col" are required'),
+    ([{'collector': 'usage', 'interval': 60, 'outfile': 'a.log'},
+      {'collector': 'usage', 'interval': 60, 'outfile': 'b.log'}], 'Job names must be unique')
+])
+def test_load_jobs_invalid(tmpdir, jobs, message):
+    with pytest.raises(click.UsageError) as err:
+        load_jobs(write_jobs(tmpdir, jobs))
+    assert message in err.value.message
+
+
+def test_format_records_does_not_modify_records():
+    job = {'collector': 'packet-loss', 'output': 'cef'}
+    records = [dict(record) for record in PACKET_LOSS]
+
+    lines = format_records(job, records)
+
+    assert records == PACKET_LOSS
+    assert lines[0].startswith('CEF:0|Darktrace|DCIP System Monitoring|1.0|110|Packet Loss|3|')
+    assert format_records(dict(job, output='log'), records)[1].startswith('[2019-01-01T00:10:00] probe2 ')
+    assert json.loads(format_records(dict(job, output='json'), records)[0]) == PACKET_LOSS[0]
+
+
+def test_collect_usage_once(tmpdir, status_info):
+    jobs_file = write_jobs(tmpdir, [
+        {'collector': 'usage', 'interval': 60, 'output': 'cef', 'outfile': os.path.join(str(tmpdir), 'usage.log')}
+    ])
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(return_value=status_info)
+    collector = Collector(api, load_jobs(jobs_file), os.path.join(str(tmpdir), 'state.json'))
+
+    collector.run(once=True)
+    collector.close()
+
+    with open(os.path.join(str(tmpdir), 'usage.log')) as infile:
+        lines = infile.read().splitlines()
+    assert lines
+    assert all(line.startswith('CEF:0|Darktrace|DCIP System Monitoring|1.0|100|System Usage|3|') for line in lines)
+    api.get.assert_called_once_with('/status')
+
+
+def test_collect_usage_to_syslog(tmpdir, status_info):
+    port = get_free_port()
+    jobs_file = write_jobs(tmpdir, [
+        {'collector': 'usage', 'interval': 60, 'output': 'cef', 'syslog': 'tcp://127.0.0.1:{0}'.format(port)}
+    ])
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(return_value=status_info)
+    collector = Collector(api, load_jobs(jobs_file), os.path.join(str(tmpdir), 'state.json'))
+
+    # Nothing listens on the port, so the records are spooled next to the state file
+    collector.run(once=True)
+    collector.close()
+
+    spool_file = os.path.join(str(tmpdir), 'spool', 'tcp_127.0.0.1_{0}.spool'.format(port))
+    messages = list(read_spool(spool_file))
+    assert messages
+    assert all(b' dtctl ' in message and b' CEF - CEF:0|Darktrace|DCIP System Monitoring|' in message
+               for message in messages)
+
+
+@patch('dtctl.collect.functions.collect_records')
+def test_collect_windows_do_not_repeat_records(collect_records, tmpdir):
+    state_file = os.path.join(str(tmpdir), 'state.json')
+    outfile = os.path.join(str(tmpdir), 'loss.log')
+    jobs = load_jobs(write_jobs(tmpdir, [{'collector': 'packet-loss', 'interval': 60, 'window': 3600,
+                                          'overlap': 10 ** 9, 'output': 'json', 'outfile': outfile}]))
+
+    collect_records.return_value = PACKET_LOSS[:1]
+    collector = Collector(MagicMock(), jobs, state_file)
+    assert collector.run_job(jobs[0]) == 1
+    collector.close()
+
+    # The next collector (e.g. after a restart) continues where the previous window ended
+    # and only writes the records that have not been written before
+    collect_records.return_value = PACKET_LOSS
+    collector = Collector(MagicMock(), jobs, state_file)
+    assert collector.run_job(jobs[0]) == 1
+    collector.close()
+
+    (_, _, first_start, first_end), (_, _, second_start, second_end) = \
+        [call[0] for call in collect_records.call_args_list]
+    assert (first_end - first_start).total_seconds() == 3600
+    assert second_start < first_end
+    assert load_collect_state(state_file)['jobs']['packet-loss']['end'] >= 1546300800000
+
+    with open(outfile) as infile:
+        assert [json.loads(line) for line in infile] == PACKET_LOSS
+
+
+@patch('dtctl.collect.functions.collect_records')
+def test_collect_errors_do_not_stop_jobs(collect_records, tmpdir, capsys):
+    jobs = load_jobs(write_jobs(tmpdir, [
+        {'name': 'failing', 'collector': 'usage', 'interval': 60, 'outfile': os.path.join(str(tmpdir), 'a.log')},
+        {'name': 'working', 'collector': 'usage', 'interval': 60, 'outfile': os.path.join(str(tmpdir), 'b.log')}
+    ]))
+    collect_records.side_effect = [SystemExit('Error: Failed connecting to http://127.0.0.1'),
+                                   [dict(PACKET_LOSS[0])]]
+    collector = Collector(MagicMock(), jobs, os.path.join(str(tmpdir), 'state.json'))
+
+    collector.run(once=True)
+    collector.close()
+
+    assert 'Job "failing" failed: Error: Failed connecting' in capsys.readouterr().err
+    assert os.path.getsize(os.path.join(str(tmpdir), 'b.log')) > 0
+
+
+@patch('dtctl.collect.functions.collect_records')
+def test_collect_schedules_jobs_on_their_interval(collect_records, tmpdir):
+    jobs = load_jobs(write_jobs(tmpdir, [
+        {'name': 'fast', 'collector': 'usage', 'interval': 1, 'outfile': os.path.join(str(tmpdir), 'a.log')},
+        {'name': 'slow', 'collector': 'usage', 'interval': 3600, 'outfile': os.path.join(str(tmpdir), 'a.log')}
+    ]))
+    collector = Collector(MagicMock(), jobs, os.path.join(str(tmpdir), 'state.json'))
+    runs = []
+
+    def collect(api, job, start_date, end_date):
+        runs.append(job['name'])
+        if len(runs) == 3:
+            collector.stop()
+        return []
+
+    collect_records.side_effect = collect
+
+    with patch('dtctl.collect.functions.time.time', side_effect=[0, 0, 0, 0, 0, 0, 1, 1, 1, 1]):
+        collector.run()
+
+    assert runs == ['fast', 'slow', 'fast']
+
+
+@patch('dtctl.collect.functions.collect_records')
+def test_collect_rotates_output_files(collect_records, tmpdir):
+    outfile = os.path.join(str(tmpdir), 'usage.log')
+    jobs = load_jobs(write_jobs(tmpdir, [{'collector': 'usage', 'interval': 60, 'output': 'json', 'outfile': outfile,
+                                          'max_bytes': 200, 'backup_count': 2}]))
+    collect_records.side_effect = lambda *args: [dict(PACKET_LOSS[0])]
+    collector = Collector(MagicMock(), jobs, os.path.join(str(tmpdir), 'state.json'))
+
+    for _ in range(10):
+        collector.run_job(jobs[0])
+    collector.close()
+
+    assert sorted(os.listdir(str(tmpdir))) == ['jobs.json', 'usage.log', 'usage.log.1', 'usage.log.2']
+
+
+@patch('dtctl.cli.get_private_key')
+@patch('dtctl.collect.commands.Collector')
+def test_collect_command(collector_class, get_private_key, tmpdir):
+    get_private_key.return_value = ''
+    jobs_file = write_jobs(tmpdir, [{'collector': 'usage', 'interval': 60, 'outfile': 'usage.log'}])
+    config_file = os.path.join(str(tmpdir), 'config.json')
+
+    result = runner.invoke(cli, ['-h', 'http://127.0.0.1', '-p', '_', '-c', config_file, 'collect', '--config',
+                                 jobs_file, '--once', '--cache-ttl', '5'])
+
+    assert result.exit_code == 0, result.output
+    api, jobs, state_file = collector_class.call_args[0]
+    assert api.cache_ttl == 5
+    assert jobs[0]['collector'] == 'usage'
+    assert state_file == os.path.join(str(tmpdir), 'collect_state.json')
+    collector_class.return_value.run.assert_called_once_with(True)
+    collector_class.return_value.close.assert_called_once_with()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+import pytest
+from click.testing import CliRunner
+from dtctl.cli import cli
+from dtctl.config.agent import KeyAgent, agent_request, get_agent_key, add_agent_key, get_agent_socket
+from dtctl.config.operations import get_private_key
+from dtctl.utils.crypto import encrypt
+
+
+runner = CliRunner()
+SECURE_DTKEY = encrypt('password', 'privkey', 'scrypt', 2 ** 10)
+
+
+@pytest.fixture
+def config_file():
+    # Unix socket paths are limited in length, so pytest's tmp_path may be too long
+    directory = tempfile.mkdtemp(prefix='dtctl')
+    yield os.path.join(directory, 'config.json')
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def running_agent(config_file):
+    agent = KeyAgent(get_agent_socket(config_file), ttl=60)
+    thread = threading.Thread(target=agent.serve_forever, kwargs={'poll_interval': 0.1}, daemon=True)
+    thread.start()
+    yield agent
+    agent.shutdown()
+    agent.server_close()
+
+
+def test_agent_socket_permissions(config_file, running_agent):
+    assert os.stat(get_agent_socket(config_file)).st_mode & 0o777 == 0o600
+
+
+def test_agent_socket_from_environment(config_file):
+    with patch.dict(os.environ, {'DTCTL_AGENT_SOCKET': '/run/user/1000/dtctl.sock'}):
+        assert get_agent_socket(config_file) == '/run/user/1000/dtctl.sock'
+
+    with patch.dict(os.environ, {}, clear=True):
+        assert get_agent_socket(config_file) == os.path.join(os.path.dirname(config_file), 'agent.sock')
+
+
+def test_agent_caches_key(config_file, running_agent):
+    socket_path = get_agent_socket(config_file)
+
+    assert get_agent_key(socket_path, SECURE_DTKEY) is None
+    assert add_agent_key(socket_path, SECURE_DTKEY, 'privkey')
+    assert get_agent_key(socket_path, SECURE_DTKEY) == 'privkey'
+    # A different encrypted key does not match the cached key
+    assert get_agent_key(socket_path, encrypt('password', 'other', 'scrypt', 2 ** 10)) is None
+
+
+def test_agent_expires_keys(config_file, running_agent):
+    socket_path = get_agent_socket(config_file)
+    running_agent.ttl = 0
+    add_agent_key(socket_path, SECURE_DTKEY, 'privkey')
+
+    assert get_agent_key(socket_path, SECURE_DTKEY) is None
+    assert agent_request(socket_path, {'command': 'status'})['expires_in'] == []
+
+
+def test_agent_rejects_invalid_requests(config_file, running_agent):
+    socket_path = get_agent_socket(config_file)
+
+    assert 'error' in agent_request(socket_path, {'command': 'unknown'})
+    assert 'error' in agent_request(socket_path, ['get'])
+
+
+def test_agent_not_running(config_file):
+    socket_path = get_agent_socket(config_file)
+
+    assert agent_request(socket_path, {'command': 'status'}) is None
+    assert get_agent_key(socket_path, SECURE_DTKEY) is None
+    assert not add_agent_key(socket_path, SECURE_DTKEY, 'privkey')
+
+
+@patch('getpass.getpass')
+def test_get_private_key_uses_agent(getpass, config_file, running_agent):
+    getpass.return_value = 'password'
+    config_dict = {'secure-dtkey': SECURE_DTKEY}
+
+    assert get_private_key(None, config_dict, config_file) == 'privkey'
+    assert get_private_key(None, config_dict, config_file) == 'privkey'
+    assert getpass.call_count == 1
+
+
+@patch('getpass.getpass')
+def test_get_private_key_without_agent(getpass, config_file):
+    getpass.return_value = 'password'
+    config_dict = {'secure-dtkey': SECURE_DTKEY}
+
+    assert get_private_key(None, config_dict, config_file) == 'privkey'
+    assert get_private_key(None, config_dict, config_file) == 'privkey'
+    assert getpass.call_count == 2
+
+
+@patch('dtctl.cli.get_private_key')
+def test_agent_status_command(get_private_key, config_file, running_agent):
+    get_private_key.return_value = ''
+    add_agent_key(get_agent_socket(config_file), SECURE_DTKEY, 'privkey')
+    result = runner.invoke(cli, ['-c', config_file, 'config', 'agent', 'status'])
+
+    assert result.exit_code == 0
+    assert 'Key agent running (pid {0:d})'.format(os.getpid()) in result.output
+    assert 'Cached private key expires in' in result.output
+
+
+@patch('dtctl.cli.get_private_key')
+def test_agent_stop_command(get_private_key, config_file):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-c', config_file, 'config', 'agent', 'stop'])
+
+    assert result.exit_code == 0
+    assert 'Key agent is not running' in result.output
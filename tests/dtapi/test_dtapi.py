@@ -1,4 +1,5 @@
 import pytest
+import time
 import datetime as dt
 from dtctl.dtapi.api import Api
 
@@ -169,3 +170,77 @@ def test_api_endpoint_not_supported(requests_mock):
         _ = api.get('/non-supported-endpoint')
 
     assert 'API endpoint not supported' == exc_info.value.args[0]
+
+
+def test_session_is_reused():
+    api = Api(HOST, PUB_DTKEY, PRIVKEY)
+
+    assert api.session is api.session
+
+
+def test_get_request_without_cache(requests_mock):
+    api = Api(HOST, PUB_DTKEY, PRIVKEY)
+    requests_mock.get(HOST + '/status', json={'key': 'value'})
+
+    api.get('/status')
+    api.get('/status')
+
+    assert requests_mock.call_count == 2
+
+
+def test_get_request_with_cache(requests_mock):
+    api = Api(HOST, PUB_DTKEY, PRIVKEY, cache_ttl=60)
+    requests_mock.get(HOST + '/status', json={'key': 'value'})
+
+    first = api.get('/status')
+    first['key'] = 'modified'
+    second = api.get('/status')
+    api.get('/status', includeacknowledged='true')
+
+    # Cached responses are parsed again, so modifying a result does not affect the cache
+    assert second == {'key': 'value'}
+    # Requests with other parameters are not served from the cache
+    assert requests_mock.call_count == 2
+
+    api.clear_cache()
+    api.get('/status')
+    assert requests_mock.call_count == 3
+
+
+def test_post_and_delete_clear_cache(requests_mock):
+    api = Api(HOST, PUB_DTKEY, PRIVKEY, cache_ttl=60)
+    requests_mock.get(HOST + '/intelfeed', [{'json': ['a.test']}, {'json': ['a.test', 'b.test']}, {'json': []}])
+    requests_mock.post(HOST + '/intelfeed', json={'response': 'SUCCESS', 'added': 1, 'updated': 0})
+    requests_mock.delete(HOST + '/intelfeed', status_code=200)
+
+    assert api.get('/intelfeed') == ['a.test']
+    assert api.get('/intelfeed') == ['a.test']
+
+    # A GET after a POST or DELETE is not served from the cache
+    api.post('/intelfeed', postdata={'addentry': 'b.test'})
+    assert api.get('/intelfeed') == ['a.test', 'b.test']
+
+    api.delete('/intelfeed', removeall='true')
+    assert api.get('/intelfeed') == []
+    assert requests_mock.call_count == 5
+
+
+def test_get_cached_expires():
+    api = Api(HOST, PUB_DTKEY, PRIVKEY, cache_ttl=60)
+    api.set_cached(HOST + '/status', '{}')
+
+    assert api.get_cached(HOST + '/status') == '{}'
+
+    api.cache_ttl = 0
+    api.set_cached(HOST + '/status', '{}')
+    assert api.get_cached(HOST + '/status') is None
+
+
+def test_prune_cache():
+    api = Api(HOST, PUB_DTKEY, PRIVKEY, cache_ttl=60)
+    api.set_cached(HOST + '/status', '{}')
+    api._cache[HOST + '/modelbreaches?starttime=1'] = ('[]', time.monotonic() - 61)
+
+    api.prune_cache()
+
+    assert list(api._cache) == [HOST + '/status']
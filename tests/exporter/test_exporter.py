@@ -0,0 +1,143 @@
+import json
+import threading
+import urllib.request
+from unittest.mock import MagicMock, patch
+import pytest
+from click.testing import CliRunner
+from dtctl.cli import cli
+from dtctl.dtapi.api import Api
+from dtctl.exporter.functions import MetricsPoller, MetricsServer, render_metrics, CONTENT_TYPE
+
+
+runner = CliRunner()
+
+SUBNETS = [
+    {'sid': 1000000000001, 'network': '10.2.2.0/24', 'dhcp': True},
+    {'sid': 1000000000003, 'network': '10.4.4.0/24', 'dhcp': False}
+]
+PACKET_LOSS = [
+    {'system': 'probe1', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T00:10:00', 'packet_loss': 2.5,
+     'worker_drop_rate': 0.1},
+    {'system': 'probe1', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T00:00:00', 'packet_loss': 1.5,
+     'worker_drop_rate': 0.0}
+]
+
+
+@pytest.fixture
+def status_info():
+    with open('tests/data/status.json') as infile:
+        return json.load(infile)
+
+
+@pytest.fixture
+def api(requests_mock, status_info):
+    requests_mock.get('http://127.0.0.1/status', json=status_info)
+    requests_mock.get('http://127.0.0.1/subnets', json=SUBNETS)
+    return Api('http://127.0.0.1', 'pubkey', 'privkey', cache_ttl=60)
+
+
+def test_render_metrics():
+    metrics = render_metrics([
+        ('darktrace_cpu_percent', 'CPU usage in percent', [
+            ({'system': 'master', 'label': 'Label "with"\nquotes\\'}, 10),
+            ({'system': 'probe'}, 'Unknown'),
+            ({'system': 'other'}, 2.5)
+        ]),
+        ('darktrace_subnets_expected', 'Nr of subnets', [({}, 4)])
+    ])
+
+    assert metrics.splitlines() == [
+        '# TYPE darktrace_cpu_percent gauge',
+        '# HELP darktrace_cpu_percent CPU usage in percent',
+        'darktrace_cpu_percent{system="master",label="Label \\"with\\"\\nquotes\\\\"} 10',
+        'darktrace_cpu_percent{system="other"} 2.5',
+        '# TYPE darktrace_subnets_expected gauge',
+        '# HELP darktrace_subnets_expected Nr of subnets',
+        'darktrace_subnets_expected 4',
+        '# EOF'
+    ]
+
+
+@patch('dtctl.system.functions.get_packet_loss')
+def test_poll_requests_status_once(get_packet_loss, api, requests_mock):
+    get_packet_loss.return_value = PACKET_LOSS
+    poller = MetricsPoller(api, packet_loss_window=600)
+
+    poller.poll()
+    metrics = poller.metrics.decode('utf-8')
+
+    # Usage and DHCP metrics are derived from the same "/status" response
+    assert [request.path for request in requests_mock.request_history] == ['/status', '/subnets']
+    assert 'darktrace_cpu_percent{system="darktrace-hostname-1",type="master",ip="",' \
+           'label="Label with a name1"} 10' in metrics
+    assert 'darktrace_dhcp_subnets{system="darktrace-hostname-1",status="tracking"}' in metrics
+    # Only the most recent packet loss of a probe is reported
+    assert 'darktrace_packet_loss_percent{system="probe1",ip="10.0.0.1"} 2.5' in metrics
+    assert 'dtctl_exporter_collector_up{collector="usage"} 1' in metrics
+    assert 'collector="coverage"' not in metrics
+    assert metrics.endswith('# EOF\n')
+
+    start_date, end_date = get_packet_loss.call_args[0][1:]
+    assert (end_date - start_date).total_seconds() == 600
+
+
+@patch('dtctl.system.functions.get_packet_loss')
+def test_poll_keeps_values_of_failing_collectors(get_packet_loss, api, capsys):
+    get_packet_loss.return_value = PACKET_LOSS
+    poller = MetricsPoller(api)
+    poller.poll()
+
+    get_packet_loss.side_effect = SystemExit('Error: Failed connecting to http://127.0.0.1')
+    poller.poll()
+    metrics = poller.metrics.decode('utf-8')
+
+    assert 'Collector "packet-loss" failed: Error: Failed connecting' in capsys.readouterr().err
+    assert 'dtctl_exporter_collector_up{collector="packet-loss"} 0' in metrics
+    assert 'dtctl_exporter_collector_last_success_timestamp_seconds{collector="packet-loss"}' in metrics
+    assert 'darktrace_packet_loss_percent{system="probe1",ip="10.0.0.1"} 2.5' in metrics
+
+
+def test_scrapes_do_not_request_the_api():
+    api = MagicMock()
+    poller = MetricsPoller(api)
+    poller.metrics = render_metrics([('darktrace_subnets_expected', 'Nr of subnets', [({}, 4)])]).encode('utf-8')
+    server = MetricsServer(('127.0.0.1', 0), poller)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+
+    try:
+        with urllib.request.urlopen(url + '/metrics') as response:
+            assert response.headers['Content-Type'] == CONTENT_TYPE
+            assert b'darktrace_subnets_expected 4\n# EOF\n' in response.read()
+
+        with pytest.raises(urllib.error.HTTPError) as err:
+            urllib.request.urlopen(url + '/')
+        assert err.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert not api.mock_calls
+
+
+@patch('dtctl.cli.get_private_key')
+@patch('dtctl.exporter.commands.MetricsServer')
+@patch('dtctl.exporter.commands.MetricsPoller')
+def test_exporter_command(poller_class, server_class, get_private_key, tmpdir):
+    get_private_key.return_value = ''
+    coverage_file = tmpdir.join('subnets.txt')
+    coverage_file.write('10.0.0.0/8\n')
+
+    result = runner.invoke(cli, ['-h', 'http://127.0.0.1', '-p', '_', '-c', str(tmpdir.join('config.json')),
+                                 'exporter', '--port', '9999', '--interval', '30', '--coverage-file',
+                                 str(coverage_file)])
+
+    assert result.exit_code == 0, result.output
+    api, interval, packet_loss_window, coverage = poller_class.call_args[0]
+    assert api.cache_ttl == 30
+    assert (interval, packet_loss_window) == (30, 3600)
+    assert coverage['infile'] == str(coverage_file)
+    assert server_class.call_args[0][0] == ('127.0.0.1', 9999)
+    poller_class.return_value.start.assert_called_once_with()
+    poller_class.return_value.stop.assert_called_once_with()
+    server_class.return_value.server_close.assert_called_once_with()
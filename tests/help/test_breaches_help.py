@@ -16,8 +16,10 @@ def test_breaches_command(get_private_key):
 
     assert result.exit_code == 0
     assert 'Commands for Darktrace model breaches' in result.output
+    assert re.search(r'export\s+Export', result.output)
     assert re.search(r'list\s+List', result.output)
     assert re.search(r'report\s+Generate', result.output)
+    assert re.search(r'sync\s+Synchronize', result.output)
 
 
 @patch('dtctl.cli.get_private_key')
@@ -32,12 +34,15 @@ def test_breaches_list_command(get_private_key):
     assert '-a, --acknowledged-only' in result.output
     assert '-k, --include-acknowledged' in result.output
     assert '-t, --tag TEXT' in result.output
+    assert '--tag-mode [any|all|none]' in result.output
     assert '-m, --minimal' in result.output
     assert '-s, --minscore FLOAT' in result.output
     assert '-p, --pid INTEGER' in result.output
     assert '-d, --days INTEGER' in result.output
     assert '--start-date [%d-%m-%Y]' in result.output
     assert '--end-date [%d-%m-%Y]' in result.output
+    assert '-l, --local' in result.output
+    assert '--store PATH' in result.output
     assert '-o, --outfile PATH' in result.output
 
 
@@ -63,3 +68,40 @@ def test_breaches_report_command(get_private_key):
     assert '-o, --outfile PATH' in result.output
     assert '-t, --template PATH' in result.output
     assert '-f, --output [csv|xlsx]' in result.output
+    assert '-l, --local' in result.output
+    assert '--store PATH' in result.output
+
+
+@patch('dtctl.cli.get_private_key')
+def test_breaches_sync_command(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', 'breaches', 'sync', '--help'])
+
+    assert result.exit_code == 0
+    assert 'Synchronize new model breaches to a local breach store.' in result.output
+
+    # Options
+    assert '-d, --days INTEGER' in result.output
+    assert '-s, --store PATH' in result.output
+    assert '--state-file PATH' in result.output
+    assert '-o, --outfile PATH' in result.output
+
+
+@patch('dtctl.cli.get_private_key')
+def test_breaches_export_command(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', 'breaches', 'export', '--help'])
+
+    assert result.exit_code == 0
+    assert 'Export model breaches as CEF or LEEF events' in result.output
+
+    # Options
+    assert '-f, --format [cef|leef]' in result.output
+    assert '-k, --include-acknowledged' in result.output
+    assert '-t, --tag TEXT' in result.output
+    assert '-s, --minscore FLOAT' in result.output
+    assert '-d, --days INTEGER' in result.output
+    assert '-l, --local' in result.output
+    assert '-o, --outfile PATH' in result.output
+    assert '--syslog TEXT' in result.output
+    assert '--batch-size INTEGER RANGE' in result.output
@@ -0,0 +1,19 @@
+from unittest.mock import patch
+from click.testing import CliRunner
+from dtctl.cli import cli
+
+
+runner = CliRunner()
+
+
+@patch('dtctl.cli.get_private_key')
+def test_collect_command(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', 'collect', '--help'])
+
+    assert result.exit_code == 0
+    assert 'Run the system monitoring collectors' in result.output
+    assert '-f, --config FILE' in result.output
+    assert '--state-file PATH' in result.output
+    assert '--cache-ttl INTEGER RANGE' in result.output
+    assert '--once' in result.output
@@ -18,6 +18,7 @@ def test_config_command(get_private_key):
     assert 'Manage dtctl configurations' in result.output
     assert re.search(r'get\s+View', result.output)
     assert re.search(r'set\s+Set', result.output)
+    assert re.search(r'agent\s+Cache', result.output)
 
 
 @patch('dtctl.cli.get_private_key')
@@ -51,4 +52,16 @@ def test_config_set_command(get_private_key):
     assert re.search(r'pub-dtkey\s+Configure', result.output)
     assert re.search(r'cacert\s+Configure', result.output)
     assert re.search(r'dtkey\s+Configure', result.output)
-    assert re.search(r'host\s+Configure', result.output)
\ No newline at end of file
+    assert re.search(r'host\s+Configure', result.output)
+
+
+@patch('dtctl.cli.get_private_key')
+def test_config_agent_command(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', 'config', 'agent', '--help'])
+
+    assert result.exit_code == 0
+    assert 'Manage the local key agent' in result.output
+    assert re.search(r'start\s+Start', result.output)
+    assert re.search(r'status\s+Show', result.output)
+    assert re.search(r'stop\s+Stop', result.output)
@@ -0,0 +1,20 @@
+from unittest.mock import patch
+from click.testing import CliRunner
+from dtctl.cli import cli
+
+
+runner = CliRunner()
+
+
+@patch('dtctl.cli.get_private_key')
+def test_exporter_command(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', 'exporter', '--help'])
+
+    assert result.exit_code == 0
+    assert 'Serve appliance health metrics' in result.output
+    assert '--address TEXT' in result.output
+    assert '--port INTEGER RANGE' in result.output
+    assert '--interval INTEGER RANGE' in result.output
+    assert '--packet-loss-window INTEGER RANGE' in result.output
+    assert '--coverage-file FILE' in result.output
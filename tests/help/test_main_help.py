@@ -28,10 +28,13 @@ def test_commands():
 
     assert result.exit_code == 0
     assert re.search(r'breaches\s+Commands', result.output)
+    assert re.search(r'collect\s+Run', result.output)
     assert re.search(r'config\s+Manage', result.output)
     assert re.search(r'devices\s+List', result.output)
+    assert re.search(r'exporter\s+Serve', result.output)
     assert re.search(r'intelfeed\s+Manage', result.output)
     assert re.search(r'models\s+View', result.output)
     assert re.search(r'query\s+Send', result.output)
+    assert re.search(r'serve\s+Serve', result.output)
     assert re.search(r'subnets\s+View', result.output)
     assert re.search(r'system\s+View', result.output)
@@ -17,6 +17,7 @@ def test_models_command(get_private_key):
     assert result.exit_code == 0
     assert 'View Darktrace models' in result.output
     assert re.search(r'autoupdatable\s+Models', result.output)
+    assert re.search(r'history\s+Timeline', result.output)
     assert re.search(r'input-diff\s+Shows', result.output)
     assert re.search(r'list\s+List', result.output)
     assert re.search(r'pending-updates\s+Models', result.output)
@@ -78,6 +79,7 @@ def test_models_list_command(get_private_key):
     assert '-e, --enhanced-only' in result.output
     assert '-a, --active-only' in result.output
     assert '-w, --with-components' in result.output
+    assert '-j, --jsonl' in result.output
     assert '-o, --outfile PATH' in result.output
 
 
@@ -112,6 +114,7 @@ def test_models_report_command(get_private_key):
     assert '--start-date [%d-%m-%Y]' in result.output
     assert '--end-date [%d-%m-%Y]' in result.output
     assert '-a, --active-only' in result.output
+    assert '-g, --group-by [model|category|tag]' in result.output
     assert '-o, --outfile PATH' in result.output
 
 
@@ -164,8 +167,11 @@ def test_models_update_diff_command(get_private_key):
 
     # Ensures that arguments additions fail the test
     assert 'List models that have updates pending and their respective changes' in result.output
+    assert 'are listed under "components"' in result.output
 
     # Options
+    assert '-w, --workers INTEGER RANGE' in result.output
+    assert '--no-cache' in result.output
     assert '-o, --outfile PATH' in result.output
 
 
@@ -176,4 +182,25 @@ def test_models_updatable_command(get_private_key):
 
     assert result.exit_code == 0
     assert 'List all models that can be updated without losing custom changes' in result.output
-    assert '-o, --outfile PATH' in result.output
\ No newline at end of file
+    assert '-o, --outfile PATH' in result.output
+
+
+@patch('dtctl.cli.get_private_key')
+def test_models_history_command(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', 'models', 'history', '--help'])
+
+    assert result.exit_code == 0
+    assert 'Create a timeline with every version of every model' in result.output
+
+    # Options
+    assert '-p, --pid INTEGER' in result.output
+    assert '-a, --active-only' in result.output
+    assert '-d, --days INTEGER' in result.output
+    assert '--start-date [%d-%m-%Y]' in result.output
+    assert '--end-date [%d-%m-%Y]' in result.output
+    assert '-c, --changes' in result.output
+    assert '-w, --workers INTEGER RANGE' in result.output
+    assert '--no-cache' in result.output
+    assert '-f, --output [xlsx|parquet|csv]' in result.output
+    assert '-o, --outfile PATH' in result.output
@@ -0,0 +1,19 @@
+from unittest.mock import patch
+from click.testing import CliRunner
+from dtctl.cli import cli
+
+
+runner = CliRunner()
+
+
+@patch('dtctl.cli.get_private_key')
+def test_serve_command(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', 'serve', '--help'])
+
+    assert result.exit_code == 0
+    assert 'Serve dtctl commands from a long-running process' in result.output
+    assert '--socket PATH' in result.output
+    assert '--cache-ttl INTEGER RANGE' in result.output
+    assert '--status' in result.output
+    assert '--stop' in result.output
@@ -51,7 +51,10 @@ def test_subnets_dhcp_command(get_private_key):
 
     assert result.exit_code == 0
     assert 'Metrics for DHCP tracking' in result.output
+    assert re.search(r'without_clients\s+DHCP never seen', result.output)
     assert '-o, --outfile PATH' in result.output
+    assert '-s, --per-subnet' in result.output
+    assert '--syslog TEXT' in result.output
 
 
 @patch('dtctl.cli.get_private_key')
@@ -82,3 +85,5 @@ def test_subnets_unidirectional_command(get_private_key):
     assert result.exit_code == 0
     assert 'Metrics for unidirectional traffic' in result.output
     assert '-o, --outfile PATH' in result.output
+    assert '-b, --buckets TEXT' in result.output
+    assert '-t, --top INTEGER' in result.output
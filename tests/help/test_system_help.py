@@ -22,6 +22,7 @@ def test_system_command(get_private_key):
     assert re.search(r'instances\s+View', result.output)
     assert re.search(r'issues\s+View', result.output)
     assert re.search(r'packet-loss\s+View', result.output)
+    assert re.search(r'snapshot\s+All', result.output)
     assert re.search(r'status\s+Detailed', result.output)
     assert re.search(r'summary-statistics\s+Summary', result.output)
     assert re.search(r'tags\s+All', result.output)
@@ -78,6 +79,10 @@ def test_system_packet_loss_command(get_private_key):
     assert '-o, --outfile PATH' in result.output
     assert '--log' in result.output
     assert '--cef' in result.output
+    assert '--aggregate TEXT' in result.output
+    assert '--rolling TEXT' in result.output
+    assert '--top INTEGER RANGE' in result.output
+    assert '-f, --format [json|csv|parquet|openmetrics]' in result.output
 
 
 @patch('dtctl.cli.get_private_key')
@@ -120,6 +125,7 @@ def test_system_usage_command(get_private_key):
     assert '-o, --outfile PATH' in result.output
     assert '--log' in result.output
     assert '--cef' in result.output
+    assert '--syslog TEXT' in result.output
 
 
 @patch('dtctl.cli.get_private_key')
@@ -142,3 +148,16 @@ def test_system_coverage_command(get_private_key):
 
     assert '--log' in result.output
     assert '--cef' in result.output
+
+
+@patch('dtctl.cli.get_private_key')
+def test_system_snapshot_command(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', 'system', 'snapshot', '--help'])
+
+    assert result.exit_code == 0
+    assert 'Calculate all metrics derived from Darktrace status information at once.' in result.output
+    assert '- Unidirectional traffic' in result.output
+    assert '-o, --outfile PATH' in result.output
+    assert '--log' in result.output
+    assert '--cef' in result.output
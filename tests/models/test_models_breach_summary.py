@@ -0,0 +1,63 @@
+from dtctl.models.functions import summarize_breaches
+
+
+BREACHES = [
+    {'pbid': 1, 'time': 1546300800000, 'score': 0.2, 'acknowledged': False,
+     'model': {'name': 'Anomalous Connection::Data Sent', 'tags': ['AP: Egress']},
+     'triggeredComponents': [{'device': {'did': 1}}]},
+    {'pbid': 2, 'time': 1546300900000, 'score': 0.8, 'acknowledged': True,
+     'model': {'name': 'Anomalous Connection::Data Sent', 'tags': ['AP: Egress']},
+     'triggeredComponents': [{'device': {'did': 1}}]},
+    {'pbid': 3, 'time': 1546301000000, 'score': 0.5, 'acknowledged': False,
+     'model': {'name': 'Anomalous Connection::Port Scan', 'tags': ['AP: Egress', 'AP: Scanning']},
+     'triggeredComponents': [{'device': {'did': 2}}]},
+    {'pbid': 4, 'time': 1546301100000, 'score': 1.0, 'acknowledged': False,
+     'model': {'name': 'Device::New Device', 'tags': []}, 'device': {'did': 3}}
+]
+
+
+def test_summarize_breaches_per_model():
+    summary = summarize_breaches(BREACHES)
+
+    data_sent = summary.loc['Anomalous Connection::Data Sent']
+    assert list(summary.index)[0] == 'Anomalous Connection::Data Sent'
+    assert data_sent['nr_of_breaches'] == 2
+    assert data_sent['nr_of_acknowledged'] == 1
+    assert data_sent['nr_of_devices'] == 1
+    assert data_sent['score_p50'] == 0.5
+    assert str(data_sent['first_breach']) == '2019-01-01 00:00:00'
+    assert str(data_sent['last_breach']) == '2019-01-01 00:01:40'
+
+
+def test_summarize_breaches_per_category_and_tag():
+    summary = summarize_breaches(BREACHES, 'category')
+
+    assert summary.loc['Anomalous Connection', 'nr_of_breaches'] == 3
+    assert summary.loc['Anomalous Connection', 'nr_of_devices'] == 2
+    assert summary.loc['Device', 'nr_of_breaches'] == 1
+
+    summary = summarize_breaches(BREACHES, 'tag')
+
+    assert summary.loc['AP: Egress', 'nr_of_breaches'] == 3
+    assert summary.loc['AP: Scanning', 'nr_of_breaches'] == 1
+    assert len(summary) == 2
+
+
+def test_summarize_breaches_without_breaches():
+    for group_by in ('model', 'category', 'tag'):
+        summary = summarize_breaches([], group_by)
+
+        assert summary.empty
+        assert 'score_p90' in summary.columns
+
+    # Breaches of models without tags do not count for any tag
+    assert summarize_breaches(BREACHES[3:], 'tag').empty
+
+
+def test_summarize_breaches_without_scores():
+    breaches = [dict(breach, score=None) for breach in BREACHES]
+
+    summary = summarize_breaches(breaches, 'category')
+
+    assert summary.loc['Anomalous Connection', 'nr_of_breaches'] == 3
+    assert summary['score_p50'].isna().all()
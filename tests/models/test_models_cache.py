@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+import pytest
+from dtctl.dtapi.api import Api
+from dtctl.models.cache import ModelVersionCache
+from dtctl.models.model_differ import fetch_model_versions
+
+
+def test_model_version_cache(tmpdir):
+    cache = ModelVersionCache('{0}/model_versions'.format(tmpdir))
+
+    assert cache.get(1, 2) is None
+
+    cache.put(1, 2, {'policy': {'name': 'Model'}})
+
+    assert cache.get(1, 2) == {'policy': {'name': 'Model'}}
+    assert cache.get_path(1, 2).endswith('1/2.json')
+
+
+def test_model_version_cache_writes_atomically(tmpdir):
+    cache = ModelVersionCache('{0}/model_versions'.format(tmpdir))
+    cache.put(1, 2, {'policy': {'name': 'Model'}})
+
+    # A failed write keeps the cached version and leaves no temporary file behind
+    with pytest.raises(TypeError):
+        cache.put(1, 2, {'policy': object()})
+
+    assert cache.get(1, 2) == {'policy': {'name': 'Model'}}
+    assert os.listdir(os.path.dirname(cache.get_path(1, 2))) == ['2.json']
+
+    # Concurrent writes of the same version do not share a temporary file
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda nr: cache.put(1, 3, {'policy': {'name': 'Model {0}'.format(nr)}}), range(32)))
+
+    assert cache.get(1, 3)['policy']['name'].startswith('Model ')
+    assert sorted(os.listdir(os.path.dirname(cache.get_path(1, 3)))) == ['2.json', '3.json']
+
+
+def test_fetch_model_versions(tmpdir):
+    cache = ModelVersionCache('{0}/model_versions'.format(tmpdir))
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(side_effect=lambda call: {'call': call})
+
+    versions = fetch_model_versions(api, [(1, 10), (1, 11), (2, 20), (1, 10)], cache, workers=4)
+
+    assert versions[(1, 11)] == {'call': '/models/1?phid=11'}
+    assert versions[(2, 20)] == {'call': '/models/2?phid=20'}
+    assert api.get.call_count == 3
+
+    # Cached versions are not fetched again
+    versions = fetch_model_versions(api, [(1, 10), (3, 30)], cache)
+
+    assert versions[(1, 10)] == {'call': '/models/1?phid=10'}
+    assert api.get.call_count == 4
+    api.get.assert_called_with('/models/3?phid=30')
+
+    # Without a cache every version is fetched
+    fetch_model_versions(api, [(1, 10)])
+    assert api.get.call_count == 5
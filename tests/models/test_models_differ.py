@@ -0,0 +1,75 @@
+import copy
+from dtctl.models.model_differ import get_model_differences
+
+
+def make_model_version(phid, components, weights=None, tags=None):
+    return {
+        'policy': {
+            'pid': 1,
+            'phid': phid,
+            'name': 'Test::Model',
+            'message': 'Update',
+            'priority': 3,
+            'tags': tags or ['Test'],
+            'actions': {'alert': True},
+            'logic': {'type': 'weightedComponentList',
+                      'data': [{'cid': component['cid'], 'weight': (weights or {}).get(component['cid'], 1)}
+                               for component in components]}
+        },
+        'components': components
+    }
+
+
+def make_component(cid, threshold, filters):
+    return {'cid': cid, 'chid': cid, 'mlid': 1, 'active': True, 'threshold': threshold,
+            'filters': [dict(component_filter, cfid=cid * 10) for component_filter in filters]}
+
+
+FILTER_A = {'id': 'A', 'comparator': 'is', 'filtertype': 'Direction', 'arguments': {'value': 'out'}}
+FILTER_B = {'id': 'B', 'comparator': 'display', 'filtertype': 'Hostname', 'arguments': {}}
+FILTER_C = {'id': 'C', 'comparator': '>', 'filtertype': 'Size', 'arguments': {'value': 100}}
+
+
+def test_model_differences():
+    active = make_model_version(10, [make_component(1, 10, [FILTER_A, FILTER_B]),
+                                     make_component(2, 20, [FILTER_C]),
+                                     make_component(3, 30, [FILTER_A])])
+    updated = make_model_version(11, [make_component(13, 30, [FILTER_A]),
+                                      make_component(11, 10, [dict(FILTER_A, arguments={'value': 'in'}),
+                                                              FILTER_C]),
+                                      make_component(14, 40, [FILTER_B, FILTER_C])],
+                                 weights={13: 5}, tags=['Test', 'New'])
+    updated['policy']['priority'] = 4
+
+    active_copy = copy.deepcopy(active)
+    updated_copy = copy.deepcopy(updated)
+
+    differences = get_model_differences(updated, active)
+
+    # Inputs are not modified
+    assert active == active_copy
+    assert updated == updated_copy
+
+    assert differences['model'] == 'Test::Model'
+    assert differences['policy']['tags'] == {'added_tags': ['New']}
+    assert differences['policy']['base'] == [{'change': 'changed', 'path': 'priority', 'old': 3, 'new': 4}]
+
+    components = differences['components']
+    assert [component['threshold'] for component in components['added']] == [40]
+    assert [component['threshold'] for component in components['removed']] == [20]
+    assert components['reordered'] == [{'from': 0, 'to': 1}]
+
+    modified = {component['index']: component for component in components['modified']}
+    assert modified[0] == {'index': 0, 'weight': {'old': 1, 'new': 5}}
+    assert modified[1]['filters']['added'][0]['id'] == 'C'
+    assert modified[1]['filters']['removed'][0]['id'] == 'B'
+    assert modified[1]['filters']['rules'] == [
+        {'id': 'A', 'changes': [{'change': 'changed', 'path': 'arguments.value', 'old': 'out', 'new': 'in'}]}
+    ]
+
+
+def test_model_without_differences():
+    active = make_model_version(10, [make_component(1, 10, [FILTER_A])])
+    updated = make_model_version(11, [make_component(2, 10, [FILTER_A])])
+
+    assert get_model_differences(updated, active) == {'model': 'Test::Model', 'message': 'Update'}
@@ -0,0 +1,69 @@
+import datetime as dt
+from unittest.mock import MagicMock, patch
+import click
+import pytest
+import pandas as pd
+from dtctl.dtapi.api import Api
+from dtctl.models.functions import get_model_history_frame
+from dtctl.models.history import get_model_history
+from dtctl.utils.reporting import export_frame
+
+
+MODELS = [
+    {'pid': 2, 'name': 'Model::Two', 'active': True, 'tags': ['A'], 'description': 'Two', 'history': [
+        {'phid': 21, 'modified': '2019-02-01 00:00:00', 'by': 'System', 'message': 'Update', 'active': True},
+        {'phid': 20, 'modified': '2019-01-01 00:00:00', 'by': 'System', 'message': 'Created', 'active': False}
+    ]},
+    {'pid': 1, 'name': 'Model::One', 'active': False, 'tags': [], 'description': 'One', 'history': [
+        {'phid': 10, 'modified': '2019-01-15 00:00:00', 'by': 'analyst', 'message': 'Created', 'active': False}
+    ]}
+]
+
+
+def make_model_version(pid, phid, priority):
+    return {'policy': {'pid': pid, 'phid': phid, 'name': 'Model', 'message': '', 'priority': priority,
+                       'logic': {'data': []}}, 'components': []}
+
+
+def test_get_model_history_frame():
+    history = get_model_history_frame(MODELS)
+
+    assert list(history['phid']) == [10, 20, 21]
+    assert list(history['name']) == ['Model::One', 'Model::Two', 'Model::Two']
+    # History values take precedence over model values
+    assert list(history['active']) == [False, False, True]
+
+    assert get_model_history_frame([]).empty
+
+
+def test_get_model_history():
+    versions = {20: make_model_version(2, 20, 3), 21: make_model_version(2, 21, 4)}
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(side_effect=lambda call: MODELS if call == '/models' else versions[int(call[-2:])])
+
+    history = get_model_history(api, start_date=dt.datetime(2019, 1, 10), with_changes=True)
+
+    assert list(history['phid']) == [10, 21]
+    assert history['changes'][0] is None
+    assert history['changes'][1] == {'policy': {'base': [{'change': 'changed', 'path': 'priority',
+                                                          'old': 3, 'new': 4}]}}
+
+    history = get_model_history(api, active_only=True, pids=[2])
+    assert list(history['phid']) == [20, 21]
+    assert 'changes' not in history
+
+
+def test_export_frame(tmpdir):
+    frame = pd.DataFrame({'pid': [1], 'tags': [['A', 'B']]})
+
+    export_frame(frame, '{0}/history.csv'.format(tmpdir), 'csv')
+
+    assert pd.read_csv('{0}/history.csv'.format(tmpdir))['tags'][0] == '["A", "B"]'
+    assert frame['tags'][0] == ['A', 'B']
+
+
+def test_export_frame_parquet_without_pyarrow(tmpdir):
+    with patch('pandas.DataFrame.to_parquet', side_effect=ImportError):
+        with pytest.raises(click.UsageError):
+            export_frame(pd.DataFrame({'pid': [1]}), '{0}/history.parquet'.format(tmpdir), 'parquet')
@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock, patch
+import pytest
+import click
+from dtctl.dtapi.api import Api
+from dtctl.models.functions import select_models_by_key_values, search_models, get_models
+from dtctl.models.index import ModelIndex, get_model_index
+from dtctl.system.functions import get_system_model
+
+
+MODELS = [
+    {'pid': 1, 'uuid': 'ABC-1', 'name': 'Anomalous Connection::Data Sent', 'active': True, 'tags': ['AP: Egress']},
+    {'pid': 2, 'uuid': 'abc-2', 'name': 'Compliance::Crypto::Mining', 'active': False, 'tags': ['ap: egress']},
+    {'pid': 3, 'uuid': 'abc-3', 'name': 'System::Packet Loss', 'active': True, 'tags': []}
+]
+
+
+def get_api():
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(return_value=MODELS)
+    return api
+
+
+def test_model_index_lookups():
+    index = ModelIndex(MODELS)
+
+    assert index.get_by_pid(2)['name'] == 'Compliance::Crypto::Mining'
+    assert index.get_by_pid('3')['name'] == 'System::Packet Loss'
+    assert index.get_by_name('system::packet loss')['pid'] == 3
+    assert index.get_by_uuid('abc-1')['pid'] == 1
+    assert index.get_by_name('Unknown') is None
+    assert [model['pid'] for model in index.get_by_tag('AP: EGRESS')] == [1, 2]
+    assert [model['pid'] for model in index.get_by_category('compliance')] == [2]
+    assert [model['pid'] for model in index.get_by_category('Compliance::Crypto')] == [2]
+    assert [model['pid'] for model in index.search('*::?ata*')] == [1]
+    assert [model['pid'] for model in index.select('active', 'true')] == [1, 3]
+    assert [model['pid'] for model in index.select('pid', 'x')] == []
+
+
+def test_model_index_duplicate_names():
+    models = MODELS + [{'pid': 4, 'uuid': 'abc-4', 'name': 'system::packet loss', 'active': False, 'tags': []}]
+    index = ModelIndex(models)
+
+    assert index.get_by_name('System::Packet Loss')['pid'] == 3
+    assert [model['pid'] for model in index.select('name', 'System::Packet Loss')] == [3, 4]
+    assert [model['pid'] for model in index.select('name', 'Unknown')] == []
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(return_value=models)
+    assert [model['pid'] for model in select_models_by_key_values(api, {'name': 'system::packet loss'})] == [3, 4]
+
+
+def test_model_index_is_cached_per_api():
+    api = get_api()
+
+    assert get_model_index(api) is get_model_index(api)
+    api.get.assert_called_once_with('/models')
+
+
+def test_select_and_search_models():
+    api = get_api()
+
+    assert [model['pid'] for model in select_models_by_key_values(api, {'name': 'system::packet loss',
+                                                                        'active': 'false'})] == [2, 3]
+    assert [model['pid'] for model in search_models(api, 'system::*')] == [3]
+
+
+def test_get_system_model():
+    api = get_api()
+
+    assert get_system_model(api, 'System::Packet Loss')['pid'] == 3
+
+    with pytest.raises(click.UsageError):
+        get_system_model(api, 'System::System')
+
+
+def test_get_models_with_components():
+    models = [
+        {'pid': 1, 'name': 'Model::One', 'active': True, 'tags': [], 'logic': {'data': [{'cid': 10}, 20]}},
+        {'pid': 2, 'name': 'Model::Two', 'active': False, 'tags': [], 'logic': {'data': [30]}}
+    ]
+    components = [{'cid': 20, 'name': 'b'}, {'cid': 10, 'name': 'a'}]
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(side_effect=lambda endpoint, **_: models if endpoint == '/models' else components)
+
+    joined = get_models(api, False, False, True, None)
+
+    assert [component['name'] for component in joined[0]['components']] == ['a', 'b']
+    assert joined[1]['components'] == []
+    assert 'components' not in models[0]
+
+    streamed = get_models(api, False, True, True, None, stream=True)
+
+    assert not isinstance(streamed, list)
+    assert [model['pid'] for model in streamed] == [1]
+
+
+@patch('dtctl.models.index.time.monotonic')
+def test_model_index_rebuilt_after_cache_ttl(monotonic):
+    monotonic.return_value = 1000.0
+    api = get_api()
+    api.cache_ttl = 60
+    index = get_model_index(api)
+
+    monotonic.return_value = 1030.0
+    assert get_model_index(api) is index
+
+    monotonic.return_value = 1061.0
+    assert get_model_index(api) is not index
+    assert api.get.call_count == 2
+
+
+@patch('dtctl.models.index.time.monotonic')
+def test_model_index_without_cache_ttl(monotonic):
+    monotonic.return_value = 1000.0
+    api = get_api()
+    index = get_model_index(api)
+
+    monotonic.return_value = 100000.0
+    assert get_model_index(api) is index
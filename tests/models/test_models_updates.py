@@ -0,0 +1,78 @@
+import datetime as dt
+from unittest.mock import MagicMock
+from dtctl.dtapi.api import Api
+from dtctl.models import functions
+from dtctl.models.functions import get_pending_updates, get_updatable, get_models_by_date_range
+
+
+MODELS = [
+    {'pid': 1, 'name': 'Up to date', 'modified': '2019-01-01 00:00:00', 'history': [
+        {'phid': 11, 'active': True, 'by': 'System', 'modified': '2019-01-01 00:00:00'},
+        {'phid': 10, 'active': False, 'by': 'System', 'modified': '2018-01-01 00:00:00'}
+    ]},
+    {'pid': 2, 'name': 'Pending, customized', 'modified': '2019-02-01 00:00:00', 'history': [
+        {'phid': 20, 'active': True, 'by': 'analyst', 'modified': '2019-01-01 00:00:00'},
+        {'phid': 21, 'active': False, 'by': 'System', 'modified': '2019-02-01 00:00:00'}
+    ]},
+    {'pid': 3, 'name': 'Pending, not customized', 'modified': '2019-03-01 00:00:00', 'history': [
+        {'phid': 31, 'active': False, 'by': 'System', 'modified': '2019-03-01 00:00:00'},
+        {'phid': 30, 'active': True, 'by': 'darktrace', 'modified': '2019-01-01 00:00:00'}
+    ]},
+    {'pid': 4, 'name': 'Pending, single version', 'modified': '2019-04-01 00:00:00', 'history': [
+        {'phid': 40, 'active': False, 'by': 'System', 'modified': '2019-04-01 00:00:00'}
+    ]},
+    {'pid': 5, 'name': 'Without history', 'modified': '2019-05-01 00:00:00', 'history': []}
+]
+
+
+def get_api(models):
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(return_value=models)
+    return api
+
+
+def test_get_pending_updates():
+    assert [model['pid'] for model in get_pending_updates(get_api(MODELS))] == [2, 3, 4]
+    assert get_pending_updates(get_api([])) == []
+
+
+def test_get_updatable():
+    assert get_updatable(get_api(MODELS)) == ['Pending, customized']
+
+
+def test_history_state_is_cached_per_cached_response(requests_mock):
+    functions._HISTORY_STATES.clear()
+    requests_mock.get('http://127.0.0.1/models', json=MODELS)
+
+    # Without a response cache the history state is not cached either
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    get_pending_updates(api)
+    assert len(functions._HISTORY_STATES) == 0
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey', cache_ttl=60)
+    assert [model['pid'] for model in get_pending_updates(api)] == [2, 3, 4]
+    assert get_updatable(api) == ['Pending, customized']
+
+    cache_key = api.get_cache_key('/models')
+    assert list(functions._HISTORY_STATES) == [cache_key]
+    assert functions.get_history_state([], cache_key) is functions._HISTORY_STATES[cache_key]
+    assert requests_mock.call_count == 2
+
+    # A response that is fetched again gets a new key
+    api.clear_cache()
+    get_pending_updates(api)
+    assert api.get_cache_key('/models') != cache_key
+    assert len(functions._HISTORY_STATES) == 2
+
+
+def test_get_history_state():
+    history_state = functions.get_history_state(MODELS + [{'pid': 6, 'history': [{'phid': 60, 'active': True}]}])
+
+    assert history_state == {0: (True, 'System'), 1: (False, 'analyst'), 2: (False, 'darktrace'), 3: (False, None)}
+
+
+def test_get_models_by_date_range():
+    models = get_models_by_date_range(MODELS, start_date=dt.datetime(2019, 2, 1), end_date=dt.datetime(2019, 4, 1))
+
+    assert [model['pid'] for model in models] == [2, 3, 4]
+    assert get_models_by_date_range([], start_date=dt.datetime(2019, 2, 1), end_date=dt.datetime(2019, 4, 1)) == []
@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import MagicMock, patch
+import pytest
+from click.testing import CliRunner
+from dtctl.cli import cli, DEFAULT_CONFIG_FILE
+from dtctl.dtapi.api import Api
+from dtctl.serve.functions import CommandServer, forward_command, get_forwarded_options, get_serve_socket, \
+    invoke_command
+from dtctl.utils.state import ProgramState
+
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def config_file():
+    # Unix socket paths are limited in length, so pytest's tmp_path may be too long
+    directory = tempfile.mkdtemp(prefix='dtctl')
+    yield os.path.join(directory, 'config.json')
+    shutil.rmtree(directory)
+
+
+@pytest.fixture
+def program_state(config_file):
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(return_value={'version': '4.0'})
+    return ProgramState(api, False, {}, config_file)
+
+
+@pytest.fixture
+def server(config_file, program_state):
+    server = CommandServer(get_serve_socket(config_file), cli, program_state)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.1}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_serve_socket_next_to_config_file(config_file):
+    with patch.dict(os.environ, {}, clear=True):
+        assert get_serve_socket(config_file) == os.path.join(os.path.dirname(config_file), 'serve.sock')
+
+    with patch.dict(os.environ, {'DTCTL_SERVE_SOCKET': '/run/user/1000/dtctl.sock'}):
+        assert get_serve_socket(config_file) == '/run/user/1000/dtctl.sock'
+
+
+def test_forwarded_options():
+    options = get_forwarded_options(cli, ['-c', '/tmp/config.json', 'system', 'info'])
+
+    assert options['config_file'] == '/tmp/config.json'
+    assert options['host'] is None
+    assert get_forwarded_options(cli, ['system', 'info'])['config_file'] == DEFAULT_CONFIG_FILE
+    assert get_forwarded_options(cli, ['--host', 'https://dt', 'system', 'info'])['host'] == 'https://dt'
+
+
+@pytest.mark.parametrize('args', [
+    [],
+    ['--help'],
+    ['--version'],
+    ['config', 'get', 'host'],
+    ['serve', '--status'],
+    ['-d', 'system', 'info'],
+    ['--insecure', 'system', 'info'],
+    ['-p', 'pubkey', 'system', 'info'],
+    ['-s', 'privkey', 'system', 'info'],
+    ['-e', '/path/to/cacert', 'system', 'info'],
+    ['--unknown-option', 'system', 'info'],
+])
+def test_commands_that_run_locally(args):
+    assert get_forwarded_options(cli, args) is None
+
+
+def test_forward_command(capsys, config_file, server, program_state):
+    assert forward_command(cli, ['-c', config_file, 'system', 'info']) == 0
+    assert forward_command(cli, ['-c', config_file, 'system', 'info']) == 0
+
+    assert '"version": "4.0"' in capsys.readouterr().out
+    assert server.served == 2
+
+
+def test_forward_command_with_relative_outfile(capsys, config_file, server):
+    output_dir = os.path.dirname(config_file)
+    current_dir = os.getcwd()
+    os.chdir(output_dir)
+    try:
+        assert forward_command(cli, ['-c', config_file, 'system', 'info', '-o', 'info.json']) == 0
+    finally:
+        os.chdir(current_dir)
+
+    assert os.path.exists(os.path.join(output_dir, 'info.json'))
+    assert os.getcwd() == current_dir
+
+
+def test_forward_command_errors(capsys, config_file, server):
+    assert forward_command(cli, ['-c', config_file, 'system', 'unknown']) == 2
+    assert 'No such command "unknown"' in capsys.readouterr().err
+
+
+def test_forward_command_to_other_host_runs_locally(config_file, server):
+    assert forward_command(cli, ['-c', config_file, '-h', 'https://other', 'system', 'info']) is None
+    assert server.served == 0
+
+
+def test_forward_command_with_other_config_file_runs_locally(config_file, server):
+    other_config_file = os.path.join(os.path.dirname(config_file), 'other.json')
+
+    with patch.dict(os.environ, {'DTCTL_SERVE_SOCKET': get_serve_socket(config_file)}):
+        assert forward_command(cli, ['-c', other_config_file, 'system', 'info']) is None
+    assert server.served == 0
+
+
+def test_forward_command_without_server(config_file):
+    assert forward_command(cli, ['-c', config_file, 'system', 'info']) is None
+
+
+def test_invoke_command_exit_codes(capsys, program_state):
+    program_state.api.get = MagicMock(side_effect=SystemExit('Error: Failed connecting'))
+
+    assert invoke_command(cli, program_state, ['system', 'info']) == 1
+    assert 'Error: Failed connecting' in capsys.readouterr().err
+    assert invoke_command(cli, program_state, ['system', 'info', '--help']) == 0
+    assert invoke_command(cli, program_state, ['system', 'info', '--unknown']) == 2
+
+
+def test_serve_status_without_server(config_file):
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', '-s', '_', '-c', config_file, 'serve', '--status'])
+
+    assert result.exit_code != 0
+    assert 'dtctl serve is not running' in result.output
+
+
+def test_serve_status(config_file, server):
+    result = runner.invoke(cli, ['-h', '_', '-p', '_', '-s', '_', '-c', config_file, 'serve', '--status'])
+
+    assert result.exit_code == 0
+    assert 'dtctl serve running (pid {0:d})'.format(os.getpid()) in result.output
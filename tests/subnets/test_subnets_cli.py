@@ -23,3 +23,13 @@ def test_subnets_wrong_subcommand(get_private_key):
 
     assert result.exit_code is not 0
     assert 'Error: No such command "wrong".' in result.output
+
+
+@patch('dtctl.cli.get_private_key')
+def test_subnets_unidirectional_negative_top(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', 'http://localhost', '-p', 'pubkey', '-s', 'privkey',
+                                 'subnets', 'unidirectional', '--top', '-1'])
+
+    assert result.exit_code != 0
+    assert 'Invalid value for "--top" / "-t"' in result.output
@@ -0,0 +1,128 @@
+import json
+import pytest
+import click
+from dtctl.subnets.functions import get_subnet_frame, count_devices, calculate_unidirectional_traffic, \
+    parse_bucket_edges, calculate_dhcp_stats, extract_subnets_per_instances
+
+
+@pytest.fixture
+def status_info():
+    data_file = 'tests/data/status.json'
+    with open(data_file) as infile:
+        json_data = json.load(infile)
+    return json_data
+
+
+def test_get_subnet_frame(status_info):
+    subnet_frame = get_subnet_frame(status_info)
+
+    assert len(subnet_frame.index) == 3
+    assert list(subnet_frame['instance'].unique()) == ['darktrace-instance-1', 'darktrace-instance-2']
+    assert 'recentUnidirectionalTrafficPercent' in subnet_frame.columns
+
+
+def test_count_devices(status_info):
+    assert count_devices(get_subnet_frame(status_info)) == {'clients': 30, 'servers': 300, 'total': 330}
+
+
+def test_calculate_unidirectional_traffic(status_info):
+    subnet_data = status_info['instances']['darktrace-instance-2']['subnetData']
+    subnet_data[0]['recentUnidirectionalTrafficPercent'] = 5
+    subnet_data[1]['recentUnidirectionalTrafficPercent'] = 85
+    subnet_frame = get_subnet_frame(status_info)
+
+    result = calculate_unidirectional_traffic(status_info, subnet_frame, top=1)
+
+    assert 'darktrace-instance-3' not in result
+    assert result['darktrace-instance-1']['subnets_reporting_unidirectional'] == 0
+    assert result['darktrace-instance-1']['mean_percentage'] is None
+    assert result['darktrace-instance-1']['worst_subnets'] == []
+
+    instance = result['darktrace-instance-2']
+    assert instance['total_seen_subnets'] == 2
+    assert instance['mean_percentage'] == 45.0
+    assert instance['median_percentage'] == 45.0
+    assert instance['p95_percentage'] == 81.0
+    assert instance['0_to_10%'] == 1
+    assert instance['10_to_40%'] == 0
+    assert instance['70_to_100%'] == 1
+    assert instance['worst_subnets'] == [{'sid': 1000000000002, 'network': '10.3.3.3.0/24', 'percentage': 85.0}]
+
+    result = calculate_unidirectional_traffic(status_info, subnet_frame, (0, 50, 100))
+    assert result['darktrace-instance-2']['0_to_50%'] == 1
+    assert result['darktrace-instance-2']['50_to_100%'] == 1
+    assert 'worst_subnets' not in result['darktrace-instance-2']
+
+
+def test_calculate_unidirectional_traffic_outside_bucket_edges(status_info):
+    subnet_data = status_info['instances']['darktrace-instance-2']['subnetData']
+    subnet_data[0]['recentUnidirectionalTrafficPercent'] = -5
+    subnet_data[1]['recentUnidirectionalTrafficPercent'] = 150
+
+    result = calculate_unidirectional_traffic(status_info, get_subnet_frame(status_info), (0, 50, 100))
+
+    assert result['darktrace-instance-2']['0_to_50%'] == 1
+    assert result['darktrace-instance-2']['50_to_100%'] == 1
+    # Statistics are calculated on the reported percentages
+    assert result['darktrace-instance-2']['mean_percentage'] == 72.5
+
+
+def test_parse_bucket_edges():
+    assert parse_bucket_edges('0,10,40,70,100') == (0, 10, 40, 70, 100)
+    assert parse_bucket_edges('0, 2.5, 100') == (0, 2.5, 100)
+
+    for edges in ['', '10', '0,a,100', '0,50,50']:
+        with pytest.raises(click.UsageError) as exc_info:
+            parse_bucket_edges(edges)
+        assert 'bucket edges' in exc_info.value.message.lower()
+
+
+def test_calculate_dhcp_stats(status_info):
+    subnets = [
+        {'sid': 1000000000001, 'network': '10.2.2.0/24', 'dhcp': True},
+        {'sid': 1000000000003, 'network': '10.4.4.0/24', 'dhcp': False}
+    ]
+    status_info['instances']['darktrace-instance-1']['subnetData'][0]['dhcpQuality'] = 75
+    subnet_frame = get_subnet_frame(status_info)
+
+    result = calculate_dhcp_stats(status_info, subnet_frame, subnets)
+
+    assert len(result) == 2
+    assert result[0]['system'] == 'darktrace-hostname-1'
+    assert result[0]['subnets_seen'] == 1
+    assert result[0]['subnets_tracking_dhcp'] == 1
+    assert result[0]['total_dhcp_quality'] == 75
+    assert result[0]['average_dhcp_quality'] == 75
+
+    # No subnets tracking DHCP must not result in a ZeroDivisionError
+    assert result[1]['subnets_seen'] == 2
+    assert result[1]['subnets_failing_dhcp'] == 1
+    assert result[1]['subnets_not_registered'] == 1
+    assert result[1]['subnets_tracking_dhcp'] == 0
+    assert result[1]['average_dhcp_quality'] == 0
+
+    # Input must not be modified
+    assert subnets[0]['sid'] == 1000000000001
+
+    per_subnet = calculate_dhcp_stats(status_info, subnet_frame, subnets, per_subnet=True)
+    assert [subnet['dhcp_status'] for subnet in per_subnet] == ['tracking', 'failing', 'not_registered']
+    assert per_subnet[0]['dhcp_quality'] == 75
+    assert per_subnet[1]['dhcp_quality'] is None
+
+
+def test_calculate_dhcp_stats_without_subnets(status_info):
+    for instance in status_info['instances'].values():
+        instance['subnetData'] = []
+
+    result = calculate_dhcp_stats(status_info, get_subnet_frame(status_info), [])
+
+    assert [stats['subnets_seen'] for stats in result] == [0, 0]
+    assert [stats['average_dhcp_quality'] for stats in result] == [0, 0]
+
+
+
+def test_extract_subnets_per_instances(status_info):
+    result = extract_subnets_per_instances(status_info, get_subnet_frame(status_info))
+
+    assert result['darktrace-instance-3'] == {'error': True}
+    assert all(isinstance(result[name], list) for name in ('darktrace-instance-1', 'darktrace-instance-2'))
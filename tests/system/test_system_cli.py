@@ -58,3 +58,29 @@ def test_system_coverage_no_columns(get_private_key):
 
     assert result.exit_code is not 0
     assert 'Error: please specify CSV columns to use' in result.output
+
+
+@patch('dtctl.system.commands.get_packet_loss')
+@patch('dtctl.cli.get_private_key')
+def test_system_packet_loss_aggregate(get_private_key, get_packet_loss):
+    get_private_key.return_value = ''
+    get_packet_loss.return_value = [
+        {'system': 'probe-01', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T00:10:00', 'packet_loss': 1.5,
+         'worker_drop_rate': 0.1}
+    ]
+    result = runner.invoke(cli, ['-h', 'http://localhost', '-p', 'pubkey', '-s', 'privkey', 'system', 'packet-loss',
+                                 '--aggregate', '1h', '--format', 'csv'])
+
+    assert result.exit_code == 0
+    assert 'probe-01,10.0.0.1,2019-01-01T00:00:00,1,1.5,1.5,0.1,0.1' in result.output
+
+
+@patch('dtctl.cli.get_private_key')
+def test_system_packet_loss_options_require_aggregate(get_private_key):
+    get_private_key.return_value = ''
+    result = runner.invoke(cli, ['-h', 'http://localhost', '-p', 'pubkey', '-s', 'privkey', 'system', 'packet-loss',
+                                 '--top', '5'])
+
+    assert result.exit_code != 0
+    assert '--rolling, --top and --format require --aggregate' in result.output
+
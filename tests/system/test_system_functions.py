@@ -1,9 +1,12 @@
+import os
 import json
 import pytest
 import ipaddress
 from unittest.mock import MagicMock
+import click
 from dtctl.system.functions import get_instances, get_info, get_usage, get_subnets_from_csv_file, \
-    get_subnets_from_text_file
+    get_subnets_from_text_file, get_snapshot, extract_packet_loss_information, iter_packet_loss_information, \
+    extract_system_issue_information, aggregate_packet_loss, get_packet_loss_trend_records, write_packet_loss_trend
 from dtctl.dtapi.api import Api
 
 
@@ -85,6 +88,30 @@ def test_get_usage(status_info):
     assert 'dtqueue' not in result[1]  # probes don't have dtqueue
 
 
+def test_get_snapshot(status_info):
+    subnets = [
+        {'sid': 1000000000001, 'network': '10.2.2.0/24', 'dhcp': True},
+        {'sid': 1000000000002, 'network': '10.3.3.0/24', 'dhcp': False}
+    ]
+    for instance in status_info['instances'].values():
+        for subnet in instance.get('subnetData', []):
+            subnet['dhcpQuality'] = 80
+
+    api = Api('http://127.0.0.1', 'pubkey', 'privkey')
+    api.get = MagicMock(side_effect=lambda call, **_: status_info if call == '/status' else subnets)
+
+    result = get_snapshot(api)
+
+    assert api.get.call_count == 2
+    assert result['system'] == 'darktrace-unifiedviewer'
+    assert result['devices'] == {'clients': 30, 'servers': 300, 'total': 330}
+    assert len(result['usage']) == 6
+    assert result['instances']['darktrace-instance-3']['error']
+    assert result['subnets_per_instance']['darktrace-instance-3'] == {'error': True}
+    assert result['unidirectional']['darktrace-instance-2']['total_seen_subnets'] == 2
+    assert result['dhcp'][1]['subnets_with_dhcp_disabled'] == 1
+
+
 def test_get_subnets_from_csv_file():
     infile_sample = 'tests/data/subnet_input_list.csv'
 
@@ -103,3 +130,133 @@ def test_get_subnets_from_txt_file():
         assert isinstance(subnet, ipaddress.IPv4Network)
         assert str(subnet) == '10.{0}.0.0/24'.format(i)
         i += 1
+
+
+def packet_loss_breach(time, *values):
+    return {
+        'pbid': time,
+        'triggeredComponents': [{
+            'time': time,
+            'triggeredFilters': [{'comparatorType': 'display', 'filterType': 'Event details',
+                                  'trigger': {'value': 'Packet loss'}}] +
+                                [{'comparatorType': '>', 'filterType': 'Event details', 'trigger': {'value': value}}
+                                 for value in values]
+        }]
+    }
+
+
+def test_extract_packet_loss_information():
+    breaches = [
+        packet_loss_breach(1546300800000, 'Host probe-01-10.0.0.1: Packet loss rate above 1.50% '
+                                          '(worker drop rate: 0.10%)'),
+        # Values with malformed percentages are kept, values without a host are skipped
+        packet_loss_breach(1546300860000, 'Host probe-02-10.0.0.2: Packet loss rate above unknown',
+                           'Packet loss without host', None),
+        packet_loss_breach(1546300920000, 'Host master: rate above 3.5 and worker drop rate: 2.00%')
+    ]
+
+    assert extract_packet_loss_information(breaches) == [
+        {'system': 'probe-01', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T00:00:00', 'packet_loss': 1.5,
+         'worker_drop_rate': 0.1},
+        {'system': 'probe-02', 'ip': '10.0.0.2', 'timestamp': '2019-01-01T00:01:00', 'packet_loss': None,
+         'worker_drop_rate': None},
+        {'system': '', 'ip': 'master', 'timestamp': '2019-01-01T00:02:00', 'packet_loss': 3.5,
+         'worker_drop_rate': 2.0}
+    ]
+
+
+def test_iter_packet_loss_information_streams_breaches():
+    def breaches():
+        yield packet_loss_breach(1546300800000, 'Host probe-01-10.0.0.1: rate above 1.0 (worker drop rate: 0.0)')
+        raise AssertionError('Breaches are read before the first record is used')
+
+    records = iter_packet_loss_information(breaches())
+
+    assert next(records)['packet_loss'] == 1.0
+
+
+def test_extract_system_issue_information():
+    breaches = [
+        {'triggeredComponents': [{'time': 1546300800000, 'triggeredFilters': [
+            {'comparatorType': 'display', 'filterType': 'Event details', 'trigger': {'value': 'Displayed'}},
+            {'comparatorType': 'contains', 'filterType': 'Message', 'trigger': {'value': 'Other'}},
+            {'comparatorType': 'contains', 'filterType': 'Event details', 'trigger': {'value': 'Probe down'}},
+            {'comparatorType': 'contains', 'filterType': 'Event details', 'trigger': {'value': 'Second'}}
+        ]}, {'time': 1546300800000, 'triggeredFilters': []}]}
+    ]
+
+    assert extract_system_issue_information(breaches, {'hostname': 'master'}) == [
+        {'system': 'master', 'timestamp': '2019-01-01T00:00:00', 'message': 'Probe down'}
+    ]
+    assert extract_system_issue_information(breaches, {})[0]['system'] == 'unknown'
+
+
+@pytest.fixture
+def packet_loss_records():
+    return [
+        {'system': 'probe-01', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T00:10:00', 'packet_loss': 1.0,
+         'worker_drop_rate': 0.1},
+        {'system': 'probe-01', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T00:50:00', 'packet_loss': 3.0,
+         'worker_drop_rate': None},
+        {'system': 'probe-01', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T02:00:00', 'packet_loss': 2.0,
+         'worker_drop_rate': 0.3},
+        {'system': 'probe-02', 'ip': '10.0.0.2', 'timestamp': '2019-01-01T01:30:00', 'packet_loss': 0.5,
+         'worker_drop_rate': 0.0}
+    ]
+
+
+def test_aggregate_packet_loss(packet_loss_records):
+    trend = aggregate_packet_loss(packet_loss_records, '1h', rolling='2h')
+
+    # The interval of 01:00 without packet loss of probe-01 is left out
+    assert get_packet_loss_trend_records(trend) == [
+        {'system': 'probe-01', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T00:00:00', 'reports': 2,
+         'packet_loss_max': 3.0, 'packet_loss_mean': 2.0, 'worker_drop_rate_max': 0.1,
+         'worker_drop_rate_mean': 0.1, 'packet_loss_rolling_max': 3.0, 'packet_loss_rolling_mean': 2.0},
+        {'system': 'probe-01', 'ip': '10.0.0.1', 'timestamp': '2019-01-01T02:00:00', 'reports': 1,
+         'packet_loss_max': 2.0, 'packet_loss_mean': 2.0, 'worker_drop_rate_max': 0.3,
+         'worker_drop_rate_mean': 0.3, 'packet_loss_rolling_max': 2.0, 'packet_loss_rolling_mean': 2.0},
+        {'system': 'probe-02', 'ip': '10.0.0.2', 'timestamp': '2019-01-01T01:00:00', 'reports': 1,
+         'packet_loss_max': 0.5, 'packet_loss_mean': 0.5, 'worker_drop_rate_max': 0.0,
+         'worker_drop_rate_mean': 0.0, 'packet_loss_rolling_max': 0.5, 'packet_loss_rolling_mean': 0.5}
+    ]
+
+
+def test_aggregate_packet_loss_top(packet_loss_records):
+    trend = aggregate_packet_loss(packet_loss_records, '1d', top=1)
+
+    assert trend['system'].tolist() == ['probe-01']
+    assert trend['packet_loss_max'].tolist() == [3.0]
+
+
+@pytest.mark.parametrize('interval, rolling, option', [
+    ('hourly', None, '--aggregate'),
+    ('1h', '1M', '--rolling')
+])
+def test_aggregate_packet_loss_invalid_interval(packet_loss_records, interval, rolling, option):
+    with pytest.raises(click.UsageError) as err:
+        aggregate_packet_loss(packet_loss_records, interval, rolling)
+    assert 'Invalid {0} interval'.format(option) in str(err.value)
+
+
+def test_write_packet_loss_trend(packet_loss_records, tmpdir, capsys):
+    trend = aggregate_packet_loss(packet_loss_records, '1h')
+    outfile = os.path.join(str(tmpdir), 'trend.csv')
+
+    write_packet_loss_trend(trend, outfile, 'csv')
+    with open(outfile) as infile:
+        lines = infile.read().splitlines()
+    assert lines[0] == 'system,ip,timestamp,reports,packet_loss_max,packet_loss_mean,worker_drop_rate_max,' \
+                       'worker_drop_rate_mean'
+    assert lines[1] == 'probe-01,10.0.0.1,2019-01-01T00:00:00,2,3.0,2.0,0.1,0.1'
+
+    write_packet_loss_trend(trend, None, 'openmetrics')
+    metrics = capsys.readouterr().out
+    assert '# TYPE darktrace_packet_loss_max_percent gauge' in metrics
+    assert 'darktrace_packet_loss_max_percent{system="probe-01",ip="10.0.0.1"} 3.0 1546300800\n' in metrics
+    assert metrics.endswith('# EOF\n')
+
+    with pytest.raises(click.UsageError) as err:
+        write_packet_loss_trend(trend, None, 'parquet')
+    assert 'Parquet output requires --outfile' in str(err.value)
+
@@ -0,0 +1,80 @@
+import os
+import sys
+import subprocess
+import click
+import pytest
+from dtctl.cli import cli
+from dtctl.utils.clickutils import LazyGroup
+
+HEAVY_MODULES = ['pandas', 'numpy', 'openpyxl', 'netaddr', 'Cryptodome', 'requests']
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_loaded_heavy_modules(code):
+    # A fresh interpreter is needed, as the test session itself already imported everything
+    check = '{0}\nimport sys\nprint(",".join(m for m in {1!r} if m in sys.modules))'.format(code, HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', check], stdout=subprocess.PIPE, check=True,
+                            universal_newlines=True)
+    return [module for module in result.stdout.strip().split(',') if module]
+
+
+def test_cli_import_does_not_load_heavy_modules():
+    assert get_loaded_heavy_modules('import dtctl.cli') == []
+
+
+# Wall-clock timing depends on the machine, so this test only runs when explicitly enabled
+@pytest.mark.skipif(not os.environ.get('DTCTL_IMPORT_TIME_TEST'),
+                    reason='set DTCTL_IMPORT_TIME_TEST=1 to check the CLI import time')
+def test_cli_import_time_within_threshold():
+    # Regression bound on the startup time of the CLI, see benchmarks/bench_import_time.py
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    result = subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'benchmarks', 'bench_import_time.py'),
+                             '--runs', '3', '--threshold', '250'],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, env=env)
+    assert result.returncode == 0, result.stdout
+
+
+def test_resolving_subcommands_does_not_load_heavy_modules():
+    code = '\n'.join([
+        'import click',
+        'from dtctl.cli import cli',
+        'ctx = click.Context(cli)',
+        'for command in [cli.get_command(ctx, name) for name in cli.list_commands(ctx)]:',
+        '    for name in getattr(command, "list_commands", lambda ctx: [])(ctx):',
+        '        command.get_command(ctx, name)'
+    ])
+    assert get_loaded_heavy_modules(code) == []
+
+
+def test_all_lazy_subcommands_resolve():
+    ctx = click.Context(cli)
+    assert 'serve' in cli.list_commands(ctx)
+
+    for group_name in cli.list_commands(ctx):
+        group = cli.get_command(ctx, group_name)
+        assert isinstance(group, click.Command), group_name
+        assert group.name == group_name
+        if not isinstance(group, click.MultiCommand):
+            continue
+
+        assert isinstance(group, LazyGroup)
+        for name in group.list_commands(ctx):
+            command = group.get_command(ctx, name)
+            assert isinstance(command, click.Command), '{0} {1}'.format(group_name, name)
+            assert command.name == name
+
+
+def test_lazy_group_rejects_non_commands():
+    group = LazyGroup('test', lazy_subcommands={'broken': 'dtctl.cli.DEFAULT_CONFIG_FILE'})
+
+    with pytest.raises(ValueError):
+        group.get_command(click.Context(group), 'broken')
+
+
+def test_lazy_group_lists_eager_and_lazy_commands():
+    group = LazyGroup('test', lazy_subcommands={'list': 'dtctl.filters.commands.list_filters'})
+    group.add_command(click.Command('eager'))
+
+    assert group.list_commands(click.Context(group)) == ['eager', 'list']
+    assert group.get_command(click.Context(group), 'missing') is None
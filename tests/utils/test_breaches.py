@@ -0,0 +1,36 @@
+import datetime as dt
+from unittest.mock import MagicMock
+from dtctl.utils.breaches import get_breach_device_id, iter_model_breaches
+from dtctl.utils.timeutils import fmttime
+
+
+def test_get_breach_device_id():
+    assert get_breach_device_id({'pbid': 1, 'triggeredComponents': [{'device': {'did': 5}}]}) == 5
+    assert get_breach_device_id({'pbid': 2, 'triggeredComponents': [{}], 'device': {'did': 6}}) == 6
+    assert get_breach_device_id({'pbid': 3}) is None
+
+
+def test_iter_model_breaches_requests_windows():
+    start_date = dt.datetime(2019, 1, 1)
+    end_date = dt.datetime(2019, 1, 20)
+    api = MagicMock()
+    # The breach on the boundary of the first two windows is returned by both requests
+    api.get.side_effect = [[{'pbid': 1}, {'pbid': 2}], [{'pbid': 2}, {'pbid': 3}], [{'pbid': 4}]]
+
+    breaches = iter_model_breaches(api, start_date, end_date, pid=10)
+
+    assert api.get.call_count == 0
+    assert [breach['pbid'] for breach in breaches] == [1, 2, 3, 4]
+    assert [call[1] for call in api.get.call_args_list] == [
+        {'starttime': fmttime(start_date), 'endtime': fmttime(dt.datetime(2019, 1, 8)), 'pid': 10},
+        {'starttime': fmttime(dt.datetime(2019, 1, 8)), 'endtime': fmttime(dt.datetime(2019, 1, 15)), 'pid': 10},
+        {'starttime': fmttime(dt.datetime(2019, 1, 15)), 'endtime': fmttime(end_date), 'pid': 10}
+    ]
+
+
+def test_iter_model_breaches_without_start_date():
+    api = MagicMock()
+    api.get.return_value = [{'pbid': 1}]
+
+    assert list(iter_model_breaches(api, None, None, pid=10)) == [{'pbid': 1}]
+    api.get.assert_called_once_with('/modelbreaches', starttime=None, endtime=None, pid=10)
@@ -1,5 +1,5 @@
 import pytest
-from dtctl.utils.cef import Cef
+from dtctl.utils.cef import Cef, format_cef_header, escape_cef_value
 
 
 @pytest.fixture
@@ -89,6 +89,14 @@ def test_escape_strings_for_cef():
     assert cef.escape_strings_for_cef(r'test') == 'test'
     assert cef.escape_strings_for_cef(r'test=test') == r'test\=test'
     assert cef.escape_strings_for_cef(r'test\test') == r'test\\test'
+    assert cef.escape_strings_for_cef('line1\r\nline2') == r'line1\r\nline2'
+
+
+def test_format_cef_header():
+    assert format_cef_header('Darktrace', 'DCIP', '1.0', 10, 'Model|Name\\', 5) == \
+        'CEF:0|Darktrace|DCIP|1.0|10|Model\\|Name\\\\|5|'
+    assert escape_cef_value(1.5) == '1.5'
+    assert escape_cef_value('a=b\n') == r'a\=b\n'
 
 
 def test_generate_logs_for_system_usage():
@@ -185,6 +193,10 @@ def test_generate_logs_for_system_issue():
                                      'end=Jan 01 2019 01:01:01 deviceExternalId=system1 ' \
                                      'msg=Probe 10.0.0.1 has problem x'
 
+    # Newlines in values would otherwise split the event over multiple lines
+    cef_logging = cef.generate_logs([dict(output[0], message='Probe down\nsince 01:00')])
+    assert cef_logging[0].endswith(r'msg=Probe down\nsince 01:00' + '\n')
+
     with pytest.raises(TypeError) as exc_info:
         cef.generate_logs('Not a list')
     assert isinstance(exc_info.value, TypeError)
@@ -222,3 +234,25 @@ def test_cef_mapping():
     assert cef.MAPPING['DHCP Quality']['average_dhcp_quality'] == 'cs3Label'
 
     assert cef.MAPPING['System Issue']['message'] == 'msg'
+
+
+def test_generate_logs_does_not_modify_input():
+    cef = Cef(130, 'System Issue')
+    output = [{"system": "system1", "ip": "10.0.0.1", "timestamp": "2019-01-01T01:01:01",
+               "message": r"a=b\c", "unmapped": 1}]
+    original = [dict(json_object) for json_object in output]
+
+    cef_logging = cef.generate_logs(output)
+
+    assert output == original
+    assert cef.generate_logs(output) == cef_logging
+    assert cef_logging == ['CEF:0|Darktrace|DCIP System Monitoring|1.0|130|System Issue|3|end=Jan 01 2019 01:01:01 '
+                           'deviceExternalId=system1 dvc=10.0.0.1 msg=a\\=b\\\\c\n']
+
+
+def test_generate_logs_invalid_timestamp():
+    cef = Cef(130, 'System Issue')
+
+    for timestamp in ('2019-01-01 01:01:01', '2019-13-01T01:01:01', '2019-01-01'):
+        with pytest.raises(ValueError):
+            cef.generate_logs([{"system": "system1", "timestamp": timestamp, "message": "x"}])
@@ -1,6 +1,6 @@
 import pytest
 from click import UsageError
-from dtctl.utils.crypto import encrypt, decrypt
+from dtctl.utils.crypto import encrypt, decrypt, DEFAULT_KDF, DEFAULT_KDF_COSTS
 
 
 def test_encrypt():
@@ -24,3 +24,30 @@ def test_decrypt():
 
     assert isinstance(exc_info.value, UsageError)
     assert exc_info.value.args[0] == 'Password incorrect'
+
+
+def test_encrypt_with_kdf():
+    test_string = 'This is a test string for encryption'
+    test_passphrase = 'G15#a@{lC[h~hC(bZ"IApvhI:zS3'
+    encrypted_string = encrypt(test_passphrase, test_string, 'scrypt', 2 ** 10)
+
+    assert encrypted_string.startswith('scrypt$1024$')
+    assert decrypt(test_passphrase, encrypted_string) == test_string
+
+
+def test_encrypt_with_default_kdf():
+    encrypted_string = encrypt('passphrase', 'data')
+
+    assert encrypted_string.startswith('{0}${1:d}$'.format(DEFAULT_KDF, DEFAULT_KDF_COSTS[DEFAULT_KDF]))
+
+
+def test_encrypt_with_unsupported_kdf():
+    with pytest.raises(UsageError):
+        encrypt('passphrase', 'data', 'md5')
+
+
+def test_decrypt_legacy_format():
+    # Encrypted before key derivation functions were configurable
+    encrypted_string = 'TFexJCPeTbw=.vPxgCPNDTCBRc3hs9E6LIw==.qFkcAvrLjgs60wtrfA5CeAqhLxB7jooLL9U91pXL8dQ='
+
+    assert decrypt('G15#a@{lC[h~hC(bZ"IApvhI:zS3', encrypted_string) == 'Legacy encrypted private key'
@@ -0,0 +1,40 @@
+from dtctl.utils.diffing import diff_values, match_items, find_reordered, content_key
+
+
+def test_diff_values():
+    old = {'a': 1, 'b': {'c': [1, 2]}, 'd': 'removed'}
+    new = {'a': 2, 'b': {'c': [1, 3]}, 'e': 'added'}
+
+    assert diff_values(old, new) == [
+        {'change': 'removed', 'path': 'd', 'old': 'removed'},
+        {'change': 'added', 'path': 'e', 'new': 'added'},
+        {'change': 'changed', 'path': 'a', 'old': 1, 'new': 2},
+        {'change': 'changed', 'path': 'b.c.1', 'old': 2, 'new': 3}
+    ]
+    assert diff_values([1], [1, 2], 'list') == [{'change': 'changed', 'path': 'list', 'old': [1], 'new': [1, 2]}]
+    assert diff_values(old, dict(old)) == []
+    assert old == {'a': 1, 'b': {'c': [1, 2]}, 'd': 'removed'}
+
+
+def test_content_key():
+    assert content_key({'a': 1, 'b': 2}) == content_key({'b': 2, 'a': 1})
+    assert content_key({'a': 1}) != content_key({'a': 2})
+
+
+def test_match_items():
+    old = [{'id': 'A', 'value': 1}, {'name': 'x', 'value': 2}, {'name': 'y', 'value': 3, 'other': 1},
+           {'name': 'gone', 'value': 4}]
+    new = [{'name': 'x', 'value': 2}, {'id': 'A', 'value': 5}, {'name': 'y', 'value': 3, 'other': 2},
+           {'name': 'new', 'value': 6, 'extra': True}]
+
+    pairs, removed, added = match_items(old, new, identity='id')
+
+    assert pairs == [(0, 1), (1, 0), (2, 2)]
+    assert removed == [3]
+    assert added == [3]
+
+
+def test_find_reordered():
+    assert find_reordered([(0, 0), (1, 1), (2, 2)]) == []
+    assert find_reordered([(0, 2), (1, 0), (2, 1)]) == [(0, 2)]
+    assert find_reordered([]) == []
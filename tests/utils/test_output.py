@@ -1,7 +1,9 @@
 import os
 import json
+import socket
+import click
 import pytest
-from dtctl.utils.output import process_output
+from dtctl.utils.output import process_output, process_output_lines
 
 
 def test_process_output(tmpdir, capsys):
@@ -78,3 +80,44 @@ def test_process_output_to_cef(capsys):
     assert 'CEF:0|DCIP|System Monitoring|1.0|100|system usage|5|' \
            'start=1234567890 end=1234567890 src=10.10.10.2 cs1Label=type cs1=master ' \
            'cs2Label=label cs2=Appliance label2 cn1Label=bandwidth cn1=1000 cn2Label=cpu cn2=50' in captured.out
+
+
+def test_process_output_lines(tmpdir, capsys):
+    tmpfile = '{0}/pytest.tmp.jsonl'.format(tmpdir)
+
+    process_output_lines(({'id': number, 'b': 1, 'a': 2} for number in range(3)), tmpfile)
+
+    with open(tmpfile) as infile:
+        lines = infile.readlines()
+
+    assert len(lines) == 3
+    assert lines[0] == '{"a": 2, "b": 1, "id": 0}\n'
+    assert json.loads(lines[2])['id'] == 2
+
+    process_output_lines([{'id': 1}], None)
+    assert capsys.readouterr().out == '{"id": 1}\n'
+
+    with pytest.raises(SystemExit):
+        process_output_lines(iter([]), None)
+
+
+def test_process_output_to_syslog(tmpdir):
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+
+    try:
+        process_output(['line1\n', 'line2'], None, to_json=False,
+                       syslog='udp://127.0.0.1:{0}'.format(server.getsockname()[1]), spool_dir=str(tmpdir))
+        messages = [server.recv(1024).decode('utf-8') for _ in range(2)]
+    finally:
+        server.close()
+
+    assert messages[0].startswith('<14>1 ')
+    assert [message.split(' ', 7)[7] for message in messages] == ['line1', 'line2']
+
+
+def test_process_output_to_syslog_requires_lines():
+    with pytest.raises(click.UsageError) as err:
+        process_output([{'a': 1}], None, syslog='udp://127.0.0.1')
+    assert 'Only line based output' in str(err.value)
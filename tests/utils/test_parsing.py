@@ -1,5 +1,5 @@
 import pytest
-from dtctl.utils.parsing import convert_json_to_log_lines, convert_series
+from dtctl.utils.parsing import convert_json_to_log_lines, convert_series, iter_log_lines
 
 
 @pytest.fixture
@@ -71,3 +71,35 @@ def test_convert_json_to_log_lines(correct_output, failing_output):
         convert_json_to_log_lines(failing_output)
 
     assert isinstance(exc_info.value, TypeError)
+
+
+def test_convert_json_to_log_lines_does_not_modify_output(correct_output):
+    expected = [dict(record) for record in correct_output]
+
+    convert_json_to_log_lines(correct_output)
+
+    assert correct_output == expected
+
+
+def test_iter_log_lines_encodes_like_json():
+    records = iter([
+        {'timestamp': '2019-01-01T00:00:01', 'system': 'system1', 'text': 'a "quoted"\tvalue \u00e9',
+         'flag': True, 'empty': None, 'ratio': 0.1, 'nan': float('nan'), 'inf': float('-inf'), 'ids': (1, 2)},
+        {'system': 'system2', 'timestamp': '2019-01-01T00:00:02', 'count': 10 ** 20, 'flag': False}
+    ])
+
+    lines = iter_log_lines(records)
+
+    assert next(lines) == '[2019-01-01T00:00:01] system1 text="a \\"quoted\\"\\tvalue \\u00e9" flag=true ' \
+                          'empty=null ratio=0.1 nan=NaN inf=-Infinity ids=[1, 2]\n'
+    assert next(lines) == '[2019-01-01T00:00:02] system2 count=100000000000000000000 flag=false\n'
+
+
+def test_iter_log_lines_flatten(failing_output):
+    records = failing_output + [{'system': 'system2', 'timestamp': '2019-01-01T00:00:02',
+                                 'dhcp': {'failing': 1, 'subnets': [{'id': 1}], 'none': {}}}]
+
+    lines = list(iter_log_lines(records, flatten=True))
+
+    assert lines == ['[2019-01-01T00:00:01] system1 key1.0=1 key1.1=2 key1.2=3 key2="value2"\n',
+                     '[2019-01-01T00:00:02] system2 dhcp.failing=1 dhcp.subnets.0.id=1 dhcp.none={}\n']
@@ -0,0 +1,192 @@
+import os
+import re
+import socket
+import threading
+import click
+import pytest
+from dtctl.utils.sinks import StreamSink, SyslogSink, open_sink, parse_syslog_url, get_spool_file, read_spool
+
+
+def test_stream_sink_batches_lines(tmpdir):
+    outfile = str(tmpdir.join('out.log'))
+    sink = StreamSink(outfile, batch_size=3)
+    sends = []
+    send = sink.send
+    sink.send = lambda lines: sends.append(len(lines)) or send(lines)
+
+    assert sink.write_lines('line{0}'.format(index) for index in range(7)) == 7
+    sink.close()
+
+    assert sends == [3, 3, 1]
+    with open(outfile) as infile:
+        assert infile.read().splitlines() == ['line{0}'.format(index) for index in range(7)]
+
+
+def test_stream_sink_stdout(capsys):
+    with StreamSink() as sink:
+        sink.write('line1')
+        sink.write('line2')
+
+    assert capsys.readouterr().out == 'line1\nline2\n'
+
+
+def listen_udp():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    return server
+
+
+class TcpReceiver(threading.Thread):
+    """Receives the connections of a TCP syslog sink"""
+
+    def __init__(self, server):
+        super(TcpReceiver, self).__init__(daemon=True)
+        self.server = server
+        self.data = b''
+
+    def run(self):
+        connection, _ = self.server.accept()
+        with connection:
+            while True:
+                data = connection.recv(65536)
+                if not data:
+                    return
+                self.data += data
+
+    @property
+    def messages(self):
+        """Messages of the received octet-counted frames, without their syslog header"""
+        messages = []
+        data = self.data
+        while data:
+            length, data = data.split(b' ', 1)
+            messages.append(data[:int(length)].decode('utf-8').split(' ', 7)[7])
+            data = data[int(length):]
+        return messages
+
+
+def listen_tcp(port=0):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', port))
+    server.listen(1)
+    return server
+
+
+def get_free_port():
+    server = listen_tcp()
+    port = server.getsockname()[1]
+    server.close()
+    return port
+
+
+def test_syslog_sink_udp():
+    server = listen_udp()
+
+    try:
+        with SyslogSink('udp://127.0.0.1:{0}'.format(server.getsockname()[1]), batch_size=2, msgid='CEF') as sink:
+            sink.write_lines(['event1', 'event2', 'event3'])
+
+        messages = [server.recv(1024).decode('utf-8') for _ in range(3)]
+    finally:
+        server.close()
+
+    # RFC 5424: <PRI>VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID STRUCTURED-DATA MSG
+    assert re.match(r'^<14>1 \d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z \S+ dtctl \d+ CEF - event1$', messages[0])
+    assert [message.split(' ', 7)[7] for message in messages] == ['event1', 'event2', 'event3']
+
+
+def test_syslog_sink_tcp():
+    server = listen_tcp()
+    receiver = TcpReceiver(server)
+    receiver.start()
+
+    try:
+        with SyslogSink('tcp://127.0.0.1:{0}'.format(server.getsockname()[1]), batch_size=10, queue_size=1) as sink:
+            assert sink.write_lines('event{0}'.format(index) for index in range(1000)) == 1000
+        receiver.join(5)
+    finally:
+        server.close()
+
+    assert receiver.messages == ['event{0}'.format(index) for index in range(1000)]
+
+
+def test_syslog_sink_connection_refused():
+    port = get_free_port()
+
+    with pytest.raises(SystemExit) as err:
+        SyslogSink('tcp://127.0.0.1:{0}'.format(port))
+    assert 'Failed connecting to tcp://127.0.0.1:{0}'.format(port) in str(err.value)
+
+
+def test_syslog_sink_spools_and_replays(tmpdir, capsys):
+    port = get_free_port()
+    url = 'tcp://127.0.0.1:{0}'.format(port)
+    spool_file = get_spool_file(str(tmpdir), url)
+
+    # The server is down, so the messages are spooled
+    with SyslogSink(url, batch_size=2, spool_file=spool_file) as sink:
+        assert sink.write_lines(['event1', 'event2', 'event3']) == 3
+    assert '3 messages were spooled to {0}'.format(spool_file) in capsys.readouterr().err
+    assert [message.split(b' ', 7)[7] for message in read_spool(spool_file)] == [b'event1', b'event2', b'event3']
+
+    # Once the server is up, the spool is sent before new messages
+    server = listen_tcp(port)
+    receiver = TcpReceiver(server)
+    receiver.start()
+    try:
+        with SyslogSink(url, batch_size=2, spool_file=spool_file) as sink:
+            sink.write_lines(['event4'])
+        receiver.join(5)
+    finally:
+        server.close()
+
+    assert receiver.messages == ['event1', 'event2', 'event3', 'event4']
+    assert not os.path.exists(spool_file)
+    assert not os.path.exists(spool_file + '.replay')
+
+
+def test_syslog_sink_spool_is_limited(tmpdir):
+    url = 'tcp://127.0.0.1:{0}'.format(get_free_port())
+
+    with pytest.raises(SystemExit) as err:
+        with SyslogSink(url, spool_file=str(tmpdir.join('syslog.spool')), spool_max_bytes=200) as sink:
+            sink.write_lines(['x' * 100])
+            sink.write_lines(['x' * 100])
+            sink.write_lines(['x' * 100])
+    assert 'spool file' in str(err.value) and 'is full' in str(err.value)
+
+
+def test_read_spool_ignores_partial_messages(tmpdir):
+    spool_file = str(tmpdir.join('syslog.spool'))
+    with open(spool_file, 'wb') as outfile:
+        outfile.write(b'6 event1' + b'6 event2' + b'6 even')
+
+    assert list(read_spool(spool_file)) == [b'event1', b'event2']
+
+
+def test_get_spool_file():
+    assert get_spool_file('/etc/dtctl', 'tls://[::1]:6514') == '/etc/dtctl/spool/tls___1_6514.spool'
+
+
+def test_parse_syslog_url():
+    assert parse_syslog_url('udp://siem.local') == ('udp', 'siem.local', 514)
+    assert parse_syslog_url('tcp://10.0.0.1:601') == ('tcp', '10.0.0.1', 601)
+    assert parse_syslog_url('tcp://[::1]:601') == ('tcp', '::1', 601)
+    assert parse_syslog_url('tls://siem.local') == ('tls', 'siem.local', 6514)
+
+    for url in ('http://siem.local', 'siem.local:514', 'udp://siem.local:port'):
+        with pytest.raises(click.UsageError):
+            parse_syslog_url(url)
+
+
+def test_open_sink(tmpdir):
+    sink = open_sink(str(tmpdir.join('out.log')))
+    assert isinstance(sink, StreamSink)
+    sink.close()
+
+    sink = open_sink(syslog_url='udp://127.0.0.1:514', spool_dir=str(tmpdir))
+    assert isinstance(sink, SyslogSink)
+    assert sink.spool_file == os.path.join(str(tmpdir), 'spool', 'udp_127.0.0.1_514.spool')
+    sink.close()
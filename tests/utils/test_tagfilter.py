@@ -0,0 +1,47 @@
+import pytest
+from dtctl.utils.tagfilter import TagFilter, substring_filter, is_glob
+
+
+def test_tag_filter_modes():
+    tags = ['AP: Egress', 'Critical']
+
+    assert TagFilter(['Critical', 'Other']).matches(tags)
+    assert not TagFilter(['critical']).matches(tags)
+    assert TagFilter(['AP: *']).matches(tags)
+    assert TagFilter(['AP: *', 'Critical'], mode='all').matches(tags)
+    assert not TagFilter(['AP: *', 'Other'], mode='all').matches(tags)
+    assert not TagFilter(['Crit*'], mode='none').matches(tags)
+    assert TagFilter(['Other'], mode='none').matches(tags)
+    assert TagFilter(['other'], mode='none').matches(None)
+
+
+def test_tag_filter_ignore_case():
+    assert TagFilter(['critical'], ignore_case=True).matches(['Critical'])
+    assert substring_filter('enhanced').matches(['Enhanced Monitoring'])
+    assert substring_filter('[ap]').matches(['Tag [AP] test'])
+    assert not substring_filter('[ap]').matches(['a'])
+
+
+def test_tag_filter_returns_items_once():
+    breaches = [
+        {'pbid': 1, 'model': {'tags': ['AP: Egress', 'AP: Tooling']}},
+        {'pbid': 2, 'model': {'tags': ['Critical']}},
+        {'pbid': 3, 'model': {'tags': []}}
+    ]
+
+    def get_tags(breach):
+        return breach['model']['tags']
+
+    assert [breach['pbid'] for breach in TagFilter(['AP: Egress', 'AP: Tooling']).filter(breaches, get_tags)] == [1]
+    assert [breach['pbid'] for breach in TagFilter(['AP: *'], mode='none').filter(breaches, get_tags)] == [2, 3]
+
+
+def test_tag_filter_unsupported_mode():
+    with pytest.raises(ValueError):
+        TagFilter(['Critical'], mode='some')
+
+
+def test_is_glob():
+    assert is_glob('AP: *')
+    assert is_glob('Tag?')
+    assert not is_glob('Critical')